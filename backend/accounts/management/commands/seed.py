@@ -81,6 +81,7 @@ class Command(BaseCommand):
                     supply=supply,
                     type=StockMovement.Types.IN,
                     quantity=balance.quantity,
+                    balance=StockMovement.Balance.CENTRAL,
                     movement_date=date.today(),
                     note='Estoque inicial',
                     created_by=admin,
@@ -1026,4 +1026,5 @@ class Command(BaseCommand):
             movement_date=movement_date,
             note=note,
             created_by=created_by,
+            balance=StockMovement.Balance.CENTRAL if school is None else StockMovement.Balance.SCHOOL,
         )
@@ -4,6 +4,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from merenda_semed.mixins import SparseFieldsetsMixin
+
 from .permissions import IsSemedAdmin
 from .serializers import (
     MeUpdateSerializer,
@@ -28,8 +30,9 @@ class MeView(APIView):
         return Response(UserSerializer(request.user).data)
 
 
-class NutritionistUserViewSet(viewsets.ModelViewSet):
+class NutritionistUserViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsSemedAdmin]
+    cursor_ordering = '-date_joined'
     queryset = User.objects.filter(role=User.Roles.NUTRITIONIST).order_by('-date_joined')
     http_method_names = ['get', 'post', 'patch', 'head', 'options']
 
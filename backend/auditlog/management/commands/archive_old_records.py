@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auditlog.models import AuditLog
+from auditlog.partitions import drop_empty_partitions, ensure_partitions
+from inventory.models import Notification
+from merenda_semed.archive import archive_rows
+
+
+class Command(BaseCommand):
+    help = 'Move registros de auditoria e notificacoes antigos para o arquivo compactado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--audit-days', type=int, default=None, help='Retencao dos registros de auditoria (dias).')
+        parser.add_argument('--notification-days', type=int, default=None, help='Retencao das notificacoes (dias).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = max(1, options['batch_size'])
+        audit_days = options['audit_days'] if options['audit_days'] is not None else settings.AUDIT_LOG_RETENTION_DAYS
+        notification_days = (
+            options['notification_days']
+            if options['notification_days'] is not None
+            else settings.NOTIFICATION_RETENTION_DAYS
+        )
+
+        audit_cutoff = now - timedelta(days=audit_days)
+        audit_archived = archive_rows(AuditLog.objects.all(), audit_cutoff, batch_size=batch_size)
+        notifications_archived = archive_rows(
+            Notification.objects.all(),
+            now - timedelta(days=notification_days),
+            batch_size=batch_size,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{audit_archived} registro(s) de auditoria e {notifications_archived} notificacao(oes) arquivado(s).'
+        ))
+
+        created = ensure_partitions()
+        dropped = drop_empty_partitions(audit_cutoff.date())
+        if created or dropped:
+            self.stdout.write(self.style.SUCCESS(
+                f'Particoes criadas: {len(created)}; particoes vazias removidas: {len(dropped)}.'
+            ))
@@ -0,0 +1,37 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from auditlog.models import AuditLog
+from auditlog.writer import load_fallback_entries
+
+
+class Command(BaseCommand):
+    help = 'Grava no banco os registros de auditoria salvos no arquivo de contingencia.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = settings.AUDIT_LOG_FALLBACK_PATH
+        replaying = f'{path}.replaying'
+        # Writers keep appending to the original name while this file is read.
+        if not os.path.exists(replaying):
+            if not os.path.exists(path):
+                self.stdout.write(self.style.SUCCESS('Nenhum registro de auditoria pendente.'))
+                return
+            os.replace(path, replaying)
+
+        with open(replaying, encoding='utf-8') as handle:
+            entries = list(load_fallback_entries(handle))
+        user_ids = {str(pk) for pk in get_user_model().objects.values_list('pk', flat=True)}
+        logs = [AuditLog(**entry) for entry in entries if str(entry['user_id']) in user_ids]
+        AuditLog.objects.bulk_create(logs, batch_size=max(1, options['batch_size']), ignore_conflicts=True)
+        os.remove(replaying)
+
+        skipped = len(entries) - len(logs)
+        self.stdout.write(self.style.SUCCESS(f'{len(logs)} registro(s) de auditoria gravado(s).'))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'{skipped} registro(s) ignorado(s): usuario inexistente.'))
@@ -1,20 +1,24 @@
-import json
+import uuid
 
 from django.forms.models import model_to_dict
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 
 from .models import AuditLog
+from .writer import audit_writer
 
 
 class AuditLogMiddleware(MiddlewareMixin):
     MUTATING_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
 
     def process_request(self, request):
-        request._audit_request_payload = self._parse_request_payload(request)
+        # Raw bytes; the writer decodes them off the request path.
+        request._audit_request_payload = self._read_request_payload(request) if self._is_audited_route(request) else None
         request._audit_before_payload = None
 
     def process_view(self, request, view_func, view_args, view_kwargs):
-        request._audit_before_payload = self._snapshot_before_payload(view_func, view_kwargs)
+        if self._is_audited_route(request):
+            request._audit_before_payload = self._snapshot_before_payload(view_func, view_kwargs)
 
     def process_response(self, request, response):
         try:
@@ -24,14 +28,16 @@ class AuditLogMiddleware(MiddlewareMixin):
             pass
         return response
 
-    def _maybe_log(self, request, response):
+    def _is_audited_route(self, request):
         if request.method not in self.MUTATING_METHODS:
-            return
+            return False
         path = getattr(request, 'path', '') or ''
-        if not path.startswith('/api/'):
-            return
-        if path.startswith('/api/auth/'):
+        return path.startswith('/api/') and not path.startswith('/api/auth/')
+
+    def _maybe_log(self, request, response):
+        if not self._is_audited_route(request):
             return
+        path = request.path
 
         user = getattr(request, 'user', None)
         if not user or not getattr(user, 'is_authenticated', False):
@@ -39,18 +45,21 @@ class AuditLogMiddleware(MiddlewareMixin):
         if getattr(user, 'role', None) != 'NUTRITIONIST':
             return
 
-        AuditLog.objects.create(
-            user=user,
-            action_type=self._map_action_type(request.method),
-            method=request.method,
-            path=path,
-            action_route=self._get_action_route(request),
-            ip_address=self._get_ip_address(request),
-            status_code=getattr(response, 'status_code', None),
-            payload_before=getattr(request, '_audit_before_payload', None),
-            payload_after=self._parse_response_payload(response),
-            request_payload=getattr(request, '_audit_request_payload', None),
-        )
+        audit_writer.submit({
+            # Fixed here so a replayed fallback entry is never inserted twice.
+            'id': uuid.uuid4(),
+            'user_id': user.pk,
+            'action_type': self._map_action_type(request.method),
+            'method': request.method,
+            'path': path,
+            'action_route': self._get_action_route(request),
+            'ip_address': self._get_ip_address(request),
+            'status_code': getattr(response, 'status_code', None),
+            'payload_before': getattr(request, '_audit_before_payload', None),
+            'payload_after': self._response_payload(response),
+            'request_payload': getattr(request, '_audit_request_payload', None),
+            'created_at': timezone.now(),
+        })
 
     def _map_action_type(self, method):
         if method == 'POST':
@@ -73,40 +82,15 @@ class AuditLogMiddleware(MiddlewareMixin):
             return forwarded_for.split(',')[0].strip()
         return request.META.get('REMOTE_ADDR') or None
 
-    def _parse_request_payload(self, request):
-        body = getattr(request, 'body', b'') or b''
-        if not body:
-            return None
-        try:
-            decoded = body.decode('utf-8')
-        except UnicodeDecodeError:
-            return {'raw': '<non-utf8>'}
-        try:
-            return json.loads(decoded)
-        except json.JSONDecodeError:
-            return {'raw': decoded[:5000]}
+    def _read_request_payload(self, request):
+        return getattr(request, 'body', b'') or None
 
-    def _parse_response_payload(self, response):
+    def _response_payload(self, response):
         if hasattr(response, 'data'):
-            return self._json_safe(response.data)
-        content = getattr(response, 'content', b'') or b''
-        if not content:
+            return response.data
+        if getattr(response, 'streaming', False):
             return None
-        try:
-            decoded = content.decode('utf-8')
-        except UnicodeDecodeError:
-            return {'raw': '<non-utf8>'}
-        try:
-            return json.loads(decoded)
-        except json.JSONDecodeError:
-            return {'raw': decoded[:5000]}
-
-    def _json_safe(self, value):
-        try:
-            encoded = json.dumps(value, default=str)
-            return json.loads(encoded)
-        except TypeError:
-            return {'raw': str(value)}
+        return getattr(response, 'content', b'') or None
 
     def _snapshot_before_payload(self, view_func, view_kwargs):
         pk = (view_kwargs or {}).get('pk')
@@ -127,4 +111,4 @@ class AuditLogMiddleware(MiddlewareMixin):
             return None
         data = model_to_dict(instance)
         data['id'] = str(getattr(instance, 'pk', pk))
-        return self._json_safe(data)
+        return data
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditlog', '0002_rename_auditlog_aud_created_5f5082_idx_auditlog_au_created_320ace_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:45
+
+import auditlog.payloads
+from django.db import migrations, models
+
+PAYLOAD_FIELDS = ('payload_before', 'payload_after', 'request_payload')
+
+
+def pack_payloads(apps, schema_editor):
+    AuditLog = apps.get_model('auditlog', 'AuditLog')
+    rows = AuditLog.objects.exclude(
+        payload_before__isnull=True, payload_after__isnull=True, request_payload__isnull=True
+    ).values_list('pk', *PAYLOAD_FIELDS)
+    for pk, before, after, request in rows.iterator(chunk_size=500):
+        AuditLog.objects.filter(pk=pk).update(payload=auditlog.payloads.pack(before, after, request))
+
+
+def unpack_payloads(apps, schema_editor):
+    AuditLog = apps.get_model('auditlog', 'AuditLog')
+    rows = AuditLog.objects.exclude(payload__isnull=True).values_list('pk', 'payload')
+    for pk, payload in rows.iterator(chunk_size=500):
+        payloads = auditlog.payloads.unpack(payload)
+        AuditLog.objects.filter(pk=pk).update(
+            payload_before=payloads['before'],
+            payload_after=payloads['after'],
+            request_payload=payloads['request'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditlog', '0003_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='payload',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(pack_payloads, unpack_payloads),
+        migrations.RemoveField(
+            model_name='auditlog',
+            name='payload_after',
+        ),
+        migrations.RemoveField(
+            model_name='auditlog',
+            name='payload_before',
+        ),
+        migrations.RemoveField(
+            model_name='auditlog',
+            name='request_payload',
+        ),
+    ]
@@ -0,0 +1,56 @@
+import datetime
+
+import auditlog.partitions
+from django.conf import settings
+from django.db import migrations
+
+TABLE = auditlog.partitions.TABLE
+UNPARTITIONED = f'{TABLE}_unpartitioned'
+
+
+def partition_by_month(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    AuditLog = apps.get_model('auditlog', 'AuditLog')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(created_at) FROM {TABLE}')
+        first = cursor.fetchone()[0]
+    today = datetime.date.today()
+    months = auditlog.partitions.months_between(
+        first.date() if first else today,
+        auditlog.partitions.months_after(today, 2),
+    )
+
+    # The old indexes and primary key keep their names until the old table is dropped,
+    # so the new ones are created after the copy.
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {UNPARTITIONED}')
+    schema_editor.execute(
+        f'CREATE TABLE {TABLE} (LIKE {UNPARTITIONED} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        'PARTITION BY RANGE (created_at)'
+    )
+    schema_editor.execute(f'CREATE TABLE {auditlog.partitions.DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+    for month in months:
+        schema_editor.execute(auditlog.partitions.create_partition_sql(month))
+    schema_editor.execute(f'INSERT INTO {TABLE} SELECT * FROM {UNPARTITIONED}')
+    schema_editor.execute(f'DROP TABLE {UNPARTITIONED}')
+    schema_editor.execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)')
+    schema_editor.execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_id_fk FOREIGN KEY (user_id) '
+        f'REFERENCES {User._meta.db_table} ({User._meta.pk.column}) DEFERRABLE INITIALLY DEFERRED'
+    )
+    for index in AuditLog._meta.indexes:
+        schema_editor.add_index(AuditLog, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditlog', '0004_pack_payloads'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # One-way: the partitioned table works with the model as it is.
+        migrations.RunPython(partition_by_month, migrations.RunPython.noop),
+    ]
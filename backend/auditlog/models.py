@@ -2,6 +2,17 @@ import uuid
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+from .payloads import pack, unpack
+
+
+class AuditLogQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.pack_payloads()
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class AuditLog(models.Model):
@@ -18,10 +29,12 @@ class AuditLog(models.Model):
     action_route = models.CharField(max_length=512, blank=True, default='')
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     status_code = models.PositiveSmallIntegerField(null=True, blank=True)
-    payload_before = models.JSONField(null=True, blank=True)
-    payload_after = models.JSONField(null=True, blank=True)
-    request_payload = models.JSONField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Before, diff to after and request payloads packed by auditlog.payloads.pack.
+    payload = models.BinaryField(null=True, blank=True, editable=False)
+    # Set when the request is audited, not when the buffered writer inserts it.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = AuditLogQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
@@ -34,3 +47,54 @@ class AuditLog(models.Model):
 
     def __str__(self) -> str:
         return f'{self.user_id} {self.method} {self.path} ({self.created_at.isoformat()})'
+
+    def payloads(self) -> dict:
+        """Full before/after/request payloads and the stored diff, unpacked once per instance."""
+        if '_payloads' not in self.__dict__:
+            self._payloads = unpack(self.payload)
+        return self._payloads
+
+    def _set_payload(self, key, value):
+        self.payloads()[key] = value
+        self._payloads_changed = True
+
+    def pack_payloads(self):
+        if not self.__dict__.get('_payloads_changed'):
+            return
+        payloads = self.payloads()
+        self.payload = pack(payloads['before'], payloads['after'], payloads['request'])
+        self._payloads_changed = False
+        # Unpacked again on the next read, diff included.
+        del self._payloads
+
+    def save(self, *args, **kwargs):
+        self.pack_payloads()
+        super().save(*args, **kwargs)
+
+    @property
+    def payload_before(self):
+        return self.payloads()['before']
+
+    @payload_before.setter
+    def payload_before(self, value):
+        self._set_payload('before', value)
+
+    @property
+    def payload_after(self):
+        return self.payloads()['after']
+
+    @payload_after.setter
+    def payload_after(self, value):
+        self._set_payload('after', value)
+
+    @property
+    def request_payload(self):
+        return self.payloads()['request']
+
+    @request_payload.setter
+    def request_payload(self, value):
+        self._set_payload('request', value)
+
+    @property
+    def payload_diff(self):
+        return self.payloads()['diff']
@@ -0,0 +1,105 @@
+"""
+Monthly range partitions of the audit log table on PostgreSQL.
+
+Migration 0005 turns ``auditlog_auditlog`` into a table partitioned by
+``created_at`` with one partition per month, named ``auditlog_auditlog_pYYYYMM``,
+plus a default partition for anything outside them. The primary key becomes
+``(id, created_at)``, as PostgreSQL requires the partition key in it; ids are
+still UUIDs, so they stay unique.
+
+``ensure_partitions`` creates the partitions of the coming months ahead of
+time, and ``drop_empty_partitions`` removes the months the archive has
+emptied. ``archive_old_records`` calls both. On other databases all of this is
+a no-op and the table stays as it is.
+"""
+import datetime
+
+from django.db import connection
+
+TABLE = 'auditlog_auditlog'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def next_month(month):
+    return datetime.date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+
+def months_after(today, count):
+    """First day of the month ``count`` months after the month of ``today``."""
+    month = month_start(today)
+    for _ in range(count):
+        month = next_month(month)
+    return month
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def is_partitioned(cursor) -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE])
+    return cursor.fetchone() is not None
+
+
+def create_partition_sql(month):
+    return (
+        f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+    )
+
+
+def months_between(first, last):
+    month = month_start(first)
+    while month <= month_start(last):
+        yield month
+        month = next_month(month)
+
+
+def ensure_partitions(months_ahead=2, today=None) -> list[str]:
+    """Create the partitions from this month to ``months_ahead`` months later."""
+    today = today or datetime.date.today()
+    created = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return created
+        for month in months_between(today, months_after(today, months_ahead)):
+            cursor.execute('SELECT to_regclass(%s)', [partition_name(month)])
+            if cursor.fetchone()[0] is None:
+                cursor.execute(create_partition_sql(month))
+                created.append(partition_name(month))
+    return created
+
+
+def drop_empty_partitions(before) -> list[str]:
+    """Drop the empty month partitions that end on or before ``before``."""
+    dropped = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return dropped
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            [TABLE],
+        )
+        for (name,) in cursor.fetchall():
+            if name == DEFAULT_PARTITION:
+                continue
+            try:
+                month = datetime.datetime.strptime(name[len(TABLE) + 2:], '%Y%m').date()
+            except ValueError:
+                continue
+            if next_month(month) > before:
+                continue
+            cursor.execute(f'SELECT 1 FROM {name} LIMIT 1')
+            if cursor.fetchone() is None:
+                cursor.execute(f'DROP TABLE {name}')
+                dropped.append(name)
+    return dropped
@@ -0,0 +1,159 @@
+"""
+Compact storage for audit payloads.
+
+An entry used to keep three full JSON documents: the row before the change,
+the response after it and the request body. Most of "after" repeats "before",
+and signatures or images made up most of the bytes, often several times over.
+
+``pack`` keeps one zlib-compressed document instead:
+
+* ``b``: the payload before the change;
+* ``d``: a structural diff from ``b`` to the payload after the change;
+* ``r``: the request payload.
+
+Before that, any string of AUDIT_LOG_BLOB_MIN_BYTES or more is moved to a blob
+store (``merenda_semed/blobs.py``) and replaced by ``{"$blob": <ref>}``, so a
+value is written once by content hash however many entries repeat it. Base64
+data URIs are stored decoded, as the signatures and images themselves are, and
+come back with the content type of the stored file. The store is a separate
+one under AUDIT_BLOB_ROOT, which ``/api/blobs/`` does not serve; entries
+written before it existed find their blobs in BLOB_ROOT.
+
+A diff node is one of ``{"v": value}`` (replace), ``{"d": {key: node},
+"r": [removed keys]}`` for objects, or ``{"l": length, "i": {index: node}}``
+for lists; unchanged values have no node.
+"""
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from merenda_semed.blobs import blob_name, blob_path, load_data_uri, put_blob, read_blob, store_data_uri
+
+BLOB_KEY = '$blob'
+TEXT_BLOB_EXTENSION = '.txt'
+
+
+def audit_blob_root():
+    return settings.AUDIT_BLOB_ROOT
+
+
+def _is_blob_marker(value):
+    return isinstance(value, dict) and len(value) == 1 and isinstance(value.get(BLOB_KEY), str)
+
+
+def extract_blobs(value, min_size):
+    """``value`` with every string of ``min_size`` characters or more moved to the blob store."""
+    if isinstance(value, str):
+        if len(value) < min_size:
+            return value
+        ref = store_data_uri(value, audit_blob_root())
+        if ref is value:
+            ref = put_blob(value.encode('utf-8'), 'text/plain', audit_blob_root())
+        return {BLOB_KEY: ref}
+    if isinstance(value, dict):
+        return {key: extract_blobs(item, min_size) for key, item in value.items()}
+    if isinstance(value, list):
+        return [extract_blobs(item, min_size) for item in value]
+    return value
+
+
+def restore_blobs(value):
+    if _is_blob_marker(value):
+        ref = value[BLOB_KEY]
+        name = blob_name(ref)
+        root = audit_blob_root()
+        if name and not blob_path(name, root).exists():
+            root = None
+        if name and name.endswith(TEXT_BLOB_EXTENSION):
+            try:
+                return read_blob(name, root).decode('utf-8')
+            except FileNotFoundError:
+                return ''
+        return load_data_uri(ref, root)
+    if isinstance(value, dict):
+        return {key: restore_blobs(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [restore_blobs(item) for item in value]
+    return value
+
+
+def diff(before, after):
+    """Diff node turning ``before`` into ``after``, or ``None`` when they are equal."""
+    if _is_blob_marker(before) or _is_blob_marker(after):
+        return None if before == after else {'v': after}
+    if isinstance(before, dict) and isinstance(after, dict):
+        changed = {}
+        for key, value in after.items():
+            node = diff(before[key], value) if key in before else {'v': value}
+            if node is not None:
+                changed[key] = node
+        removed = [key for key in before if key not in after]
+        node = {}
+        if changed:
+            node['d'] = changed
+        if removed:
+            node['r'] = removed
+        return node or None
+    if isinstance(before, list) and isinstance(after, list):
+        changed = {}
+        for index, value in enumerate(after):
+            item = diff(before[index], value) if index < len(before) else {'v': value}
+            if item is not None:
+                changed[str(index)] = item
+        if not changed and len(before) == len(after):
+            return None
+        node = {'l': len(after)}
+        if changed:
+            node['i'] = changed
+        return node
+    # type() as well: True == 1 and 1 == 1.0, but they are different JSON values.
+    if type(before) is type(after) and before == after:
+        return None
+    return {'v': after}
+
+
+def apply_diff(before, node):
+    if node is None:
+        return before
+    if 'v' in node:
+        return node['v']
+    if 'l' in node:
+        changed = node.get('i', {})
+        return [
+            apply_diff(before[index] if index < len(before) else None, changed.get(str(index)))
+            for index in range(node['l'])
+        ]
+    removed = set(node.get('r', ()))
+    result = {key: value for key, value in before.items() if key not in removed}
+    for key, item in node.get('d', {}).items():
+        result[key] = apply_diff(before.get(key), item)
+    return result
+
+
+def pack(before, after, request, min_size=None) -> bytes:
+    if min_size is None:
+        min_size = settings.AUDIT_LOG_BLOB_MIN_BYTES
+    before = extract_blobs(before, min_size)
+    document = {
+        'b': before,
+        'd': diff(before, extract_blobs(after, min_size)),
+        'r': extract_blobs(request, min_size),
+    }
+    encoded = json.dumps(document, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+    return zlib.compress(encoded)
+
+
+def unpack(data) -> dict:
+    """Full ``before``/``after``/``request`` payloads and the stored ``diff``."""
+    if data is None:
+        return {'before': None, 'after': None, 'request': None, 'diff': None}
+    document = json.loads(zlib.decompress(bytes(data)))
+    return {
+        'before': restore_blobs(document['b']),
+        'after': restore_blobs(apply_diff(document['b'], document['d'])),
+        'request': restore_blobs(document['r']),
+        'diff': restore_blobs(document['d']),
+    }
+
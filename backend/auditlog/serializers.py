@@ -6,6 +6,11 @@ from .models import AuditLog
 class AuditLogSerializer(serializers.ModelSerializer):
     user_email = serializers.EmailField(source='user.email', read_only=True)
     user_name = serializers.CharField(source='user.name', read_only=True)
+    # Rebuilt from the packed ``payload`` column (see auditlog/payloads.py).
+    payload_before = serializers.JSONField(read_only=True)
+    payload_after = serializers.JSONField(read_only=True)
+    request_payload = serializers.JSONField(read_only=True)
+    payload_diff = serializers.JSONField(read_only=True)
 
     class Meta:
         model = AuditLog
@@ -23,5 +28,6 @@ class AuditLogSerializer(serializers.ModelSerializer):
             'payload_before',
             'payload_after',
             'request_payload',
+            'payload_diff',
             'created_at',
         ]
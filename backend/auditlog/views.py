@@ -1,12 +1,24 @@
+import heapq
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import generics, permissions
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from accounts.permissions import IsSemedAdmin
+from merenda_semed.archive import read_archive
 
 from .models import AuditLog
 from .serializers import AuditLogSerializer
+from .writer import audit_writer
 
 User = get_user_model()
 
@@ -17,46 +29,159 @@ class AuditLogPagination(PageNumberPagination):
     max_page_size = 100
 
 
+def _parse_bound(raw):
+    """``(datetime, date)`` for a ``date_from``/``date_to`` value; at most one is set."""
+    raw = (raw or '').strip()
+    if not raw:
+        return None, None
+    dt = parse_datetime(raw)
+    if dt is not None:
+        # Same reading the ORM gives naive values: local time.
+        return (timezone.make_aware(dt) if timezone.is_naive(dt) else dt), None
+    return None, parse_date(raw)
+
+
+def _utc_day(bound, slack):
+    """UTC day of an archive partition for a parsed bound; local dates get ``slack`` days."""
+    dt, d = bound
+    if dt is not None:
+        return dt.astimezone(dt_timezone.utc).date()
+    if d is not None:
+        return d + timedelta(days=slack)
+    return None
+
+
+class ArchiveMergedList:
+    """Live rows of ``queryset`` and archived rows as one newest-first list.
+
+    The paginator only slices it, so each page reads the live rows up to its
+    end and merges them with the archived ones already in memory.
+    """
+
+    def __init__(self, queryset, archived):
+        self.queryset = queryset
+        self.archived = archived
+
+    def count(self):
+        return self.queryset.count() + len(self.archived)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        live = list(self.queryset[:stop] if stop is not None else self.queryset)
+        merged = heapq.merge(live, self.archived, key=lambda log: log.created_at, reverse=True)
+        page = list(islice(merged, start, stop))
+        missing = {log.user_id for log in page if not AuditLog.user.is_cached(log)}
+        users = User.objects.in_bulk(missing) if missing else {}
+        for log in page:
+            if log.user_id in users:
+                log.user = users[log.user_id]
+        return page
+
+
 class AuditLogListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated, IsSemedAdmin]
     serializer_class = AuditLogSerializer
     pagination_class = AuditLogPagination
 
+    def _filters(self):
+        params = self.request.query_params
+        return {
+            'user_id': (params.get('user_id') or '').strip(),
+            'action_type': (params.get('action_type') or '').strip().upper(),
+            'method': (params.get('method') or '').strip().upper(),
+            'path': (params.get('path') or '').strip(),
+            'from': _parse_bound(params.get('date_from')),
+            'to': _parse_bound(params.get('date_to')),
+        }
+
     def get_queryset(self):
         queryset = AuditLog.objects.select_related('user').all()
+        filters = self._filters()
 
-        user_id = (self.request.query_params.get('user_id') or '').strip()
-        action_type = (self.request.query_params.get('action_type') or '').strip().upper()
-        method = (self.request.query_params.get('method') or '').strip().upper()
-        path_contains = (self.request.query_params.get('path') or '').strip()
-        date_from_raw = (self.request.query_params.get('date_from') or '').strip()
-        date_to_raw = (self.request.query_params.get('date_to') or '').strip()
-
-        if user_id:
-            queryset = queryset.filter(user_id=user_id)
-        if action_type:
-            queryset = queryset.filter(action_type=action_type)
-        if method:
-            queryset = queryset.filter(method=method)
-        if path_contains:
-            queryset = queryset.filter(path__icontains=path_contains)
-
-        if date_from_raw:
-            dt = parse_datetime(date_from_raw)
-            if dt is not None:
-                queryset = queryset.filter(created_at__gte=dt)
-            else:
-                d = parse_date(date_from_raw)
-                if d is not None:
-                    queryset = queryset.filter(created_at__date__gte=d)
-
-        if date_to_raw:
-            dt = parse_datetime(date_to_raw)
-            if dt is not None:
-                queryset = queryset.filter(created_at__lte=dt)
-            else:
-                d = parse_date(date_to_raw)
-                if d is not None:
-                    queryset = queryset.filter(created_at__date__lte=d)
+        if filters['user_id']:
+            queryset = queryset.filter(user_id=filters['user_id'])
+        if filters['action_type']:
+            queryset = queryset.filter(action_type=filters['action_type'])
+        if filters['method']:
+            queryset = queryset.filter(method=filters['method'])
+        if filters['path']:
+            queryset = queryset.filter(path__icontains=filters['path'])
+
+        dt, d = filters['from']
+        if dt is not None:
+            queryset = queryset.filter(created_at__gte=dt)
+        elif d is not None:
+            queryset = queryset.filter(created_at__date__gte=d)
+
+        dt, d = filters['to']
+        if dt is not None:
+            queryset = queryset.filter(created_at__lte=dt)
+        elif d is not None:
+            queryset = queryset.filter(created_at__date__lte=d)
 
         return queryset
+
+    def _include_archived(self, filters):
+        if self.request.query_params.get('include_archived', '').lower() in ('1', 'true'):
+            return True
+        # Ranges reaching past the retention horizon include the archive on their own.
+        dt, d = filters['from']
+        horizon = timezone.now() - timedelta(days=settings.AUDIT_LOG_RETENTION_DAYS)
+        return (dt is not None and dt < horizon) or (d is not None and d < timezone.localdate(horizon))
+
+    def _check_archive_range(self, filters):
+        # Every page counts the matching archived rows, so the days read are bounded.
+        from_dt, from_d = filters['from']
+        to_dt, to_d = filters['to']
+        first = timezone.localdate(from_dt) if from_dt is not None else from_d
+        last = timezone.localdate(to_dt) if to_dt is not None else to_d or timezone.localdate()
+        max_days = settings.AUDIT_ARCHIVE_MAX_DAYS
+        if first is None or (last - first).days >= max_days:
+            raise ValidationError({
+                'date_from': f'Consultas ao arquivo exigem date_from e um intervalo de ate {max_days} dias.',
+            })
+
+    def _archived_logs(self, filters):
+        """Archived entries matching the same filters as the queryset, newest first."""
+        self._check_archive_range(filters)
+        from_dt, from_d = filters['from']
+        to_dt, to_d = filters['to']
+        first = _utc_day(filters['from'], slack=-1)
+        last = _utc_day(filters['to'], slack=1)
+        path = filters['path'].lower()
+
+        def matches(log):
+            local_date = timezone.localdate(log.created_at)
+            return (
+                (not filters['user_id'] or str(log.user_id) == filters['user_id'])
+                and (not filters['action_type'] or log.action_type == filters['action_type'])
+                and (not filters['method'] or log.method == filters['method'])
+                and (not path or path in log.path.lower())
+                and (from_dt is None or log.created_at >= from_dt)
+                and (from_d is None or local_date >= from_d)
+                and (to_dt is None or log.created_at <= to_dt)
+                and (to_d is None or local_date <= to_d)
+            )
+
+        return [log for log in read_archive(AuditLog, first, last) if matches(log)]
+
+    def list(self, request, *args, **kwargs):
+        filters = self._filters()
+        if not self._include_archived(filters):
+            return super().list(request, *args, **kwargs)
+        merged = ArchiveMergedList(self.get_queryset(), self._archived_logs(filters))
+        page = self.paginate_queryset(merged)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+
+class AuditLogWriterStatsView(APIView):
+    """Queue depth and write/spill/drop counters of this process's audit writer."""
+    permission_classes = [permissions.IsAuthenticated, IsSemedAdmin]
+
+    def get(self, request):
+        return Response(audit_writer.stats())
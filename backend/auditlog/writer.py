@@ -0,0 +1,205 @@
+"""
+Buffered writer for audit log entries.
+
+The middleware only captures what an entry needs (raw request body, response
+data, the row before the change) and hands it to ``audit_writer``. A
+background thread turns those captures into JSON and inserts them with
+``bulk_create`` every AUDIT_LOG_BATCH_SIZE entries or
+AUDIT_LOG_FLUSH_INTERVAL_MS milliseconds, whichever comes first.
+
+Entries that cannot reach the database (full queue, failed insert, entries
+still queued at shutdown) are appended as JSON lines to
+AUDIT_LOG_FALLBACK_PATH; ``replay_audit_fallback`` loads them back. With
+AUDIT_LOG_BUFFERED off every entry is inserted in the request, as before.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_FIELDS = ('payload_before', 'payload_after', 'request_payload')
+
+
+def _decode_json_bytes(body):
+    if not body:
+        return None
+    try:
+        decoded = body.decode('utf-8')
+    except UnicodeDecodeError:
+        return {'raw': '<non-utf8>'}
+    try:
+        return json.loads(decoded)
+    except json.JSONDecodeError:
+        return {'raw': decoded[:5000]}
+
+
+def json_safe(value):
+    """Captured payload as plain JSON; request and response bodies arrive as bytes."""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return _decode_json_bytes(bytes(value))
+    try:
+        return json.loads(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return {'raw': str(value)}
+
+
+def prepare(entry: dict) -> dict:
+    return {
+        **entry,
+        **{field: json_safe(entry.get(field)) for field in PAYLOAD_FIELDS},
+    }
+
+
+class AuditLogWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.written = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def submit(self, entry: dict) -> None:
+        if not settings.AUDIT_LOG_BUFFERED:
+            AuditLog.objects.create(**prepare(entry))
+            self.written += 1
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._spill([entry])
+
+    def _ensure_started(self):
+        # After a fork the parent's thread is gone; start over in the child.
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=settings.AUDIT_LOG_QUEUE_SIZE)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self, timeout):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            return batch
+        batch_size = settings.AUDIT_LOG_BATCH_SIZE
+        while len(batch) < batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        interval = settings.AUDIT_LOG_FLUSH_INTERVAL_MS / 1000
+        while not self._stop.is_set():
+            batch = self._next_batch(interval)
+            if batch:
+                self.write(batch)
+        close_old_connections()
+
+    def write(self, batch) -> None:
+        """Insert ``batch``; on any database error the entries go to the fallback file."""
+        prepared = [prepare(entry) for entry in batch]
+        try:
+            close_old_connections()
+            AuditLog.objects.bulk_create([AuditLog(**entry) for entry in prepared])
+        except Exception:  # noqa: BLE001 - audit logging never raises into callers
+            logger.exception('Falha ao gravar %s registro(s) de auditoria.', len(prepared))
+            self.failed_batches += 1
+            self._spill(prepared)
+            return
+        self.written += len(prepared)
+
+    def drain(self) -> int:
+        """Write everything still queued, in the calling thread."""
+        if self._queue is None or self._pid != os.getpid():
+            return 0
+        count = 0
+        while True:
+            batch = []
+            while len(batch) < settings.AUDIT_LOG_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return count
+            self.write(batch)
+            count += len(batch)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=settings.AUDIT_LOG_FLUSH_INTERVAL_MS / 1000 + 1)
+        if self._queue is None or self._pid != os.getpid():
+            return
+        # The database may already be gone at interpreter exit: keep the rest on disk.
+        pending = []
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if pending:
+            self._spill(pending)
+
+    def _spill(self, entries) -> None:
+        try:
+            lines = ''.join(json.dumps(prepare(entry), cls=DjangoJSONEncoder) + '\n' for entry in entries)
+            with self._file_lock, open(settings.AUDIT_LOG_FALLBACK_PATH, 'a', encoding='utf-8') as handle:
+                handle.write(lines)
+        except Exception:  # noqa: BLE001
+            logger.exception('Descartados %s registro(s) de auditoria.', len(entries))
+            self.dropped += len(entries)
+            return
+        self.spilled += len(entries)
+
+    def stats(self) -> dict:
+        return {
+            'buffered': settings.AUDIT_LOG_BUFFERED,
+            'queue_depth': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0,
+            'queue_size': settings.AUDIT_LOG_QUEUE_SIZE,
+            'written': self.written,
+            'spilled': self.spilled,
+            'dropped': self.dropped,
+            'failed_batches': self.failed_batches,
+        }
+
+
+def load_fallback_entries(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        entry = json.loads(line)
+        entry['created_at'] = parse_datetime(entry['created_at'])
+        yield entry
+
+
+audit_writer = AuditLogWriter()
+atexit.register(audit_writer.close)
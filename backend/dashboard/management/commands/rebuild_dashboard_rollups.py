@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.rollups import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recria os agregados mensais do dashboard a partir das movimentacoes e registros de refeicoes.'
+
+    def handle(self, *args, **options):
+        movement_rows, meal_rows = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Agregados recriados: {movement_rows} linhas de movimentacao, {meal_rows} linhas de refeicoes servidas.'
+        ))
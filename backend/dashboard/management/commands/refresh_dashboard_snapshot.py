@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.services import refresh_dashboard_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o snapshot do dashboard (para agendamento periodico).'
+
+    def handle(self, *args, **options):
+        snapshot = refresh_dashboard_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Snapshot do dashboard gerado em {snapshot.generated_at.isoformat()}.'))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(default='global', max_length=32, unique=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('generated_at', models.DateTimeField()),
+                ('is_stale', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
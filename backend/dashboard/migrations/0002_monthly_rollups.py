@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import dashboard.rollups
+
+
+def backfill_rollups(apps, schema_editor):
+    dashboard.rollups.rebuild_all(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        ('inventory', '0015_move_images_to_blob_store'),
+        ('menus', '0010_move_images_to_blob_store'),
+        ('schools', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyMealsServedRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Primeiro dia do mes')),
+                ('meal_type', models.CharField(choices=[('BREAKFAST1', 'Desjejum'), ('SNACK1', 'Lanche'), ('LUNCH', 'Almoco'), ('SNACK2', 'Lanche'), ('BREAKFAST2', 'Desjejum'), ('DINNER_COFFEE', 'Cafe da noite'), ('BREAKFAST', 'Cafe (legado)'), ('SNACK', 'Lanche (legado)')], max_length=16)),
+                ('served_count', models.PositiveBigIntegerField(default=0)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='schools.school')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'school', 'meal_type'), name='unique_meals_served_rollup_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyStockMovementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Primeiro dia do mes')),
+                ('type', models.CharField(choices=[('IN', 'Entrada'), ('OUT', 'Saida')], max_length=3)),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('movement_count', models.PositiveIntegerField(default=0)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='schools.school')),
+                ('supply', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.supply')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'type'], name='dashboard_m_month_525688_idx')],
+                'constraints': [models.UniqueConstraint(fields=('month', 'school', 'supply', 'type'), name='unique_movement_rollup_key')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+from django.db import models
+
+from inventory.models import StockMovement, Supply
+from menus.models import MenuItem
+from schools.models import School
+
+
+class DashboardSnapshot(models.Model):
+    """Precomputed payload of the dashboard counters, one row per ``key``."""
+    GLOBAL = 'global'
+
+    key = models.CharField(max_length=32, unique=True, default=GLOBAL)
+    payload = models.JSONField(default=dict)
+    generated_at = models.DateTimeField()
+    is_stale = models.BooleanField(default=False)
+
+    def __str__(self) -> str:
+        return f'{self.key} ({self.generated_at.isoformat()})'
+
+
+class MonthlyStockMovementRollup(models.Model):
+    """Stock movements of a school summed per month, supply and type."""
+    month = models.DateField(help_text='Primeiro dia do mes')
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='+')
+    supply = models.ForeignKey(Supply, on_delete=models.CASCADE, related_name='+')
+    type = models.CharField(max_length=3, choices=StockMovement.Types.choices)
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    movement_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'school', 'supply', 'type'], name='unique_movement_rollup_key'),
+        ]
+        indexes = [
+            models.Index(fields=['month', 'type']),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.month:%Y-%m} {self.school_id} {self.supply_id} {self.type}: {self.quantity}'
+
+
+class MonthlyMealsServedRollup(models.Model):
+    """Meals served by a school summed per month and meal type."""
+    month = models.DateField(help_text='Primeiro dia do mes')
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='+')
+    meal_type = models.CharField(max_length=16, choices=MenuItem.MealType.choices)
+    served_count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'school', 'meal_type'], name='unique_meals_served_rollup_key'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.month:%Y-%m} {self.school_id} {self.meal_type}: {self.served_count}'
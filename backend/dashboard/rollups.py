@@ -0,0 +1,235 @@
+"""
+Monthly rollups behind ``DashboardSeriesView``.
+
+Posted movements are added to ``MonthlyStockMovementRollup`` as increments; an
+edited movement takes its stored values out and adds the new ones, a deleted
+one is taken out. Meal service entries are replaced
+as a whole when a school resubmits a day, so the affected school-month slice of
+``MonthlyMealsServedRollup`` is recomputed instead. Only movements tied to a
+school are rolled up; that is all the series reads.
+"""
+from __future__ import annotations
+
+import threading
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+from inventory.models import StockMovement
+from menus.models import MealServiceEntry, MenuItem
+
+from .models import MonthlyMealsServedRollup, MonthlyStockMovementRollup
+
+ZERO = Decimal('0')
+
+_pending = threading.local()
+
+
+def month_start(value) -> date:
+    # Instances built with ``objects.create(movement_date='2026-02-10')`` keep the raw string.
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.replace(day=1)
+
+
+def apply_movements(movements, removed=()) -> None:
+    """Add ``movements`` to the monthly rollup and take ``removed`` out of it,
+    inside the posting transaction when there is one."""
+    totals: dict = defaultdict(lambda: [ZERO, 0])
+    for sign, group in ((1, movements), (-1, removed)):
+        for movement in group:
+            if movement.school_id is None:
+                continue
+            key = (month_start(movement.movement_date), movement.school_id, movement.supply_id, movement.type)
+            totals[key][0] += sign * Decimal(str(movement.quantity))
+            totals[key][1] += sign
+    # An edit of the note only, for instance, changes nothing.
+    totals = {key: value for key, value in totals.items() if value != [ZERO, 0]}
+    if not totals:
+        return
+
+    with transaction.atomic():
+        # Only added movements need a row; a removed one was counted in an existing row.
+        MonthlyStockMovementRollup.objects.bulk_create(
+            [
+                MonthlyStockMovementRollup(month=month, school_id=school_id, supply_id=supply_id, type=movement_type)
+                for (month, school_id, supply_id, movement_type), (_, count) in totals.items()
+                if count > 0
+            ],
+            ignore_conflicts=True,
+        )
+        # Lock in a stable order, like the ledger does for balances.
+        rows = MonthlyStockMovementRollup.objects.select_for_update().filter(
+            month__in={key[0] for key in totals},
+            school_id__in={key[1] for key in totals},
+            supply_id__in={key[2] for key in totals},
+        ).order_by('pk')
+        pk_by_key = {
+            (row.month, row.school_id, row.supply_id, row.type): row.pk
+            for row in rows
+        }
+        # Rows deleted with their school or supply are gone already.
+        totals = {key: value for key, value in totals.items() if key in pk_by_key}
+        if not totals:
+            return
+        pks = [pk_by_key[key] for key in totals]
+        quantity_field = DecimalField(max_digits=14, decimal_places=2)
+        MonthlyStockMovementRollup.objects.filter(pk__in=pks).update(
+            quantity=F('quantity') + Case(
+                *[When(pk=pk_by_key[key], then=Value(total, output_field=quantity_field)) for key, (total, _) in totals.items()],
+                default=Value(ZERO, output_field=quantity_field),
+                output_field=quantity_field,
+            ),
+            movement_count=F('movement_count') + Case(
+                *[When(pk=pk_by_key[key], then=Value(count)) for key, (_, count) in totals.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+        if any(count < 0 for _, count in totals.values()):
+            MonthlyStockMovementRollup.objects.filter(pk__in=pks, movement_count=0).delete()
+
+
+def rebuild_meals_served(school_id, month: date) -> None:
+    """Recompute one school-month slice of the meals served rollup."""
+    month = month_start(month)
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    totals = (
+        MealServiceEntry.objects.filter(
+            report__school_id=school_id,
+            report__service_date__gte=month,
+            report__service_date__lt=next_month,
+        )
+        .values('meal_type')
+        .annotate(total=Sum('served_count'))
+    )
+    with transaction.atomic():
+        MonthlyMealsServedRollup.objects.filter(school_id=school_id, month=month).delete()
+        MonthlyMealsServedRollup.objects.bulk_create([
+            MonthlyMealsServedRollup(school_id=school_id, month=month, meal_type=row['meal_type'], served_count=row['total'] or 0)
+            for row in totals
+        ])
+
+
+def schedule_meals_served_rebuild(school_id, month: date) -> None:
+    """Recompute a meals served slice once the current transaction commits.
+
+    A resubmission deletes and recreates every entry of the day; the pending
+    set makes the slice rebuild once per commit instead of once per entry.
+    """
+    pending = getattr(_pending, 'slices', None)
+    if pending is None:
+        pending = _pending.slices = set()
+    key = (school_id, month_start(month))
+    pending.add(key)
+    transaction.on_commit(partial(_rebuild_pending_slice, key))
+
+
+def _rebuild_pending_slice(key) -> None:
+    pending = getattr(_pending, 'slices', set())
+    if key in pending:
+        pending.discard(key)
+        rebuild_meals_served(*key)
+
+
+def rebuild_all(apps=None) -> tuple[int, int]:
+    """Recreate both rollups from the source tables (backfill).
+
+    ``apps`` lets the initial data migration run this against historical models.
+    """
+    if apps is None:
+        from django.apps import apps
+    movement = apps.get_model('inventory', 'StockMovement')
+    meal_entry = apps.get_model('menus', 'MealServiceEntry')
+    movement_rollup = apps.get_model('dashboard', 'MonthlyStockMovementRollup')
+    meals_rollup = apps.get_model('dashboard', 'MonthlyMealsServedRollup')
+
+    with transaction.atomic():
+        movement_rollup.objects.all().delete()
+        movement_rows = movement_rollup.objects.bulk_create(
+            [
+                movement_rollup(
+                    month=row['month'],
+                    school_id=row['school_id'],
+                    supply_id=row['supply_id'],
+                    type=row['type'],
+                    quantity=row['total'] or ZERO,
+                    movement_count=row['count'],
+                )
+                for row in movement.objects.filter(school__isnull=False)
+                .annotate(month=TruncMonth('movement_date'))
+                .values('month', 'school_id', 'supply_id', 'type')
+                .annotate(total=Sum('quantity'), count=Count('id'))
+                .order_by()
+            ],
+            batch_size=1000,
+        )
+
+        meals_rollup.objects.all().delete()
+        meal_rows = meals_rollup.objects.bulk_create(
+            [
+                meals_rollup(
+                    month=row['month'],
+                    school_id=row['report__school_id'],
+                    meal_type=row['meal_type'],
+                    served_count=row['total'] or 0,
+                )
+                for row in meal_entry.objects.annotate(month=TruncMonth('report__service_date'))
+                .values('month', 'report__school_id', 'meal_type')
+                .annotate(total=Sum('served_count'))
+                .order_by()
+            ],
+            batch_size=1000,
+        )
+    return len(movement_rows), len(meal_rows)
+
+
+def _filter_range(queryset, *, date_from=None, date_to=None, school=None):
+    if date_from:
+        queryset = queryset.filter(month__gte=month_start(date_from))
+    if date_to:
+        queryset = queryset.filter(month__lte=month_start(date_to))
+    if school:
+        queryset = queryset.filter(school_id=school)
+    return queryset
+
+
+def consumption_by_month(**filters) -> list[dict]:
+    rows = (
+        _filter_range(MonthlyStockMovementRollup.objects.filter(type=StockMovement.Types.OUT), **filters)
+        .values('month')
+        .annotate(total=Sum('quantity'))
+        .order_by('month')
+    )
+    return [
+        {
+            'name': row['month'].strftime('%b'),
+            'value': float(row['total'] or 0),
+        }
+        for row in rows
+    ]
+
+
+def served_by_school_category(**filters) -> list[dict]:
+    rows = (
+        _filter_range(MonthlyMealsServedRollup.objects.all(), **filters)
+        .values('school_id', 'school__name', 'meal_type')
+        .annotate(total=Sum('served_count'))
+        .order_by('school__name', 'meal_type')
+    )
+    labels = dict(MenuItem.MealType.choices)
+    return [
+        {
+            'school_id': str(row['school_id']),
+            'school_name': row['school__name'],
+            'meal_type': row['meal_type'],
+            'meal_label': labels.get(row['meal_type'], row['meal_type']),
+            'value': int(row['total'] or 0),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, models
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.timesince import timesince
+
+from inventory.models import Delivery, SchoolStockBalance, Supplier, Supply
+from menus.models import MealServiceEntry, Menu
+from schools.models import School
+
+from .models import DashboardSnapshot
+
+
+def _low_stock_balances():
+    return SchoolStockBalance.objects.low_stock().filter(supply__is_active=True)
+
+
+def build_dashboard_payload() -> dict:
+    """Run every dashboard query and return a JSON-serializable payload."""
+    # 1. Basic Counts
+    schools_total = 0
+    schools_active = 0
+    supplies_total = 0
+    menus_published = 0
+    try:
+        schools_total = School.objects.count()
+        schools_active = School.objects.filter(is_active=True).count()
+        supplies_total = Supply.objects.filter(
+            models.Q(is_active=True)
+            | models.Q(balance__quantity__gt=0)
+            | models.Q(school_balances__quantity__gt=0),
+        ).distinct().count()
+        menus_published = Menu.objects.filter(status=Menu.Status.PUBLISHED).count()
+    except DatabaseError:
+        # Keep endpoint alive even if one optional dashboard source is unavailable.
+        pass
+
+    # Low stock based on School Stock Balances
+    low_stock = 0
+    try:
+        low_stock = _low_stock_balances().count()
+    except DatabaseError:
+        pass
+
+    # 2. Month Summary
+    today = timezone.localdate()
+    current_month_start = today.replace(day=1)
+
+    # Meals served = sum of MealServiceEntry.served_count for the current month
+    meals_served = 0
+    try:
+        meals_served = MealServiceEntry.objects.filter(
+            report__service_date__gte=current_month_start,
+            report__school__isnull=False,
+        ).aggregate(total=Sum('served_count'))['total'] or 0
+    except DatabaseError:
+        meals_served = 0
+
+    # Deliveries realized
+    deliveries_count = 0
+    try:
+        deliveries_count = Delivery.objects.filter(
+            status__in=[Delivery.Status.SENT, Delivery.Status.CONFERRED],
+            delivery_date__gte=current_month_start
+        ).count()
+    except DatabaseError:
+        deliveries_count = 0
+
+    # 3. Recent Activity (Mix of: Published Menus, Low Stock Alerts, New Suppliers)
+    # Fetch top 5 of each, merge/sort in python, then take top 5 overall.
+    # Subtitles are relative ("4h atrás") and are rendered when the snapshot is read.
+    activities = []
+    try:
+        for menu in Menu.objects.filter(status=Menu.Status.PUBLISHED).select_related('school').order_by('-published_at')[:5]:
+            published_at = menu.published_at or menu.updated_at or menu.created_at
+            activities.append({
+                'type': 'MENU_PUBLISHED',
+                'title': menu.name or 'Cardápio Publicado',
+                'subtitle_prefix': 'Publicado ',
+                'timestamp': published_at,
+                'icon': 'upload_file',
+                'iconBg': 'bg-primary-100 dark:bg-primary-900/30',
+                'iconColor': 'text-primary-500',
+            })
+    except DatabaseError:
+        pass
+
+    try:
+        for balance in _low_stock_balances().select_related('school', 'supply').order_by('-last_updated')[:5]:
+            activities.append({
+                'type': 'LOW_STOCK',
+                'title': f"Estoque Baixo: {balance.supply.name}",
+                'subtitle_prefix': f"{balance.school.name} • ",
+                'timestamp': balance.last_updated,
+                'icon': 'low_priority',
+                'iconBg': 'bg-warning-100 dark:bg-warning-900/30',
+                'iconColor': 'text-warning-500',
+            })
+    except DatabaseError:
+        pass
+
+    try:
+        for supplier in Supplier.objects.order_by('-created_at')[:5]:
+            activities.append({
+                'type': 'new_supplier',
+                'title': 'Novo Fornecedor Cadastrado',
+                'subtitle_prefix': f"{supplier.name} • ",
+                'timestamp': supplier.created_at,
+                'icon': 'person_add',
+                'iconBg': 'bg-success-100 dark:bg-success-900/30',
+                'iconColor': 'text-success-500',
+            })
+    except DatabaseError:
+        pass
+
+    # Sort combined list by timestamp desc
+    activities.sort(key=lambda x: x['timestamp'], reverse=True)
+    recent_activities = [
+        {**activity, 'timestamp': activity['timestamp'].isoformat()}
+        for activity in activities[:5]
+    ]
+
+    return {
+        'schools_total': schools_total,
+        'schools_active': schools_active,
+        'supplies_total': supplies_total,
+        'low_stock': low_stock,
+        'menus_published': menus_published,
+        'month_summary': {
+            'meals_served': meals_served,
+            'deliveries_realized': deliveries_count,
+        },
+        'recent_activities': recent_activities,
+    }
+
+
+def refresh_dashboard_snapshot(key: str = DashboardSnapshot.GLOBAL) -> DashboardSnapshot:
+    snapshot, _ = DashboardSnapshot.objects.update_or_create(
+        key=key,
+        defaults={
+            'payload': build_dashboard_payload(),
+            'generated_at': timezone.now(),
+            'is_stale': False,
+        },
+    )
+    return snapshot
+
+
+def _is_current(snapshot: DashboardSnapshot) -> bool:
+    if snapshot.is_stale:
+        return False
+    now = timezone.now()
+    if now - snapshot.generated_at > timedelta(seconds=settings.DASHBOARD_SNAPSHOT_MAX_AGE):
+        return False
+    # The month summary is relative to the current month.
+    generated_on = timezone.localdate(snapshot.generated_at)
+    today = timezone.localdate(now)
+    return (generated_on.year, generated_on.month) == (today.year, today.month)
+
+
+def get_dashboard_snapshot(*, fresh: bool = False) -> DashboardSnapshot:
+    """Return the current snapshot, rebuilding it when missing, stale, expired or forced."""
+    if not fresh:
+        snapshot = DashboardSnapshot.objects.filter(key=DashboardSnapshot.GLOBAL).first()
+        if snapshot is not None and _is_current(snapshot):
+            return snapshot
+    return refresh_dashboard_snapshot()
+
+
+def mark_dashboard_stale():
+    # Filtering on is_stale keeps repeated calls from rewriting (and locking) the row.
+    DashboardSnapshot.objects.filter(is_stale=False).update(is_stale=True)
+
+
+def render_dashboard_snapshot(snapshot: DashboardSnapshot) -> dict:
+    payload = dict(snapshot.payload)
+    activities = []
+    for activity in payload.get('recent_activities', []):
+        activity = dict(activity)
+        timestamp = parse_datetime(activity['timestamp'])
+        activity['timestamp'] = timestamp
+        activity['subtitle'] = f"{activity.pop('subtitle_prefix', '')}{timesince(timestamp)} atrás"
+        activities.append(activity)
+    payload['recent_activities'] = activities
+    payload['generated_at'] = snapshot.generated_at
+    return payload
@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from inventory.models import Delivery, SchoolStockBalance, StockBalance, StockMovement, Supplier, Supply
+from inventory.signals import stock_movements_posted
+from menus.models import MealServiceEntry, MealServiceReport, Menu
+from menus.signals import meal_service_reported
+from schools.models import School
+
+from .rollups import apply_movements, schedule_meals_served_rebuild
+from .services import mark_dashboard_stale
+
+# Models whose changes show up on the dashboard. Bulk writes (queryset.update,
+# bulk_create) send no model signals; the ledger and the meal service reports
+# announce theirs below, and DASHBOARD_SNAPSHOT_MAX_AGE bounds how long any
+# other bulk write can go unnoticed.
+DASHBOARD_SOURCES = (
+    Delivery,
+    MealServiceEntry,
+    Menu,
+    School,
+    SchoolStockBalance,
+    StockBalance,
+    Supplier,
+    Supply,
+)
+
+
+def _invalidate_dashboard(sender, **kwargs):
+    # Run after commit so writers never wait on the snapshot row lock.
+    transaction.on_commit(mark_dashboard_stale)
+
+
+for model in DASHBOARD_SOURCES:
+    post_save.connect(_invalidate_dashboard, sender=model, dispatch_uid=f'dashboard-{model._meta.label_lower}-save')
+    post_delete.connect(_invalidate_dashboard, sender=model, dispatch_uid=f'dashboard-{model._meta.label_lower}-delete')
+stock_movements_posted.connect(_invalidate_dashboard, dispatch_uid='dashboard-movements-posted')
+meal_service_reported.connect(_invalidate_dashboard, dispatch_uid='dashboard-meal-service-reported')
+
+
+# Monthly rollups read by the series endpoint. The ledger announces its bulk
+# inserts; single saves (seed commands, admin, API edits) and deletes are picked
+# up through post_save and post_delete.
+def _roll_up_posted_movements(sender, movements, **kwargs):
+    apply_movements(movements)
+
+
+def _roll_up_saved_movement(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    stored = getattr(instance, '_stored_movement', None)
+    apply_movements([instance], removed=[stored] if stored is not None else [])
+
+
+def _roll_up_deleted_movement(sender, instance, **kwargs):
+    apply_movements([], removed=[instance])
+
+
+def _roll_up_meal_report(sender, report, **kwargs):
+    schedule_meals_served_rebuild(report.school_id, report.service_date)
+
+
+def _roll_up_meal_entry(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        report = instance.report
+    except MealServiceReport.DoesNotExist:
+        return
+    schedule_meals_served_rebuild(report.school_id, report.service_date)
+
+
+stock_movements_posted.connect(_roll_up_posted_movements, dispatch_uid='dashboard-rollup-movements-posted')
+post_save.connect(_roll_up_saved_movement, sender=StockMovement, dispatch_uid='dashboard-rollup-movement-save')
+post_delete.connect(_roll_up_deleted_movement, sender=StockMovement, dispatch_uid='dashboard-rollup-movement-delete')
+meal_service_reported.connect(_roll_up_meal_report, dispatch_uid='dashboard-rollup-meal-report')
+post_save.connect(_roll_up_meal_entry, sender=MealServiceEntry, dispatch_uid='dashboard-rollup-meal-entry-save')
+post_delete.connect(_roll_up_meal_entry, sender=MealServiceEntry, dispatch_uid='dashboard-rollup-meal-entry-delete')
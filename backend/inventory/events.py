@@ -0,0 +1,144 @@
+"""
+Notification and delivery events for the SSE stream (see merenda_semed/events.py).
+
+Saved ``Notification`` rows and ``Delivery.status`` transitions are published
+after commit by the receivers below. ``ChangePoller`` finds the same changes in
+the database for the bridge, so rows written by other processes or with
+``bulk_create`` reach this process's connections too.
+
+The unread notification count is counted on the partial ``is_read=False``
+index each time, so every process gives the same answer. Bulk changes
+(``mark_all_read``, the expiry sweep) publish the new count; the poller
+publishes it when it changed in another process.
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from merenda_semed.events import broker, event
+
+from .models import Delivery, Notification
+
+# Rows committed a little after their timestamp are still picked up.
+POLL_OVERLAP = timedelta(seconds=5)
+POLL_LIMIT = 500
+
+
+def unread_count() -> int:
+    return Notification.objects.filter(is_read=False).count()
+
+
+def unread_count_event(count: int | None = None):
+    count = unread_count() if count is None else count
+    return event('unread_count', f'unread_count:{uuid.uuid4()}', {'count': count})
+
+
+def publish_unread_count():
+    """Announce the unread count after a bulk change, once it is committed."""
+    transaction.on_commit(lambda: broker.publish(unread_count_event()))
+
+
+def notification_event(notification):
+    return event('notification', f'notification:{notification.pk}', {
+        'id': notification.pk,
+        'notification_type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'delivery': notification.delivery_id,
+        'school': notification.school_id,
+        'is_alert': notification.is_alert,
+        'created_at': notification.created_at,
+    })
+
+
+def delivery_status_event(delivery_id, school_id, status, updated_at, previous_status=None):
+    return event('delivery_status', f'delivery:{delivery_id}:{status}:{updated_at.isoformat()}', {
+        'id': delivery_id,
+        'school': school_id,
+        'status': status,
+        'previous_status': previous_status,
+        'updated_at': updated_at,
+    })
+
+
+def _remember_loaded_state(sender, instance, **kwargs):
+    # __dict__: a deferred field must not cost a query here.
+    if sender is Delivery:
+        instance._loaded_status = instance.__dict__.get('status')
+    else:
+        instance._loaded_is_read = instance.__dict__.get('is_read')
+
+
+def _publish_created(item):
+    broker.publish(item)
+    broker.publish(unread_count_event())
+
+
+def _notification_saved(sender, instance, created, **kwargs):
+    previous = None if created else instance._loaded_is_read
+    instance._loaded_is_read = instance.is_read
+    if created:
+        item = notification_event(instance)
+        transaction.on_commit(lambda: _publish_created(item))
+    elif previous is not None and previous != instance.is_read:
+        publish_unread_count()
+
+
+def _notification_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        publish_unread_count()
+
+
+def _delivery_saved(sender, instance, created, **kwargs):
+    previous = None if created else instance._loaded_status
+    instance._loaded_status = instance.status
+    if previous == instance.status:
+        return
+    item = delivery_status_event(instance.pk, instance.school_id, instance.status, instance.updated_at, previous)
+    transaction.on_commit(lambda: broker.publish(item))
+
+
+class ChangePoller:
+    """Events for notifications and delivery updates found in the database since the last call."""
+
+    def __init__(self):
+        self.since = timezone.now()
+        self.statuses = {}
+        self.unread = None
+
+    def __call__(self):
+        now = timezone.now()
+        since, self.since = self.since - POLL_OVERLAP, now
+        items = [
+            notification_event(notification)
+            for notification in Notification.objects.filter(created_at__gte=since).order_by('created_at')[:POLL_LIMIT]
+        ]
+        deliveries = (
+            Delivery.objects.filter(updated_at__gte=since)
+            .order_by('updated_at')
+            .values_list('id', 'school_id', 'status', 'updated_at')[:POLL_LIMIT]
+        )
+        if len(self.statuses) > 10 * POLL_LIMIT:
+            self.statuses.clear()
+        for delivery_id, school_id, status, updated_at in deliveries:
+            previous = self.statuses.get(delivery_id)
+            self.statuses[delivery_id] = status
+            if previous != status:
+                items.append(delivery_status_event(delivery_id, school_id, status, updated_at, previous))
+        # Notifications read, created or deleted by another process.
+        unread = unread_count()
+        if unread != self.unread:
+            items.append(unread_count_event(unread))
+        self.unread = unread
+        return items
+
+
+post_init.connect(_remember_loaded_state, sender=Delivery, dispatch_uid='inventory-events-delivery-init')
+post_init.connect(_remember_loaded_state, sender=Notification, dispatch_uid='inventory-events-notification-init')
+post_save.connect(_delivery_saved, sender=Delivery, dispatch_uid='inventory-events-delivery-save')
+post_save.connect(_notification_saved, sender=Notification, dispatch_uid='inventory-events-notification-save')
+post_delete.connect(_notification_deleted, sender=Notification, dispatch_uid='inventory-events-notification-delete')
+broker.register_poller(ChangePoller())
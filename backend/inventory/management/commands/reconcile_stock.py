@@ -0,0 +1,66 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from inventory.services.reconciliation import reconcile_stock
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os saldos a partir das movimentacoes e compara com os saldos gravados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--correct',
+            action='store_true',
+            help='Registra movimentacoes de ajuste para as divergencias de saldo (lotes so sao reportados).',
+        )
+        parser.add_argument('--user', help='E-mail do usuario que assina os ajustes (padrao: um administrador SEMED).')
+        parser.add_argument('--workers', type=int, help='Quantidade de workers em paralelo.')
+        parser.add_argument('--output', help='Grava o relatorio de divergencias em JSON neste caminho.')
+
+    def _user(self, email):
+        User = get_user_model()
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'Usuario {email} nao encontrado.')
+            return user
+        user = User.objects.filter(role=User.Roles.SEMED_ADMIN, is_active=True).order_by('email').first()
+        if user is None:
+            raise CommandError('Informe --user: nenhum administrador SEMED ativo para registrar os ajustes.')
+        return user
+
+    def handle(self, *args, **options):
+        user = self._user(options['user']) if options['correct'] or options['user'] else None
+        run = reconcile_stock(correct=options['correct'], user=user, workers=options['workers'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(
+                    {
+                        'started_at': run.started_at,
+                        'finished_at': run.finished_at,
+                        'supplies_checked': run.supplies_checked,
+                        'movements_checked': run.movements_checked,
+                        'corrections_posted': run.corrections_posted,
+                        'discrepancies': run.discrepancies,
+                    },
+                    handle,
+                    cls=DjangoJSONEncoder,
+                    indent=2,
+                )
+
+        summary = (
+            f'Reconciliacao concluida | insumos: {run.supplies_checked} | movimentacoes: {run.movements_checked} | '
+            f'divergencias: {run.discrepancy_count} | ajustes registrados: {run.corrections_posted}'
+        )
+        style = self.style.WARNING if run.discrepancy_count else self.style.SUCCESS
+        self.stdout.write(style(summary))
+        for item in run.discrepancies:
+            school = f" escola {item['school_id']}" if item['school_id'] else ''
+            self.stdout.write(
+                f"  {item['kind']}: insumo {item['supply_id']}{school} | esperado {item['expected']} | "
+                f"gravado {item['actual']} | diferenca {item['difference']}"
+            )
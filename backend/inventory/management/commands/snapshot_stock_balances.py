@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.services.snapshots import take_snapshots
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Data invalida: {value}. Use YYYY-MM-DD.')
+
+
+class Command(BaseCommand):
+    help = 'Grava a fotografia diaria dos saldos (central e escolas) a partir das movimentacoes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=_date, help='Ultimo dia fotografado (YYYY-MM-DD). Padrao: ontem.')
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Refaz todas as fotografias, nao apenas os dias desde a ultima execucao.',
+        )
+
+    def handle(self, *args, **options):
+        run = take_snapshots(options['date'], full=options['full'])
+        since = f'desde {run.rebuilt_from.isoformat()}' if run.rebuilt_from else 'completa'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Fotografia de estoque ate {run.through_date.isoformat()} ({since}) | '
+                f'registros gravados: {run.rows_written}'
+            )
+        )
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:57
+
+import merenda_semed.blobs
+from django.db import migrations
+
+BLOB_COLUMNS = {
+    'Delivery': ['sender_signature', 'receiver_signature', 'conference_signature'],
+    'DeliveryNutritionistSignature': ['signature_data'],
+    'SupplierReceipt': ['sender_signature', 'receiver_signature'],
+}
+
+
+def move_to_blob_store(apps, schema_editor):
+    for model_name, fields in BLOB_COLUMNS.items():
+        model = apps.get_model('inventory', model_name)
+        merenda_semed.blobs.rewrite_columns(model, fields, merenda_semed.blobs.store_data_uri)
+
+
+def restore_inline_images(apps, schema_editor):
+    for model_name, fields in BLOB_COLUMNS.items():
+        model = apps.get_model('inventory', model_name)
+        merenda_semed.blobs.rewrite_columns(model, fields, merenda_semed.blobs.load_data_uri)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_alter_delivery_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='delivery',
+            name='conference_signature',
+            field=merenda_semed.blobs.BlobTextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='delivery',
+            name='receiver_signature',
+            field=merenda_semed.blobs.BlobTextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='delivery',
+            name='sender_signature',
+            field=merenda_semed.blobs.BlobTextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='deliverynutritionistsignature',
+            name='signature_data',
+            field=merenda_semed.blobs.BlobTextField(),
+        ),
+        migrations.AlterField(
+            model_name='supplierreceipt',
+            name='receiver_signature',
+            field=merenda_semed.blobs.BlobTextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='supplierreceipt',
+            name='sender_signature',
+            field=merenda_semed.blobs.BlobTextField(blank=True),
+        ),
+        migrations.RunPython(move_to_blob_store, restore_inline_images),
+    ]
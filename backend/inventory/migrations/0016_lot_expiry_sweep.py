@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_move_images_to_blob_store'),
+        ('schools', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotExpirySweep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('ran_on', models.DateField()),
+                ('full', models.BooleanField(default=False)),
+                ('expired_marked', models.PositiveIntegerField(default=0)),
+                ('notifications_created', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='dedupe_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='lotbalancecentral',
+            index=models.Index(fields=['updated_at'], name='inventory_l_updated_5a9159_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lotbalanceschool',
+            index=models.Index(fields=['updated_at'], name='inventory_l_updated_da32ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplylot',
+            index=models.Index(fields=['expiry_date'], name='inventory_s_expiry__4ea867_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplylot',
+            index=models.Index(fields=['updated_at'], name='inventory_s_updated_d90f20_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('dedupe_key',), name='unique_notification_dedupe_key'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+
+def fill_effective_min_stock(apps, schema_editor):
+    SchoolStockBalance = apps.get_model('inventory', 'SchoolStockBalance')
+    Supply = apps.get_model('inventory', 'Supply')
+    supply_min_stock = Supply.objects.filter(pk=models.OuterRef('supply_id')).values('min_stock')[:1]
+    SchoolStockBalance.objects.update(effective_min_stock=models.Case(
+        models.When(min_stock__gt=0, then=models.F('min_stock')),
+        default=models.Subquery(supply_min_stock),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_event_stream_indexes'),
+        ('schools', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schoolstockbalance',
+            name='effective_min_stock',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(fill_effective_min_stock, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='schoolstockbalance',
+            index=models.Index(condition=models.Q(('quantity__lt', models.F('effective_min_stock'))), fields=['school'], name='school_stock_low_idx'),
+        ),
+    ]
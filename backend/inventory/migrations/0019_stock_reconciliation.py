@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Notes written by the ledger callers before movements recorded their balance,
+# for the movements with a school that did not hit the school's balance.
+LEGACY_NOTES = [
+    ('Saida automatica da entrega ', 'central'),
+    ('Ajuste de conferencia por lote ', 'none'),
+    ('Ajuste de conferencia (', 'central'),
+]
+
+
+def classify_movements(apps, schema_editor):
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    legacy = StockMovement.objects.filter(balance='')
+    legacy.filter(school__isnull=True).update(balance='central')
+    for prefix, balance in LEGACY_NOTES:
+        legacy.filter(note__startswith=prefix).update(balance=balance)
+    legacy.update(balance='school')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_school_stock_effective_min_stock'),
+        ('schools', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReconciliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('supplies_checked', models.PositiveIntegerField(default=0)),
+                ('movements_checked', models.PositiveBigIntegerField(default=0)),
+                ('discrepancy_count', models.PositiveIntegerField(default=0)),
+                ('corrections_posted', models.PositiveIntegerField(default=0)),
+                ('discrepancies', models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='balance',
+            field=models.CharField(blank=True, choices=[('central', 'Estoque central'), ('school', 'Estoque da escola'), ('none', 'Somente registro')], default='', max_length=8),
+        ),
+        migrations.RunPython(classify_movements, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['supply', 'balance', 'school'], include=('type', 'quantity'), name='stock_movement_ledger_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockreconciliation',
+            name='triggered_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
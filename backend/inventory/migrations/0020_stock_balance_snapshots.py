@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_stock_reconciliation'),
+        ('schools', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockSnapshotRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('through_date', models.DateField()),
+                ('rebuilt_from', models.DateField(blank=True, null=True)),
+                ('rows_written', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['supply', 'school', 'movement_date'], name='stock_movement_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['created_at'], name='stock_movement_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockbalancesnapshot',
+            name='school',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='schools.school'),
+        ),
+        migrations.AddField(
+            model_name='stockbalancesnapshot',
+            name='supply',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventory.supply'),
+        ),
+        migrations.AddIndex(
+            model_name='stockbalancesnapshot',
+            index=models.Index(fields=['snapshot_date'], name='inventory_s_snapsho_8386e1_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockbalancesnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('school__isnull', True)), fields=('supply', 'snapshot_date'), name='unique_central_stock_snapshot'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockbalancesnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('school__isnull', False)), fields=('school', 'supply', 'snapshot_date'), name='unique_school_stock_snapshot'),
+        ),
+    ]
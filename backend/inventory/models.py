@@ -4,6 +4,7 @@ from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
 
+from merenda_semed.blobs import BlobTextField
 from schools.models import School
 
 
@@ -55,22 +56,61 @@ class StockBalance(models.Model):
         return f"{self.supply.name} - {self.quantity}"
 
 
+def effective_min_stock(min_stock, supply_min_stock):
+    """The school's own minimum when set, the supply's otherwise."""
+    return min_stock if min_stock > 0 else supply_min_stock
+
+
+class SchoolStockBalanceQuerySet(models.QuerySet):
+    def low_stock(self):
+        return self.filter(quantity__lt=models.F('effective_min_stock'))
+
+    def refresh_effective_min_stock(self) -> int:
+        """Recompute ``effective_min_stock`` in one UPDATE, for rows written without ``save()``."""
+        supply_min_stock = Supply.objects.filter(pk=models.OuterRef('supply_id')).values('min_stock')[:1]
+        return self.update(effective_min_stock=models.Case(
+            models.When(min_stock__gt=0, then=models.F('min_stock')),
+            default=models.Subquery(supply_min_stock),
+        ))
+
+
 class SchoolStockBalance(models.Model):
     """Tracks stock balance for each supply at each school."""
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='stock_balances')
     supply = models.ForeignKey(Supply, on_delete=models.CASCADE, related_name='school_balances')
     quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     min_stock = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text='Limite mínimo de estoque para esta escola')
+    # min_stock, or the supply's when zero; kept by save() and inventory/signals.py.
+    effective_min_stock = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     last_updated = models.DateTimeField(auto_now=True)
 
+    objects = SchoolStockBalanceQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['school', 'supply'], name='unique_school_supply_balance'),
         ]
+        indexes = [
+            models.Index(
+                fields=['school'],
+                condition=models.Q(quantity__lt=models.F('effective_min_stock')),
+                name='school_stock_low_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'min_stock' in update_fields:
+            min_stock = Decimal(str(self.min_stock or 0))
+            supply_min_stock = Decimal(str(self.supply.min_stock or 0)) if min_stock <= 0 else None
+            self.effective_min_stock = effective_min_stock(min_stock, supply_min_stock)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'effective_min_stock'}
+        super().save(*args, **kwargs)
 
     @property
     def is_low_stock(self):
-        return self.quantity < self.min_stock
+        return self.quantity < self.effective_min_stock
 
     def __str__(self) -> str:
         return f"{self.school.name} - {self.supply.name}: {self.quantity}"
@@ -81,16 +121,34 @@ class StockMovement(models.Model):
         IN = 'IN', 'Entrada'
         OUT = 'OUT', 'Saida'
 
+    class Balance(models.TextChoices):
+        CENTRAL = 'central', 'Estoque central'
+        SCHOOL = 'school', 'Estoque da escola'
+        NONE = 'none', 'Somente registro'
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     supply = models.ForeignKey(Supply, on_delete=models.CASCADE, related_name='movements')
     school = models.ForeignKey(School, on_delete=models.SET_NULL, related_name='stock_movements', null=True, blank=True)
     type = models.CharField(max_length=3, choices=Types.choices)
     quantity = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    # Aggregate balance the movement was applied to (see services/ledger.py). Blank
+    # on rows written outside the ledger: central without a school, the school's otherwise.
+    balance = models.CharField(max_length=8, choices=Balance.choices, blank=True, default='')
     movement_date = models.DateField()
     note = models.TextField(blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Grouped sums of the reconciliation (services/reconciliation.py).
+            models.Index(fields=['supply', 'balance', 'school'], include=['type', 'quantity'], name='stock_movement_ledger_idx'),
+            # Deltas since a balance snapshot (services/snapshots.py).
+            models.Index(fields=['supply', 'school', 'movement_date'], name='stock_movement_date_idx'),
+            # Movements created after a snapshot run with an earlier date.
+            models.Index(fields=['created_at'], name='stock_movement_created_idx'),
+        ]
+
     def __str__(self) -> str:
         return f"{self.supply.name} - {self.type} {self.quantity}"
 
@@ -130,18 +188,24 @@ class Delivery(models.Model):
     sent_at = models.DateTimeField(blank=True, null=True)
     conference_submitted_at = models.DateTimeField(blank=True, null=True)
     # Sender signature (person who delivered)
-    sender_signature = models.TextField(blank=True)
+    sender_signature = BlobTextField(blank=True)
     sender_signed_by = models.CharField(max_length=255, blank=True)
     # Receiver signature (person at school who received)
-    receiver_signature = models.TextField(blank=True)
+    receiver_signature = BlobTextField(blank=True)
     receiver_signed_by = models.CharField(max_length=255, blank=True)
     # Legacy fields (kept for backward compat, mapped to receiver)
-    conference_signature = models.TextField(blank=True)
+    conference_signature = BlobTextField(blank=True)
     conference_signed_by = models.CharField(max_length=255, blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='created_deliveries')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Polled by the event stream bridge (inventory/events.py).
+            models.Index(fields=['updated_at']),
+        ]
+
     def __str__(self) -> str:
         return f"Entrega {self.school.name} - {self.delivery_date}"
 
@@ -152,7 +216,7 @@ class DeliveryNutritionistSignature(models.Model):
     name = models.CharField(max_length=255)
     crn = models.CharField(max_length=80, blank=True)
     function_role = models.CharField(max_length=100, blank=True)
-    signature_data = models.TextField()
+    signature_data = BlobTextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -194,10 +258,20 @@ class Notification(models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
     is_read = models.BooleanField(default=False)
     is_alert = models.BooleanField(default=False)
+    # Set by senders that must not repeat a notification (see inventory/services/expiry.py).
+    dedupe_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['dedupe_key'], name='unique_notification_dedupe_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at']),
+            # unread_count() (inventory/events.py) counts only these rows.
+            models.Index(fields=['is_read'], condition=models.Q(is_read=False), name='notification_unread_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} - {self.created_at}"
@@ -236,9 +310,9 @@ class SupplierReceipt(models.Model):
     expected_date = models.DateField()
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.DRAFT)
     notes = models.TextField(blank=True)
-    sender_signature = models.TextField(blank=True)
+    sender_signature = BlobTextField(blank=True)
     sender_signed_by = models.CharField(max_length=255, blank=True)
-    receiver_signature = models.TextField(blank=True)
+    receiver_signature = BlobTextField(blank=True)
     receiver_signed_by = models.CharField(max_length=255, blank=True)
     conference_started_at = models.DateTimeField(blank=True, null=True)
     conference_finished_at = models.DateTimeField(blank=True, null=True)
@@ -299,6 +373,10 @@ class SupplyLot(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['supply', 'lot_code', 'expiry_date'], name='unique_supply_lot_code_expiry'),
         ]
+        indexes = [
+            models.Index(fields=['expiry_date']),
+            models.Index(fields=['updated_at']),
+        ]
         ordering = ['expiry_date', 'lot_code']
 
     def __str__(self) -> str:
@@ -310,6 +388,11 @@ class LotBalanceCentral(models.Model):
     quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
     def __str__(self) -> str:
         return f'Central {self.lot}: {self.quantity}'
 
@@ -324,11 +407,112 @@ class LotBalanceSchool(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['school', 'lot'], name='unique_school_lot_balance'),
         ]
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
 
     def __str__(self) -> str:
         return f'{self.school.name} - {self.lot}: {self.quantity}'
 
 
+class StockReconciliation(models.Model):
+    """One run of the stock reconciliation (see inventory/services/reconciliation.py)."""
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    supplies_checked = models.PositiveIntegerField(default=0)
+    movements_checked = models.PositiveBigIntegerField(default=0)
+    discrepancy_count = models.PositiveIntegerField(default=0)
+    corrections_posted = models.PositiveIntegerField(default=0)
+    discrepancies = models.JSONField(default=list, blank=True)
+    triggered_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self) -> str:
+        return f'Reconciliacao de estoque {self.started_at.isoformat()}'
+
+
+class StockBalanceSnapshot(models.Model):
+    """
+    Ledger balance of a supply at the end of ``snapshot_date``, centrally (no
+    school) or at a school. Only written for the days the balance changed.
+    """
+    school = models.ForeignKey(School, on_delete=models.CASCADE, null=True, blank=True, related_name='stock_snapshots')
+    supply = models.ForeignKey(Supply, on_delete=models.CASCADE, related_name='stock_snapshots')
+    snapshot_date = models.DateField()
+    quantity = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['supply', 'snapshot_date'],
+                condition=models.Q(school__isnull=True),
+                name='unique_central_stock_snapshot',
+            ),
+            models.UniqueConstraint(
+                fields=['school', 'supply', 'snapshot_date'],
+                condition=models.Q(school__isnull=False),
+                name='unique_school_stock_snapshot',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['snapshot_date']),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.supply_id} em {self.snapshot_date.isoformat()}: {self.quantity}'
+
+
+class StockSnapshotRun(models.Model):
+    """One run of ``snapshot_stock_balances``; the next run starts from the latest."""
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    through_date = models.DateField()
+    # First day written by the run; earlier than the previous through_date when
+    # movements were posted with a past date since.
+    rebuilt_from = models.DateField(null=True, blank=True)
+    rows_written = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self) -> str:
+        return f'Fotografia de estoque ate {self.through_date.isoformat()}'
+
+
+class StockSnapshotInvalidation(models.Model):
+    """A movement dated ``movement_date`` was edited or deleted; the next snapshot run rebuilds from it."""
+    movement_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='stock_snapshot_inval_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'Movimentacao alterada em {self.movement_date.isoformat()}'
+
+
+class LotExpirySweep(models.Model):
+    """One successful run of ``check_lot_expiry``; the next run starts from the latest."""
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    ran_on = models.DateField()
+    full = models.BooleanField(default=False)
+    expired_marked = models.PositiveIntegerField(default=0)
+    notifications_created = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self) -> str:
+        return f'Varredura de validade {self.started_at.isoformat()}'
+
+
 class SupplierReceiptItemLot(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     receipt_item = models.ForeignKey(SupplierReceiptItem, on_delete=models.CASCADE, related_name='lots')
@@ -1,9 +1,11 @@
 from django.db import transaction
-from django.db.utils import DatabaseError
+from django.db.models import Prefetch
 from decimal import Decimal
 
 from rest_framework import serializers
 
+from merenda_semed.blobs import BlobModelSerializerMixin, normalize_image_value
+
 from .models import (
     Delivery,
     DeliveryItem,
@@ -20,8 +22,10 @@ from .models import (
     SupplyLot,
     StockBalance,
     StockMovement,
+    StockReconciliation,
 )
-from .services.lots import regenerate_delivery_item_lot_plan_fefo
+from .services.ledger import InsufficientStock, LedgerEntry, post_movements
+from .services.lots import regenerate_delivery_lot_plans
 
 
 
@@ -54,7 +58,17 @@ class SupplySerializer(serializers.ModelSerializer):
         return normalized
 
 
-class StockBalanceSerializer(serializers.ModelSerializer):
+class AsOfQuantityMixin:
+    """Serialize ``as_of_quantity`` as the quantity when the rows carry it (``?as_of=``)."""
+
+    def to_representation(self, instance):
+        as_of_quantity = getattr(instance, 'as_of_quantity', None)
+        if as_of_quantity is not None:
+            instance.quantity = as_of_quantity
+        return super().to_representation(instance)
+
+
+class StockBalanceSerializer(AsOfQuantityMixin, serializers.ModelSerializer):
     supply = SupplySerializer(read_only=True)
     is_low_stock = serializers.SerializerMethodField()
 
@@ -66,7 +80,7 @@ class StockBalanceSerializer(serializers.ModelSerializer):
         return obj.quantity < obj.supply.min_stock
 
 
-class SchoolStockBalanceSerializer(serializers.ModelSerializer):
+class SchoolStockBalanceSerializer(AsOfQuantityMixin, serializers.ModelSerializer):
     supply = SupplySerializer(read_only=True)
     school_name = serializers.CharField(source='school.name', read_only=True)
     is_low_stock = serializers.SerializerMethodField()
@@ -77,15 +91,11 @@ class SchoolStockBalanceSerializer(serializers.ModelSerializer):
         fields = ['id', 'school', 'school_name', 'supply', 'quantity', 'min_stock', 'is_low_stock', 'status', 'last_updated']
         read_only_fields = ['id', 'school_name', 'is_low_stock', 'status', 'last_updated']
 
-    def _get_min_stock(self, obj):
-        # Use school-specific min_stock if set, otherwise fall back to supply's global min_stock
-        return obj.min_stock if obj.min_stock > 0 else obj.supply.min_stock
-
     def get_is_low_stock(self, obj):
-        return obj.quantity < self._get_min_stock(obj)
+        return obj.is_low_stock
 
     def get_status(self, obj):
-        min_stock = self._get_min_stock(obj)
+        min_stock = obj.effective_min_stock
         if obj.quantity < min_stock:
             return 'BAIXO'
         elif obj.quantity >= min_stock * 2:
@@ -203,7 +213,7 @@ class SupplierReceiptConferenceLotInputSerializer(serializers.Serializer):
     note = serializers.CharField(required=False, allow_blank=True, max_length=1000)
 
 
-class SupplierReceiptSerializer(serializers.ModelSerializer):
+class SupplierReceiptSerializer(BlobModelSerializerMixin, serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     school_name = serializers.CharField(source='school.name', read_only=True)
     items = SupplierReceiptItemSerializer(many=True)
@@ -285,14 +295,16 @@ class SupplierReceiptConferenceInputSerializer(serializers.Serializer):
         return items
 
     def validate_sender_signature_data(self, value):
-        if not value or not value.startswith('data:image/'):
+        normalized = normalize_image_value(value)
+        if normalized is None:
             raise serializers.ValidationError('Assinatura do entregador invalida.')
-        return value
+        return normalized
 
     def validate_receiver_signature_data(self, value):
-        if not value or not value.startswith('data:image/'):
+        normalized = normalize_image_value(value)
+        if normalized is None:
             raise serializers.ValidationError('Assinatura do recebedor invalida.')
-        return value
+        return normalized
 
     def validate_sender_signer_name(self, value):
         cleaned = value.strip()
@@ -323,26 +335,52 @@ class StockMovementSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = self.context['request'].user
-        supply = validated_data['supply']
-        with transaction.atomic():
-            balance, _ = StockBalance.objects.select_for_update().get_or_create(supply=supply)
-            quantity = validated_data['quantity']
-            if validated_data['type'] == StockMovement.Types.OUT:
-                if balance.quantity - quantity < 0:
-                    raise serializers.ValidationError('Saldo insuficiente para esta saida.')
-                balance.quantity -= quantity
-            else:
-                balance.quantity += quantity
-            balance.save()
-            movement = StockMovement.objects.create(created_by=user, **validated_data)
-        return movement
+        entry = LedgerEntry(
+            supply=validated_data['supply'],
+            school=validated_data.get('school'),
+            type=validated_data['type'],
+            quantity=validated_data['quantity'],
+            movement_date=validated_data['movement_date'],
+            note=validated_data.get('note', ''),
+            created_by_id=user.pk,
+        )
+        try:
+            with transaction.atomic():
+                return post_movements([entry]).movements[0]
+        except InsufficientStock:
+            raise serializers.ValidationError('Saldo insuficiente para esta saida.')
+
+
+def prefetch_delivery_tree(queryset):
+    """Load everything the delivery serializers render in a fixed number of queries."""
+    lots_qs = DeliveryItemLot.objects.select_related('lot__supplier').order_by('lot__expiry_date', 'lot__lot_code')
+    items_qs = DeliveryItem.objects.select_related('supply').prefetch_related(Prefetch('lots', queryset=lots_qs))
+    return queryset.select_related('school', 'sender').prefetch_related(
+        Prefetch('items', queryset=items_qs),
+        Prefetch('nutritionist_signatures', queryset=DeliveryNutritionistSignature.objects.order_by('created_at')),
+    )
+
+
+class DeliveryItemLotSerializer(serializers.ModelSerializer):
+    lot_code = serializers.CharField(source='lot.lot_code', read_only=True)
+    expiry_date = serializers.DateField(source='lot.expiry_date', read_only=True)
+    lot_status = serializers.CharField(source='lot.status', read_only=True)
+    supplier_name = serializers.CharField(source='lot.supplier.name', read_only=True, allow_null=True)
+
+    class Meta:
+        model = DeliveryItemLot
+        fields = [
+            'id', 'delivery_item', 'lot', 'lot_code', 'expiry_date', 'lot_status', 'supplier_name',
+            'planned_quantity', 'received_quantity', 'divergence_note',
+        ]
+        read_only_fields = ['id', 'delivery_item', 'lot_code', 'expiry_date', 'lot_status', 'supplier_name']
 
 
 class DeliveryItemSerializer(serializers.ModelSerializer):
     supply_name = serializers.CharField(source='supply.name', read_only=True)
     supply_unit = serializers.CharField(source='supply.unit', read_only=True)
     shortage_quantity = serializers.SerializerMethodField()
-    lots = serializers.SerializerMethodField()
+    lots = DeliveryItemLotSerializer(many=True, read_only=True)
 
     class Meta:
         model = DeliveryItem
@@ -357,7 +395,7 @@ class DeliveryItemSerializer(serializers.ModelSerializer):
             'shortage_quantity',
             'lots',
         ]
-        read_only_fields = ['id', 'supply_name', 'supply_unit', 'received_quantity', 'divergence_note', 'shortage_quantity']
+        read_only_fields = ['id', 'supply_name', 'supply_unit', 'received_quantity', 'divergence_note', 'shortage_quantity', 'lots']
 
     def get_shortage_quantity(self, obj):
         if obj.received_quantity is None:
@@ -365,42 +403,24 @@ class DeliveryItemSerializer(serializers.ModelSerializer):
         shortage = obj.planned_quantity - obj.received_quantity
         return shortage if shortage > 0 else 0
 
-    def get_lots(self, obj):
-        return DeliveryItemLotSerializer(obj.lots.select_related('lot').all(), many=True).data
-
-
-class DeliveryItemLotSerializer(serializers.ModelSerializer):
-    lot_code = serializers.CharField(source='lot.lot_code', read_only=True)
-    expiry_date = serializers.DateField(source='lot.expiry_date', read_only=True)
-    lot_status = serializers.CharField(source='lot.status', read_only=True)
-    supplier_name = serializers.CharField(source='lot.supplier.name', read_only=True, allow_null=True)
-
-    class Meta:
-        model = DeliveryItemLot
-        fields = [
-            'id', 'delivery_item', 'lot', 'lot_code', 'expiry_date', 'lot_status', 'supplier_name',
-            'planned_quantity', 'received_quantity', 'divergence_note',
-        ]
-        read_only_fields = ['id', 'delivery_item', 'lot_code', 'expiry_date', 'lot_status', 'supplier_name']
-
 
 class DeliveryItemLotInputSerializer(serializers.Serializer):
     lot = serializers.UUIDField()
     planned_quantity = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0)
 
 
-class DeliveryNutritionistSignatureSerializer(serializers.ModelSerializer):
+class DeliveryNutritionistSignatureSerializer(BlobModelSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = DeliveryNutritionistSignature
         fields = ['id', 'delivery', 'name', 'crn', 'function_role', 'signature_data', 'created_at']
         read_only_fields = ['id', 'created_at']
 
 
-class DeliverySerializer(serializers.ModelSerializer):
+class DeliverySerializer(BlobModelSerializerMixin, serializers.ModelSerializer):
     school_name = serializers.CharField(source='school.name', read_only=True)
     sender_name = serializers.CharField(source='sender.name', read_only=True, allow_null=True)
     sender_position = serializers.CharField(source='sender.position', read_only=True, allow_null=True)
-    nutritionist_signatures = serializers.SerializerMethodField()
+    nutritionist_signatures = DeliveryNutritionistSignatureSerializer(many=True, read_only=True)
     items = DeliveryItemSerializer(many=True)
 
     class Meta:
@@ -465,14 +485,6 @@ class DeliverySerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Nao e permitido repetir insumos na mesma entrega.')
         return items
 
-    def get_nutritionist_signatures(self, obj):
-        try:
-            signatures = obj.nutritionist_signatures.all()
-        except DatabaseError:
-            # Keep deliveries endpoint available even when signature schema is temporarily out of sync.
-            return []
-        return DeliveryNutritionistSignatureSerializer(signatures, many=True).data
-
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
         user = self.context['request'].user
@@ -481,12 +493,8 @@ class DeliverySerializer(serializers.ModelSerializer):
             DeliveryItem.objects.bulk_create([
                 DeliveryItem(delivery=delivery, **item_data) for item_data in items_data
             ])
-            for item in delivery.items.select_related('supply').all():
-                try:
-                    regenerate_delivery_item_lot_plan_fefo(item)
-                except serializers.ValidationError:
-                    # Compat mode: allow draft delivery even when no lot balances are available yet.
-                    pass
+            # Compat mode: items without enough lot balances are simply left without a lot plan.
+            regenerate_delivery_lot_plans(delivery.items.select_related('supply').all())
         return delivery
 
     def update(self, instance, validated_data):
@@ -504,18 +512,24 @@ class DeliverySerializer(serializers.ModelSerializer):
                 DeliveryItem.objects.bulk_create([
                     DeliveryItem(delivery=instance, **item_data) for item_data in items_data
                 ])
-                for item in instance.items.select_related('supply').all():
-                    try:
-                        regenerate_delivery_item_lot_plan_fefo(item)
-                    except serializers.ValidationError:
-                        pass
+                regenerate_delivery_lot_plans(instance.items.select_related('supply').all())
         return instance
 
 
+class PublicDeliveryItemLotSerializer(serializers.ModelSerializer):
+    lot_code = serializers.CharField(source='lot.lot_code', read_only=True)
+    expiry_date = serializers.DateField(source='lot.expiry_date', read_only=True)
+    supplier_name = serializers.CharField(source='lot.supplier.name', read_only=True, allow_null=True)
+
+    class Meta:
+        model = DeliveryItemLot
+        fields = ['id', 'lot', 'lot_code', 'expiry_date', 'supplier_name', 'planned_quantity', 'received_quantity', 'divergence_note']
+
+
 class PublicDeliveryItemSerializer(serializers.ModelSerializer):
     supply_name = serializers.CharField(source='supply.name', read_only=True)
     supply_unit = serializers.CharField(source='supply.unit', read_only=True)
-    lots = serializers.SerializerMethodField()
+    lots = PublicDeliveryItemLotSerializer(many=True, read_only=True)
 
     class Meta:
         model = DeliveryItem
@@ -529,21 +543,8 @@ class PublicDeliveryItemSerializer(serializers.ModelSerializer):
             'lots',
         ]
 
-    def get_lots(self, obj):
-        return PublicDeliveryItemLotSerializer(obj.lots.select_related('lot').all(), many=True).data
 
-
-class PublicDeliveryItemLotSerializer(serializers.ModelSerializer):
-    lot_code = serializers.CharField(source='lot.lot_code', read_only=True)
-    expiry_date = serializers.DateField(source='lot.expiry_date', read_only=True)
-    supplier_name = serializers.CharField(source='lot.supplier.name', read_only=True, allow_null=True)
-
-    class Meta:
-        model = DeliveryItemLot
-        fields = ['id', 'lot', 'lot_code', 'expiry_date', 'supplier_name', 'planned_quantity', 'received_quantity', 'divergence_note']
-
-
-class PublicDeliverySerializer(serializers.ModelSerializer):
+class PublicDeliverySerializer(BlobModelSerializerMixin, serializers.ModelSerializer):
     school_name = serializers.CharField(source='school.name', read_only=True)
     sender_name = serializers.CharField(source='sender.name', read_only=True, allow_null=True)
     sender_position = serializers.CharField(source='sender.position', read_only=True, allow_null=True)
@@ -589,14 +590,20 @@ class DeliveryConferenceInputSerializer(serializers.Serializer):
     receiver_signer_name = serializers.CharField(required=False, allow_blank=True)
 
     def validate_sender_signature_data(self, value):
-        if value and not value.startswith('data:image/'):
+        if not value:
+            return value
+        normalized = normalize_image_value(value)
+        if normalized is None:
             raise serializers.ValidationError('Assinatura do remetente invalida.')
-        return value
+        return normalized
 
     def validate_receiver_signature_data(self, value):
-        if value and not value.startswith('data:image/'):
+        if not value:
+            return value
+        normalized = normalize_image_value(value)
+        if normalized is None:
             raise serializers.ValidationError('Assinatura do receptor invalida.')
-        return value
+        return normalized
 
     def validate_sender_signer_name(self, value):
         return value.strip() if value else value
@@ -650,6 +657,16 @@ class SupplyLotSerializer(serializers.ModelSerializer):
         return getattr(getattr(obj, 'central_balance', None), 'quantity', None)
 
 
+class StockReconciliationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockReconciliation
+        fields = [
+            'id', 'started_at', 'finished_at', 'supplies_checked', 'movements_checked',
+            'discrepancy_count', 'corrections_posted', 'discrepancies', 'triggered_by',
+        ]
+        read_only_fields = fields
+
+
 class NotificationSerializer(serializers.ModelSerializer):
     school_name = serializers.CharField(source='school.name', read_only=True)
     delivery_school = serializers.CharField(source='delivery.school.name', read_only=True)
@@ -0,0 +1,144 @@
+"""
+Lot expiry sweep behind ``check_lot_expiry``.
+
+Lots with balance whose expiry date has passed are marked EXPIRED in one
+UPDATE, and the balance rows that need an alert (expired lots, and active lots
+exactly at one of the alert windows) are selected in SQL. Notifications carry a
+``dedupe_key`` built from what used to be checked with one query per row (type,
+school, title and day), so they are inserted with one ``bulk_create`` and a
+repeated run on the same day adds nothing.
+
+Each successful run is recorded as a ``LotExpirySweep``. The next run only looks
+at lots that can have changed since that one started: lots or balances updated
+since, lots whose expiry date passed since, and lots at an alert window today.
+Expired lots that still have balance are looked at on every run, so they keep
+getting their daily alert. The first run, or one with ``full=True``, looks at
+every lot.
+"""
+from __future__ import annotations
+
+import hashlib
+from datetime import date, timedelta
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from inventory.events import publish_unread_count
+from inventory.models import LotBalanceCentral, LotBalanceSchool, LotExpirySweep, Notification, SupplyLot
+
+
+def notification_dedupe_key(notification_type: str, title: str, school_id=None, day: date | None = None) -> str:
+    day = day or date.today()
+    raw = f'{notification_type}|{school_id or ""}|{title}|{day.isoformat()}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _balance_exists(model, **filters):
+    return Exists(model.objects.filter(lot=OuterRef('pk'), **filters))
+
+
+def _with_balance():
+    return _balance_exists(LotBalanceCentral, quantity__gt=0) | _balance_exists(LotBalanceSchool, quantity__gt=0)
+
+
+def _candidate_lots(previous: LotExpirySweep | None, today: date, alert_dates: list[date]):
+    lots = SupplyLot.objects.all()
+    if previous is None:
+        return lots
+    since = previous.started_at
+    return lots.filter(
+        Q(status=SupplyLot.Status.EXPIRED) & _with_balance()
+        | Q(updated_at__gte=since)
+        | Q(expiry_date__gte=previous.ran_on, expiry_date__lt=today)
+        | Q(expiry_date__in=alert_dates)
+        | _balance_exists(LotBalanceCentral, updated_at__gte=since)
+        | _balance_exists(LotBalanceSchool, updated_at__gte=since)
+    )
+
+
+def _alert_rows(model, lots, alert_dates, *fields):
+    return (
+        model.objects.filter(quantity__gt=0, lot__in=lots)
+        .filter(
+            Q(lot__status=SupplyLot.Status.EXPIRED)
+            | Q(lot__status=SupplyLot.Status.ACTIVE, lot__expiry_date__in=alert_dates)
+        )
+        .values_list('quantity', 'lot__lot_code', 'lot__expiry_date', 'lot__status', 'lot__supply__name', *fields)
+    )
+
+
+def sweep_lot_expiry(thresholds, *, full: bool = False, today: date | None = None) -> LotExpirySweep:
+    today = today or date.today()
+    started_at = timezone.now()
+    thresholds = sorted({int(days) for days in thresholds if int(days) >= 0}, reverse=True)
+    alert_dates = [today + timedelta(days=days) for days in thresholds]
+    previous = None if full else LotExpirySweep.objects.order_by('-started_at').first()
+    lots = _candidate_lots(previous, today, alert_dates)
+
+    expired_marked = (
+        lots.filter(_with_balance(), expiry_date__lt=today)
+        .exclude(status=SupplyLot.Status.EXPIRED)
+        .update(status=SupplyLot.Status.EXPIRED, updated_at=timezone.now())
+    )
+
+    pending = {}
+
+    def notify(notification_type, title, message, school_id=None):
+        key = notification_dedupe_key(notification_type, title, school_id, today)
+        pending.setdefault(key, Notification(
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            school_id=school_id,
+            is_alert=True,
+            dedupe_key=key,
+        ))
+
+    for quantity, lot_code, expiry_date, status, supply_name in _alert_rows(LotBalanceCentral, lots, alert_dates):
+        if status == SupplyLot.Status.EXPIRED:
+            notify(
+                Notification.NotificationType.LOT_EXPIRED,
+                f'Lote vencido (Central) - {supply_name}',
+                f'Lote {lot_code} vencido em {expiry_date.isoformat()} com saldo {quantity}.',
+            )
+            continue
+        days_to_expiry = (expiry_date - today).days
+        notify(
+            Notification.NotificationType.LOT_EXPIRING_SOON,
+            f'Lote vencendo em {days_to_expiry} dia(s) (Central) - {supply_name}',
+            f'Lote {lot_code} vence em {expiry_date.isoformat()} e possui saldo {quantity}.',
+        )
+
+    school_rows = _alert_rows(LotBalanceSchool, lots, alert_dates, 'school_id', 'school__name')
+    for quantity, lot_code, expiry_date, status, supply_name, school_id, school_name in school_rows:
+        if status == SupplyLot.Status.EXPIRED:
+            notify(
+                Notification.NotificationType.LOT_EXPIRED,
+                f'Lote vencido - {school_name}',
+                f'{supply_name} lote {lot_code} vencido em {expiry_date.isoformat()} com saldo {quantity}.',
+                school_id=school_id,
+            )
+            continue
+        days_to_expiry = (expiry_date - today).days
+        notify(
+            Notification.NotificationType.LOT_EXPIRING_SOON,
+            f'Lote vencendo em {days_to_expiry} dia(s) - {school_name}',
+            f'{supply_name} lote {lot_code} vence em {expiry_date.isoformat()} com saldo {quantity}.',
+            school_id=school_id,
+        )
+
+    existing = set(Notification.objects.filter(dedupe_key__in=list(pending)).values_list('dedupe_key', flat=True))
+    new_notifications = [notification for key, notification in pending.items() if key not in existing]
+    # ignore_conflicts covers a concurrent run inserting the same keys in between.
+    Notification.objects.bulk_create(new_notifications, batch_size=500, ignore_conflicts=True)
+    if new_notifications:
+        publish_unread_count()
+
+    return LotExpirySweep.objects.create(
+        started_at=started_at,
+        finished_at=timezone.now(),
+        ran_on=today,
+        full=previous is None,
+        expired_marked=expired_marked,
+        notifications_created=len(new_notifications),
+    )
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Case, CharField, DecimalField, F, Q, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from inventory.models import SchoolStockBalance, StockBalance, StockMovement, Supply
+from inventory.signals import stock_movements_posted
+
+
+ZERO = Decimal('0')
+
+CENTRAL = StockMovement.Balance.CENTRAL
+SCHOOL = StockMovement.Balance.SCHOOL
+
+_QUANTITY_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+@dataclass
+class LedgerEntry:
+    """
+    One stock movement to post.
+
+    ``balance`` selects the aggregate balance the movement changes: the central
+    ``StockBalance`` (``CENTRAL``), the ``SchoolStockBalance`` of ``school``
+    (``SCHOOL``) or none at all (``None``, the movement is only recorded).
+    ``school`` is always copied to the movement row.
+    """
+    supply: Supply
+    type: str
+    quantity: Decimal
+    movement_date: date
+    created_by_id: object
+    note: str = ''
+    school: object = None
+    balance: str | None = CENTRAL
+
+    @property
+    def delta(self) -> Decimal:
+        quantity = _as_decimal(self.quantity)
+        return -quantity if self.type == StockMovement.Types.OUT else quantity
+
+
+@dataclass
+class PostingResult:
+    movements: list[StockMovement] = field(default_factory=list)
+    central_balances: dict = field(default_factory=dict)
+    school_balances: dict = field(default_factory=dict)
+
+    def school_balance(self, school, supply) -> SchoolStockBalance | None:
+        return self.school_balances.get((_pk(school), _pk(supply)))
+
+
+class InsufficientStock(ValidationError):
+    def __init__(self, entry: LedgerEntry, available: Decimal):
+        self.entry = entry
+        self.available = available
+        super().__init__(f'Saldo insuficiente para {entry.supply.name}. Disponivel: {available}')
+
+
+def _as_decimal(value) -> Decimal:
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value or 0))
+
+
+def _pk(value):
+    return getattr(value, 'pk', value)
+
+
+def movement_balance():
+    """The ``balance`` a movement row changed, as an expression."""
+    # Movements from before the balance column: central without a school, the school's otherwise.
+    return Case(
+        When(balance='', school__isnull=True, then=Value(CENTRAL)),
+        When(balance='', then=Value(SCHOOL)),
+        default=F('balance'),
+        output_field=CharField(),
+    )
+
+
+def balance_filter(balance: str) -> Q:
+    """Movement rows that changed ``balance``; same rule as ``movement_balance``, but indexable."""
+    return Q(balance=balance) | Q(balance='', school__isnull=balance == CENTRAL)
+
+
+def signed_quantity():
+    """The movement quantity, negative for OUT, as an expression."""
+    return Case(
+        When(type=StockMovement.Types.OUT, then=-F('quantity')),
+        default=F('quantity'),
+        output_field=_QUANTITY_FIELD,
+    )
+
+
+def _supply_min_stock(entries, supply_ids) -> dict:
+    """``min_stock`` per supply, read from the entries' supplies where they are loaded."""
+    known = {
+        entry.supply.pk: entry.supply.min_stock
+        for entry in entries
+        if isinstance(entry.supply, Supply)
+    }
+    missing = [supply_id for supply_id in supply_ids if supply_id not in known]
+    if missing:
+        known.update(Supply.objects.filter(pk__in=missing).values_list('pk', 'min_stock'))
+    return known
+
+
+def _apply_deltas(model, rows: dict, deltas: dict, extra: dict | None = None):
+    """Apply every delta in a single ``UPDATE ... SET quantity = quantity + CASE ...``."""
+    whens = [
+        When(pk=rows[key].pk, then=Value(delta, output_field=_QUANTITY_FIELD))
+        for key, delta in deltas.items()
+        if delta != 0
+    ]
+    if not whens:
+        return
+    model.objects.filter(pk__in=[rows[key].pk for key in deltas]).update(
+        quantity=F('quantity') + Case(*whens, default=Value(ZERO, output_field=_QUANTITY_FIELD), output_field=_QUANTITY_FIELD),
+        **(extra or {}),
+    )
+    for key, delta in deltas.items():
+        rows[key].quantity = _as_decimal(rows[key].quantity) + delta
+
+
+def _check_available(rows: dict, deltas: dict, first_entry: dict):
+    for key, delta in deltas.items():
+        available = _as_decimal(rows[key].quantity)
+        if delta < 0 and available + delta < 0:
+            raise InsufficientStock(first_entry[key], available)
+
+
+def post_movements(entries: list[LedgerEntry]) -> PostingResult:
+    """
+    Post a batch of movements against the aggregate stock balances.
+
+    All affected balance rows are created if missing and locked with one query
+    per table, always in the same order (central rows by supply, then school
+    rows by school and supply), so concurrent postings cannot deadlock. Deltas
+    are checked on the net change per balance row and applied with ``F()``
+    expressions; the movement rows are bulk inserted and announced through
+    ``stock_movements_posted``. Must run inside ``transaction.atomic()``.
+    """
+    result = PostingResult()
+    if not entries:
+        return result
+
+    central_deltas: dict = {}
+    school_deltas: dict = {}
+    first_entry: dict = {}
+    for entry in entries:
+        if entry.balance == CENTRAL:
+            key = _pk(entry.supply)
+            central_deltas[key] = central_deltas.get(key, ZERO) + entry.delta
+        elif entry.balance == SCHOOL:
+            if entry.school is None:
+                raise ValidationError('school obrigatorio para movimentar estoque da escola.')
+            key = (_pk(entry.school), _pk(entry.supply))
+            school_deltas[key] = school_deltas.get(key, ZERO) + entry.delta
+        else:
+            continue
+        if entry.delta < 0:
+            first_entry.setdefault(key, entry)
+
+    if central_deltas:
+        StockBalance.objects.bulk_create(
+            [StockBalance(supply_id=supply_id, quantity=ZERO) for supply_id in central_deltas],
+            ignore_conflicts=True,
+        )
+        locked = StockBalance.objects.select_for_update().filter(
+            supply_id__in=list(central_deltas),
+        ).order_by('supply_id')
+        result.central_balances = {row.supply_id: row for row in locked}
+        _check_available(result.central_balances, central_deltas, first_entry)
+        _apply_deltas(StockBalance, result.central_balances, central_deltas)
+
+    if school_deltas:
+        supply_min_stock = _supply_min_stock(entries, {supply_id for _, supply_id in school_deltas})
+        SchoolStockBalance.objects.bulk_create(
+            [
+                SchoolStockBalance(
+                    school_id=school_id,
+                    supply_id=supply_id,
+                    quantity=ZERO,
+                    min_stock=ZERO,
+                    effective_min_stock=supply_min_stock[supply_id],
+                )
+                for school_id, supply_id in school_deltas
+            ],
+            ignore_conflicts=True,
+        )
+        school_ids = {school_id for school_id, _ in school_deltas}
+        supply_ids = {supply_id for _, supply_id in school_deltas}
+        locked = SchoolStockBalance.objects.select_for_update().filter(
+            school_id__in=school_ids,
+            supply_id__in=supply_ids,
+        ).order_by('school_id', 'supply_id')
+        result.school_balances = {
+            (row.school_id, row.supply_id): row
+            for row in locked
+            if (row.school_id, row.supply_id) in school_deltas
+        }
+        _check_available(result.school_balances, school_deltas, first_entry)
+        _apply_deltas(SchoolStockBalance, result.school_balances, school_deltas, {'last_updated': timezone.now()})
+
+    result.movements = StockMovement.objects.bulk_create([
+        StockMovement(
+            supply=entry.supply,
+            school=entry.school,
+            type=entry.type,
+            quantity=entry.quantity,
+            movement_date=entry.movement_date,
+            note=entry.note,
+            balance=entry.balance or StockMovement.Balance.NONE,
+            created_by_id=entry.created_by_id,
+        )
+        for entry in entries
+    ])
+    stock_movements_posted.send(sender=StockMovement, movements=result.movements)
+    return result
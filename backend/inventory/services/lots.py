@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import defaultdict
+from dataclasses import dataclass, field
 from datetime import date
 from decimal import Decimal
 
@@ -149,62 +150,105 @@ def debit_lot_school(*, school, lot: SupplyLot, quantity) -> LotBalanceSchool:
     return balance
 
 
-def fefo_suggestion_service(*, supply: Supply, qty, from_central: bool = True, school=None) -> list[LotAllocation]:
-    """Return FEFO lot allocations for a requested quantity without persisting."""
-    requested = _as_decimal(qty)
-    if requested <= 0:
-        return []
+@dataclass
+class FefoPlan:
+    """FEFO allocation for one requested (supply, quantity) pair."""
+    supply: Supply
+    requested: Decimal
+    allocations: list[LotAllocation] = field(default_factory=list)
+    available: Decimal = ZERO
+
+    @property
+    def allocated(self) -> Decimal:
+        return sum((allocation.quantity for allocation in self.allocations), ZERO)
 
+    @property
+    def shortage(self) -> Decimal:
+        return max(self.requested - self.allocated, ZERO)
+
+
+def _fefo_candidate_balances(supply_ids, *, from_central: bool, school=None):
     today = date.today()
     if from_central:
-        balances = (
-            LotBalanceCentral.objects.select_related('lot', 'lot__supply')
-            .filter(
-                lot__supply=supply,
-                quantity__gt=0,
-                lot__status=SupplyLot.Status.ACTIVE,
-            )
-            .filter(Q(lot__expiry_date__gte=today))
-            .order_by('lot__expiry_date', 'lot__lot_code', 'lot__created_at')
-        )
+        balances = LotBalanceCentral.objects.filter(lot__supply_id__in=supply_ids)
     else:
-        if school is None:
-            raise ValidationError('school obrigatorio para FEFO da escola.')
-        balances = (
-            LotBalanceSchool.objects.select_related('lot', 'lot__supply')
-            .filter(
-                school=school,
-                lot__supply=supply,
-                quantity__gt=0,
-                lot__status=SupplyLot.Status.ACTIVE,
-            )
-            .filter(Q(lot__expiry_date__gte=today))
-            .order_by('lot__expiry_date', 'lot__lot_code', 'lot__created_at')
+        balances = LotBalanceSchool.objects.filter(school=school, lot__supply_id__in=supply_ids)
+    return (
+        balances.select_related('lot', 'lot__supply')
+        .filter(
+            quantity__gt=0,
+            lot__status=SupplyLot.Status.ACTIVE,
         )
+        .filter(Q(lot__expiry_date__gte=today))
+        .order_by('lot__expiry_date', 'lot__lot_code', 'lot__created_at')
+    )
 
-    remaining = requested
-    allocations: list[LotAllocation] = []
-    for balance in balances:
-        available = _as_decimal(balance.quantity)
-        if available <= 0:
+
+def fefo_allocate_batch(requests, *, from_central: bool = True, school=None) -> list[FefoPlan]:
+    """
+    FEFO allocations for many ``(supply, quantity)`` requests without persisting.
+
+    Candidate lot balances for every requested supply are loaded with a single
+    query. Requests are served in order; requests for the same supply draw from
+    the same balances, so a lot is never promised twice. Plans that cannot be
+    fully served keep their partial allocations and report ``shortage``.
+    """
+    plans = [FefoPlan(supply=supply, requested=_as_decimal(qty)) for supply, qty in requests]
+    supply_ids = {plan.supply.pk for plan in plans if plan.requested > 0}
+    if not supply_ids:
+        return plans
+    if not from_central and school is None:
+        raise ValidationError('school obrigatorio para FEFO da escola.')
+
+    balances_by_supply: dict = defaultdict(list)
+    for balance in _fefo_candidate_balances(supply_ids, from_central=from_central, school=school):
+        balances_by_supply[balance.lot.supply_id].append(balance)
+    left = {
+        balance.pk: _as_decimal(balance.quantity)
+        for balances in balances_by_supply.values()
+        for balance in balances
+    }
+
+    for plan in plans:
+        if plan.requested <= 0:
             continue
-        take = min(available, remaining)
-        if take > 0:
-            allocations.append(LotAllocation(lot=balance.lot, quantity=take))
+        balances = balances_by_supply.get(plan.supply.pk, [])
+        plan.available = sum((left[balance.pk] for balance in balances), ZERO)
+        remaining = plan.requested
+        for balance in balances:
+            available = left[balance.pk]
+            if available <= 0:
+                continue
+            take = min(available, remaining)
+            plan.allocations.append(LotAllocation(lot=balance.lot, quantity=take))
+            left[balance.pk] = available - take
             remaining -= take
-        if remaining <= 0:
-            break
+            if remaining <= 0:
+                break
+    return plans
 
-    if remaining > 0:
-        origin = 'central' if from_central else 'escola'
-        raise ValidationError(f'Saldo por lote insuficiente para {supply.name} no estoque {origin}.')
-    return allocations
 
+def _fefo_shortage_error(supply: Supply, from_central: bool) -> ValidationError:
+    origin = 'central' if from_central else 'escola'
+    return ValidationError(f'Saldo por lote insuficiente para {supply.name} no estoque {origin}.')
 
-def replace_delivery_item_lot_plan(delivery_item: DeliveryItem, allocations: list[LotAllocation]) -> list[DeliveryItemLot]:
-    """Replace planned lot composition for a delivery item."""
+
+def fefo_suggestion_service(*, supply: Supply, qty, from_central: bool = True, school=None) -> list[LotAllocation]:
+    """Return FEFO lot allocations for a requested quantity without persisting."""
+    plan = fefo_allocate_batch([(supply, qty)], from_central=from_central, school=school)[0]
+    if plan.shortage > 0:
+        raise _fefo_shortage_error(supply, from_central)
+    return plan.allocations
+
+
+def _ensure_draft(delivery_item: DeliveryItem):
     if delivery_item.delivery.status != delivery_item.delivery.Status.DRAFT:
         raise ValidationError('Somente entregas em rascunho podem ter lotes planejados alterados.')
+
+
+def replace_delivery_item_lot_plan(delivery_item: DeliveryItem, allocations: list[LotAllocation]) -> list[DeliveryItemLot]:
+    """Replace planned lot composition for a delivery item."""
+    _ensure_draft(delivery_item)
     DeliveryItemLot.objects.filter(delivery_item=delivery_item).delete()
     rows = [
         DeliveryItemLot(
@@ -225,14 +269,84 @@ def regenerate_delivery_item_lot_plan_fefo(delivery_item: DeliveryItem) -> list[
     return replace_delivery_item_lot_plan(delivery_item, allocations)
 
 
+def regenerate_delivery_lot_plans(delivery_items) -> dict:
+    """
+    Batch version of ``regenerate_delivery_item_lot_plan_fefo``.
+
+    Returns ``{item.pk: FefoPlan}``. Items whose plan has a shortage keep their
+    current lots, which is what the per-item function does when it raises.
+    """
+    items = list(delivery_items)
+    for item in items:
+        _ensure_draft(item)
+    plans = fefo_allocate_batch(
+        [(item.supply, item.planned_quantity) for item in items],
+        from_central=True,
+    )
+    served = [(item, plan) for item, plan in zip(items, plans) if plan.shortage == 0]
+    if served:
+        DeliveryItemLot.objects.filter(delivery_item__in=[item for item, _ in served]).delete()
+        DeliveryItemLot.objects.bulk_create([
+            DeliveryItemLot(
+                delivery_item=item,
+                lot=allocation.lot,
+                planned_quantity=allocation.quantity,
+            )
+            for item, plan in served
+            for allocation in plan.allocations
+            if _as_decimal(allocation.quantity) > 0
+        ])
+    return {item.pk: plan for item, plan in zip(items, plans)}
+
+
+def _lot_rows_by_item(delivery_items) -> dict:
+    rows_by_item: dict = defaultdict(list)
+    for row in DeliveryItemLot.objects.select_related('lot').filter(delivery_item__in=delivery_items):
+        rows_by_item[row.delivery_item_id].append(row)
+    return rows_by_item
+
+
+def ensure_delivery_lot_plans(delivery_items) -> tuple[dict, dict]:
+    """
+    Batch version of ``ensure_delivery_item_lot_plan``.
+
+    Returns ``(lots, errors)``: planned ``DeliveryItemLot`` rows for the items
+    whose plan is consistent, and the ``ValidationError`` the per-item function
+    would have raised for the others, both keyed by item pk.
+    """
+    items = list(delivery_items)
+    rows_by_item = _lot_rows_by_item(items)
+    missing = [
+        item for item in items
+        if not rows_by_item[item.pk] and _as_decimal(item.planned_quantity) > 0
+    ]
+    plans = regenerate_delivery_lot_plans(missing) if missing else {}
+    if missing:
+        rows_by_item.update(_lot_rows_by_item(missing))
+
+    lots: dict = {}
+    errors: dict = {}
+    for item in items:
+        plan = plans.get(item.pk)
+        if plan is not None and plan.shortage > 0:
+            errors[item.pk] = _fefo_shortage_error(item.supply, True)
+            continue
+        rows = rows_by_item[item.pk]
+        planned_sum = sum((_as_decimal(row.planned_quantity) for row in rows), ZERO)
+        if planned_sum != _as_decimal(item.planned_quantity):
+            errors[item.pk] = ValidationError(
+                f'Soma dos lotes planejados difere da quantidade planejada de {item.supply.name}.'
+            )
+            continue
+        lots[item.pk] = rows
+    return lots, errors
+
+
 def ensure_delivery_item_lot_plan(delivery_item: DeliveryItem) -> list[DeliveryItemLot]:
-    lots = list(DeliveryItemLot.objects.select_related('lot').filter(delivery_item=delivery_item))
-    if not lots and _as_decimal(delivery_item.planned_quantity) > 0:
-        lots = regenerate_delivery_item_lot_plan_fefo(delivery_item)
-    planned_sum = sum((_as_decimal(row.planned_quantity) for row in lots), ZERO)
-    if planned_sum != _as_decimal(delivery_item.planned_quantity):
-        raise ValidationError(f'Soma dos lotes planejados difere da quantidade planejada de {delivery_item.supply.name}.')
-    return lots
+    lots, errors = ensure_delivery_lot_plans([delivery_item])
+    if delivery_item.pk in errors:
+        raise errors[delivery_item.pk]
+    return lots[delivery_item.pk]
 
 
 def ensure_aggregate_balance_consistency_for_credit(*, supply: Supply, quantity, school=None):
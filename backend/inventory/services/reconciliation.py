@@ -0,0 +1,273 @@
+"""
+Stock reconciliation behind ``reconcile_stock``.
+
+The expected balances are recomputed from the ledger: ``StockMovement`` rows
+summed (IN adds, OUT subtracts) per supply and ``balance``, and per school for
+school movements, with one grouped query per partition of supplies. They are
+diffed against the three stores that are kept incrementally:
+
+* ``StockBalance`` (kind ``central``) and ``SchoolStockBalance`` (``school``);
+* the lot balances summed per supply (``central_lots`` and ``school_lots``),
+  only for supplies that have lot balances in that store.
+
+Partitions are independent, so they run on a pool of worker threads, each with
+its own connection. On Postgres the run reads in a REPEATABLE READ transaction
+and every worker reads the snapshot it exports, so all partitions see the same
+state of the tables.
+
+With ``correct=True`` each aggregate discrepancy gets a correcting movement,
+recorded with the balance it fixes but not applied to it: the balance row
+already holds the corrected value, so the ledger is what gets brought in line.
+Lot discrepancies are only reported; which lot is wrong needs a person.
+Movements posted while the run reads are not in its snapshot, so before
+correcting, the balances of the affected supplies are locked like the ledger
+locks them and those supplies are reconciled again; only the discrepancies
+still found then are corrected.
+
+Each run is recorded as a ``StockReconciliation``.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventory.models import (
+    LotBalanceCentral,
+    LotBalanceSchool,
+    SchoolStockBalance,
+    StockBalance,
+    StockMovement,
+    StockReconciliation,
+    Supply,
+)
+from inventory.services.ledger import CENTRAL, SCHOOL, movement_balance, signed_quantity
+from inventory.signals import stock_movements_posted
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+CORRECTION_NOTE = 'Ajuste de reconciliacao de estoque'
+# Discrepancies that get a correcting movement.
+AGGREGATE_KINDS = ('central', 'school')
+
+_QUANTITY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+@dataclass(frozen=True)
+class Discrepancy:
+    kind: str
+    supply_id: object
+    school_id: object
+    expected: Decimal
+    actual: Decimal
+
+    @property
+    def difference(self) -> Decimal:
+        return self.actual - self.expected
+
+    def as_dict(self) -> dict:
+        return {
+            'kind': self.kind,
+            'supply_id': str(self.supply_id),
+            'school_id': str(self.school_id) if self.school_id is not None else None,
+            'expected': str(self.expected),
+            'actual': str(self.actual),
+            'difference': str(self.difference),
+        }
+
+
+def _sum(expression):
+    return Coalesce(Sum(expression), Value(ZERO), output_field=_QUANTITY_FIELD)
+
+
+def _as_decimal(value) -> Decimal:
+    # SQLite sums decimals as floats; balances are kept in cents.
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def _ledger(supply_ids):
+    rows = (
+        StockMovement.objects.filter(supply_id__in=supply_ids)
+        .annotate(store=movement_balance())
+        .filter(store__in=[CENTRAL, SCHOOL])
+        .values('supply_id', 'store', 'school_id')
+        .annotate(total=_sum(signed_quantity()), movements=Count('pk'))
+        .order_by()
+    )
+    central, school, movements = {}, {}, 0
+    for row in rows:
+        movements += row['movements']
+        total = _as_decimal(row['total'])
+        if row['store'] == CENTRAL:
+            # Central movements may carry a school (deliveries); they all add up to one balance.
+            central[row['supply_id']] = central.get(row['supply_id'], ZERO) + total
+        else:
+            school[(row['school_id'], row['supply_id'])] = total
+    return central, school, movements
+
+
+def _compare(kind, expected: dict, actual: dict, keys=None):
+    found = []
+    for key in sorted(keys if keys is not None else set(expected) | set(actual), key=str):
+        wanted = expected.get(key, ZERO)
+        held = actual.get(key, ZERO)
+        if wanted != held:
+            school_id, supply_id = key if isinstance(key, tuple) else (None, key)
+            found.append(Discrepancy(
+                kind=kind,
+                supply_id=supply_id,
+                school_id=school_id,
+                expected=wanted,
+                actual=held,
+            ))
+    return found
+
+
+def _grouped(queryset, *fields):
+    rows = queryset.values(*fields).annotate(total=_sum('quantity')).order_by()
+    if len(fields) == 1:
+        return {row[fields[0]]: _as_decimal(row['total']) for row in rows}
+    return {tuple(row[name] for name in fields): _as_decimal(row['total']) for row in rows}
+
+
+def reconcile_partition(supply_ids) -> tuple[list[Discrepancy], int]:
+    """Discrepancies of ``supply_ids`` and the number of ledger movements read."""
+    central, school, movements = _ledger(supply_ids)
+
+    central_held = {
+        supply_id: _as_decimal(quantity)
+        for supply_id, quantity in StockBalance.objects.filter(supply_id__in=supply_ids).values_list('supply_id', 'quantity')
+    }
+    school_held = {
+        (school_id, supply_id): _as_decimal(quantity)
+        for school_id, supply_id, quantity in SchoolStockBalance.objects.filter(
+            supply_id__in=supply_ids,
+        ).values_list('school_id', 'supply_id', 'quantity')
+    }
+    central_lots = _grouped(LotBalanceCentral.objects.filter(lot__supply_id__in=supply_ids), 'lot__supply_id')
+    school_lots = _grouped(
+        LotBalanceSchool.objects.filter(lot__supply_id__in=supply_ids), 'school_id', 'lot__supply_id',
+    )
+
+    found = _compare('central', central, central_held)
+    found += _compare('school', school, school_held)
+    found += _compare('central_lots', central, central_lots, keys=set(central_lots))
+    found += _compare('school_lots', school, school_lots, keys=set(school_lots))
+    return found, movements
+
+
+def _partitions(supply_ids, size):
+    size = max(int(size), 1)
+    return [supply_ids[start:start + size] for start in range(0, len(supply_ids), size)]
+
+
+def _snapshot_id(outermost: bool, export: bool):
+    """Read the run from one snapshot; exported for the workers when ``export`` (Postgres only)."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if outermost:
+            # Must come before any query in the transaction.
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        if not export:
+            return None
+        cursor.execute('SELECT pg_export_snapshot()')
+        return cursor.fetchone()[0]
+
+
+def _run_in_worker(supply_ids, snapshot):
+    try:
+        with transaction.atomic():
+            if snapshot:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+                    cursor.execute('SET TRANSACTION SNAPSHOT %s', [snapshot])
+            return reconcile_partition(supply_ids)
+    finally:
+        connections.close_all()
+
+
+def _recheck(discrepancies: list[Discrepancy]) -> list[Discrepancy]:
+    """Lock the balances of the supplies with an aggregate discrepancy and find those still there."""
+    supply_ids = sorted({item.supply_id for item in discrepancies if item.kind in AGGREGATE_KINDS}, key=str)
+    if not supply_ids:
+        return []
+    # Same order as post_movements, so a posting either waits or is seen here.
+    list(StockBalance.objects.select_for_update().filter(supply_id__in=supply_ids).order_by('supply_id').values_list('pk'))
+    list(
+        SchoolStockBalance.objects.select_for_update()
+        .filter(supply_id__in=supply_ids)
+        .order_by('school_id', 'supply_id')
+        .values_list('pk')
+    )
+    found, _ = reconcile_partition(supply_ids)
+    return [item for item in found if item.kind in AGGREGATE_KINDS]
+
+
+def _correction(discrepancy: Discrepancy, user_id, today: date) -> StockMovement:
+    difference = discrepancy.difference
+    return StockMovement(
+        supply_id=discrepancy.supply_id,
+        school_id=discrepancy.school_id,
+        type=StockMovement.Types.IN if difference > 0 else StockMovement.Types.OUT,
+        quantity=abs(difference),
+        balance=CENTRAL if discrepancy.kind == 'central' else SCHOOL,
+        movement_date=today,
+        note=CORRECTION_NOTE,
+        created_by_id=user_id,
+    )
+
+
+def reconcile_stock(*, correct: bool = False, user=None, workers: int | None = None,
+                    partition_size: int | None = None) -> StockReconciliation:
+    """Diff every supply's balances against the ledger; see the module docstring."""
+    if correct and user is None:
+        raise ValueError('Correcting movements need a user.')
+    workers = settings.STOCK_RECONCILIATION_WORKERS if workers is None else workers
+    partition_size = partition_size or settings.STOCK_RECONCILIATION_PARTITION_SIZE
+    started_at = timezone.now()
+    discrepancies: list[Discrepancy] = []
+    movements = 0
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        snapshot = _snapshot_id(outermost, export=workers > 1)
+        supply_ids = list(Supply.objects.order_by('pk').values_list('pk', flat=True))
+        partitions = _partitions(supply_ids, partition_size)
+        if workers > 1 and len(partitions) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(lambda ids: _run_in_worker(ids, snapshot), partitions))
+        else:
+            results = [reconcile_partition(ids) for ids in partitions]
+        for found, read in results:
+            discrepancies += found
+            movements += read
+
+    # A new transaction: the corrections must see what was posted since the snapshot.
+    with transaction.atomic():
+        corrections = []
+        if correct:
+            today = date.today()
+            corrections = StockMovement.objects.bulk_create([
+                _correction(discrepancy, user.pk, today)
+                for discrepancy in _recheck(discrepancies)
+            ])
+            if corrections:
+                stock_movements_posted.send(sender=StockMovement, movements=corrections)
+
+        return StockReconciliation.objects.create(
+            started_at=started_at,
+            finished_at=timezone.now(),
+            supplies_checked=len(supply_ids),
+            movements_checked=movements,
+            discrepancy_count=len(discrepancies),
+            corrections_posted=len(corrections),
+            discrepancies=[discrepancy.as_dict() for discrepancy in discrepancies],
+            triggered_by=user,
+        )
@@ -0,0 +1,188 @@
+"""
+Daily balance snapshots behind ``snapshot_stock_balances`` and ``as_of=``.
+
+A ``StockBalanceSnapshot`` holds the ledger balance of a supply, centrally or at
+a school, at the end of a day. Rows are only written for days with movements
+that changed the balance. The balance on any date is then the latest snapshot
+up to that date plus the movements dated after it. Both parts are correlated
+subqueries on indexed columns (``annotate_as_of``), so a historical query costs
+about the same as a current one.
+
+Each run is recorded as a ``StockSnapshotRun`` and continues from the previous
+one: it writes the days after the previous ``through_date``. Movements created
+since the previous run with an earlier date make it rebuild from that date, and
+so do movements edited or deleted since (``StockSnapshotInvalidation`` rows,
+written by inventory/signals.py). Until the next run picks them up, ``as_of``
+answers for those dates leave the change out. Bulk ``update()`` and ``delete()``
+on movements send no signals and need a ``--full`` run.
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Min, OuterRef, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from inventory.models import (
+    SchoolStockBalance,
+    StockBalanceSnapshot,
+    StockMovement,
+    StockSnapshotInvalidation,
+    StockSnapshotRun,
+)
+from inventory.services.ledger import CENTRAL, SCHOOL, balance_filter, movement_balance, signed_quantity
+
+ZERO = Decimal('0')
+SNAPSHOT_BATCH_SIZE = 1000
+# Lower bound for "movements after the snapshot" when there is no snapshot yet.
+NO_SNAPSHOT = date(1900, 1, 1)
+
+_QUANTITY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _as_decimal(value) -> Decimal:
+    # SQLite sums decimals as floats; balances are kept in cents.
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+def _start_date(previous: StockSnapshotRun | None, through: date) -> date | None:
+    """First day to write; ``None`` rebuilds everything."""
+    if previous is None:
+        return None
+    start = previous.through_date + timedelta(days=1)
+    backdated = StockMovement.objects.filter(
+        created_at__gte=previous.started_at,
+        movement_date__lt=start,
+    ).aggregate(first=Min('movement_date'))['first']
+    changed = StockSnapshotInvalidation.objects.filter(
+        created_at__gte=previous.started_at,
+    ).aggregate(first=Min('movement_date'))['first']
+    for first in (backdated, changed):
+        if first is not None:
+            start = min(start, first)
+    return start
+
+
+def _daily_deltas(start: date | None, through: date):
+    movements = StockMovement.objects.filter(movement_date__lte=through)
+    if start is not None:
+        movements = movements.filter(movement_date__gte=start)
+    rows = (
+        movements.annotate(store=movement_balance())
+        .filter(store__in=[CENTRAL, SCHOOL])
+        .values('store', 'school_id', 'supply_id', 'movement_date')
+        .annotate(delta=Sum(signed_quantity()))
+        .order_by('movement_date')
+    )
+    deltas = {}
+    for row in rows:
+        school_id = row['school_id'] if row['store'] == SCHOOL else None
+        day = deltas.setdefault((school_id, row['supply_id']), {})
+        # Central movements may carry a school; they all add up to the central balance.
+        day[row['movement_date']] = day.get(row['movement_date'], ZERO) + _as_decimal(row['delta'])
+    return deltas
+
+
+def _base_quantities(start: date | None, supply_ids) -> dict:
+    """Latest snapshot before ``start`` per (school, supply) of ``supply_ids``."""
+    if start is None or not supply_ids:
+        return {}
+    latest = (
+        StockBalanceSnapshot.objects.filter(snapshot_date__lt=start, supply_id__in=supply_ids)
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=[F('school_id'), F('supply_id')],
+            order_by=F('snapshot_date').desc(),
+        ))
+        .filter(position=1)
+    )
+    return {(row.school_id, row.supply_id): _as_decimal(row.quantity) for row in latest}
+
+
+def take_snapshots(through: date | None = None, *, full: bool = False) -> StockSnapshotRun:
+    """Write the snapshots up to ``through`` (yesterday by default); see the module docstring."""
+    started_at = timezone.now()
+    through = through or date.today() - timedelta(days=1)
+    previous = None if full else StockSnapshotRun.objects.first()
+    if previous is not None:
+        # Later snapshots are already written; a run never goes back on them.
+        through = max(through, previous.through_date)
+    start = _start_date(previous, through)
+
+    with transaction.atomic():
+        stale = StockBalanceSnapshot.objects.all()
+        if start is not None:
+            stale = stale.filter(snapshot_date__gte=start)
+        stale.delete()
+        # Every change recorded before this run is covered by it.
+        StockSnapshotInvalidation.objects.filter(created_at__lt=started_at).delete()
+
+        deltas = _daily_deltas(start, through)
+        base = _base_quantities(start, {supply_id for _, supply_id in deltas})
+        rows = []
+        for (school_id, supply_id), days in deltas.items():
+            quantity = base.get((school_id, supply_id), ZERO)
+            for day in sorted(days):
+                if days[day] == 0:
+                    continue
+                quantity += days[day]
+                rows.append(StockBalanceSnapshot(
+                    school_id=school_id,
+                    supply_id=supply_id,
+                    snapshot_date=day,
+                    quantity=quantity,
+                ))
+        StockBalanceSnapshot.objects.bulk_create(rows, batch_size=SNAPSHOT_BATCH_SIZE)
+
+        return StockSnapshotRun.objects.create(
+            started_at=started_at,
+            finished_at=timezone.now(),
+            through_date=through,
+            rebuilt_from=start,
+            rows_written=len(rows),
+        )
+
+
+def parse_as_of(raw) -> date | None:
+    """The ``as_of`` query parameter; ``None`` when absent."""
+    if not raw:
+        return None
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        raise ValidationError({'as_of': 'Data invalida. Use o formato YYYY-MM-DD.'})
+
+
+def annotate_as_of(balances, as_of: date):
+    """
+    Annotate ``StockBalance`` or ``SchoolStockBalance`` rows with ``as_of_quantity``,
+    their ledger balance at the end of ``as_of``.
+    """
+    at_school = balances.model is SchoolStockBalance
+    snapshots = StockBalanceSnapshot.objects.filter(supply_id=OuterRef('supply_id'), snapshot_date__lte=as_of)
+    movements = StockMovement.objects.filter(
+        balance_filter(SCHOOL if at_school else CENTRAL),
+        supply_id=OuterRef('supply_id'),
+        movement_date__gt=OuterRef('as_of_snapshot_date'),
+        movement_date__lte=as_of,
+    )
+    if at_school:
+        snapshots = snapshots.filter(school_id=OuterRef('school_id'))
+        movements = movements.filter(school_id=OuterRef('school_id'))
+    else:
+        snapshots = snapshots.filter(school__isnull=True)
+    snapshots = snapshots.order_by('-snapshot_date')
+    moved = movements.order_by().values('supply_id').annotate(total=Sum(signed_quantity())).values('total')
+
+    return balances.annotate(
+        as_of_snapshot_date=Coalesce(Subquery(snapshots.values('snapshot_date')[:1]), Value(NO_SNAPSHOT)),
+    ).annotate(
+        as_of_quantity=(
+            Coalesce(Subquery(snapshots.values('quantity')[:1]), Value(ZERO), output_field=_QUANTITY_FIELD)
+            + Coalesce(Subquery(moved), Value(ZERO), output_field=_QUANTITY_FIELD)
+        ),
+    )
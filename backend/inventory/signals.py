@@ -0,0 +1,57 @@
+from datetime import date
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal
+
+from .models import SchoolStockBalance, StockMovement, StockSnapshotInvalidation, Supply
+
+# Sent by inventory.services.ledger.post_movements after the movement rows are
+# bulk inserted (bulk_create sends no post_save). Receives ``movements``.
+stock_movements_posted = Signal()
+
+
+def _refresh_school_min_stock(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Balances without their own minimum follow the supply's.
+    if raw or (update_fields is not None and 'min_stock' not in update_fields):
+        return
+    (
+        SchoolStockBalance.objects
+        .filter(supply=instance, min_stock__lte=0)
+        .exclude(effective_min_stock=instance.min_stock)
+        .update(effective_min_stock=instance.min_stock)
+    )
+
+
+def _remember_stored_movement(sender, instance, raw=False, **kwargs):
+    # The row as it was before an edit, for post_save receivers that keep
+    # aggregates of movements (dashboard rollups, balance snapshots).
+    instance._stored_movement = None
+    if raw or instance._state.adding:
+        return
+    instance._stored_movement = StockMovement.objects.filter(pk=instance.pk).first()
+
+
+# Fields that change a movement's share of the balances.
+LEDGER_FIELDS = ('supply_id', 'school_id', 'type', 'quantity', 'balance', 'movement_date')
+
+
+def _invalidate_snapshots_on_edit(sender, instance, created, raw=False, **kwargs):
+    stored = getattr(instance, '_stored_movement', None)
+    if raw or created or stored is None:
+        return
+    if all(str(getattr(stored, name)) == str(getattr(instance, name)) for name in LEDGER_FIELDS):
+        return
+    # movement_date may still be the raw string given to the instance.
+    dates = [stored.movement_date, instance.movement_date]
+    first = min(value if isinstance(value, date) else date.fromisoformat(value) for value in dates)
+    StockSnapshotInvalidation.objects.create(movement_date=first)
+
+
+def _invalidate_snapshots_on_delete(sender, instance, **kwargs):
+    StockSnapshotInvalidation.objects.create(movement_date=instance.movement_date)
+
+
+post_save.connect(_refresh_school_min_stock, sender=Supply, dispatch_uid='inventory-supply-effective-min-stock')
+pre_save.connect(_remember_stored_movement, sender=StockMovement, dispatch_uid='inventory-movement-stored-row')
+post_save.connect(_invalidate_snapshots_on_edit, sender=StockMovement, dispatch_uid='inventory-movement-snapshot-edit')
+post_delete.connect(_invalidate_snapshots_on_delete, sender=StockMovement, dispatch_uid='inventory-movement-snapshot-delete')
@@ -1,11 +1,13 @@
+from collections import defaultdict
+from datetime import timedelta
+
 from django.db import models
 from django.db import transaction
 from django.db.models.deletion import ProtectedError
 from django.db.models import F, Q
+from django.db.models.functions import Coalesce
 from django.http import HttpResponse
 from django.utils import timezone
-import csv
-import io
 from openpyxl import Workbook
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
@@ -16,9 +18,16 @@ from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
+from accounts.permissions import IsSemedAdmin
 from merenda_semed.authentication import QueryParamJWTAuthentication
+from merenda_semed.exports import ITERATOR_CHUNK_SIZE, csv_response, json_stream_response, xlsx_response
+from merenda_semed.mixins import SparseFieldsetsMixin
+from merenda_semed.pagination import KeysetCursorPagination
 from schools.models import School
+from search.backends import matching_ids
+from search.models import SearchDocument
 
+from .events import publish_unread_count, unread_count
 from .models import (
     Delivery,
     DeliveryItem,
@@ -34,15 +43,19 @@ from .models import (
     SupplyLot,
     StockBalance,
     StockMovement,
+    StockReconciliation,
 )
+from .services.ledger import CENTRAL, SCHOOL, LedgerEntry, post_movements
 from .services.lots import (
     credit_lot_central,
     credit_lot_school,
     debit_lot_central,
-    ensure_delivery_item_lot_plan,
+    ensure_delivery_lot_plans,
     get_or_create_supply_lot,
     regenerate_delivery_item_lot_plan_fefo,
 )
+from .services.reconciliation import reconcile_stock
+from .services.snapshots import annotate_as_of, parse_as_of
 from .serializers import (
     DeliverySerializer,
     NotificationSerializer,
@@ -57,6 +70,8 @@ from .serializers import (
     SupplyLotSerializer,
     StockBalanceSerializer,
     StockMovementSerializer,
+    StockReconciliationSerializer,
+    prefetch_delivery_tree,
 )
 
 
@@ -114,10 +129,85 @@ def _draw_pdf_footer(pdf, page_number):
     pdf.drawRightString(width - 32, 14, _pdf_text(f"Pagina {page_number}"))
 
 
-class SupplyViewSet(viewsets.ModelViewSet):
+CENTRAL_LOT_FIELDS = (
+    'id', 'supply_id', 'supply_name', 'supply__unit', 'lot_code', 'status', 'expiry_date',
+    'manufacture_date', 'supplier__name', 'central_balance__quantity',
+)
+# Lots per destinations query when central_lots is streamed.
+CENTRAL_LOT_CHUNK_SIZE = 500
+SENT_DELIVERY_STATUSES = (Delivery.Status.SENT, Delivery.Status.CONFERRED, Delivery.Status.FINALIZED)
+
+
+class CentralLotPagination(KeysetCursorPagination):
+    ordering = ('expiry_date', 'supply_name', 'lot_code', 'pk')
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+
+def _lot_destinations(lot_ids):
+    """Quantity sent and last delivery date per school for each lot, grouped in the database."""
+    rows = (
+        DeliveryItemLot.objects
+        .filter(lot_id__in=lot_ids, delivery_item__delivery__status__in=SENT_DELIVERY_STATUSES)
+        .values(
+            'lot_id',
+            school_id=F('delivery_item__delivery__school_id'),
+            school_name=F('delivery_item__delivery__school__name'),
+        )
+        .annotate(
+            quantity=models.Sum(Coalesce('received_quantity', 'planned_quantity')),
+            last_delivery_date=models.Max('delivery_item__delivery__delivery_date'),
+        )
+        .order_by('lot_id', 'school_name')
+    )
+    destinations = defaultdict(list)
+    for row in rows:
+        destinations[row['lot_id']].append({
+            'school_id': str(row['school_id']),
+            'school_name': row['school_name'],
+            'quantity': float(row['quantity'] or 0),
+            'last_delivery_date': row['last_delivery_date'],
+        })
+    return destinations
+
+
+def _central_lot_rows(lots, today, days_to_expiry):
+    destinations = _lot_destinations([lot['id'] for lot in lots]) if lots else {}
+    rows = []
+    for lot in lots:
+        days_left = (lot['expiry_date'] - today).days
+        if days_left < 0:
+            expiry_state = 'expired'
+        elif days_left <= days_to_expiry:
+            expiry_state = 'near_expiry'
+        else:
+            expiry_state = 'ok'
+        lot_destinations = destinations.get(lot['id'], [])
+        rows.append({
+            'id': str(lot['id']),
+            'supply_id': str(lot['supply_id']),
+            'supply_name': lot['supply_name'],
+            'unit': lot['supply__unit'],
+            'lot_code': lot['lot_code'],
+            'status': lot['status'],
+            'expiry_date': lot['expiry_date'],
+            'manufacture_date': lot['manufacture_date'],
+            'supplier_name': lot['supplier__name'] or '',
+            'central_quantity': lot['central_balance__quantity'] or 0,
+            'days_to_expiry': days_left,
+            'expiry_state': expiry_state,
+            'sent_total': round(sum(row['quantity'] for row in lot_destinations), 2),
+            'destinations': lot_destinations,
+        })
+    return rows
+
+
+class SupplyViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = Supply.objects.all().order_by('name')
     serializer_class = SupplySerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = 'name'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -125,7 +215,7 @@ class SupplyViewSet(viewsets.ModelViewSet):
         category = self.request.query_params.get('category')
         is_active = self.request.query_params.get('is_active')
         if query:
-            queryset = queryset.filter(name__icontains=query)
+            queryset = queryset.filter(pk__in=matching_ids(SearchDocument.EntityType.SUPPLY, query))
         if category:
             queryset = queryset.filter(category__icontains=category)
         if is_active in ['true', 'false']:
@@ -198,107 +288,60 @@ class SupplyViewSet(viewsets.ModelViewSet):
             days_to_expiry = 0
 
         today = timezone.localdate()
-        delivery_lots_qs = (
-            DeliveryItemLot.objects
-            .select_related('delivery_item__delivery__school')
-            .filter(delivery_item__delivery__status__in=[
-                Delivery.Status.SENT,
-                Delivery.Status.CONFERRED,
-                Delivery.Status.FINALIZED,
-            ])
-            .order_by('-delivery_item__delivery__delivery_date')
-        )
-
-        queryset = (
-            SupplyLot.objects
-            .select_related('supply', 'supplier', 'central_balance')
-            .prefetch_related(models.Prefetch('delivery_item_lots', queryset=delivery_lots_qs))
-            .filter(supply__is_active=True)
-            .order_by('expiry_date', 'supply__name', 'lot_code')
-        )
+        queryset = SupplyLot.objects.filter(supply__is_active=True)
         if not include_zero:
             queryset = queryset.filter(central_balance__quantity__gt=0)
 
-        rows = []
-        near_expiry_count = 0
-        expired_count = 0
-        total_central_quantity = 0
-
-        for lot in queryset:
-            central_quantity = getattr(getattr(lot, 'central_balance', None), 'quantity', 0) or 0
-            total_central_quantity += float(central_quantity)
-            days_left = (lot.expiry_date - today).days if lot.expiry_date else None
-            if days_left is None:
-                expiry_state = 'unknown'
-            elif days_left < 0:
-                expiry_state = 'expired'
-                expired_count += 1
-            elif days_left <= days_to_expiry:
-                expiry_state = 'near_expiry'
-                near_expiry_count += 1
-            else:
-                expiry_state = 'ok'
-
-            destinations_map = {}
-            total_sent = 0.0
-            for item_lot in lot.delivery_item_lots.all():
-                delivery = item_lot.delivery_item.delivery
-                school = delivery.school
-                if not school:
-                    continue
-                sent_qty = item_lot.received_quantity if item_lot.received_quantity is not None else item_lot.planned_quantity
-                sent_qty = float(sent_qty or 0)
-                total_sent += sent_qty
-                key = str(school.id)
-                row = destinations_map.get(key)
-                if row is None:
-                    destinations_map[key] = {
-                        'school_id': str(school.id),
-                        'school_name': school.name,
-                        'quantity': sent_qty,
-                        'last_delivery_date': delivery.delivery_date,
-                    }
-                else:
-                    row['quantity'] += sent_qty
-                    if delivery.delivery_date and (row['last_delivery_date'] is None or delivery.delivery_date > row['last_delivery_date']):
-                        row['last_delivery_date'] = delivery.delivery_date
-
-            destinations = list(destinations_map.values())
-            destinations.sort(key=lambda row: row['school_name'])
-
-            rows.append({
-                'id': str(lot.id),
-                'supply_id': str(lot.supply_id),
-                'supply_name': lot.supply.name,
-                'unit': lot.supply.unit,
-                'lot_code': lot.lot_code,
-                'status': lot.status,
-                'expiry_date': lot.expiry_date,
-                'manufacture_date': lot.manufacture_date,
-                'supplier_name': lot.supplier.name if lot.supplier else '',
-                'central_quantity': central_quantity,
-                'days_to_expiry': days_left,
-                'expiry_state': expiry_state,
-                'sent_total': round(total_sent, 2),
-                'destinations': destinations,
-            })
-
-        return Response({
-            'summary': {
-                'total_lots': len(rows),
-                'near_expiry_lots': near_expiry_count,
-                'expired_lots': expired_count,
-                'total_central_quantity': round(total_central_quantity, 2),
-                'days_to_expiry': days_to_expiry,
-            },
-            'results': rows,
-        })
-
+        totals = queryset.aggregate(
+            total_lots=models.Count('pk'),
+            near_expiry_lots=models.Count(
+                'pk',
+                filter=Q(expiry_date__gte=today, expiry_date__lte=today + timedelta(days=days_to_expiry)),
+            ),
+            expired_lots=models.Count('pk', filter=Q(expiry_date__lt=today)),
+            total_central_quantity=models.Sum('central_balance__quantity'),
+        )
+        summary = {
+            **totals,
+            'total_central_quantity': round(float(totals['total_central_quantity'] or 0), 2),
+            'days_to_expiry': days_to_expiry,
+        }
 
-class StockViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = StockBalance.objects.select_related('supply').all().order_by('supply__name')
+        lots = (
+            queryset
+            .annotate(supply_name=F('supply__name'))
+            .order_by(*CentralLotPagination.ordering)
+            .values(*CENTRAL_LOT_FIELDS)
+        )
+        paginator = CentralLotPagination()
+        page = paginator.paginate_queryset(lots, request, view=self)
+        if page is not None:
+            response = paginator.get_paginated_response(_central_lot_rows(page, today, days_to_expiry))
+            response.data['summary'] = summary
+            return response
+
+        def rows():
+            chunk = []
+            for lot in lots.iterator(chunk_size=CENTRAL_LOT_CHUNK_SIZE):
+                chunk.append(lot)
+                if len(chunk) == CENTRAL_LOT_CHUNK_SIZE:
+                    yield from _central_lot_rows(chunk, today, days_to_expiry)
+                    chunk = []
+            yield from _central_lot_rows(chunk, today, days_to_expiry)
+
+        return json_stream_response({'summary': summary}, 'results', rows())
+
+
+class StockViewSet(SparseFieldsetsMixin, viewsets.ReadOnlyModelViewSet):
+    # Annotated: the cursor reads its position from an attribute of the row.
+    queryset = (
+        StockBalance.objects.select_related('supply')
+        .annotate(supply_name=F('supply__name'))
+        .order_by('supply_name')
+    )
     serializer_class = StockBalanceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = 'supply_name'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -306,15 +349,21 @@ class StockViewSet(viewsets.ReadOnlyModelViewSet):
         category = self.request.query_params.get('category')
         low_stock = self.request.query_params.get('low_stock')
         is_active = self.request.query_params.get('is_active')
+        as_of = parse_as_of(self.request.query_params.get('as_of'))
+        quantity = 'quantity'
+        if as_of:
+            # Balances at the end of that day, from the daily snapshots (services/snapshots.py).
+            queryset = annotate_as_of(queryset, as_of)
+            quantity = 'as_of_quantity'
         if query:
-            queryset = queryset.filter(supply__name__icontains=query)
+            queryset = queryset.filter(supply_id__in=matching_ids(SearchDocument.EntityType.SUPPLY, query))
         if category:
             queryset = queryset.filter(supply__category__icontains=category)
         if low_stock in ['true', 'false']:
             if low_stock == 'true':
-                queryset = queryset.filter(quantity__lt=models.F('supply__min_stock'))
+                queryset = queryset.filter(**{f'{quantity}__lt': models.F('supply__min_stock')})
             else:
-                queryset = queryset.filter(quantity__gte=models.F('supply__min_stock'))
+                queryset = queryset.filter(**{f'{quantity}__gte': models.F('supply__min_stock')})
         if is_active in ['true', 'false']:
             if is_active == 'true':
                 # Nao ocultar saldos existentes caso o insumo esteja inativo por cadastro.
@@ -323,8 +372,20 @@ class StockViewSet(viewsets.ReadOnlyModelViewSet):
                 queryset = queryset.filter(supply__is_active=False)
         return queryset
 
+    @action(detail=False, methods=['get', 'post'], permission_classes=[permissions.IsAuthenticated, IsSemedAdmin])
+    def reconciliation(self, request):
+        """GET: latest reconciliation run. POST: run one now; ``correct`` posts correcting movements."""
+        if request.method == 'POST':
+            correct = str(request.data.get('correct', '')).lower() in ['true', '1', 'yes']
+            run = reconcile_stock(correct=correct, user=request.user)
+            return Response(StockReconciliationSerializer(run).data, status=201)
+        run = StockReconciliation.objects.first()
+        if run is None:
+            return Response({'detail': 'Nenhuma reconciliacao executada.'}, status=404)
+        return Response(StockReconciliationSerializer(run).data)
+
 
-class StockMovementViewSet(viewsets.ModelViewSet):
+class StockMovementViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = StockMovement.objects.select_related('supply').filter(supply__is_active=True).order_by('-created_at')
     serializer_class = StockMovementSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -349,10 +410,11 @@ class StockMovementViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class ResponsibleViewSet(viewsets.ModelViewSet):
+class ResponsibleViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = Responsible.objects.all().order_by('name')
     serializer_class = ResponsibleSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = 'name'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -368,10 +430,11 @@ class ResponsibleViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all().order_by('name')
     serializer_class = SupplierSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = 'name'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -402,7 +465,7 @@ class SupplierViewSet(viewsets.ModelViewSet):
             )
 
 
-class SupplierReceiptViewSet(viewsets.ModelViewSet):
+class SupplierReceiptViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = (
         SupplierReceipt.objects
         .select_related('supplier', 'school', 'created_by')
@@ -410,6 +473,7 @@ class SupplierReceiptViewSet(viewsets.ModelViewSet):
         .all()
         .order_by('-expected_date', '-created_at')
     )
+    cursor_ordering = ('-expected_date', '-created_at')
     serializer_class = SupplierReceiptSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -464,6 +528,7 @@ class SupplierReceiptViewSet(viewsets.ModelViewSet):
             if missing_ids:
                 raise ValidationError('Envie a conferencia de todos os itens do recebimento.')
 
+            ledger_entries = []
             for entry in payload_items:
                 item = receipt_items.get(str(entry['item_id']))
                 if not item:
@@ -536,31 +601,18 @@ class SupplierReceiptViewSet(viewsets.ModelViewSet):
                         else:
                             credit_lot_central(lot, lot_entry['received_quantity'])
 
-                if receipt.school_id:
-                    school_balance, _ = SchoolStockBalance.objects.select_for_update().get_or_create(
-                        school=receipt.school,
-                        supply=resolved_supply,
-                        defaults={'quantity': 0, 'min_stock': 0},
-                    )
-                    school_balance.quantity += quantity
-                    school_balance.save()
-                else:
-                    balance, _ = StockBalance.objects.select_for_update().get_or_create(
-                        supply=resolved_supply,
-                        defaults={'quantity': 0},
-                    )
-                    balance.quantity += quantity
-                    balance.save(update_fields=['quantity'])
-
-                StockMovement.objects.create(
+                ledger_entries.append(LedgerEntry(
                     supply=resolved_supply,
                     school=receipt.school if receipt.school_id else None,
+                    balance=SCHOOL if receipt.school_id else CENTRAL,
                     type=StockMovement.Types.IN,
                     quantity=quantity,
                     movement_date=receipt.expected_date,
                     note=f'Entrada por recebimento de fornecedor {receipt.id}.',
-                    created_by=request.user,
-                )
+                    created_by_id=request.user.pk,
+                ))
+
+            post_movements(ledger_entries)
 
             now = timezone.now()
             receipt.status = SupplierReceipt.Status.CONFERRED
@@ -591,36 +643,42 @@ class StockExportCsvView(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request):
-        queryset = StockBalance.objects.select_related('supply').filter(supply__is_active=True).order_by('supply__name')
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename=\"stock.csv\"'
-        writer = csv.writer(response)
-        writer.writerow(['Insumo', 'Categoria', 'Unidade', 'Quantidade', 'Minimo', 'Status', 'Diferenca'])
-        for balance in queryset:
-            diff = balance.quantity - balance.supply.min_stock
-            if balance.quantity < balance.supply.min_stock:
-                status = 'BAIXO'
-            elif balance.quantity >= balance.supply.min_stock * 2:
-                status = 'ALTO'
-            else:
-                status = 'NORMAL'
-            writer.writerow([
-                balance.supply.name,
-                balance.supply.category,
-                balance.supply.unit,
-                balance.quantity,
-                balance.supply.min_stock,
-                status,
-                diff,
-            ])
-        return response
+        queryset = (
+            StockBalance.objects.filter(supply__is_active=True)
+            .order_by('supply__name')
+            .values_list('supply__name', 'supply__category', 'supply__unit', 'quantity', 'supply__min_stock')
+        )
+
+        def rows():
+            for name, category, unit, quantity, min_stock in queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+                if quantity < min_stock:
+                    status = 'BAIXO'
+                elif quantity >= min_stock * 2:
+                    status = 'ALTO'
+                else:
+                    status = 'NORMAL'
+                yield [name, category, unit, quantity, min_stock, status, quantity - min_stock]
+
+        return csv_response(
+            'stock.csv',
+            ['Insumo', 'Categoria', 'Unidade', 'Quantidade', 'Minimo', 'Status', 'Diferenca'],
+            rows(),
+        )
 
 
 class StockExportPdfView(viewsets.ViewSet):
     authentication_classes = [QueryParamJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
+    filename = 'stock_report.pdf'
+
     def list(self, request):
+        response = HttpResponse(content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
+        self.render(request.query_params, response)
+        return response
+
+    def render(self, params, out):
         queryset = StockBalance.objects.select_related('supply').filter(supply__is_active=True).order_by('supply__category', 'supply__name')
 
         items = []
@@ -647,9 +705,7 @@ class StockExportPdfView(viewsets.ViewSet):
         high_total = sum(1 for entry in items if entry['status'] == 'ALTO')
         total_items = len(items)
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename=\"stock_report.pdf\"'
-        pdf = canvas.Canvas(response, pagesize=A4)
+        pdf = canvas.Canvas(out, pagesize=A4)
         _, height = A4
         generated_at = timezone.now()
         page_number = 1
@@ -742,7 +798,6 @@ class StockExportPdfView(viewsets.ViewSet):
 
         _draw_pdf_footer(pdf, page_number)
         pdf.save()
-        return response
 
 
 class StockExportXlsxView(viewsets.ViewSet):
@@ -750,108 +805,83 @@ class StockExportXlsxView(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request):
-        queryset = StockBalance.objects.select_related('supply').filter(supply__is_active=True).order_by('supply__category', 'supply__name')
+        queryset = (
+            StockBalance.objects.filter(supply__is_active=True)
+            .order_by('supply__category', 'supply__name')
+            .values_list('supply__name', 'supply__category', 'supply__unit', 'quantity', 'supply__min_stock')
+        )
 
-        workbook = Workbook()
-        
-        # Summary sheet
-        summary_sheet = workbook.active
-        summary_sheet.title = 'Resumo'
+        workbook = Workbook(write_only=True)
+
+        # Summary sheet (filled last; write-only sheets keep their creation order)
+        summary_sheet = workbook.create_sheet(title='Resumo')
         summary_sheet.append(['Categoria', 'Total Itens', 'Itens Baixos', 'Itens Normais', 'Itens Altos'])
-        
+
         # All items sheet
         items_sheet = workbook.create_sheet(title='Todos os Itens')
         items_sheet.append(['Insumo', 'Categoria', 'Unidade', 'Quantidade', 'Estoque Minimo', 'Status', 'Diferenca'])
-        
+
         # Low stock sheet
         low_sheet = workbook.create_sheet(title='Estoque Baixo')
         low_sheet.append(['Insumo', 'Categoria', 'Unidade', 'Quantidade', 'Estoque Minimo', 'Falta'])
-        
+
         # Normal stock sheet
         normal_sheet = workbook.create_sheet(title='Estoque Normal')
         normal_sheet.append(['Insumo', 'Categoria', 'Unidade', 'Quantidade', 'Estoque Minimo'])
-        
+
         # High stock sheet
         high_sheet = workbook.create_sheet(title='Estoque Alto')
         high_sheet.append(['Insumo', 'Categoria', 'Unidade', 'Quantidade', 'Estoque Minimo', 'Excesso'])
 
         category_stats = {}
-        
-        for balance in queryset:
-            cat = balance.supply.category or 'Sem Categoria'
+
+        for name, category, unit, quantity, min_stock in queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            cat = category or 'Sem Categoria'
             if cat not in category_stats:
                 category_stats[cat] = {'total': 0, 'low': 0, 'normal': 0, 'high': 0}
-            
+
             category_stats[cat]['total'] += 1
-            diff = float(balance.quantity) - float(balance.supply.min_stock)
-            
-            if balance.quantity < balance.supply.min_stock:
+            diff = float(quantity) - float(min_stock)
+
+            if quantity < min_stock:
                 status = 'BAIXO'
                 category_stats[cat]['low'] += 1
-                low_sheet.append([
-                    balance.supply.name,
-                    cat,
-                    balance.supply.unit,
-                    float(balance.quantity),
-                    float(balance.supply.min_stock),
-                    abs(diff),
-                ])
-            elif balance.quantity >= balance.supply.min_stock * 2:
+                low_sheet.append([name, cat, unit, float(quantity), float(min_stock), abs(diff)])
+            elif quantity >= min_stock * 2:
                 status = 'ALTO'
                 category_stats[cat]['high'] += 1
-                high_sheet.append([
-                    balance.supply.name,
-                    cat,
-                    balance.supply.unit,
-                    float(balance.quantity),
-                    float(balance.supply.min_stock),
-                    diff,
-                ])
+                high_sheet.append([name, cat, unit, float(quantity), float(min_stock), diff])
             else:
                 status = 'NORMAL'
                 category_stats[cat]['normal'] += 1
-                normal_sheet.append([
-                    balance.supply.name,
-                    cat,
-                    balance.supply.unit,
-                    float(balance.quantity),
-                    float(balance.supply.min_stock),
-                ])
-            
-            items_sheet.append([
-                balance.supply.name,
-                cat,
-                balance.supply.unit,
-                float(balance.quantity),
-                float(balance.supply.min_stock),
-                status,
-                diff,
-            ])
-        
+                normal_sheet.append([name, cat, unit, float(quantity), float(min_stock)])
+
+            items_sheet.append([name, cat, unit, float(quantity), float(min_stock), status, diff])
+
         for cat, stats in category_stats.items():
             summary_sheet.append([cat, stats['total'], stats['low'], stats['normal'], stats['high']])
 
-        buffer = io.BytesIO()
-        workbook.save(buffer)
-        buffer.seek(0)
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        response['Content-Disposition'] = 'attachment; filename=\"stock_report.xlsx\"'
-        return response
+        return xlsx_response(workbook, 'stock_report.xlsx')
 
 
 class DeliveryExportPdfView(viewsets.ViewSet):
     authentication_classes = [QueryParamJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
+    filename = 'deliveries.pdf'
+
     def list(self, request):
+        response = HttpResponse(content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
+        self.render(request.query_params, response)
+        return response
+
+    def render(self, params, out):
         queryset = Delivery.objects.select_related('school').prefetch_related('items__supply').all().order_by('-delivery_date')
-        school = request.query_params.get('school')
-        status_value = request.query_params.get('status')
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
+        school = params.get('school')
+        status_value = params.get('status')
+        date_from = params.get('date_from')
+        date_to = params.get('date_to')
         if school:
             queryset = queryset.filter(school_id=school)
         if status_value:
@@ -868,9 +898,7 @@ class DeliveryExportPdfView(viewsets.ViewSet):
         sent_total = sum(1 for delivery in deliveries if delivery.status == Delivery.Status.SENT)
         conferred_total = sum(1 for delivery in deliveries if delivery.status == Delivery.Status.CONFERRED)
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename=\"deliveries.pdf\"'
-        pdf = canvas.Canvas(response, pagesize=A4)
+        pdf = canvas.Canvas(out, pagesize=A4)
         _, height = A4
         generated_at = timezone.now()
         page_number = 1
@@ -982,7 +1010,6 @@ class DeliveryExportPdfView(viewsets.ViewSet):
 
         _draw_pdf_footer(pdf, page_number)
         pdf.save()
-        return response
 
 
 class DeliveryExportXlsxView(viewsets.ViewSet):
@@ -990,7 +1017,7 @@ class DeliveryExportXlsxView(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request):
-        queryset = Delivery.objects.select_related('school').prefetch_related('items').all().order_by('-delivery_date')
+        queryset = Delivery.objects.all()
         school = request.query_params.get('school')
         status_value = request.query_params.get('status')
         date_from = request.query_params.get('date_from')
@@ -1003,11 +1030,26 @@ class DeliveryExportXlsxView(viewsets.ViewSet):
             queryset = queryset.filter(delivery_date__gte=date_from)
         if date_to:
             queryset = queryset.filter(delivery_date__lte=date_to)
+        status_labels = dict(Delivery.Status.choices)
 
-        workbook = Workbook()
-        summary_sheet = workbook.active
-        summary_sheet.title = 'Entregas'
+        workbook = Workbook(write_only=True)
+        summary_sheet = workbook.create_sheet(title='Entregas')
         summary_sheet.append(['Data', 'Escola', 'Status', 'Itens', 'Responsavel', 'Telefone', 'Observacoes'])
+        deliveries = (
+            queryset.annotate(items_count=models.Count('items'))
+            .order_by('-delivery_date', 'pk')
+            .values_list('delivery_date', 'school__name', 'status', 'items_count', 'responsible_name', 'responsible_phone', 'notes')
+        )
+        for delivery_date, school_name, status, items_count, responsible_name, responsible_phone, notes in deliveries.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            summary_sheet.append([
+                str(delivery_date),
+                school_name,
+                status_labels.get(status, status),
+                items_count,
+                responsible_name,
+                responsible_phone,
+                notes,
+            ])
 
         items_sheet = workbook.create_sheet(title='Itens')
         items_sheet.append([
@@ -1021,51 +1063,53 @@ class DeliveryExportXlsxView(viewsets.ViewSet):
             'Falta',
             'Observacao Divergencia',
         ])
-
-        for delivery in queryset:
-            items = list(delivery.items.select_related('supply').all())
-            summary_sheet.append([
-                str(delivery.delivery_date),
-                delivery.school.name,
-                delivery.get_status_display(),
-                len(items),
-                delivery.responsible_name,
-                delivery.responsible_phone,
-                delivery.notes,
+        items = (
+            DeliveryItem.objects.filter(delivery__in=queryset)
+            .order_by('-delivery__delivery_date', 'delivery_id')
+            .values_list(
+                'delivery__delivery_date',
+                'delivery__school__name',
+                'delivery__status',
+                'supply__name',
+                'supply__unit',
+                'planned_quantity',
+                'received_quantity',
+                'divergence_note',
+            )
+        )
+        for delivery_date, school_name, status, supply_name, unit, planned, received, divergence_note in items.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            shortage = None
+            if received is not None:
+                shortage_value = planned - received
+                shortage = float(shortage_value) if shortage_value > 0 else 0
+            items_sheet.append([
+                str(delivery_date),
+                school_name,
+                status_labels.get(status, status),
+                supply_name,
+                unit,
+                float(planned),
+                float(received) if received is not None else None,
+                shortage,
+                divergence_note,
             ])
-            for item in items:
-                shortage = None
-                if item.received_quantity is not None:
-                    shortage_value = item.planned_quantity - item.received_quantity
-                    shortage = float(shortage_value) if shortage_value > 0 else 0
-                items_sheet.append([
-                    str(delivery.delivery_date),
-                    delivery.school.name,
-                    delivery.get_status_display(),
-                    item.supply.name,
-                    item.supply.unit,
-                    float(item.planned_quantity),
-                    float(item.received_quantity) if item.received_quantity is not None else None,
-                    shortage,
-                    item.divergence_note,
-                ])
 
-        buffer = io.BytesIO()
-        workbook.save(buffer)
-        buffer.seek(0)
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        response['Content-Disposition'] = 'attachment; filename=\"deliveries.xlsx\"'
-        return response
+        return xlsx_response(workbook, 'deliveries.xlsx')
 
 
 class DeliveryDivergenceExportPdfView(viewsets.ViewSet):
     authentication_classes = [QueryParamJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
+    filename = 'delivery_divergences.pdf'
+
     def list(self, request):
+        response = HttpResponse(content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
+        self.render(request.query_params, response)
+        return response
+
+    def render(self, params, out):
         queryset = (
             DeliveryItem.objects
             .select_related('delivery__school', 'supply')
@@ -1076,10 +1120,10 @@ class DeliveryDivergenceExportPdfView(viewsets.ViewSet):
             )
             .order_by('-delivery__delivery_date', 'delivery__school__name', 'supply__name')
         )
-        school = request.query_params.get('school')
-        status_value = request.query_params.get('status')
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
+        school = params.get('school')
+        status_value = params.get('status')
+        date_from = params.get('date_from')
+        date_to = params.get('date_to')
         if school:
             queryset = queryset.filter(delivery__school_id=school)
         if status_value:
@@ -1097,9 +1141,7 @@ class DeliveryDivergenceExportPdfView(viewsets.ViewSet):
             for item in rows
         )
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename=\"delivery_divergences.pdf\"'
-        pdf = canvas.Canvas(response, pagesize=A4)
+        pdf = canvas.Canvas(out, pagesize=A4)
         generated_at = timezone.now()
         page_number = 1
         filters = [
@@ -1177,7 +1219,6 @@ class DeliveryDivergenceExportPdfView(viewsets.ViewSet):
 
         _draw_pdf_footer(pdf, page_number)
         pdf.save()
-        return response
 
 
 class DeliveryDivergenceExportXlsxView(viewsets.ViewSet):
@@ -1208,9 +1249,8 @@ class DeliveryDivergenceExportXlsxView(viewsets.ViewSet):
         if date_to:
             queryset = queryset.filter(delivery__delivery_date__lte=date_to)
 
-        workbook = Workbook()
-        summary_sheet = workbook.active
-        summary_sheet.title = 'Resumo'
+        workbook = Workbook(write_only=True)
+        summary_sheet = workbook.create_sheet(title='Resumo')
         summary_sheet.append(['Indicador', 'Valor'])
 
         details_sheet = workbook.create_sheet(title='Divergencias')
@@ -1230,9 +1270,10 @@ class DeliveryDivergenceExportXlsxView(viewsets.ViewSet):
             'Conferida em',
         ])
 
-        rows = list(queryset)
+        total_rows = 0
         total_shortage = 0.0
-        for item in rows:
+        for item in queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            total_rows += 1
             shortage = None
             if item.received_quantity is not None:
                 shortage_value = item.planned_quantity - item.received_quantity
@@ -1254,33 +1295,33 @@ class DeliveryDivergenceExportXlsxView(viewsets.ViewSet):
                 item.delivery.conference_submitted_at.strftime('%Y-%m-%d %H:%M') if item.delivery.conference_submitted_at else '',
             ])
 
-        summary_sheet.append(['Total de divergencias', len(rows)])
+        summary_sheet.append(['Total de divergencias', total_rows])
         summary_sheet.append(['Falta acumulada', total_shortage])
 
-        buffer = io.BytesIO()
-        workbook.save(buffer)
-        buffer.seek(0)
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        response['Content-Disposition'] = 'attachment; filename=\"delivery_divergences.xlsx\"'
-        return response
+        return xlsx_response(workbook, 'delivery_divergences.xlsx')
 
 
 class ConsumptionExportPdfView(viewsets.ViewSet):
     authentication_classes = [QueryParamJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
+    filename = 'consumption.pdf'
+
     def list(self, request):
+        response = HttpResponse(content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
+        self.render(request.query_params, response)
+        return response
+
+    def render(self, params, out):
         queryset = StockMovement.objects.select_related('supply', 'school').filter(
             type=StockMovement.Types.OUT,
             supply__is_active=True,
         ).order_by('-movement_date')
-        supply = request.query_params.get('supply')
-        school = request.query_params.get('school')
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
+        supply = params.get('supply')
+        school = params.get('school')
+        date_from = params.get('date_from')
+        date_to = params.get('date_to')
         if supply:
             queryset = queryset.filter(supply_id=supply)
         if school:
@@ -1294,9 +1335,7 @@ class ConsumptionExportPdfView(viewsets.ViewSet):
         total_records = len(movements)
         total_quantity = sum(float(movement.quantity) for movement in movements)
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename=\"consumption.pdf\"'
-        pdf = canvas.Canvas(response, pagesize=A4)
+        pdf = canvas.Canvas(out, pagesize=A4)
         _, height = A4
         generated_at = timezone.now()
         page_number = 1
@@ -1374,7 +1413,6 @@ class ConsumptionExportPdfView(viewsets.ViewSet):
 
         _draw_pdf_footer(pdf, page_number)
         pdf.save()
-        return response
 
 
 class ConsumptionExportXlsxView(viewsets.ViewSet):
@@ -1382,7 +1420,7 @@ class ConsumptionExportXlsxView(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request):
-        queryset = StockMovement.objects.select_related('supply').filter(
+        queryset = StockMovement.objects.filter(
             type=StockMovement.Types.OUT,
             supply__is_active=True,
         ).order_by('-movement_date')
@@ -1399,57 +1437,50 @@ class ConsumptionExportXlsxView(viewsets.ViewSet):
         if date_to:
             queryset = queryset.filter(movement_date__lte=date_to)
 
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = 'Consumo'
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title='Consumo')
         sheet.append(['Data', 'Insumo', 'Unidade', 'Quantidade', 'Observacao'])
 
         totals_sheet = workbook.create_sheet(title='Resumo por Insumo')
         totals_sheet.append(['Insumo', 'Unidade', 'Quantidade Total'])
 
         totals = {}
-        for movement in queryset:
-            sheet.append([
-                str(movement.movement_date),
-                movement.supply.name,
-                movement.supply.unit,
-                float(movement.quantity),
-                movement.note,
-            ])
-            key = movement.supply_id
-            if key not in totals:
-                totals[key] = {
-                    'name': movement.supply.name,
-                    'unit': movement.supply.unit,
+        rows = queryset.values_list('movement_date', 'supply_id', 'supply__name', 'supply__unit', 'quantity', 'note')
+        for movement_date, supply_id, supply_name, unit, quantity, note in rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            sheet.append([str(movement_date), supply_name, unit, float(quantity), note])
+            if supply_id not in totals:
+                totals[supply_id] = {
+                    'name': supply_name,
+                    'unit': unit,
                     'total': 0.0,
                 }
-            totals[key]['total'] += float(movement.quantity)
+            totals[supply_id]['total'] += float(quantity)
 
         for entry in totals.values():
             totals_sheet.append([entry['name'], entry['unit'], entry['total']])
 
-        buffer = io.BytesIO()
-        workbook.save(buffer)
-        buffer.seek(0)
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        response['Content-Disposition'] = 'attachment; filename=\"consumption.xlsx\"'
-        return response
+        return xlsx_response(workbook, 'consumption.xlsx')
 
 
 class SupplierReceiptExportPdfView(viewsets.ViewSet):
     authentication_classes = [QueryParamJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
+    filename = 'supplier_receipts.pdf'
+
     def list(self, request):
+        response = HttpResponse(content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
+        self.render(request.query_params, response)
+        return response
+
+    def render(self, params, out):
         queryset = SupplierReceipt.objects.select_related('supplier', 'school').prefetch_related('items__supply', 'items__supply_created').all().order_by('-expected_date', '-created_at')
-        supplier = request.query_params.get('supplier')
-        school = request.query_params.get('school')
-        status_value = request.query_params.get('status')
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
+        supplier = params.get('supplier')
+        school = params.get('school')
+        status_value = params.get('status')
+        date_from = params.get('date_from')
+        date_to = params.get('date_to')
         if supplier:
             queryset = queryset.filter(supplier_id=supplier)
         if school:
@@ -1466,9 +1497,7 @@ class SupplierReceiptExportPdfView(viewsets.ViewSet):
         total_items = sum(receipt.items.count() for receipt in receipts)
         conferred_total = sum(1 for receipt in receipts if receipt.status == SupplierReceipt.Status.CONFERRED)
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename=\"supplier_receipts.pdf\"'
-        pdf = canvas.Canvas(response, pagesize=A4)
+        pdf = canvas.Canvas(out, pagesize=A4)
         _, height = A4
         generated_at = timezone.now()
         page_number = 1
@@ -1581,11 +1610,10 @@ class SupplierReceiptExportPdfView(viewsets.ViewSet):
 
         _draw_pdf_footer(pdf, page_number)
         pdf.save()
-        return response
 
 
-class DeliveryViewSet(viewsets.ModelViewSet):
-    queryset = Delivery.objects.select_related('school', 'created_by').prefetch_related('items__supply').all().order_by('-created_at')
+class DeliveryViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
+    queryset = prefetch_delivery_tree(Delivery.objects.all()).order_by('-created_at')
     serializer_class = DeliverySerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -1619,38 +1647,33 @@ class DeliveryViewSet(viewsets.ModelViewSet):
             raise ValidationError('Adicione itens antes de enviar a entrega.')
 
         with transaction.atomic():
-            for item in items:
-                balance, _ = StockBalance.objects.select_for_update().get_or_create(supply=item.supply)
-                # Backward-compatibility:
-                # old/manual stock entries may not have lot balances yet. In this case,
-                # allow sending when aggregate central stock is sufficient.
-                try:
-                    item_lots = ensure_delivery_item_lot_plan(item)
-                except ValidationError:
-                    item_lots = []
-                if balance.quantity < item.planned_quantity:
-                    raise ValidationError(
-                        f"Saldo insuficiente para {item.supply.name}. Disponivel: {balance.quantity}"
-                    )
-                balance.quantity -= item.planned_quantity
-                balance.save()
-                for item_lot in item_lots:
-                    debit_lot_central(item_lot.lot, item_lot.planned_quantity)
-                StockMovement.objects.create(
+            post_movements([
+                LedgerEntry(
                     supply=item.supply,
                     school=delivery.school,
                     type=StockMovement.Types.OUT,
                     quantity=item.planned_quantity,
                     movement_date=delivery.delivery_date,
                     note=f"Saida automatica da entrega {delivery.id} para {delivery.school.name}.",
-                    created_by=request.user,
+                    created_by_id=request.user.pk,
                 )
+                for item in items
+            ])
+            # Backward-compatibility:
+            # old/manual stock entries may not have lot balances yet. In this case,
+            # allow sending when aggregate central stock is sufficient.
+            lots_by_item, _ = ensure_delivery_lot_plans(items)
+            for item in items:
+                for item_lot in lots_by_item.get(item.pk, []):
+                    debit_lot_central(item_lot.lot, item_lot.planned_quantity)
 
             delivery.status = Delivery.Status.SENT
             delivery.conference_enabled = True
             delivery.sent_at = timezone.now()
             delivery.save(update_fields=['status', 'conference_enabled', 'sent_at', 'updated_at'])
 
+        # The lot plan may have changed above; reload so the prefetched tree is fresh.
+        delivery = self.get_queryset().get(pk=delivery.pk)
         serializer = self.get_serializer(delivery)
         return Response(serializer.data)
 
@@ -1776,6 +1799,7 @@ class DeliveryViewSet(viewsets.ModelViewSet):
                 delivery.status = Delivery.Status.FINALIZED
                 delivery.save(update_fields=['status', 'updated_at'])
 
+        delivery = self.get_queryset().get(pk=delivery.pk)
         serializer = self.get_serializer(delivery)
         return Response(serializer.data)
 
@@ -1876,7 +1900,7 @@ class DeliveryViewSet(viewsets.ModelViewSet):
         pdf.save()
         return response
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     """ViewSet for listing and managing notifications."""
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
@@ -1887,8 +1911,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        count = self.get_queryset().filter(is_read=False).count()
-        return Response({'count': count})
+        return Response({'count': unread_count()})
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
@@ -1900,21 +1923,23 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         self.get_queryset().filter(is_read=False).update(is_read=True)
+        publish_unread_count()
         return Response({'status': 'ok'})
 
 
-class SchoolStockConfigViewSet(viewsets.ModelViewSet):
+class SchoolStockConfigViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     """ViewSet for configuring stock limits per school."""
-    queryset = SchoolStockBalance.objects.select_related('school', 'supply').all()
+    queryset = SchoolStockBalance.objects.select_related('school', 'supply').annotate(supply_name=F('supply__name'))
     serializer_class = SchoolStockBalanceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = 'supply_name'
 
     def get_queryset(self):
         queryset = super().get_queryset()
         school = self.request.query_params.get('school')
         if school:
             queryset = queryset.filter(school_id=school)
-        return queryset.order_by('supply__name')
+        return queryset.order_by('supply_name')
 
     @action(detail=False, methods=['post'])
     def bulk_update_limits(self, request):
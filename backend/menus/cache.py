@@ -0,0 +1,93 @@
+"""
+Cache for the public menu endpoints.
+
+Parents open the same published menu thousands of times, mostly at the start
+of the week. The serialized JSON and the rendered PDF are cached under a
+fingerprint of everything they are built from: the menu row (``updated_at`` is
+bumped on publish and on item bulk updates), its school, and the count and
+newest ``created_at`` of its items. Any change produces a new key, so stale
+entries are never served and simply expire. The fingerprint doubles as a
+strong ETag, so revalidating clients get a 304 without a body. The JSON holds
+signed image URLs that expire, so its key and ETag also change with the blob
+signing window.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+from merenda_semed.blobs import INCLUDE_BLOBS_QUERY_PARAM, signing_window
+
+from .serializers import MenuSerializer
+from .utils import generate_menu_pdf
+
+
+def menu_fingerprint(menu) -> str:
+    items = menu.items.aggregate(count=Count('id'), latest=Max('created_at'))
+    parts = [
+        menu.pk,
+        menu.updated_at.isoformat(),
+        menu.school.updated_at.isoformat(),
+        items['count'],
+        items['latest'].isoformat() if items['latest'] else '',
+    ]
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _get_or_set(key, build):
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, settings.PUBLIC_MENU_CACHE_TIMEOUT)
+    return value
+
+
+def menu_json(menu, request) -> tuple[dict, str]:
+    """Serialized menu and its ETag. Blob URLs are absolute and signed, so the host
+    and the signing window are part of the key."""
+    variant = '|'.join([
+        request.build_absolute_uri('/'),
+        request.query_params.get(INCLUDE_BLOBS_QUERY_PARAM, ''),
+        str(signing_window()),
+    ])
+    etag = hashlib.sha256(f'{menu_fingerprint(menu)}|{variant}'.encode()).hexdigest()
+    data = _get_or_set(
+        f'public-menu:json:{etag}',
+        lambda: MenuSerializer(menu, context={'request': request}).data,
+    )
+    return data, etag
+
+
+def _render_pdf(menu) -> bytes:
+    buffer = io.BytesIO()
+    generate_menu_pdf(menu, buffer)
+    return buffer.getvalue()
+
+
+def menu_pdf(menu) -> tuple[bytes, str]:
+    etag = menu_fingerprint(menu)
+    return _get_or_set(f'public-menu:pdf:{etag}', lambda: _render_pdf(menu)), etag
+
+
+def not_modified(request, etag):
+    """A 304 for conditional GETs that already hold ``etag``, otherwise ``None``."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return None
+    etags = parse_etags(header)
+    # If-None-Match uses the weak comparison: W/"x" matches "x".
+    if '*' in etags or quote_etag(etag) in [tag.removeprefix('W/') for tag in etags]:
+        return with_cache_headers(HttpResponseNotModified(), etag)
+    return None
+
+
+def with_cache_headers(response, etag, *, public=True):
+    response['ETag'] = quote_etag(etag)
+    visibility = {'public': True} if public else {'private': True}
+    patch_cache_control(response, max_age=settings.PUBLIC_MENU_MAX_AGE, must_revalidate=True, **visibility)
+    return response
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:57
+
+import merenda_semed.blobs
+from django.db import migrations
+
+BLOB_COLUMNS = {
+    'MenuItem': ['image_data'],
+}
+
+
+def move_to_blob_store(apps, schema_editor):
+    for model_name, fields in BLOB_COLUMNS.items():
+        model = apps.get_model('menus', model_name)
+        merenda_semed.blobs.rewrite_columns(model, fields, merenda_semed.blobs.store_data_uri)
+
+
+def restore_inline_images(apps, schema_editor):
+    for model_name, fields in BLOB_COLUMNS.items():
+        model = apps.get_model('menus', model_name)
+        merenda_semed.blobs.rewrite_columns(model, fields, merenda_semed.blobs.load_data_uri)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0009_menu_nutritional_info'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='menuitem',
+            name='image_data',
+            field=merenda_semed.blobs.BlobTextField(blank=True),
+        ),
+        migrations.RunPython(move_to_blob_store, restore_inline_images),
+    ]
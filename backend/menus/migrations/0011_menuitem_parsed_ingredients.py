@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0010_move_images_to_blob_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='parsed_catalog_version',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='parsed_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='parsed_ingredients',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
@@ -2,6 +2,7 @@ import uuid
 from django.conf import settings
 from django.db import models
 
+from merenda_semed.blobs import BlobTextField
 from schools.models import School
 
 
@@ -63,10 +64,16 @@ class MenuItem(models.Model):
     meal_name = models.CharField(max_length=120, blank=True)
     portion_text = models.CharField(max_length=120, blank=True)
     image_url = models.URLField(blank=True)
-    image_data = models.TextField(blank=True)
+    image_data = BlobTextField(blank=True)
     description = models.TextField()
     recipe = models.ForeignKey('recipes.Recipe', null=True, blank=True, on_delete=models.SET_NULL, related_name='menu_items')
     calc_mode = models.CharField(max_length=20, choices=CalcMode.choices, default=CalcMode.FREE_TEXT)
+    # Parsed description for the production calculator, kept with the digest of
+    # the description and the supply catalog version it was resolved against
+    # (see production/services/production_calc.py).
+    parsed_ingredients = models.JSONField(default=list, blank=True, editable=False)
+    parsed_digest = models.CharField(max_length=64, blank=True, default='', editable=False)
+    parsed_catalog_version = models.PositiveIntegerField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
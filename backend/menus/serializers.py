@@ -1,12 +1,13 @@
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import serializers
 
+from merenda_semed.blobs import BlobModelSerializerMixin
 from schools.models import School
 
 from .models import MealServiceEntry, MealServiceReport, Menu, MenuItem
 
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(BlobModelSerializerMixin, serializers.ModelSerializer):
     recipe_name = serializers.SerializerMethodField()
 
     class Meta:
@@ -0,0 +1,66 @@
+"""
+Resolution of the "current" published menu of a school.
+
+A school's current menu is the published menu whose week covers the reference
+date. Weekends and gaps in the publication calendar have no such menu, so the
+public pages fall back to the latest published one. The preference is written
+as an ordering, which lets a single window-function query pick the current
+menu for any number of schools at once.
+"""
+from datetime import date
+
+from django.db.models import Case, F, IntegerField, Value, When, Window
+from django.db.models.functions import RowNumber
+
+from .models import Menu
+
+
+def _preference(on: date, prefer_past: bool):
+    def flag(**lookups):
+        return Case(When(then=Value(1), **lookups), default=Value(0), output_field=IntegerField())
+
+    ordering = [flag(week_start__lte=on, week_end__gte=on).desc()]
+    if prefer_past:
+        # Before the latest menu overall, take the latest one that already started.
+        ordering.append(flag(week_start__lte=on).desc())
+    ordering.append(F('week_start').desc())
+    return ordering
+
+
+def _published(on: date, fallback: bool, queryset=None):
+    queryset = (queryset if queryset is not None else Menu.objects.all()).filter(status=Menu.Status.PUBLISHED)
+    if not fallback:
+        queryset = queryset.filter(week_start__lte=on, week_end__gte=on)
+    return queryset
+
+
+def current_published_menu(school, on: date | None = None, *, fallback=True, prefer_past=False, queryset=None):
+    """Current published menu of ``school`` on ``on`` (today by default), or ``None``."""
+    on = on or date.today()
+    return (
+        _published(on, fallback, queryset)
+        .filter(school=school)
+        .order_by(*_preference(on, prefer_past))
+        .first()
+    )
+
+
+def current_published_menus(schools, on: date | None = None, *, fallback=True, prefer_past=False, queryset=None):
+    """Map school id to its current published menu, for every school in ``schools`` in one query.
+
+    Schools without a published menu are left out of the result.
+    """
+    on = on or date.today()
+    menus = (
+        _published(on, fallback, queryset)
+        .filter(school__in=schools)
+        .annotate(
+            preference_rank=Window(
+                RowNumber(),
+                partition_by=F('school_id'),
+                order_by=_preference(on, prefer_past),
+            )
+        )
+        .filter(preference_rank=1)
+    )
+    return {menu.school_id: menu for menu in menus}
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent when a school submits its meal service report, whose entries are
+# replaced in bulk. Receives ``report``.
+meal_service_reported = Signal()
@@ -2,13 +2,14 @@ import uuid
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-import csv
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError, PermissionDenied
 from rest_framework.response import Response
 
 from merenda_semed.authentication import QueryParamJWTAuthentication
+from merenda_semed.exports import ITERATOR_CHUNK_SIZE, csv_response
+from merenda_semed.mixins import SparseFieldsetsMixin
 from accounts.permissions import IsSemedAdmin
 
 from .models import Menu, MenuItem
@@ -18,10 +19,11 @@ from production.serializers import MenuProductionCalculateSerializer
 from production.services.production_calc import calculate_for_menu
 
 
-class MenuViewSet(viewsets.ModelViewSet):
+class MenuViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = Menu.objects.select_related('school').prefetch_related('items').all().order_by('-week_start')
     serializer_class = MenuSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = '-week_start'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -64,6 +66,8 @@ class MenuViewSet(viewsets.ModelViewSet):
             for item in items_data
         ]
         MenuItem.objects.bulk_create(items)
+        # bulk_create skips auto_now; touching the menu changes its public cache fingerprint.
+        menu.save(update_fields=['updated_at'])
         return Response(MenuItemSerializer(menu.items.all(), many=True).data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
@@ -71,7 +75,7 @@ class MenuViewSet(viewsets.ModelViewSet):
         menu = self.get_object()
         menu.status = Menu.Status.PUBLISHED
         menu.published_at = timezone.now()
-        menu.save(update_fields=['status', 'published_at'])
+        menu.save(update_fields=['status', 'published_at', 'updated_at'])
         return Response(MenuSerializer(menu).data)
 
     @action(detail=True, methods=['post'])
@@ -168,27 +172,27 @@ class MenuExportCsvView(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request):
-        queryset = Menu.objects.select_related('school').prefetch_related('items').all().order_by('-week_start')
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename=\"menus.csv\"'
-        writer = csv.writer(response)
-        writer.writerow(['Escola', 'Nome Cardapio', 'Semana Inicio', 'Semana Fim', 'Status', 'Dia', 'Refeicao', 'Nome Refeicao', 'Quantidade', 'Imagem', 'Descricao'])
-        for menu in queryset:
-            for item in menu.items.all():
-                writer.writerow([
-                    menu.school.name,
-                    menu.name,
-                    menu.week_start,
-                    menu.week_end,
-                    menu.status,
-                    item.day_of_week,
-                    item.meal_type,
-                    item.meal_name,
-                    item.portion_text,
-                    item.image_url,
-                    item.description,
-                ])
-        return response
+        rows = (
+            MenuItem.objects.order_by('-menu__week_start', 'menu_id')
+            .values_list(
+                'menu__school__name',
+                'menu__name',
+                'menu__week_start',
+                'menu__week_end',
+                'menu__status',
+                'day_of_week',
+                'meal_type',
+                'meal_name',
+                'portion_text',
+                'image_url',
+                'description',
+            )
+        )
+        return csv_response(
+            'menus.csv',
+            ['Escola', 'Nome Cardapio', 'Semana Inicio', 'Semana Fim', 'Status', 'Dia', 'Refeicao', 'Nome Refeicao', 'Quantidade', 'Imagem', 'Descricao'],
+            rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE),
+        )
 
 
 class MenuExportPdfView(viewsets.ViewSet):
@@ -0,0 +1,127 @@
+"""
+Date-partitioned archive for rows moved out of append-only tables.
+
+``archive_rows`` moves the rows of a model created before a cutoff into
+``ARCHIVE_ROOT/<app_label>.<model_name>/<YYYY>/<MM>/<YYYY-MM-DD>.jsonl.gz``,
+one line per row, partitioned by the UTC day of ``created_at``. It works a
+chunk at a time: the chunk is appended to the files of its days (each append
+is a separate gzip member; readers see one stream) and then deleted in its own
+short transaction, so no lock is held for the whole run.
+
+A crash between the two steps leaves the chunk both on disk and in the table;
+the next run archives it again and ``read_archive`` skips the repeated lines.
+"""
+import base64
+import datetime
+import gzip
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+
+ARCHIVE_SUFFIX = '.jsonl.gz'
+
+
+def archive_root():
+    return Path(settings.ARCHIVE_ROOT)
+
+
+def partition_root(model):
+    return archive_root() / model._meta.label_lower
+
+
+def partition_path(model, day):
+    return partition_root(model) / f'{day:%Y}' / f'{day:%m}' / f'{day.isoformat()}{ARCHIVE_SUFFIX}'
+
+
+def _utc_day(value):
+    return value.astimezone(datetime.timezone.utc).date()
+
+
+def encode_row(obj) -> dict:
+    record = {}
+    for field in obj._meta.concrete_fields:
+        value = field.value_from_object(obj)
+        if isinstance(field, models.BinaryField) and value is not None:
+            value = base64.b64encode(bytes(value)).decode('ascii')
+        elif isinstance(value, (datetime.datetime, datetime.time)):
+            # DjangoJSONEncoder would cut these to milliseconds.
+            value = value.isoformat()
+        record[field.attname] = value
+    return record
+
+
+def decode_row(model, record):
+    """Unsaved ``model`` instance with the fields of an archived ``record``."""
+    values = {
+        field.attname: field.to_python(record.get(field.attname))
+        for field in model._meta.concrete_fields
+    }
+    obj = model(**values)
+    obj._state.adding = False
+    return obj
+
+
+def _append(path, records):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = ''.join(json.dumps(record, cls=DjangoJSONEncoder) + '\n' for record in records)
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='ab') as handle:
+            handle.write(lines.encode('utf-8'))
+        raw.flush()
+        # On disk before the rows are deleted.
+        os.fsync(raw.fileno())
+
+
+def archive_rows(queryset, cutoff, batch_size=1000, date_field='created_at') -> int:
+    """Move rows of ``queryset`` with ``date_field`` before ``cutoff`` to the archive."""
+    model = queryset.model
+    pending = queryset.filter(**{f'{date_field}__lt': cutoff}).order_by(date_field, 'pk')
+    archived = 0
+    while True:
+        rows = list(pending[:batch_size])
+        if not rows:
+            return archived
+        by_day = defaultdict(list)
+        for row in rows:
+            by_day[_utc_day(getattr(row, date_field))].append(encode_row(row))
+        for day, records in sorted(by_day.items()):
+            _append(partition_path(model, day), records)
+        with transaction.atomic():
+            model.objects.filter(pk__in=[row.pk for row in rows]).delete()
+        archived += len(rows)
+
+
+def archived_days(model, date_from=None, date_to=None):
+    """Days with an archive file for ``model`` within the range, newest first."""
+    days = []
+    for path in partition_root(model).glob(f'*/*/*{ARCHIVE_SUFFIX}'):
+        try:
+            day = datetime.date.fromisoformat(path.name[:-len(ARCHIVE_SUFFIX)])
+        except ValueError:
+            continue
+        if (date_from is None or day >= date_from) and (date_to is None or day <= date_to):
+            days.append(day)
+    return sorted(days, reverse=True)
+
+
+def read_archive(model, date_from=None, date_to=None, date_field='created_at'):
+    """Archived ``model`` instances of the days in the range, newest first.
+
+    Only the files of those days are opened; ``date_from`` and ``date_to`` are
+    UTC dates.
+    """
+    seen = set()
+    for day in archived_days(model, date_from, date_to):
+        with gzip.open(partition_path(model, day), 'rt', encoding='utf-8') as handle:
+            rows = [decode_row(model, json.loads(line)) for line in handle if line.strip()]
+        rows.sort(key=lambda row: getattr(row, date_field), reverse=True)
+        for row in rows:
+            if row.pk in seen:
+                continue
+            seen.add(row.pk)
+            yield row
@@ -1,6 +1,26 @@
+"""
+ASGI entry point, for the server-sent events stream only.
+
+The API runs on WSGI (wsgi.py). Under ASGI, Django reads the body of a
+synchronous StreamingHttpResponse into memory before sending it, which would
+undo the constant-memory CSV/XLSX exports, JSON streams and blob and report
+downloads. This process serves ``/api/events/stream/`` and answers 404 to
+anything else.
+"""
 import os
+
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'merenda_semed.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+ASGI_PATHS = ('/api/events/stream/',)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] not in ASGI_PATHS:
+        await send({'type': 'http.response.start', 'status': 404, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'Not Found'})
+        return
+    await django_application(scope, receive, send)
@@ -0,0 +1,241 @@
+"""
+Content-addressed blob store for the images that used to live inline on rows.
+
+Signatures and menu images arrive from the SPA as base64 ``data:`` URIs. Kept
+as they are, every delivery or menu list would carry megabytes of base64.
+Instead the decoded bytes are written once under ``BLOB_ROOT``, named after
+their SHA-256 digest (so identical images are stored once), and the column
+keeps a short reference such as ``blob:<sha256>.png``.
+
+Serializers render references as URLs of ``/api/blobs/<name>``. Clients that
+really need the inline image can pass ``?include_blobs=1``. The URLs carry a
+signature that expires (``BLOB_URL_MAX_AGE``), so ``<img>`` tags can load them
+without a token; anyone else needs to be authenticated.
+"""
+import base64
+import binascii
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.signing import BadSignature, Signer
+from django.db import models
+from django.urls import reverse
+from rest_framework import serializers
+
+BLOB_REF_PREFIX = 'blob:'
+INCLUDE_BLOBS_QUERY_PARAM = 'include_blobs'
+
+_DATA_URI_RE = re.compile(r'^data:(?P<mime>[\w.+-]+/[\w.+-]+)(?:;[^;,]*)*;base64,(?P<data>.*)$', re.DOTALL)
+_BLOB_NAME_RE = re.compile(r'(?P<name>[0-9a-f]{64}\.[a-z0-9]+)')
+_BLOB_REF_RE = re.compile(r'^blob:' + _BLOB_NAME_RE.pattern + r'$')
+_BLOB_URL_RE = re.compile(r'/api/blobs/' + _BLOB_NAME_RE.pattern + r'/?(?:\?[^#]*)?$')
+_signer = Signer(salt='merenda_semed.blobs')
+
+
+def blob_root():
+    return Path(settings.BLOB_ROOT)
+
+
+def blob_path(name, root=None):
+    """Path of a blob under ``root``, the served ``BLOB_ROOT`` by default."""
+    return Path(root or blob_root()) / name[:2] / name
+
+
+def _extension_for(mime):
+    extension = mimetypes.guess_extension(mime) or '.bin'
+    return extension.lstrip('.').lower()
+
+
+def content_type_for(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def is_blob_ref(value):
+    return isinstance(value, str) and bool(_BLOB_REF_RE.match(value))
+
+
+def blob_name(value):
+    match = _BLOB_REF_RE.match(value or '')
+    return match.group('name') if match else None
+
+
+def put_blob(content, mime, root=None):
+    """Store raw bytes and return their reference. Existing blobs are reused."""
+    name = f'{hashlib.sha256(content).hexdigest()}.{_extension_for(mime)}'
+    path = blob_path(name, root)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a sibling temp file first so readers never see a partial blob.
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(content)
+            os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+    return f'{BLOB_REF_PREFIX}{name}'
+
+
+def read_blob(name, root=None):
+    with open(blob_path(name, root), 'rb') as handle:
+        return handle.read()
+
+
+def delete_blob(name):
+    """Remove a blob; ``False`` when it was already gone."""
+    try:
+        blob_path(name).unlink()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def store_data_uri(value, root=None):
+    """Move a base64 data URI into the store; any other value is returned unchanged."""
+    if not isinstance(value, str):
+        return value
+    match = _DATA_URI_RE.match(value)
+    if not match:
+        return value
+    try:
+        content = base64.b64decode(match.group('data'), validate=True)
+    except (binascii.Error, ValueError):
+        return value
+    return put_blob(content, match.group('mime'), root)
+
+
+def load_data_uri(value, root=None):
+    """Inverse of :func:`store_data_uri`: expand a reference back into a data URI."""
+    name = blob_name(value)
+    if not name:
+        return value
+    try:
+        content = read_blob(name, root)
+    except FileNotFoundError:
+        return ''
+    encoded = base64.b64encode(content).decode('ascii')
+    return f'data:{content_type_for(name)};base64,{encoded}'
+
+
+def signing_window(now=None) -> int:
+    """The ``BLOB_URL_MAX_AGE`` window ``now`` falls in; blob URLs change with it.
+
+    Anything caching rendered blob URLs must key on it as well.
+    """
+    return int(time.time() if now is None else now) // settings.BLOB_URL_MAX_AGE
+
+
+def blob_url(name, now=None):
+    """Signed URL of a blob.
+
+    The expiry is rounded up to the next ``BLOB_URL_MAX_AGE`` window, so lists
+    rendered in the same window give the same URL and browsers can cache it.
+    """
+    expires = (signing_window(now) + 2) * settings.BLOB_URL_MAX_AGE
+    query = urlencode({'expires': expires, 'signature': _signer.signature(f'{name}:{expires}')})
+    return f"{reverse('blob-detail', kwargs={'name': name})}?{query}"
+
+
+def signed_url_expiry(name, params):
+    """Seconds a signed URL of ``name`` is still valid for; ``None`` when not signed or expired."""
+    expires = params.get('expires', '')
+    if not expires.isdigit():
+        return None
+    try:
+        _signer.unsign(f'{name}:{expires}:{params.get("signature", "")}')
+    except BadSignature:
+        return None
+    remaining = int(expires) - int(time.time())
+    return remaining if remaining > 0 else None
+
+
+def ref_from_url(value):
+    """Map a blob URL previously handed to a client back to its reference."""
+    match = _BLOB_URL_RE.search(value or '')
+    if not match or not blob_path(match.group('name')).exists():
+        return None
+    return f'{BLOB_REF_PREFIX}{match.group("name")}'
+
+
+def normalize_image_value(value):
+    """
+    Accept what clients send for an image field: a data URI, a blob URL or a reference.
+
+    Returns the value to persist, or ``None`` when it is not an image.
+    """
+    if not value:
+        return None
+    if value.startswith('data:image/'):
+        return value
+    ref = value if is_blob_ref(value) else ref_from_url(value)
+    if ref and content_type_for(blob_name(ref)).startswith('image/'):
+        return ref
+    return None
+
+
+def rewrite_columns(model, fields, convert, batch_size=200):
+    """Data-migration helper: rewrite ``fields`` of every row through ``convert``."""
+    for field in fields:
+        pks = list(model.objects.exclude(**{field: ''}).values_list('pk', flat=True))
+        for start in range(0, len(pks), batch_size):
+            rows = model.objects.filter(pk__in=pks[start:start + batch_size]).values_list('pk', field)
+            for pk, value in rows:
+                new_value = convert(value)
+                if new_value != value:
+                    model.objects.filter(pk=pk).update(**{field: new_value})
+
+
+class BlobTextField(models.TextField):
+    """TextField whose data URI values are moved to the blob store on save."""
+
+    def pre_save(self, model_instance, add):
+        value = super().pre_save(model_instance, add)
+        stored = store_data_uri(value)
+        if stored is not value:
+            setattr(model_instance, self.attname, stored)
+        return stored
+
+
+class BlobField(serializers.CharField):
+    """Renders blob references as URLs, or inline with ``?include_blobs=1``."""
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if _BLOB_URL_RE.search(value):
+            ref = ref_from_url(value)
+            if ref is None:
+                raise serializers.ValidationError('Arquivo nao encontrado.')
+            return ref
+        return value
+
+    def to_representation(self, value):
+        name = blob_name(value)
+        if not name:
+            return super().to_representation(value)
+        request = self.context.get('request')
+        if request is not None and _include_blobs(request):
+            return load_data_uri(value)
+        url = blob_url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+def _include_blobs(request):
+    params = getattr(request, 'query_params', request.GET)
+    return params.get(INCLUDE_BLOBS_QUERY_PARAM, '').lower() in ('1', 'true')
+
+
+class BlobModelSerializerMixin:
+    """Maps :class:`BlobTextField` model fields to :class:`BlobField`."""
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        BlobTextField: BlobField,
+    }
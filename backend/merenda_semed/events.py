@@ -0,0 +1,171 @@
+"""
+In-process fan-out of server-sent events.
+
+``broker.publish`` hands an event to every open ``/api/events/stream/``
+connection of this process. It is thread-safe: signal receivers call it from
+request threads, and each connection waits on its own asyncio queue in the
+ASGI event loop. Events carry an ``id``; an id seen recently is published once.
+
+Changes made by other processes (other workers, management commands, bulk
+inserts that send no signals) are picked up by pollers registered with
+``broker.register_poller``. While at least one connection is open, a bridge
+thread calls them every EVENT_STREAM_POLL_INTERVAL seconds and publishes what
+they return; the ids make the events they share with local signals collapse.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+# Events a slow connection may have pending before it is closed; EventSource reconnects.
+SUBSCRIBER_QUEUE_SIZE = 200
+RECENT_IDS = 2000
+
+
+def event(event_type: str, event_id: str, data) -> dict:
+    return {'id': event_id, 'type': event_type, 'data': data}
+
+
+def sse_message(item: dict) -> str:
+    data = json.dumps(item['data'], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f'id: {item["id"]}\nevent: {item["type"]}\ndata: {data}\n\n'
+
+
+class Subscription:
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = OrderedDict()
+        self._pollers = []
+        self._bridge = None
+        self._pid = None
+
+    def subscribe(self) -> Subscription:
+        """New subscription for the running event loop."""
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+        self._ensure_bridge()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def seen(self, event_id: str) -> bool:
+        with self._lock:
+            return event_id in self._recent
+
+    def publish(self, item: dict) -> bool:
+        """Send ``item`` to every subscriber; ``False`` when its id was already published."""
+        with self._lock:
+            if item['id'] in self._recent:
+                return False
+            self._recent[item['id']] = True
+            if len(self._recent) > RECENT_IDS:
+                self._recent.popitem(last=False)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, item)
+            except RuntimeError:
+                # The connection's loop is closed; it unsubscribes on its way out.
+                pass
+        return True
+
+    def register_poller(self, poller):
+        """``poller()`` returns the events of changes made outside this process."""
+        self._pollers.append(poller)
+
+    def poll(self) -> int:
+        published = 0
+        for poller in self._pollers:
+            try:
+                for item in poller():
+                    published += self.publish(item)
+            except Exception:  # noqa: BLE001 - the bridge keeps running
+                logger.exception('Falha ao consultar eventos de %r.', poller)
+        return published
+
+    def _ensure_bridge(self):
+        if settings.EVENT_STREAM_POLL_INTERVAL <= 0 or not self._pollers:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._bridge is not None and self._bridge.is_alive():
+                return
+            self._pid = os.getpid()
+            self._bridge = threading.Thread(target=self._run_bridge, name='event-stream-bridge', daemon=True)
+            self._bridge.start()
+
+    def _run_bridge(self):
+        try:
+            while self.subscriber_count():
+                self.poll()
+                close_old_connections()
+                time.sleep(settings.EVENT_STREAM_POLL_INTERVAL)
+        finally:
+            connection.close()
+            with self._lock:
+                self._bridge = None
+
+
+broker = EventBroker()
+
+
+async def event_stream(initial=None, heartbeat=None, max_seconds=None):
+    """SSE body: the events returned by ``initial()``, then whatever is published.
+
+    ``initial`` runs after subscribing, so nothing published in between is lost.
+    A comment line every ``heartbeat`` seconds keeps proxies from dropping the
+    connection, and the stream ends after ``max_seconds``; ``EventSource``
+    reconnects on its own.
+    """
+    heartbeat = heartbeat or settings.EVENT_STREAM_HEARTBEAT_SECONDS
+    max_seconds = max_seconds or settings.EVENT_STREAM_MAX_SECONDS
+    subscription = broker.subscribe()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        yield 'retry: 3000\n\n'
+        if initial is not None:
+            for item in await sync_to_async(initial)():
+                yield sse_message(item)
+        while not subscription.overflowed:
+            timeout = min(heartbeat, deadline - loop.time())
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield sse_message(item)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,62 @@
+"""
+Streaming helpers for the CSV, XLSX and large JSON responses.
+
+CSV and JSON rows are encoded as they are produced, so the response starts
+before the query has been fully read. XLSX cannot be streamed while it is being written
+(the zip directory goes at the end), so write-only workbooks are saved to a
+spooled temporary file that only touches disk past ``SPOOL_MAX_SIZE``.
+"""
+import csv
+import json
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+ITERATOR_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(filename, header, rows):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def json_stream_response(head, key, items):
+    """The ``head`` object with ``items`` streamed as a JSON array under ``key``."""
+
+    def dumps(value):
+        # Same output as the API's JSON renderer.
+        return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+    def chunks():
+        opening = dumps(head)[:-1]
+        yield f'{opening}{"," if head else ""}{dumps(key)}:['
+        for index, item in enumerate(items):
+            yield f'{"," if index else ""}{dumps(item)}'
+        yield ']}'
+
+    return StreamingHttpResponse(chunks(), content_type='application/json')
+
+
+def xlsx_response(workbook, filename):
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    workbook.save(spool)
+    spool.seek(0)
+    return FileResponse(spool, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
@@ -0,0 +1,74 @@
+"""
+Viewset mixins shared across apps.
+"""
+from rest_framework import serializers
+
+
+def _parse_field_paths(raw):
+    """Turn ``"items.lots,notes"`` into ``{'items': {'lots': {}}, 'notes': {}}``."""
+    tree = {}
+    for path in (raw or '').split(','):
+        parts = [part.strip() for part in path.split('.') if part.strip()]
+        node = tree
+        for part in parts:
+            node = node.setdefault(part, {})
+    return tree
+
+
+def _nested_serializer(field):
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    if isinstance(field, serializers.Serializer):
+        return field
+    return None
+
+
+def _keep_fields(serializer, tree):
+    for name in list(serializer.fields):
+        if name not in tree:
+            serializer.fields.pop(name)
+            continue
+        nested = _nested_serializer(serializer.fields[name])
+        if tree[name] and nested is not None:
+            _keep_fields(nested, tree[name])
+
+
+def _drop_fields(serializer, tree):
+    for name, subtree in tree.items():
+        if name not in serializer.fields:
+            continue
+        if not subtree:
+            serializer.fields.pop(name)
+            continue
+        nested = _nested_serializer(serializer.fields[name])
+        if nested is not None:
+            _drop_fields(nested, subtree)
+
+
+class SparseFieldsetsMixin:
+    """
+    Lets read requests trim the serialized payload with ``?fields=`` / ``?exclude=``.
+
+    Both parameters take comma separated field names; dotted paths reach into
+    nested serializers, e.g. ``?exclude=items.lots,nutritionist_signatures``.
+    """
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return serializer
+        only = _parse_field_paths(request.query_params.get(self.fields_query_param))
+        exclude = _parse_field_paths(request.query_params.get(self.exclude_query_param))
+        if not only and not exclude:
+            return serializer
+        target = _nested_serializer(serializer)
+        if target is None:
+            return serializer
+        if only:
+            _keep_fields(target, only)
+        if exclude:
+            _drop_fields(target, exclude)
+        return serializer
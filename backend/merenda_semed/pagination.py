@@ -0,0 +1,41 @@
+"""
+Keyset (cursor) pagination shared by the router-registered viewsets.
+
+Cursor pagination keeps pages stable while rows are being inserted, unlike
+offset/page-number pagination. During the SPA migration the paginator can run
+in a legacy mode (``API_LEGACY_LIST_RESPONSES``) where list endpoints keep
+returning plain arrays unless the client explicitly asks for a page.
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def is_requested(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if getattr(settings, 'API_LEGACY_LIST_RESPONSES', False) and not self.is_requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        # Views declare a single unchanging, (nearly) unique column to page on.
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering is None:
+            field_names = {field.name for field in queryset.model._meta.concrete_fields}
+            ordering = '-created_at' if 'created_at' in field_names else '-pk'
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = tuple(ordering)
+        # Tie-break on the primary key so rows sharing a cursor value keep a stable order.
+        if ordering[-1].lstrip('-') != 'pk':
+            ordering += ('-pk' if ordering[0].startswith('-') else 'pk',)
+        return ordering
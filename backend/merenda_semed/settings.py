@@ -80,6 +80,9 @@ INSTALLED_APPS = [
     'recipes',
     'production',
     'public',
+    'dashboard',
+    'reports',
+    'search',
 ]
 
 if importlib.util.find_spec('corsheaders'):
@@ -169,6 +172,52 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [FRONTEND_DIST_DIR] if FRONTEND_DIST_DIR.exists() else []
+# Seconds a dashboard snapshot is served before it is rebuilt, even without invalidation.
+DASHBOARD_SNAPSHOT_MAX_AGE = env.int('DASHBOARD_SNAPSHOT_MAX_AGE', default=300)
+# Seconds a rendered PDF report is reused for identical filters, and seconds a
+# report job may stay running before run_report_worker puts it back in the queue.
+REPORT_ARTIFACT_MAX_AGE = env.int('REPORT_ARTIFACT_MAX_AGE', default=3600)
+REPORT_JOB_TIMEOUT = env.int('REPORT_JOB_TIMEOUT', default=600)
+# Per-process memory cache unless CACHE_URL points to a shared backend (e.g. redis://).
+CACHES = {'default': env.cache_url('CACHE_URL', default='locmemcache://')}
+# Public menu JSON/PDF cache (see menus/cache.py): seconds entries are kept, and
+# the max-age browsers get before revalidating with the ETag.
+PUBLIC_MENU_CACHE_TIMEOUT = env.int('PUBLIC_MENU_CACHE_TIMEOUT', default=86400)
+PUBLIC_MENU_MAX_AGE = env.int('PUBLIC_MENU_MAX_AGE', default=300)
+# Seconds a worker keeps its supply-name index before rebuilding it, even without invalidation.
+SUPPLY_INDEX_MAX_AGE = env.int('SUPPLY_INDEX_MAX_AGE', default=600)
+# Audit log writer (see auditlog/writer.py): entries are queued and inserted in
+# batches by a background thread; what cannot be inserted goes to the fallback file.
+AUDIT_LOG_BUFFERED = env.bool('AUDIT_LOG_BUFFERED', default=True)
+AUDIT_LOG_QUEUE_SIZE = env.int('AUDIT_LOG_QUEUE_SIZE', default=10000)
+AUDIT_LOG_BATCH_SIZE = env.int('AUDIT_LOG_BATCH_SIZE', default=200)
+AUDIT_LOG_FLUSH_INTERVAL_MS = env.int('AUDIT_LOG_FLUSH_INTERVAL_MS', default=500)
+AUDIT_LOG_FALLBACK_PATH = env('AUDIT_LOG_FALLBACK_PATH', default=str(BASE_DIR / 'audit-fallback.jsonl'))
+# Audit payload strings this long or longer are kept once in the blob store (see auditlog/payloads.py).
+AUDIT_LOG_BLOB_MIN_BYTES = env.int('AUDIT_LOG_BLOB_MIN_BYTES', default=1024)
+# Their own store, apart from BLOB_ROOT: /api/blobs/ never serves audit payloads.
+AUDIT_BLOB_ROOT = env('AUDIT_BLOB_ROOT', default=str(BASE_DIR / 'audit_blobs'))
+# Retention (see merenda_semed/archive.py): archive_old_records moves rows older
+# than these many days to date-partitioned .jsonl.gz files under ARCHIVE_ROOT.
+ARCHIVE_ROOT = env('ARCHIVE_ROOT', default=str(BASE_DIR / 'archive'))
+AUDIT_LOG_RETENTION_DAYS = env.int('AUDIT_LOG_RETENTION_DAYS', default=365)
+# Longest date range an audit log query may read from the archive.
+AUDIT_ARCHIVE_MAX_DAYS = env.int('AUDIT_ARCHIVE_MAX_DAYS', default=31)
+NOTIFICATION_RETENTION_DAYS = env.int('NOTIFICATION_RETENTION_DAYS', default=180)
+# SSE stream (see merenda_semed/events.py): seconds between database polls for
+# changes made by other processes (0 turns the bridge off), between keep-alive
+# comments, and before a connection is closed for the client to reconnect.
+EVENT_STREAM_POLL_INTERVAL = env.float('EVENT_STREAM_POLL_INTERVAL', default=2.0)
+EVENT_STREAM_HEARTBEAT_SECONDS = env.int('EVENT_STREAM_HEARTBEAT_SECONDS', default=15)
+EVENT_STREAM_MAX_SECONDS = env.int('EVENT_STREAM_MAX_SECONDS', default=300)
+# Stock reconciliation (see inventory/services/reconciliation.py): worker threads,
+# each with its own database connection, and supplies checked per partition.
+STOCK_RECONCILIATION_WORKERS = env.int('STOCK_RECONCILIATION_WORKERS', default=4)
+STOCK_RECONCILIATION_PARTITION_SIZE = env.int('STOCK_RECONCILIATION_PARTITION_SIZE', default=200)
+# Content-addressed store for signatures and menu images (see merenda_semed/blobs.py).
+BLOB_ROOT = env('BLOB_ROOT', default=str(BASE_DIR / 'blobs'))
+# Blob URLs handed to clients are signed and valid for 1 to 2 times this many seconds.
+BLOB_URL_MAX_AGE = env.int('BLOB_URL_MAX_AGE', default=3600)
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.User'
@@ -182,8 +231,14 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'merenda_semed.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Compatibility switch for the SPA: while enabled, list endpoints only paginate when
+# the client sends ?cursor= or ?page_size=, otherwise they keep returning plain arrays.
+API_LEGACY_LIST_RESPONSES = env.bool('API_LEGACY_LIST_RESPONSES', default=True)
+
 # Avoid weak HMAC key warnings in JWT when SECRET_KEY is short in some environments.
 jwt_signing_key = env('JWT_SIGNING_KEY', default='').strip()
 if not jwt_signing_key:
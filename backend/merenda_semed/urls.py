@@ -5,8 +5,8 @@ from rest_framework.routers import DefaultRouter
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 from accounts.views import MeView, NutritionistUserViewSet
-from auditlog.views import AuditLogListView
-from merenda_semed.views import DashboardView, DashboardSeriesView, DashboardClearConsumptionView
+from auditlog.views import AuditLogListView, AuditLogWriterStatsView
+from merenda_semed.views import BlobView, DashboardView, DashboardSeriesView, DashboardClearConsumptionView, event_stream_view
 from schools.views import SchoolViewSet
 from inventory.views import (
     DeliveryViewSet,
@@ -68,11 +68,16 @@ urlpatterns = [
     path('api/dashboard/series/', DashboardSeriesView.as_view(), name='dashboard-series'),
     path('api/dashboard/series/clear-consumption/', DashboardClearConsumptionView.as_view(), name='dashboard-clear-consumption'),
     path('api/audit-logs/', AuditLogListView.as_view(), name='audit-log-list'),
+    path('api/audit-logs/writer/', AuditLogWriterStatsView.as_view(), name='audit-log-writer'),
+    re_path(r'^api/blobs/(?P<name>[0-9a-f]{64}\.[a-z0-9]+)/$', BlobView.as_view(), name='blob-detail'),
+    path('api/events/stream/', event_stream_view, name='event-stream'),
     path('api/auth/me/', MeView.as_view(), name='auth-me'),
     path('api/auth/', include('accounts.urls')),
     path('api/', include(router.urls)),
     path('api/recipes/', include('recipes.urls')),
     path('api/production/', include('production.urls')),
+    path('api/reports/', include('reports.urls')),
+    path('api/search/', include('search.urls')),
     path('public/calculator/', include('production.public_urls')),
     path('public/schools/<slug:slug>/', PublicSchoolDetailView.as_view(), name='public-school-detail'),
     path('public/schools/', PublicSchoolListView.as_view(), name='public-school-list'),
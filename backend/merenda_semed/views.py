@@ -1,222 +1,75 @@
-from django.db import models
+import uuid
+from datetime import date
+
+from django.conf import settings
 from django.db import DatabaseError
 from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 
-from django.db.models import Sum
-from django.db.models.functions import TruncMonth
-from django.utils import timezone
-from django.utils.timesince import timesince
-from inventory.models import Delivery, SchoolStockBalance, StockBalance, StockMovement, Supplier, Supply
-from menus.models import MealServiceEntry, Menu, MenuItem
-from schools.models import School
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from accounts.permissions import IsSemedAdmin
+from dashboard.rollups import consumption_by_month, served_by_school_category
+from dashboard.services import get_dashboard_snapshot, render_dashboard_snapshot
+from inventory.events import unread_count_event
+from inventory.models import StockMovement
+from merenda_semed.authentication import QueryParamJWTAuthentication
+from merenda_semed.blobs import blob_path, content_type_for, signed_url_expiry
+from merenda_semed.events import event_stream
 
 
 class DashboardView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        # 1. Basic Counts
-        schools_total = 0
-        schools_active = 0
-        supplies_total = 0
-        menus_published = 0
-        try:
-            schools_total = School.objects.count()
-            schools_active = School.objects.filter(is_active=True).count()
-            supplies_total = Supply.objects.filter(
-                models.Q(is_active=True)
-                | models.Q(balance__quantity__gt=0)
-                | models.Q(school_balances__quantity__gt=0),
-            ).distinct().count()
-            menus_published = Menu.objects.filter(status=Menu.Status.PUBLISHED).count()
-        except DatabaseError:
-            # Keep endpoint alive even if one optional dashboard source is unavailable.
-            pass
-        
-        # Low stock based on School Stock Balances
-        low_stock_school = 0
-        try:
-            low_stock_school = SchoolStockBalance.objects.filter(
-                quantity__lt=models.F('min_stock'),
-                min_stock__gt=0,
-                supply__is_active=True,
-            ).count()
-        except DatabaseError:
-            pass
-        # Fallback to general One-to-One StockBalance if no school specific entries are used widely yet,
-        # but the requirement was "Estoque de Feijão Baixo - Escola Municipal...".
-        # So we surely want SchoolStockBalance for the "Recent Activity". 
-        # For the COUNTER, let's keep it consistent:
-        low_stock = low_stock_school
-
-        # 2. Month Summary
-        today = timezone.localdate()
-        current_month_start = today.replace(day=1)
-        
-        # Meals served = sum of MealServiceEntry.served_count for the current month
-        meals_served = 0
-        try:
-            meals_served = MealServiceEntry.objects.filter(
-                report__service_date__gte=current_month_start,
-                report__school__isnull=False,
-            ).aggregate(total=Sum('served_count'))['total'] or 0
-        except DatabaseError:
-            meals_served = 0
-
-        # Deliveries realized
-        deliveries_count = 0
-        try:
-            deliveries_count = Delivery.objects.filter(
-                status__in=[Delivery.Status.SENT, Delivery.Status.CONFERRED],
-                delivery_date__gte=current_month_start
-            ).count()
-        except DatabaseError:
-            deliveries_count = 0
-
-        # 3. Recent Activity (Mix of: Published Menus, Low Stock Alerts, New Suppliers)
-        # We'll fetch top 5 of each and merge/sort in python for simplicity, then take top 5 overall.
-        
-        # A) Recent Menus
-        recent_menus = []
-        try:
-            recent_menus = list(
-                Menu.objects.filter(status=Menu.Status.PUBLISHED).select_related('school').order_by('-published_at')[:5]
-            )
-        except DatabaseError:
-            recent_menus = []
-        
-        # B) Low Stock (School Balances)
-        # We want "Last Updated" low stocks? Or just current low stocks? 
-        # The prompt shows "Estoque de Feijão Baixo ... 4h atrás". 
-        # SchoolStockBalance has 'last_updated'.
-        recent_low_stock = []
-        try:
-            recent_low_stock = list(
-                SchoolStockBalance.objects.filter(
-                    quantity__lt=models.F('min_stock'),
-                    min_stock__gt=0,
-                    supply__is_active=True,
-                ).select_related('school', 'supply').order_by('-last_updated')[:5]
-            )
-        except DatabaseError:
-            recent_low_stock = []
-
-        # C) New Suppliers (or maybe Deliveries?)
-        # Prompt says "Novo Fornecedor Cadastrado".
-        recent_suppliers = []
-        try:
-            recent_suppliers = list(Supplier.objects.order_by('-created_at')[:5])
-        except DatabaseError:
-            recent_suppliers = []
-
-        activities = []
-        
-        for menu in recent_menus:
-            published_at = menu.published_at or menu.updated_at or menu.created_at
-            activities.append({
-                'type': 'MENU_PUBLISHED',
-                'title': menu.name or 'Cardápio Publicado',
-                'subtitle': f"Publicado {timesince(published_at)} atrás",
-                'timestamp': published_at,
-                'icon': 'upload_file',
-                'iconBg': 'bg-primary-100 dark:bg-primary-900/30',
-                'iconColor': 'text-primary-500',
-            })
-
-        for balance in recent_low_stock:
-            activities.append({
-                'type': 'LOW_STOCK',
-                'title': f"Estoque Baixo: {balance.supply.name}",
-                'subtitle': f"{balance.school.name} • {timesince(balance.last_updated)} atrás",
-                'timestamp': balance.last_updated,
-                'icon': 'low_priority',
-                'iconBg': 'bg-warning-100 dark:bg-warning-900/30',
-                'iconColor': 'text-warning-500',
-            })
-
-        for supplier in recent_suppliers:
-            activities.append({
-                'type': 'new_supplier',
-                'title': 'Novo Fornecedor Cadastrado',
-                'subtitle': f"{supplier.name} • {timesince(supplier.created_at)} atrás",
-                'timestamp': supplier.created_at,
-                'icon': 'person_add',
-                'iconBg': 'bg-success-100 dark:bg-success-900/30',
-                'iconColor': 'text-success-500',
-            })
-
-        # Sort combined list by timestamp desc
-        activities.sort(key=lambda x: x['timestamp'], reverse=True)
-        recent_activities = activities[:5]
-
-        return Response({
-            'schools_total': schools_total,
-            'schools_active': schools_active,
-            'supplies_total': supplies_total,
-            'low_stock': low_stock,
-            'menus_published': menus_published,
-            'month_summary': {
-                'meals_served': meals_served,
-                'deliveries_realized': deliveries_count,
-            },
-            'recent_activities': recent_activities,
-        })
+        # Counters come from a precomputed snapshot; admins can force a rebuild with ?fresh=1.
+        fresh = (
+            request.query_params.get('fresh') in ('1', 'true')
+            and IsSemedAdmin().has_permission(request, self)
+        )
+        snapshot = get_dashboard_snapshot(fresh=fresh)
+        return Response(render_dashboard_snapshot(snapshot))
 
 
 class DashboardSeriesView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
+        # Reads only the monthly rollups (see dashboard.rollups); dates are floored to the month.
+        filters = {'school': None}
+        school = request.query_params.get('school')
+        if school:
+            try:
+                filters['school'] = uuid.UUID(str(school))
+            except (TypeError, ValueError):
+                raise ValidationError({'school': 'Parametro school invalido. Informe um UUID valido.'})
+        for param in ('date_from', 'date_to'):
+            raw_date = request.query_params.get(param)
+            try:
+                filters[param] = date.fromisoformat(raw_date) if raw_date else None
+            except ValueError:
+                raise ValidationError({param: 'Data invalida. Use o formato YYYY-MM-DD.'})
+
         try:
-            movements = (
-                StockMovement.objects.filter(
-                    type=StockMovement.Types.OUT,
-                    school__isnull=False,
-                )
-                .annotate(month=TruncMonth('movement_date'))
-                .values('month')
-                .annotate(total=Sum('quantity'))
-                .order_by('month')
-            )
-            series = [
-                {
-                    'name': entry['month'].strftime('%b'),
-                    'value': float(entry['total'] or 0),
-                }
-                for entry in movements
-                if entry.get('month') is not None
-            ]
+            series = consumption_by_month(**filters)
         except DatabaseError:
             series = []
 
         try:
-            served = (
-                MealServiceEntry.objects.select_related('report__school')
-                .values('report__school__id', 'report__school__name', 'meal_type')
-                .annotate(total=Sum('served_count'))
-                .order_by('report__school__name', 'meal_type')
-            )
-            labels = dict(MenuItem.MealType.choices)
-            served_by_school_category = [
-                {
-                    'school_id': str(item['report__school__id']),
-                    'school_name': item['report__school__name'],
-                    'meal_type': item['meal_type'],
-                    'meal_label': labels.get(item['meal_type'], item['meal_type']),
-                    'value': int(item['total'] or 0),
-                }
-                for item in served
-                if item.get('report__school__id') is not None
-            ]
+            served = served_by_school_category(**filters)
         except DatabaseError:
-            served_by_school_category = []
+            served = []
 
         return Response({
             'consumption_by_month': series,
-            'served_by_school_category': served_by_school_category,
+            'served_by_school_category': served,
         })
 
 
@@ -235,3 +88,54 @@ class DashboardClearConsumptionView(APIView):
             },
             status=status.HTTP_200_OK,
         )
+
+
+class BlobView(APIView):
+    """Serves blob store content to signed URLs (see merenda_semed/blobs.py) or authenticated users."""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, name):
+        max_age = signed_url_expiry(name, request.query_params)
+        if max_age is None:
+            if not request.user.is_authenticated:
+                raise NotAuthenticated
+            max_age = settings.BLOB_URL_MAX_AGE
+        try:
+            handle = open(blob_path(name), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        response = FileResponse(handle, content_type=content_type_for(name))
+        # Signatures and menu images are not for shared caches.
+        response['Cache-Control'] = f'private, max-age={max_age}'
+        response['ETag'] = f'"{name}"'
+        return response
+
+
+def _stream_user(request):
+    try:
+        authenticated = QueryParamJWTAuthentication().authenticate(Request(request))
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    return authenticated[0] if authenticated else None
+
+
+async def event_stream_view(request):
+    """
+    Server-sent events: new notifications, the unread count and delivery status changes.
+
+    EventSource cannot send headers, so the access token may come as ``?token=``,
+    as for the exports. Only served by the ASGI process (merenda_semed/asgi.py):
+    under WSGI the body would be buffered until the stream ends.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'Stream de eventos disponivel apenas no servidor ASGI.'}, status=404)
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'detail': 'As credenciais de autenticacao nao foram fornecidas.'}, status=401)
+    response = StreamingHttpResponse(
+        event_stream(initial=lambda: [unread_count_event()]),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -5,3 +5,5 @@ class ProductionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'production'
 
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from menus.models import MenuItem
+from production.services.production_calc import PARSED_FIELDS, refresh_parsed_ingredients, save_parsed_items
+from production.services.supply_index import get_supply_index
+
+
+class Command(BaseCommand):
+    help = 'Preenche os ingredientes interpretados dos itens de cardapio desatualizados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--force', action='store_true', help='Reinterpreta todos os itens.')
+
+    def handle(self, *args, **options):
+        index = get_supply_index()
+        batch_size = max(1, options['batch_size'])
+        items = MenuItem.objects.only('id', 'description', *PARSED_FIELDS).order_by('pk')
+        pending = []
+        updated = 0
+        skipped = 0
+        for item in items.iterator(chunk_size=batch_size):
+            if refresh_parsed_ingredients(item, index, force=options['force']):
+                pending.append(item)
+            if len(pending) >= batch_size:
+                saved = save_parsed_items(pending, index)
+                updated += saved
+                skipped += len(pending) - saved
+                pending = []
+        saved = save_parsed_items(pending, index)
+        updated += saved
+        skipped += len(pending) - saved
+        self.stdout.write(self.style.SUCCESS(
+            f'{updated} item(ns) de cardapio interpretado(s) (catalogo v{index.catalog_version}).'
+        ))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'{skipped} item(ns) nao gravado(s): o catalogo mudou durante a execucao. Execute novamente.'
+            ))
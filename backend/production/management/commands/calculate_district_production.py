@@ -0,0 +1,67 @@
+import json
+import uuid
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from production.services.batch import calculate_district, select_menus
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Data invalida: {value}. Use YYYY-MM-DD.')
+
+
+def _school(value):
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise CommandError(f'Escola invalida: {value}. Informe um UUID valido.')
+
+
+class Command(BaseCommand):
+    help = 'Calcula a producao de todas as escolas para uma ou mais semanas, com o total da rede.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--week-start', required=True, help='Primeira semana (YYYY-MM-DD).')
+        parser.add_argument('--week-end', help='Ultima semana incluida (YYYY-MM-DD). Padrao: --week-start.')
+        parser.add_argument('--school', action='append', default=[], help='Restringe a escola (UUID). Pode repetir.')
+        parser.add_argument('--students', type=int, default=0, help='Alunos por refeicao quando a escola nao tem valor proprio.')
+        parser.add_argument('--students-file', help='JSON {school_id: {meal_type: alunos}} com os alunos de cada escola.')
+        parser.add_argument('--waste-percent', type=float, default=0)
+        parser.add_argument('--no-stock', action='store_true', help='Nao considera o estoque das escolas.')
+        parser.add_argument('--include-drafts', action='store_true', help='Inclui cardapios em rascunho.')
+        parser.add_argument('--workers', type=int, default=1, help='Processos usados no calculo.')
+        parser.add_argument('--output', help='Arquivo JSON de saida. Padrao: saida padrao.')
+
+    def handle(self, *args, **options):
+        week_start = _date(options['week_start'])
+        week_end = _date(options['week_end']) if options['week_end'] else None
+        students_by_school = {}
+        if options['students_file']:
+            with open(options['students_file'], encoding='utf-8') as handle:
+                students_by_school = json.load(handle)
+
+        schools = [_school(value) for value in options['school']]
+        menus = select_menus(week_start, week_end, schools=schools, include_drafts=options['include_drafts'])
+        result = calculate_district(
+            menus,
+            students_by_meal_type={'DEFAULT': options['students']},
+            students_by_school=students_by_school,
+            waste_percent=options['waste_percent'],
+            include_stock=not options['no_stock'],
+            workers=max(1, options['workers']),
+        )
+
+        payload = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(payload)
+        else:
+            self.stdout.write(payload)
+        self.stderr.write(self.style.SUCCESS(
+            f'{result["menus_count"]} cardapio(s) de {result["schools_count"]} escola(s) calculado(s); '
+            f'{len(result["totals"])} insumo(s) no total da rede.'
+        ))
@@ -30,6 +30,18 @@ class SupplyAlias(models.Model):
         return f'{self.alias} -> {self.supply.name}'
 
 
+class SupplyCatalogVersion(models.Model):
+    """Single row counting changes to supplies and aliases.
+
+    Parsed menu items remember the version they were resolved against.
+    """
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'Catalogo de insumos v{self.version}'
+
+
 class SupplyConsumptionRule(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='consumption_rules')
@@ -68,6 +68,24 @@ class PublicCalculatorCalculateSerializer(MenuProductionCalculateSerializer):
     week_start = serializers.DateField()
 
 
+class DistrictProductionCalculateSerializer(MenuProductionCalculateSerializer):
+    week_start = serializers.DateField()
+    week_end = serializers.DateField(required=False)
+    schools = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+    students_by_school = serializers.DictField(
+        child=serializers.DictField(child=serializers.IntegerField(min_value=0)),
+        required=False,
+        default=dict,
+    )
+    include_drafts = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        week_end = attrs.get('week_end')
+        if week_end and week_end < attrs['week_start']:
+            raise serializers.ValidationError({'week_end': 'week_end deve ser maior ou igual a week_start.'})
+        return attrs
+
+
 class PublicCalculatorMetaSerializer(serializers.Serializer):
     school = serializers.DictField()
     allowed_scope = serializers.CharField()
@@ -0,0 +1,166 @@
+"""
+District-wide production calculation.
+
+Runs ``calculate_for_menu`` for every selected school and week in one go.
+Menus, recipes, consumption rules and school stock are read with a handful of
+queries for the whole batch, and each school gets a preloaded
+``CalculationContext``. The management command can split the menus across
+worker processes; the API runs the batch in the request.
+"""
+from __future__ import annotations
+
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.db import connections
+
+from inventory.models import SchoolStockBalance
+from menus.models import Menu
+from production.models import SupplyConsumptionRule
+
+from .production_calc import MENU_PREFETCH, CalculationContext, _to_decimal, calculate_for_menu
+from .supply_index import get_supply_index
+
+
+def select_menus(week_start, week_end=None, schools=None, include_drafts=False):
+    """Menus starting between ``week_start`` and ``week_end`` of the active schools."""
+    queryset = Menu.objects.filter(
+        school__is_active=True,
+        week_start__gte=week_start,
+        week_start__lte=week_end or week_start,
+    )
+    if not include_drafts:
+        queryset = queryset.filter(status=Menu.Status.PUBLISHED)
+    if schools:
+        queryset = queryset.filter(school__in=schools)
+    return queryset.order_by('school__name', 'week_start')
+
+
+def _contexts(school_ids):
+    rules = defaultdict(dict)
+    for rule in SupplyConsumptionRule.objects.filter(school__in=school_ids, active=True):
+        rules[rule.school_id][(rule.supply_id, rule.meal_type)] = rule
+    stock = defaultdict(dict)
+    balances = SchoolStockBalance.objects.filter(school__in=school_ids).values_list('school_id', 'supply_id', 'quantity')
+    for school_id, supply_id, quantity in balances:
+        stock[school_id][supply_id] = _to_decimal(quantity)
+    return rules, stock
+
+
+def _calculate_menus(menu_ids, options) -> list[dict]:
+    menus = list(
+        Menu.objects.filter(pk__in=menu_ids)
+        .select_related('school')
+        .prefetch_related(*MENU_PREFETCH)
+        .order_by('school__name', 'week_start')
+    )
+    rules, stock = _contexts({menu.school_id for menu in menus})
+    index = get_supply_index()
+    contexts = {}
+    results = []
+    for menu in menus:
+        context = contexts.get(menu.school_id)
+        if context is None:
+            context = contexts[menu.school_id] = CalculationContext(
+                menu.school,
+                rules=rules[menu.school_id],
+                stock=stock[menu.school_id],
+                index=index,
+            )
+        students = options['students_by_school'].get(str(menu.school_id)) or options['students_by_meal_type']
+        result = calculate_for_menu(
+            menu,
+            students,
+            waste_percent=options['waste_percent'],
+            include_stock=options['include_stock'],
+            rounding=options['rounding'],
+            context=context,
+        )
+        result['school_name'] = menu.school.name
+        results.append(result)
+    return results
+
+
+def _run_in_worker(menu_ids, options):
+    try:
+        return _calculate_menus(menu_ids, options)
+    finally:
+        connections.close_all()
+
+
+def _district_totals(results) -> list[dict]:
+    """Sum of every school's weekly totals per supply and unit."""
+    totals = {}
+    for result in results:
+        for row in result['totals_week']:
+            total = totals.setdefault((row['supply_id'], row['unit']), {
+                'supply_id': row['supply_id'],
+                'supply_name': row['supply_name'],
+                'unit': row['unit'],
+                'qty_needed': Decimal('0'),
+                'stock_shortage': None,
+                'schools': set(),
+            })
+            total['qty_needed'] += Decimal(str(row['qty_needed']))
+            # Stock at one school does not cover another, so shortages add up.
+            if row['stock_shortage'] is not None:
+                total['stock_shortage'] = (total['stock_shortage'] or Decimal('0')) + Decimal(str(row['stock_shortage']))
+            total['schools'].add(result['school_id'])
+    return [
+        {
+            **total,
+            'qty_needed': float(total['qty_needed']),
+            'stock_shortage': float(total['stock_shortage']) if total['stock_shortage'] is not None else None,
+            'schools': len(total['schools']),
+        }
+        for total in sorted(totals.values(), key=lambda total: (total['supply_name'], total['unit']))
+    ]
+
+
+def calculate_district(
+    menus,
+    students_by_meal_type: dict,
+    students_by_school: dict | None = None,
+    waste_percent=0,
+    include_stock=True,
+    rounding=None,
+    workers: int = 1,
+) -> dict:
+    """Production needs of ``menus`` per school and consolidated for the district.
+
+    ``students_by_school`` maps a school id to its own ``students_by_meal_type``;
+    schools left out use the shared one.
+    """
+    options = {
+        'students_by_meal_type': students_by_meal_type or {},
+        'students_by_school': {str(key): value for key, value in (students_by_school or {}).items()},
+        'waste_percent': waste_percent,
+        'include_stock': include_stock,
+        'rounding': rounding or {'mode': 'NEAREST', 'decimals': 2},
+    }
+    menu_ids = list(menus.values_list('pk', flat=True))
+    if workers > 1 and len(menu_ids) > 1:
+        chunks = [chunk for chunk in (menu_ids[index::workers] for index in range(workers)) if chunk]
+        # Children inherit the supply index, but not the parent's connections.
+        get_supply_index()
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            results = [
+                result
+                for chunk_results in pool.map(_run_in_worker, chunks, [options] * len(chunks))
+                for result in chunk_results
+            ]
+        results.sort(key=lambda result: (result['school_name'], result['week_start']))
+    else:
+        results = _calculate_menus(menu_ids, options)
+
+    return {
+        'menus_count': len(results),
+        'schools_count': len({result['school_id'] for result in results}),
+        'waste_percent': float(_to_decimal(waste_percent)),
+        'include_stock': bool(include_stock),
+        'results': results,
+        'totals': _district_totals(results),
+    }
@@ -2,18 +2,26 @@ from __future__ import annotations
 
 from collections import defaultdict
 from decimal import Decimal, ROUND_CEILING, ROUND_HALF_UP
+from functools import cached_property
+import hashlib
 import re
 import unicodedata
+import uuid
 
-from django.db.models import Q
+from django.db.models import Exists, Q
 
-from inventory.models import SchoolStockBalance, Supply
+from inventory.models import SchoolStockBalance
 from menus.models import Menu, MenuItem
-from production.models import SupplyAlias, SupplyConsumptionRule
+from production.models import SupplyCatalogVersion, SupplyConsumptionRule
+
+from .supply_index import get_supply_index, issue_warning
 
 
 ZERO = Decimal('0')
 ONE_HUNDRED = Decimal('100')
+# What calculate_for_menu reads from a menu; preloaded menus must carry it.
+MENU_PREFETCH = ('items__recipe__ingredients__supply', 'items__recipe')
+PARSED_FIELDS = ['parsed_ingredients', 'parsed_digest', 'parsed_catalog_version']
 
 
 def normalize_text(s: str) -> str:
@@ -39,6 +47,46 @@ def parse_ingredients_from_description(description: str) -> list[str]:
     return tokens
 
 
+def description_digest(description: str) -> str:
+    return hashlib.sha256((description or '').encode()).hexdigest()
+
+
+def refresh_parsed_ingredients(item: MenuItem, index, force=False) -> bool:
+    """Parse and resolve ``item.description`` unless the stored result is current.
+
+    Returns whether the item changed; saving it is up to the caller.
+    """
+    digest = description_digest(item.description)
+    if not force and item.parsed_digest == digest and item.parsed_catalog_version == index.catalog_version:
+        return False
+    parsed = []
+    for token in parse_ingredients_from_description(item.description):
+        supply, issue = index.resolve_token(token)
+        parsed.append({'token': token, 'supply_id': str(supply.id) if supply else None, 'issue': issue})
+    item.parsed_ingredients = parsed
+    item.parsed_digest = digest
+    item.parsed_catalog_version = index.catalog_version
+    return True
+
+
+def save_parsed_items(items, index) -> int:
+    """Save reparsed ``items``, unless the catalog moved past ``index`` meanwhile.
+
+    A worker whose index is behind would store an older parse over a newer one,
+    and the stored parse would flip between workers. The version is compared in
+    the UPDATE itself. Returns how many rows were saved.
+    """
+    items = list(items)
+    if not items:
+        return 0
+    versions = SupplyCatalogVersion.objects.filter(pk=1)
+    if index.catalog_version:
+        current = Exists(versions.filter(version=index.catalog_version))
+    else:
+        current = ~Exists(versions.filter(version__gt=0))
+    return MenuItem.objects.filter(current).bulk_update(items, PARSED_FIELDS)
+
+
 def _to_decimal(value) -> Decimal:
     if isinstance(value, Decimal):
         return value
@@ -63,24 +111,7 @@ def _convert_qty(value: Decimal, unit_from: str, unit_to: str):
 
 
 def resolve_supply_from_text(token: str, warnings: list[str] | None = None):
-    normalized = normalize_text(token)
-    if not normalized:
-        return None
-    alias = SupplyAlias.objects.select_related('supply').filter(alias=normalized).first()
-    if alias:
-        return alias.supply
-
-    candidates = list(Supply.objects.filter(is_active=True).filter(name__icontains=normalized).order_by('name')[:3])
-    if not candidates and ' ' in normalized:
-        simplified = normalized.split(' ')[0]
-        candidates = list(Supply.objects.filter(is_active=True).filter(name__icontains=simplified).order_by('name')[:3])
-    if len(candidates) == 1:
-        return candidates[0]
-    if len(candidates) > 1 and warnings is not None:
-        warnings.append(f'Alias ambiguo para token "{token}".')
-    elif warnings is not None:
-        warnings.append(f'Insumo nao encontrado para token "{token}".')
-    return None
+    return get_supply_index().resolve(token, warnings=warnings)
 
 
 def get_rule(school, supply, meal_type: str):
@@ -101,6 +132,71 @@ def get_stock_available(school, supply):
     return _to_decimal(balance.quantity) if balance else ZERO
 
 
+class CalculationContext:
+    """Lookups for one calculation, bulk-loaded once instead of queried per token.
+
+    Mirrors ``resolve_supply_from_text``, ``get_rule`` and ``get_stock_available``
+    for a single school. Supply names go through the process-wide supply index;
+    rules and stock are read the first time they are needed.
+    """
+
+    def __init__(self, school, *, rules=None, stock=None, index=None):
+        self.school = school
+        self.reparsed = {}
+        # Batch callers load rules, stock and the index for many schools at once.
+        if rules is not None:
+            self.rules = rules
+        if stock is not None:
+            self.stock = stock
+        if index is not None:
+            self.index = index
+
+    @cached_property
+    def index(self):
+        return get_supply_index()
+
+    @cached_property
+    def rules(self) -> dict:
+        rules = SupplyConsumptionRule.objects.filter(school=self.school, active=True)
+        return {(rule.supply_id, rule.meal_type): rule for rule in rules}
+
+    @cached_property
+    def stock(self) -> dict:
+        balances = SchoolStockBalance.objects.filter(school=self.school).values_list('supply_id', 'quantity')
+        return {supply_id: _to_decimal(quantity) for supply_id, quantity in balances}
+
+    def resolve_supply(self, token: str, warnings: list[str] | None = None):
+        return self.index.resolve(token, warnings=warnings)
+
+    def parsed_ingredients(self, item: MenuItem, warnings: list[str]) -> list[tuple[str, object]]:
+        """``(token, supply)`` pairs of a FREE_TEXT item, from its stored parse when current."""
+        if refresh_parsed_ingredients(item, self.index):
+            self.reparsed[item.pk] = item
+        pairs = []
+        for entry in item.parsed_ingredients:
+            supply = self.index.supplies.get(uuid.UUID(entry['supply_id'])) if entry['supply_id'] else None
+            if entry['supply_id'] and supply is None:
+                # Catalog changed through a bulk write that did not bump the version.
+                refresh_parsed_ingredients(item, self.index, force=True)
+                self.reparsed[item.pk] = item
+                return self.parsed_ingredients(item, warnings)
+            if entry['issue']:
+                warnings.append(issue_warning(entry['token'], entry['issue']))
+            pairs.append((entry['token'], supply))
+        return pairs
+
+    def save_parsed(self) -> None:
+        if self.reparsed:
+            save_parsed_items(self.reparsed.values(), self.index)
+            self.reparsed = {}
+
+    def rule(self, supply, meal_type: str):
+        return self.rules.get((supply.id, meal_type)) or self.rules.get((supply.id, ''))
+
+    def stock_available(self, supply):
+        return self.stock.get(supply.id, ZERO)
+
+
 def _round_decimal(value: Decimal, rounding: dict | None):
     rounding = rounding or {}
     mode = str(rounding.get('mode') or 'NEAREST').upper()
@@ -128,18 +224,31 @@ def _serialize_decimal(value: Decimal | None):
     return float(value)
 
 
-def calculate_for_menu(menu: Menu, students_by_meal_type: dict, waste_percent=0, include_stock=True, rounding=None) -> dict:
+def calculate_for_menu(
+    menu: Menu,
+    students_by_meal_type: dict,
+    waste_percent=0,
+    include_stock=True,
+    rounding=None,
+    context: CalculationContext | None = None,
+) -> dict:
+    """Production needs of one menu.
+
+    With a ``context``, ``menu`` is used as given and must already have its
+    school and the ``MENU_PREFETCH`` relations loaded.
+    """
     warnings: list[str] = []
     waste_factor = Decimal('1') + (_to_decimal(waste_percent) / ONE_HUNDRED)
-    menu = Menu.objects.select_related('school').prefetch_related(
-        'items__recipe__ingredients__supply',
-        'items__recipe',
-    ).get(pk=menu.pk)
+    if context is None:
+        menu = Menu.objects.select_related('school').prefetch_related(*MENU_PREFETCH).get(pk=menu.pk)
+        context = CalculationContext(menu.school)
 
     days_map: dict[str, list[dict]] = defaultdict(list)
     totals_map: dict[tuple[str, str], dict] = {}
+    supplies_by_id = {}
 
-    for item in menu.items.all().order_by('day_of_week', 'meal_type', 'created_at'):
+    items = sorted(menu.items.all(), key=lambda item: (item.day_of_week, item.meal_type, item.created_at))
+    for item in items:
         students = _students_for_meal(students_by_meal_type or {}, item.meal_type, warnings)
         meal_result = {
             'meal_type': item.meal_type,
@@ -158,6 +267,7 @@ def calculate_for_menu(menu: Menu, students_by_meal_type: dict, waste_percent=0,
                 qty_needed_raw = _to_decimal(ri.qty_base) * scale_factor * waste_factor
                 qty_needed = _round_decimal(qty_needed_raw, rounding)
                 key = (str(ri.supply_id), ri.unit)
+                supplies_by_id[key[0]] = ri.supply
                 entry = meal_agg.setdefault(key, {
                     'supply_id': str(ri.supply_id),
                     'supply_name': ri.supply.name,
@@ -172,14 +282,14 @@ def calculate_for_menu(menu: Menu, students_by_meal_type: dict, waste_percent=0,
                 entry['qty_needed_raw'] += qty_needed_raw
                 entry['qty_needed'] += qty_needed
         else:
-            tokens = parse_ingredients_from_description(item.description)
-            if not tokens:
+            parsed = context.parsed_ingredients(item, warnings)
+            if not parsed:
                 warnings.append(f'Item {item.id} sem receita e sem ingredientes parseaveis.')
-            for token in tokens:
-                supply = resolve_supply_from_text(token, warnings=warnings)
+            for _, supply in parsed:
                 if not supply:
                     continue
-                rule = get_rule(menu.school, supply, item.meal_type)
+                supplies_by_id[str(supply.id)] = supply
+                rule = context.rule(supply, item.meal_type)
                 if not rule:
                     key = (str(supply.id), supply.unit)
                     meal_agg.setdefault(key, {
@@ -216,8 +326,8 @@ def calculate_for_menu(menu: Menu, students_by_meal_type: dict, waste_percent=0,
         for key, entry in sorted(meal_agg.items(), key=lambda kv: kv[1]['supply_name']):
             supply_id, unit = key
             if include_stock:
-                supply_obj = Supply.objects.filter(id=supply_id).first()
-                stock_qty = get_stock_available(menu.school, supply_obj) if supply_obj else ZERO
+                supply_obj = supplies_by_id.get(supply_id)
+                stock_qty = context.stock_available(supply_obj) if supply_obj else ZERO
                 if supply_obj and supply_obj.unit != unit:
                     converted = _convert_qty(stock_qty, supply_obj.unit, unit)
                     if converted is None:
@@ -262,6 +372,8 @@ def calculate_for_menu(menu: Menu, students_by_meal_type: dict, waste_percent=0,
         meal_result['ingredients'] = ingredients
         days_map[item.day_of_week].append(meal_result)
 
+    context.save_parsed()
+
     totals_week = []
     for _, total in sorted(totals_map.items(), key=lambda kv: kv[1]['supply_name']):
         if include_stock and total['stock_available'] is not None:
@@ -0,0 +1,210 @@
+"""
+In-memory index of supply names and aliases for free-text resolution.
+
+Menu descriptions are matched against every active supply name and every
+``SupplyAlias``, normalized the same way as the parsed tokens. Each entry is
+posted under its words and its character trigrams; a lookup only scores the
+entries that share one of them. The score blends how many of the query words
+the entry covers (prefixes count, for typeahead) with the trigram similarity,
+so "feijao cariocca" still finds "Feijão Carioca".
+
+Each process keeps its own index. Supply and alias saves bump the
+``SupplyCatalogVersion`` row in the same transaction, and every worker compares
+its index with that row (one primary-key read) before using it, so a change
+made by any process is seen by all of them once committed. Bulk writes send no
+signals, so SUPPLY_INDEX_MAX_AGE bounds how long they can go unnoticed.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db.models import F
+
+from inventory.models import Supply
+from production.models import SupplyAlias, SupplyCatalogVersion
+
+STOPWORDS = {'e', 'com', 'de', 'da', 'do', 'das', 'dos'}
+# Below this score a token is reported as not found.
+MIN_SCORE = 0.5
+# Below this score an entry is not worth suggesting at all.
+SUGGEST_MIN_SCORE = 0.2
+# Candidates scoring within this margin of the best one make the token ambiguous.
+AMBIGUITY_MARGIN = 0.05
+AMBIGUOUS = 'ambiguous'
+NOT_FOUND = 'not_found'
+
+
+def _normalize(text: str) -> str:
+    # Imported here: production_calc imports this module.
+    from .production_calc import normalize_text
+
+    return normalize_text(text)
+
+
+def _words(text: str) -> list[str]:
+    return [word for word in text.split(' ') if word and word not in STOPWORDS]
+
+
+def _trigrams(text: str) -> frozenset[str]:
+    trigrams = set()
+    for word in text.split(' '):
+        padded = f'  {word} '
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(trigrams)
+
+
+@dataclass(frozen=True)
+class _Entry:
+    supply_id: object
+    text: str
+    words: tuple[str, ...]
+    trigrams: frozenset[str]
+
+
+@dataclass(frozen=True)
+class SupplyMatch:
+    supply: Supply
+    matched: str
+    score: float
+
+
+def catalog_version() -> int:
+    return SupplyCatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def bump_catalog_version() -> None:
+    if not SupplyCatalogVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        SupplyCatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+def issue_warning(token: str, issue: str) -> str:
+    if issue == AMBIGUOUS:
+        return f'Alias ambiguo para token "{token}".'
+    return f'Insumo nao encontrado para token "{token}".'
+
+
+class SupplyIndex:
+    def __init__(self, supplies, aliases, catalog_version=0):
+        self.catalog_version = catalog_version
+        self.supplies = {}
+        self.aliases = {}
+        self.names = defaultdict(set)
+        self.entries: list[_Entry] = []
+        self.word_postings = defaultdict(set)
+        self.trigram_postings = defaultdict(set)
+        for supply in supplies:
+            normalized = self._add(supply, supply.name)
+            if normalized:
+                self.names[normalized].add(supply.id)
+        for alias in aliases:
+            normalized = self._add(alias.supply, alias.alias)
+            if normalized:
+                self.aliases[normalized] = alias.supply_id
+
+    def _add(self, supply, text):
+        normalized = _normalize(text)
+        if not normalized:
+            return ''
+        self.supplies[supply.id] = supply
+        entry = _Entry(supply.id, normalized, tuple(dict.fromkeys(_words(normalized))), _trigrams(normalized))
+        position = len(self.entries)
+        self.entries.append(entry)
+        for word in entry.words:
+            self.word_postings[word].add(position)
+        for trigram in entry.trigrams:
+            self.trigram_postings[trigram].add(position)
+        return normalized
+
+    @classmethod
+    def build(cls):
+        # Version first: rows committed after this read only make the version look older.
+        version = catalog_version()
+        return cls(
+            Supply.objects.filter(is_active=True).order_by('name'),
+            SupplyAlias.objects.select_related('supply').order_by('alias'),
+            catalog_version=version,
+        )
+
+    def search(self, text: str, limit: int = 10) -> list[SupplyMatch]:
+        """Supplies ranked by similarity to ``text``, best first, one row per supply."""
+        normalized = _normalize(text)
+        words = _words(normalized)
+        if not words:
+            return []
+        words = list(dict.fromkeys(words))
+        trigrams = _trigrams(' '.join(words))
+        shared = defaultdict(int)
+        for trigram in trigrams:
+            for position in self.trigram_postings.get(trigram, ()):
+                shared[position] += 1
+        word_hits = defaultdict(int)
+        for word in words:
+            for position in self.word_postings.get(word, ()):
+                word_hits[position] += 1
+
+        last = words[-1]
+        best: dict = {}
+        for position, common in shared.items():
+            entry = self.entries[position]
+            covered = word_hits.get(position, 0)
+            # The last word may still be being typed.
+            if last not in entry.words and any(own.startswith(last) for own in entry.words):
+                covered += 1
+            similarity = 2 * common / (len(trigrams) + len(entry.trigrams))
+            score = 1.0 if entry.text == normalized else round(0.5 * covered / len(words) + 0.5 * similarity, 4)
+            if score < SUGGEST_MIN_SCORE:
+                continue
+            current = best.get(entry.supply_id)
+            if current is None or score > current.score:
+                best[entry.supply_id] = SupplyMatch(self.supplies[entry.supply_id], entry.text, score)
+        ranked = sorted(best.values(), key=lambda match: (-match.score, match.supply.name))
+        return ranked[:limit]
+
+    def resolve_token(self, token: str):
+        """``(supply, issue)`` for ``token``; ``issue`` is ``AMBIGUOUS``, ``NOT_FOUND`` or ``''``."""
+        normalized = _normalize(token)
+        if not normalized:
+            return None, ''
+        if normalized in self.aliases:
+            return self.supplies[self.aliases[normalized]], ''
+        exact = self.names.get(normalized, set())
+        if len(exact) == 1:
+            return self.supplies[next(iter(exact))], ''
+
+        candidates = [match for match in self.search(normalized, limit=2) if match.score >= MIN_SCORE]
+        if len(exact) > 1 or (len(candidates) > 1 and candidates[0].score - candidates[1].score < AMBIGUITY_MARGIN):
+            return None, AMBIGUOUS
+        if candidates:
+            return candidates[0].supply, ''
+        return None, NOT_FOUND
+
+    def resolve(self, token: str, warnings: list[str] | None = None):
+        supply, issue = self.resolve_token(token)
+        if issue and warnings is not None:
+            warnings.append(issue_warning(token, issue))
+        return supply
+
+
+_lock = threading.Lock()
+_state = {'index': None, 'built_at': 0.0}
+
+
+def get_supply_index() -> SupplyIndex:
+    version = catalog_version()
+    with _lock:
+        index = _state['index']
+        expired = time.monotonic() - _state['built_at'] > settings.SUPPLY_INDEX_MAX_AGE
+        if index is None or index.catalog_version != version or expired:
+            _state['index'] = SupplyIndex.build()
+            _state['built_at'] = time.monotonic()
+        return _state['index']
+
+
+def invalidate_supply_index() -> None:
+    """Drop this process's index; other processes notice the catalog version."""
+    with _lock:
+        _state['index'] = None
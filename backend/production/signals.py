@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from inventory.models import Supply
+
+from .models import SupplyAlias
+from .services.supply_index import bump_catalog_version, invalidate_supply_index
+
+
+def _invalidate_supply_index(sender, **kwargs):
+    # The catalog version moves in the same transaction as the change, so other
+    # processes rebuild once it commits. This process drops its index now, and
+    # again after commit so it does not keep one rebuilt mid-transaction.
+    bump_catalog_version()
+    invalidate_supply_index()
+    transaction.on_commit(invalidate_supply_index)
+
+
+for model in (Supply, SupplyAlias):
+    post_save.connect(_invalidate_supply_index, sender=model, dispatch_uid=f'production-index-{model._meta.label_lower}-save')
+    post_delete.connect(_invalidate_supply_index, sender=model, dispatch_uid=f'production-index-{model._meta.label_lower}-delete')
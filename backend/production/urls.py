@@ -1,11 +1,19 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import PublicCalculatorLinkViewSet, SupplyAliasViewSet, SupplyConsumptionRuleViewSet
+from .views import (
+    DistrictProductionCalculateView,
+    PublicCalculatorLinkViewSet,
+    SupplyAliasViewSet,
+    SupplyConsumptionRuleViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'aliases', SupplyAliasViewSet, basename='production-alias')
 router.register(r'rules', SupplyConsumptionRuleViewSet, basename='production-rule')
 router.register(r'public-links', PublicCalculatorLinkViewSet, basename='production-public-link')
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('district/calculate/', DistrictProductionCalculateView.as_view(), name='production-district-calculate'),
+] + router.urls
 
@@ -1,17 +1,21 @@
-from datetime import date
-
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from rest_framework import permissions, viewsets
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from accounts.permissions import IsSemedAdmin
 from menus.models import Menu
+from menus.services import current_published_menu
+from production.services.batch import calculate_district, select_menus
 from production.services.production_calc import calculate_for_menu
+from production.services.supply_index import get_supply_index
 
 from .models import PublicCalculatorLink, SupplyAlias, SupplyConsumptionRule
 from .serializers import (
+    DistrictProductionCalculateSerializer,
     MenuProductionCalculateSerializer,
     PublicCalculatorCalculateSerializer,
     PublicCalculatorLinkSerializer,
@@ -24,6 +28,7 @@ class SupplyAliasViewSet(viewsets.ModelViewSet):
     queryset = SupplyAlias.objects.select_related('supply').all().order_by('alias')
     serializer_class = SupplyAliasSerializer
     permission_classes = [permissions.IsAuthenticated, IsSemedAdmin]
+    cursor_ordering = 'alias'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -35,11 +40,39 @@ class SupplyAliasViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(supply_id=supply)
         return queryset
 
+    @action(detail=False, methods=['get'])
+    def typeahead(self, request):
+        """Ranked supply suggestions for a menu token, from the in-memory supply index."""
+        q = (request.query_params.get('q') or '').strip()
+        try:
+            limit = int(request.query_params.get('limit') or 10)
+        except ValueError:
+            raise ValidationError({'limit': 'Parametro limit invalido.'})
+        if not 1 <= limit <= 50:
+            raise ValidationError({'limit': 'Parametro limit deve estar entre 1 e 50.'})
+        if not q:
+            return Response([])
+        return Response([
+            {
+                'supply_id': str(match.supply.id),
+                'supply_name': match.supply.name,
+                'unit': match.supply.unit,
+                'matched': match.matched,
+                'score': match.score,
+            }
+            for match in get_supply_index().search(q, limit=limit)
+        ])
+
 
 class SupplyConsumptionRuleViewSet(viewsets.ModelViewSet):
-    queryset = SupplyConsumptionRule.objects.select_related('school', 'supply').all()
+    # The model's ordering, annotated: the cursor reads its position from an attribute of the row.
+    queryset = SupplyConsumptionRule.objects.select_related('school', 'supply').annotate(
+        school_name=F('school__name'),
+        supply_name=F('supply__name'),
+    )
     serializer_class = SupplyConsumptionRuleSerializer
     permission_classes = [permissions.IsAuthenticated, IsSemedAdmin]
+    cursor_ordering = ('school_name', 'supply_name', 'meal_type')
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -66,6 +99,31 @@ class PublicCalculatorLinkViewSet(viewsets.ModelViewSet):
         return queryset
 
 
+class DistrictProductionCalculateView(APIView):
+    """Production needs of every selected school and week, with district totals."""
+    permission_classes = [permissions.IsAuthenticated, IsSemedAdmin]
+
+    def post(self, request):
+        serializer = DistrictProductionCalculateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        payload = serializer.validated_data
+        menus = select_menus(
+            payload['week_start'],
+            payload.get('week_end'),
+            schools=payload['schools'],
+            include_drafts=payload['include_drafts'],
+        )
+        result = calculate_district(
+            menus,
+            students_by_meal_type=payload.get('students_by_meal_type') or {},
+            students_by_school=payload['students_by_school'],
+            waste_percent=payload.get('waste_percent') or 0,
+            include_stock=payload.get('include_stock', True),
+            rounding=payload.get('rounding') or {'mode': 'NEAREST', 'decimals': 2},
+        )
+        return Response(result)
+
+
 class PublicCalculatorMetaView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -74,17 +132,7 @@ class PublicCalculatorMetaView(APIView):
         if not link.is_active:
             raise PermissionDenied('Token inativo.')
 
-        today = date.today()
-        menu = (
-            Menu.objects.filter(
-                school=link.school,
-                status=Menu.Status.PUBLISHED,
-                week_start__lte=today,
-                week_end__gte=today,
-            )
-            .order_by('-week_start')
-            .first()
-        ) or Menu.objects.filter(school=link.school, status=Menu.Status.PUBLISHED).order_by('-week_start').first()
+        menu = current_published_menu(link.school)
 
         current_menu = None
         if menu:
@@ -10,18 +10,21 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from inventory.models import Delivery, SchoolStockBalance, StockBalance, StockMovement, Supply
+from inventory.models import Delivery, SchoolStockBalance, StockMovement, Supply
 from inventory.models import DeliveryItemLot, LotBalanceSchool, SupplyLot
 from inventory.serializers import (
     DeliveryConferenceInputSerializer,
     PublicConsumptionInputSerializer,
     PublicDeliverySerializer,
     SupplySerializer,
+    prefetch_delivery_tree,
 )
+from inventory.services.ledger import CENTRAL, SCHOOL, InsufficientStock, LedgerEntry, post_movements
 from inventory.services.lots import credit_lot_school, debit_lot_central, debit_lot_school, fefo_suggestion_service
+from menus.cache import menu_json, menu_pdf, not_modified, with_cache_headers
 from menus.models import MealServiceEntry, MealServiceReport, Menu, MenuItem
-from menus.serializers import MenuSerializer
-from menus.utils import generate_menu_pdf
+from menus.services import current_published_menu, current_published_menus
+from menus.signals import meal_service_reported
 from production.serializers import MenuProductionCalculateSerializer
 from production.services.production_calc import calculate_for_menu
 from schools.models import School
@@ -44,27 +47,19 @@ class PublicSchoolListView(APIView):
         # List schools that have at least one published menu.
         # The public page may be accessed on weekends/holidays, when no menu
         # matches "current week" strictly.
-        schools_with_menu = School.objects.filter(
-            is_active=True,
-            menus__status=Menu.Status.PUBLISHED,
-        ).distinct().order_by('name')
-        
-        today = date.today()
-        data = []
-        for s in schools_with_menu:
-            menus = s.menus.filter(status=Menu.Status.PUBLISHED)
-            current_menu = menus.filter(week_start__lte=today, week_end__gte=today).order_by('-week_start').first()
-            if not current_menu:
-                current_menu = menus.order_by('-week_start').first()
-            
-            data.append({
-                'id': str(s.id), 
-                'name': s.name, 
-                'slug': s.public_slug, 
+        schools = School.objects.filter(is_active=True).order_by('name')
+        current_menus = current_published_menus(schools)
+        data = [
+            {
+                'id': str(s.id),
+                'name': s.name,
+                'slug': s.public_slug,
                 'city': s.city,
-                'author_name': current_menu.author_name if current_menu else ''
-            })
-            
+                'author_name': current_menus[s.id].author_name,
+            }
+            for s in schools
+            if s.id in current_menus
+        ]
         return Response(data)
 
 
@@ -101,30 +96,20 @@ class PublicMenuCurrentView(APIView):
             reference_date = date.fromisoformat(raw_date) if raw_date else date.today()
         except ValueError:
             return Response({'detail': 'Data inválida. Use YYYY-MM-DD.'}, status=400)
-        queryset = Menu.objects.prefetch_related('items').filter(
-            school=school,
-            status=Menu.Status.PUBLISHED,
-        )
-
-        # Prefer the menu that matches the provided date (or today).
-        menu = queryset.filter(
-            week_start__lte=reference_date,
-            week_end__gte=reference_date,
-        ).order_by('-week_start').first()
-
         # When a specific date is requested, do not fallback to another week.
+        # Otherwise fall back to the latest published menu when no current-week
+        # menu exists (e.g., weekends or gaps in publication calendar).
+        menu = current_published_menu(school, reference_date, fallback=not raw_date)
+
         if not menu and raw_date:
             return Response({'detail': 'Nenhum cardápio publicado para a data informada.'}, status=404)
 
-        # Fallback to latest published menu when no current-week menu exists
-        # (e.g., weekends or gaps in publication calendar).
-        if not menu:
-            menu = queryset.order_by('-week_start').first()
-
         if not menu:
             return Response({'detail': 'Nenhum cardápio publicado para esta escola.'}, status=404)
-        
-        return Response(MenuSerializer(menu).data)
+
+        menu.school = school
+        data, etag = menu_json(menu, request)
+        return not_modified(request, etag) or with_cache_headers(Response(data), etag)
 
 
 class PublicProductionCalculatorView(APIView):
@@ -171,15 +156,19 @@ class PublicMenuPdfView(PublicBaseView):
         if not week_start:
             raise PermissionDenied('week_start obrigatorio.')
         menu = get_object_or_404(
-            Menu.objects.prefetch_related('items'),
+            Menu,
             school=school,
             status=Menu.Status.PUBLISHED,
             week_start=week_start,
         )
-        response = HttpResponse(content_type='application/pdf')
+        menu.school = school
+        content, etag = menu_pdf(menu)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        response = HttpResponse(content, content_type='application/pdf')
         response['Content-Disposition'] = 'attachment; filename=\"menu.pdf\"'
-        generate_menu_pdf(menu, response)
-        return response
+        return with_cache_headers(response, etag)
 
 
 class PublicMenuByWeekView(PublicBaseView):
@@ -191,18 +180,21 @@ class PublicMenuByWeekView(PublicBaseView):
         if not week_start:
             raise PermissionDenied('week_start obrigatorio.')
         menu = get_object_or_404(
-            Menu.objects.prefetch_related('items'),
+            Menu,
             school=school,
             status=Menu.Status.PUBLISHED,
             week_start=week_start,
         )
-        return Response(MenuSerializer(menu).data)
+        menu.school = school
+        data, etag = menu_json(menu, request)
+        # The link carries the school token, so shared caches must not keep it.
+        return not_modified(request, etag) or with_cache_headers(Response(data), etag, public=False)
 
 
 
 class PublicDeliveryCurrentView(PublicBaseView):
     def _get_delivery(self, school, delivery_id=None):
-        queryset = Delivery.objects.prefetch_related('items__supply').filter(
+        queryset = prefetch_delivery_tree(Delivery.objects.all()).filter(
             school=school,
             conference_enabled=True,
         )
@@ -219,7 +211,7 @@ class PublicDeliveryCurrentView(PublicBaseView):
         delivery_id = request.query_params.get('delivery_id')
         self._validate_token(school, token)
         delivery = self._get_delivery(school, delivery_id=delivery_id)
-        return Response(PublicDeliverySerializer(delivery).data)
+        return Response(PublicDeliverySerializer(delivery, context={'request': request}).data)
 
     def post(self, request, slug):
         school = get_object_or_404(School, public_slug=slug)
@@ -251,7 +243,7 @@ class PublicDeliveryCurrentView(PublicBaseView):
                 delivery.sender_signed_by = sender_name
                 delivery.status = Delivery.Status.IN_CONFERENCE
                 delivery.save(update_fields=['sender_signature', 'sender_signed_by', 'status', 'updated_at'])
-                return Response(PublicDeliverySerializer(delivery).data)
+                return Response(PublicDeliverySerializer(delivery, context={'request': request}).data)
 
             elif step == 'items':
                 payload_items = serializer.validated_data.get('items')
@@ -310,7 +302,7 @@ class PublicDeliveryCurrentView(PublicBaseView):
                                 row.received_quantity = row.planned_quantity
                                 row.divergence_note = ''
                                 row.save(update_fields=['received_quantity', 'divergence_note'])
-                return Response(PublicDeliverySerializer(delivery).data)
+                return Response(PublicDeliverySerializer(delivery, context={'request': request}).data)
 
             elif step == 'receiver':
                 receiver_sig = serializer.validated_data.get('receiver_signature_data')
@@ -331,28 +323,23 @@ class PublicDeliveryCurrentView(PublicBaseView):
                             if row.received_quantity is None:
                                 raise PermissionDenied(f'Lote pendente de conferencia.')
 
+                ledger_entries = []
                 for item in delivery_items:
-                    school_balance, _ = SchoolStockBalance.objects.select_for_update().get_or_create(
-                        school=school,
-                        supply=item.supply,
-                        defaults={'quantity': 0}
-                    )
-                    school_balance.quantity += item.received_quantity
-                    school_balance.save()
                     lot_rows = list(DeliveryItemLot.objects.select_related('lot').filter(delivery_item=item))
                     for row in lot_rows:
                         received_lot_qty = row.received_quantity
                         if received_lot_qty > 0:
                             credit_lot_school(school=school, lot=row.lot, quantity=received_lot_qty)
-                    StockMovement.objects.create(
+                    ledger_entries.append(LedgerEntry(
                         supply=item.supply,
                         school=school,
+                        balance=SCHOOL,
                         type=StockMovement.Types.IN,
                         quantity=item.received_quantity,
                         movement_date=delivery.delivery_date,
                         note=f"Entrada confirmada da entrega {delivery.id}.",
-                        created_by=delivery.created_by,
-                    )
+                        created_by_id=delivery.created_by_id,
+                    ))
 
                 for item in delivery_items:
                     lot_rows = list(DeliveryItemLot.objects.select_for_update().select_related('lot').filter(delivery_item=item))
@@ -374,43 +361,45 @@ class PublicDeliveryCurrentView(PublicBaseView):
                                 debit_lot_central(row.lot, movement_quantity)
                                 movement_type = StockMovement.Types.OUT
                                 movement_note = f"Ajuste de conferencia por lote (excesso) da entrega {delivery.id} lote {row.lot.lot_code}."
-                            StockMovement.objects.create(
+                            # Lot adjustments only touch lot balances; the movement is recorded as is.
+                            ledger_entries.append(LedgerEntry(
                                 supply=item.supply,
                                 school=school,
+                                balance=None,
                                 type=movement_type,
                                 quantity=movement_quantity,
                                 movement_date=delivery.delivery_date,
                                 note=movement_note,
-                                created_by=delivery.created_by,
-                            )
+                                created_by_id=delivery.created_by_id,
+                            ))
                         continue
 
                     adjustment = item.planned_quantity - item.received_quantity
                     if adjustment == 0:
                         continue
-                    balance, _ = StockBalance.objects.select_for_update().get_or_create(supply=item.supply)
                     if adjustment > 0:
-                        balance.quantity += adjustment
                         movement_type = StockMovement.Types.IN
                         movement_note = f"Ajuste de conferencia (falta) da entrega {delivery.id}."
                         movement_quantity = adjustment
                     else:
                         movement_quantity = abs(adjustment)
-                        if balance.quantity - movement_quantity < 0:
-                            raise PermissionDenied('Saldo insuficiente para ajustar a conferencia.')
-                        balance.quantity -= movement_quantity
                         movement_type = StockMovement.Types.OUT
                         movement_note = f"Ajuste de conferencia (excesso) da entrega {delivery.id}."
-                    balance.save()
-                    StockMovement.objects.create(
+                    ledger_entries.append(LedgerEntry(
                         supply=item.supply,
                         school=school,
+                        balance=CENTRAL,
                         type=movement_type,
                         quantity=movement_quantity,
                         movement_date=delivery.delivery_date,
                         note=movement_note,
-                        created_by=delivery.created_by,
-                    )
+                        created_by_id=delivery.created_by_id,
+                    ))
+
+                try:
+                    post_movements(ledger_entries)
+                except InsufficientStock:
+                    raise PermissionDenied('Saldo insuficiente para ajustar a conferencia.')
 
                 delivery.status = Delivery.Status.CONFERRED
                 delivery.conference_submitted_at = timezone.now()
@@ -450,7 +439,7 @@ class PublicDeliveryCurrentView(PublicBaseView):
                     )
 
         delivery = self._get_delivery(school, delivery_id=delivery_id)
-        return Response(PublicDeliverySerializer(delivery).data)
+        return Response(PublicDeliverySerializer(delivery, context={'request': request}).data)
 
 
 
@@ -499,6 +488,7 @@ class PublicConsumptionView(PublicBaseView):
 
         low_stock_items = []
         with transaction.atomic():
+            ledger_entries = []
             for entry in items:
                 supply = supplies.get(str(entry['supply']))
                 # Try lot-level FEFO only when lot balances exist for this school/supply (compatibility mode).
@@ -514,36 +504,34 @@ class PublicConsumptionView(PublicBaseView):
                     )
                     for allocation in allocations:
                         debit_lot_school(school=school, lot=allocation.lot, quantity=allocation.quantity)
-                # Update school stock balance
-                school_balance, _ = SchoolStockBalance.objects.select_for_update().get_or_create(
-                    school=school,
-                    supply=supply,
-                    defaults={'quantity': 0}
-                )
-                if school_balance.quantity - entry['quantity'] < 0:
-                    raise PermissionDenied(f"Estoque insuficiente de {supply.name} na escola.")
-                school_balance.quantity -= entry['quantity']
-                school_balance.save()
-                
-                # Check if stock is now low (use school-specific min_stock if set, otherwise supply's)
-                min_stock = school_balance.min_stock if school_balance.min_stock > 0 else supply.min_stock
-                if school_balance.quantity < min_stock:
-                    low_stock_items.append({
-                        'supply_name': supply.name,
-                        'quantity': school_balance.quantity,
-                        'min_stock': min_stock,
-                    })
-                
-                StockMovement.objects.create(
+                ledger_entries.append(LedgerEntry(
                     supply=supply,
                     school=school,
+                    balance=SCHOOL,
                     type=StockMovement.Types.OUT,
                     quantity=entry['quantity'],
                     movement_date=entry['movement_date'],
                     note=entry.get('note', ''),
                     created_by_id=created_by,
-                )
-            
+                ))
+
+            # Update school stock balances
+            try:
+                posting = post_movements(ledger_entries)
+            except InsufficientStock as exc:
+                raise PermissionDenied(f"Estoque insuficiente de {exc.entry.supply.name} na escola.")
+
+            # Check if stock is now low (school-specific min_stock if set, otherwise supply's)
+            for supply in {ledger_entry.supply.pk: ledger_entry.supply for ledger_entry in ledger_entries}.values():
+                school_balance = posting.school_balance(school, supply)
+                if school_balance.is_low_stock:
+                    low_stock_items.append({
+                        'supply_name': supply.name,
+                        'quantity': school_balance.quantity,
+                        'min_stock': school_balance.effective_min_stock,
+                    })
+
+
             # Create notification for low stock items
             if low_stock_items:
                 from inventory.models import Notification
@@ -597,19 +585,12 @@ class PublicMealServiceView(PublicBaseView):
     }
 
     def _resolve_menu(self, school, service_date):
-        queryset = Menu.objects.prefetch_related('items').filter(
-            school=school,
-            status=Menu.Status.PUBLISHED,
+        return current_published_menu(
+            school,
+            service_date,
+            prefer_past=True,
+            queryset=Menu.objects.prefetch_related('items'),
         )
-        menu = queryset.filter(
-            week_start__lte=service_date,
-            week_end__gte=service_date,
-        ).order_by('-week_start').first()
-        if not menu:
-            menu = queryset.filter(week_start__lte=service_date).order_by('-week_start').first()
-        if not menu:
-            menu = queryset.order_by('-week_start').first()
-        return menu
 
     def _build_categories(self, menu, service_date):
         if not menu:
@@ -717,6 +698,7 @@ class PublicMealServiceView(PublicBaseView):
                     for item in provided_items
                 ]
             )
+            meal_service_reported.send(sender=MealServiceReport, report=report)
 
         total_served = sum(item['served_count'] for item in provided_items)
         return Response(
@@ -1,6 +1,7 @@
-from django.db import models
 from rest_framework import permissions, viewsets
 from accounts.permissions import IsSemedAdmin
+from search.backends import matching_ids
+from search.models import SearchDocument
 
 from .models import Recipe
 from .serializers import RecipeSerializer
@@ -10,6 +11,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.prefetch_related('ingredients__supply').all().order_by('name')
     serializer_class = RecipeSerializer
     permission_classes = [permissions.IsAuthenticated, IsSemedAdmin]
+    cursor_ordering = 'name'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -21,8 +23,5 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if category:
             queryset = queryset.filter(category__iexact=category)
         if search:
-            queryset = queryset.filter(
-                models.Q(name__icontains=search) |
-                models.Q(instructions__icontains=search)
-            ).distinct()
+            queryset = queryset.filter(pk__in=matching_ids(SearchDocument.EntityType.RECIPE, search))
         return queryset
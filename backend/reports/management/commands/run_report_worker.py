@@ -0,0 +1,65 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from reports.models import ReportJob
+from reports.services import claim_next_job, purge_report_artifacts, requeue_stuck_jobs, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Processa a fila de relatorios PDF e remove do armazenamento os PDFs de relatorios '
+        'desatualizados (executar como processo separado, supervisionado).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Processa os pendentes e encerra.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Segundos de espera com a fila vazia.')
+        parser.add_argument(
+            '--purge-interval',
+            type=float,
+            default=600.0,
+            help='Segundos entre as limpezas de PDFs desatualizados.',
+        )
+
+    def handle(self, *args, **options):
+        last_purge = None
+        while True:
+            # Like a request: drop connections the database closed or that exceeded CONN_MAX_AGE.
+            close_old_connections()
+            try:
+                if last_purge is None or time.monotonic() - last_purge >= options['purge_interval']:
+                    last_purge = time.monotonic()
+                    purged = purge_report_artifacts()
+                    if purged:
+                        self.stdout.write(f'{purged} PDF(s) desatualizado(s) removido(s).')
+                requeued = requeue_stuck_jobs()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'{requeued} relatorio(s) recolocado(s) na fila.'))
+                job = claim_next_job()
+            except Exception:
+                if options['once']:
+                    raise
+                logger.exception('Falha ao consultar a fila de relatorios.')
+                time.sleep(options['sleep'])
+                continue
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            try:
+                job = run_job(job)
+            except Exception:
+                # Left RUNNING; requeue_stuck_jobs retries it after REPORT_JOB_TIMEOUT.
+                logger.exception('Falha ao processar o relatorio %s.', job.id)
+                self.stdout.write(self.style.ERROR(f'Relatorio {job.id} ({job.kind}) interrompido por erro.'))
+                continue
+            if job.status == ReportJob.Status.DONE:
+                self.stdout.write(self.style.SUCCESS(f'Relatorio {job.id} ({job.kind}) gerado.'))
+            else:
+                self.stdout.write(self.style.ERROR(f'Relatorio {job.id} ({job.kind}) falhou: {job.error}'))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:16
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('STOCK', 'Estoque'), ('DELIVERIES', 'Entregas'), ('DELIVERY_DIVERGENCES', 'Divergencias de entrega'), ('CONSUMPTION', 'Consumo'), ('SUPPLIER_RECEIPTS', 'Recebimentos de fornecedores')], max_length=32)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('PENDING', 'Pendente'), ('RUNNING', 'Processando'), ('DONE', 'Concluido'), ('FAILED', 'Falhou')], default='PENDING', max_length=16)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('artifact', models.CharField(blank=True, max_length=128)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='reports_rep_status_051565_idx'), models.Index(fields=['kind', 'is_stale'], name='reports_rep_kind_c320ad_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_stale', False), models.Q(('status', 'FAILED'), _negated=True)), fields=('fingerprint',), name='unique_live_report_job')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+class ReportJob(models.Model):
+    """A PDF report rendered by ``run_report_worker``.
+
+    Jobs with the same ``fingerprint`` (kind plus normalized filters) share one
+    artifact until the data behind the report changes and the job is marked stale.
+    """
+
+    class Kinds(models.TextChoices):
+        STOCK = 'STOCK', 'Estoque'
+        DELIVERIES = 'DELIVERIES', 'Entregas'
+        DELIVERY_DIVERGENCES = 'DELIVERY_DIVERGENCES', 'Divergencias de entrega'
+        CONSUMPTION = 'CONSUMPTION', 'Consumo'
+        SUPPLIER_RECEIPTS = 'SUPPLIER_RECEIPTS', 'Recebimentos de fornecedores'
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pendente'
+        RUNNING = 'RUNNING', 'Processando'
+        DONE = 'DONE', 'Concluido'
+        FAILED = 'FAILED', 'Falhou'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=32, choices=Kinds.choices)
+    params = models.JSONField(default=dict, blank=True)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    is_stale = models.BooleanField(default=False)
+    artifact = models.CharField(max_length=128, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='report_jobs',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # At most one live job per filter set; failed and stale jobs are history.
+            models.UniqueConstraint(
+                fields=['fingerprint'],
+                condition=models.Q(is_stale=False) & ~models.Q(status='FAILED'),
+                name='unique_live_report_job',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['kind', 'is_stale']),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.kind} {self.status} ({self.created_at.isoformat()})'
@@ -0,0 +1,36 @@
+from django.urls import reverse
+from rest_framework import serializers
+
+from .models import ReportJob
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id',
+            'kind',
+            'params',
+            'status',
+            'is_stale',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+            'download_url',
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != ReportJob.Status.DONE:
+            return None
+        url = reverse('report-job-download', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ReportJobRequestSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=ReportJob.Kinds.choices)
+    params = serializers.DictField(required=False, default=dict)
@@ -0,0 +1,191 @@
+"""
+DB-backed queue for the PDF reports.
+
+The export views render ReportLab canvases inline, which ties up a web worker
+for as long as the report takes. Here a request only records a ``ReportJob``;
+``run_report_worker`` claims pending jobs, renders them with the same view code
+and stores the PDF in the blob store. Requests for a filter set that already
+has a live job get that job back instead of a new render. The worker also
+removes the PDFs of stale and expired jobs from the store
+(``purge_report_artifacts``).
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import uuid
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from inventory.views import (
+    ConsumptionExportPdfView,
+    DeliveryDivergenceExportPdfView,
+    DeliveryExportPdfView,
+    StockExportPdfView,
+    SupplierReceiptExportPdfView,
+)
+from merenda_semed.blobs import blob_name, delete_blob, put_blob
+
+from .models import ReportJob
+
+Kinds = ReportJob.Kinds
+
+REPORT_VIEWS = {
+    Kinds.STOCK: StockExportPdfView,
+    Kinds.DELIVERIES: DeliveryExportPdfView,
+    Kinds.DELIVERY_DIVERGENCES: DeliveryDivergenceExportPdfView,
+    Kinds.CONSUMPTION: ConsumptionExportPdfView,
+    Kinds.SUPPLIER_RECEIPTS: SupplierReceiptExportPdfView,
+}
+
+# Filters each report reads from its query string.
+REPORT_FILTERS = {
+    Kinds.STOCK: (),
+    Kinds.DELIVERIES: ('school', 'status', 'date_from', 'date_to'),
+    Kinds.DELIVERY_DIVERGENCES: ('school', 'status', 'date_from', 'date_to'),
+    Kinds.CONSUMPTION: ('supply', 'school', 'date_from', 'date_to'),
+    Kinds.SUPPLIER_RECEIPTS: ('supplier', 'school', 'status', 'date_from', 'date_to'),
+}
+
+MAX_ATTEMPTS = 3
+
+
+def normalize_params(kind: str, raw: dict) -> dict:
+    """Keep the filters the report understands, validated and as strings."""
+    params = {}
+    errors = {}
+    for key in REPORT_FILTERS[kind]:
+        value = raw.get(key)
+        if value in (None, ''):
+            continue
+        value = str(value).strip()
+        try:
+            if key in ('date_from', 'date_to'):
+                value = date.fromisoformat(value).isoformat()
+            elif key in ('school', 'supply', 'supplier'):
+                value = str(uuid.UUID(value))
+        except ValueError:
+            errors[key] = 'Valor invalido.'
+            continue
+        params[key] = value
+    if errors:
+        raise ValidationError({'params': errors})
+    return params
+
+
+def fingerprint_for(kind: str, params: dict) -> str:
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+
+
+def _live_job(fingerprint: str):
+    job = (
+        ReportJob.objects.filter(fingerprint=fingerprint, is_stale=False)
+        .exclude(status=ReportJob.Status.FAILED)
+        .first()
+    )
+    if job is None:
+        return None
+    max_age = timedelta(seconds=settings.REPORT_ARTIFACT_MAX_AGE)
+    if job.status == ReportJob.Status.DONE and timezone.now() - job.finished_at > max_age:
+        # Bulk writes send no signals; the age limit bounds how stale a cached PDF can get.
+        ReportJob.objects.filter(pk=job.pk).update(is_stale=True)
+        return None
+    return job
+
+
+def request_report(kind: str, raw_params: dict, user=None) -> tuple[ReportJob, bool]:
+    """Return the live job for these filters, queueing a new one when there is none."""
+    params = normalize_params(kind, raw_params)
+    fingerprint = fingerprint_for(kind, params)
+    job = _live_job(fingerprint)
+    if job is not None:
+        return job, False
+    try:
+        with transaction.atomic():
+            job = ReportJob.objects.create(
+                kind=kind,
+                params=params,
+                fingerprint=fingerprint,
+                requested_by=user,
+            )
+    except IntegrityError:
+        # Another request queued the same filters first.
+        return _live_job(fingerprint), False
+    return job, True
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it (``None`` when idle)."""
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    with transaction.atomic():
+        job = (
+            ReportJob.objects.select_for_update(skip_locked=skip_locked)
+            .filter(status=ReportJob.Status.PENDING)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ReportJob.Status.RUNNING
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'attempts'])
+    return job
+
+
+def run_job(job: ReportJob) -> ReportJob:
+    buffer = io.BytesIO()
+    try:
+        REPORT_VIEWS[job.kind]().render(job.params, buffer)
+        artifact = put_blob(buffer.getvalue(), 'application/pdf')
+    except Exception as exc:  # noqa: BLE001 - any render error is recorded on the job
+        job.error = f'{type(exc).__name__}: {exc}'
+        job.status = ReportJob.Status.PENDING if job.attempts < MAX_ATTEMPTS else ReportJob.Status.FAILED
+        job.finished_at = timezone.now() if job.status == ReportJob.Status.FAILED else None
+        job.save(update_fields=['error', 'status', 'finished_at'])
+        return job
+    job.artifact = artifact
+    job.error = ''
+    job.status = ReportJob.Status.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['artifact', 'error', 'status', 'finished_at'])
+    return job
+
+
+def requeue_stuck_jobs() -> int:
+    """Put back jobs whose worker died mid-render."""
+    cutoff = timezone.now() - timedelta(seconds=settings.REPORT_JOB_TIMEOUT)
+    return ReportJob.objects.filter(
+        status=ReportJob.Status.RUNNING,
+        started_at__lt=cutoff,
+    ).update(status=ReportJob.Status.PENDING)
+
+
+def mark_reports_stale(kinds) -> None:
+    # Pending jobs have not read the data yet, so only running and finished ones go stale.
+    ReportJob.objects.filter(
+        kind__in=kinds,
+        is_stale=False,
+        status__in=[ReportJob.Status.RUNNING, ReportJob.Status.DONE],
+    ).update(is_stale=True)
+
+
+def purge_report_artifacts() -> int:
+    """Delete the PDFs of stale and expired jobs from the blob store; returns how many were deleted."""
+    expired = timezone.now() - timedelta(seconds=settings.REPORT_ARTIFACT_MAX_AGE)
+    finished = ReportJob.objects.filter(status=ReportJob.Status.DONE).exclude(artifact='')
+    old = finished.filter(Q(is_stale=True) | Q(finished_at__lt=expired))
+    # Blobs are content-addressed: a live job may hold the same PDF.
+    live = set(finished.filter(is_stale=False, finished_at__gte=expired).values_list('artifact', flat=True))
+    artifacts = set(old.values_list('artifact', flat=True)) - live
+    if not artifacts:
+        return 0
+    deleted = sum(delete_blob(blob_name(artifact)) for artifact in artifacts)
+    old.filter(artifact__in=artifacts).update(artifact='')
+    return deleted
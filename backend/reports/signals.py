@@ -0,0 +1,53 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from inventory.models import (
+    Delivery,
+    DeliveryItem,
+    StockBalance,
+    StockMovement,
+    Supplier,
+    SupplierReceipt,
+    SupplierReceiptItem,
+    Supply,
+)
+from inventory.signals import stock_movements_posted
+from schools.models import School
+
+from .models import ReportJob
+from .services import mark_reports_stale
+
+Kinds = ReportJob.Kinds
+
+# Reports that read each model. The ledger moves balances with queryset updates,
+# so stock reports are also invalidated by stock_movements_posted;
+# REPORT_ARTIFACT_MAX_AGE covers the remaining bulk writes.
+REPORT_SOURCES = {
+    Delivery: (Kinds.DELIVERIES, Kinds.DELIVERY_DIVERGENCES),
+    DeliveryItem: (Kinds.DELIVERIES, Kinds.DELIVERY_DIVERGENCES),
+    School: (Kinds.DELIVERIES, Kinds.DELIVERY_DIVERGENCES, Kinds.CONSUMPTION, Kinds.SUPPLIER_RECEIPTS),
+    StockBalance: (Kinds.STOCK,),
+    StockMovement: (Kinds.STOCK, Kinds.CONSUMPTION),
+    Supplier: (Kinds.SUPPLIER_RECEIPTS,),
+    SupplierReceipt: (Kinds.SUPPLIER_RECEIPTS,),
+    SupplierReceiptItem: (Kinds.SUPPLIER_RECEIPTS,),
+    Supply: tuple(Kinds.values),
+}
+
+
+def _invalidate(kinds):
+    def receiver(sender, **kwargs):
+        transaction.on_commit(partial(mark_reports_stale, kinds))
+    return receiver
+
+
+# Receivers are kept alive here; signals only hold weak references.
+_receivers = {model: _invalidate(kinds) for model, kinds in REPORT_SOURCES.items()}
+
+for model, receiver in _receivers.items():
+    post_save.connect(receiver, sender=model, dispatch_uid=f'reports-{model._meta.label_lower}-save')
+    post_delete.connect(receiver, sender=model, dispatch_uid=f'reports-{model._meta.label_lower}-delete')
+
+stock_movements_posted.connect(_receivers[StockMovement], dispatch_uid='reports-movements-posted')
@@ -0,0 +1,8 @@
+from rest_framework.routers import DefaultRouter
+
+from .views import ReportJobViewSet
+
+router = DefaultRouter()
+router.register(r'jobs', ReportJobViewSet, basename='report-job')
+
+urlpatterns = router.urls
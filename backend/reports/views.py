@@ -0,0 +1,56 @@
+from django.http import FileResponse, Http404
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from merenda_semed.authentication import QueryParamJWTAuthentication
+from merenda_semed.blobs import blob_name, blob_path
+
+from .models import ReportJob
+from .serializers import ReportJobRequestSerializer, ReportJobSerializer
+from .services import REPORT_VIEWS, request_report
+
+
+class ReportJobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = ReportJob.objects.all()
+    serializer_class = ReportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def create(self, request):
+        serializer = ReportJobRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job, _ = request_report(
+            serializer.validated_data['kind'],
+            serializer.validated_data['params'],
+            user=request.user,
+        )
+        ready = job.status == ReportJob.Status.DONE
+        return Response(
+            self.get_serializer(job).data,
+            status=status.HTTP_200_OK if ready else status.HTTP_202_ACCEPTED,
+        )
+
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path='download',
+        authentication_classes=[QueryParamJWTAuthentication],
+    )
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ReportJob.Status.DONE:
+            return Response({'detail': 'Relatorio ainda nao foi gerado.'}, status=status.HTTP_409_CONFLICT)
+        name = blob_name(job.artifact)
+        if name is None:
+            # Removed by purge_report_artifacts.
+            raise Http404
+        try:
+            handle = open(blob_path(name), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        return FileResponse(
+            handle,
+            as_attachment=True,
+            filename=REPORT_VIEWS[job.kind].filename,
+            content_type='application/pdf',
+        )
@@ -1,17 +1,23 @@
+from django.db.models import Count, F, Q
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from inventory.models import SchoolStockBalance
 from inventory.serializers import SchoolStockBalanceSerializer
+from inventory.services.snapshots import annotate_as_of, parse_as_of
+from merenda_semed.mixins import SparseFieldsetsMixin
+from search.backends import matching_ids
+from search.models import SearchDocument
 from .models import School, generate_token
 from .serializers import SchoolSerializer
 
 
-class SchoolViewSet(viewsets.ModelViewSet):
+class SchoolViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = School.objects.all().order_by('name')
     serializer_class = SchoolSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = 'name'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -20,7 +26,7 @@ class SchoolViewSet(viewsets.ModelViewSet):
         address = self.request.query_params.get('address')
         is_active = self.request.query_params.get('is_active')
         if query:
-            queryset = queryset.filter(name__icontains=query)
+            queryset = queryset.filter(pk__in=matching_ids(SearchDocument.EntityType.SCHOOL, query))
         if city:
             queryset = queryset.filter(city__icontains=city)
         if address:
@@ -52,22 +58,31 @@ class SchoolViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def stock(self, request, pk=None):
-        """Returns the stock balance for this school."""
+        """Returns the stock balance for this school; ``?as_of=`` for the end of a past day."""
         school = self.get_object()
-        balances = SchoolStockBalance.objects.select_related('supply').filter(
+        as_of = parse_as_of(request.query_params.get('as_of'))
+        balances = SchoolStockBalance.objects.select_related('school', 'supply').filter(
             school=school
         ).order_by('supply__category', 'supply__name')
-        
-        # Calculate summary stats
-        total = balances.count()
-        low_stock = sum(1 for b in balances if b.quantity < (b.min_stock if b.min_stock > 0 else b.supply.min_stock))
-        
+        quantity = 'quantity'
+        if as_of:
+            balances = annotate_as_of(balances, as_of)
+            quantity = 'as_of_quantity'
+
+        summary = balances.order_by().aggregate(
+            total=Count('pk'),
+            low_stock=Count('pk', filter=Q(**{f'{quantity}__lt': F('effective_min_stock')})),
+        )
+        total = summary['total']
+        low_stock = summary['low_stock']
+
         serializer = SchoolStockBalanceSerializer(balances, many=True)
         return Response({
             'school': {
                 'id': str(school.id),
                 'name': school.name,
             },
+            'as_of': as_of.isoformat() if as_of else None,
             'summary': {
                 'total_items': total,
                 'low_stock': low_stock,
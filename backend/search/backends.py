@@ -0,0 +1,75 @@
+"""
+Ranked matching of ``SearchDocument`` rows, per database.
+
+Every query term is matched as a prefix, so results show up while typing, and
+all terms must match. Postgres stems them with its ``portuguese`` dictionary
+against the ``search_vector`` column (title weighted over body) and ranks with
+``ts_rank_cd``. SQLite matches the light stems of search/text.py against the
+FTS5 table and ranks with ``bm25``. Other databases fall back to ``LIKE`` on the
+normalized text, unranked. So do queries made only of stop words, which have
+no terms to match; a query without any letter or digit matches everything.
+"""
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import SearchDocument
+from .text import normalize, stem, terms
+
+FTS_TABLE = 'search_searchdocument_fts'
+# bm25 column weights: title_text, body_text.
+FTS_WEIGHTS = (10.0, 1.0)
+
+
+def _postgres(documents, words):
+    query = ' & '.join(f'{word}:*' for word in words)
+    tsquery = "to_tsquery('portuguese', %s)"
+    return documents.filter(
+        RawSQL(f'search_vector @@ {tsquery}', [query], output_field=BooleanField())
+    ).annotate(
+        rank=RawSQL(f'ts_rank_cd(search_vector, {tsquery})', [query], output_field=FloatField())
+    )
+
+
+def _sqlite(documents, words):
+    query = ' '.join(f'"{stem(word)}"*' for word in words)
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    # Unqualified "id": Django aliases the table when this becomes a subquery.
+    return documents.filter(
+        RawSQL(f'id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)', [query], output_field=BooleanField())
+    ).annotate(
+        rank=RawSQL(
+            f'(SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = id)',
+            [query],
+            output_field=FloatField(),
+        )
+    )
+
+
+def _fallback(documents, words):
+    for word in words:
+        documents = documents.filter(Q(title_text__contains=word) | Q(body_text__contains=word))
+    return documents.annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+BACKENDS = {
+    'postgresql': _postgres,
+    'sqlite': _sqlite,
+}
+
+
+def search_documents(query: str, entity_types=None):
+    """Documents matching ``query``, annotated with ``rank``; best first."""
+    documents = SearchDocument.objects.all()
+    if entity_types is not None:
+        documents = documents.filter(entity_type__in=list(entity_types))
+    words = terms(query)
+    if not words:
+        # "de", "da": matched as text, as the icontains filters did.
+        return _fallback(documents, normalize(query).split()).order_by('title')
+    return BACKENDS.get(connection.vendor, _fallback)(documents, words).order_by('-rank', 'title')
+
+
+def matching_ids(entity_type: str, query: str):
+    """Subquery of the ids of ``entity_type`` objects matching ``query``, for ``pk__in``."""
+    return search_documents(query, [entity_type]).order_by().values('object_id')
@@ -0,0 +1,110 @@
+"""
+What each searchable model puts in its ``SearchDocument``.
+
+Saves and deletes keep the documents current (search/signals.py). Writes that
+send no signals (``QuerySet.update``, ``bulk_create``, renaming a school, which
+changes the title of its deliveries) are picked up by ``rebuild_search_index``.
+"""
+from dataclasses import dataclass
+from typing import Callable
+
+from django.apps import apps as global_apps
+from django.db import transaction
+
+from .models import SearchDocument
+from .text import normalize
+
+REBUILD_BATCH_SIZE = 500
+
+
+@dataclass(frozen=True)
+class Entity:
+    type: str
+    model: str
+    # obj -> (title, subtitle, other searchable texts)
+    build: Callable
+    select_related: tuple = ()
+
+
+def _supply(obj):
+    return obj.name, obj.category, [obj.storage_instructions]
+
+
+def _school(obj):
+    return obj.name, obj.city, [obj.address]
+
+
+def _recipe(obj):
+    return obj.name, obj.category, [obj.instructions]
+
+
+def _delivery(obj):
+    return (
+        f'Entrega {obj.school.name}',
+        str(obj.delivery_date),
+        [obj.responsible_name, obj.notes],
+    )
+
+
+ENTITIES = {
+    entity.type: entity
+    for entity in (
+        Entity(SearchDocument.EntityType.SUPPLY, 'inventory.Supply', _supply),
+        Entity(SearchDocument.EntityType.SCHOOL, 'schools.School', _school),
+        Entity(SearchDocument.EntityType.RECIPE, 'recipes.Recipe', _recipe),
+        Entity(SearchDocument.EntityType.DELIVERY, 'inventory.Delivery', _delivery, ('school',)),
+    )
+}
+
+
+def entity_for_model(model):
+    label = model._meta.label
+    return next((entity for entity in ENTITIES.values() if entity.model == label), None)
+
+
+def document_values(entity: Entity, obj) -> dict:
+    title, subtitle, texts = entity.build(obj)
+    return {
+        'title': title[:255],
+        'subtitle': (subtitle or '')[:255],
+        'title_text': normalize(title),
+        'body_text': normalize(' '.join(filter(None, [subtitle, *texts]))),
+    }
+
+
+def index_object(entity: Entity, obj):
+    values = document_values(entity, obj)
+    current = (
+        SearchDocument.objects.filter(entity_type=entity.type, object_id=obj.pk)
+        .values('title', 'subtitle', 'title_text', 'body_text')
+        .first()
+    )
+    if current is None:
+        SearchDocument.objects.create(entity_type=entity.type, object_id=obj.pk, **values)
+    elif current != values:
+        # Unchanged documents are left alone: an update also rewrites the search index.
+        SearchDocument.objects.filter(entity_type=entity.type, object_id=obj.pk).update(**values)
+
+
+def remove_object(entity: Entity, obj):
+    SearchDocument.objects.filter(entity_type=entity.type, object_id=obj.pk).delete()
+
+
+def rebuild_index(get_model=global_apps.get_model) -> dict:
+    """Recreate every document; ``get_model`` lets migrations pass historical models."""
+    Document = get_model('search', 'SearchDocument')
+    counts = {}
+    for entity in ENTITIES.values():
+        app_label, model_name = entity.model.split('.')
+        rows = get_model(app_label, model_name).objects.select_related(*entity.select_related).order_by('pk')
+        with transaction.atomic():
+            Document.objects.filter(entity_type=entity.type).delete()
+            batch = []
+            counts[entity.type] = 0
+            for obj in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+                batch.append(Document(entity_type=entity.type, object_id=obj.pk, **document_values(entity, obj)))
+                if len(batch) >= REBUILD_BATCH_SIZE:
+                    counts[entity.type] += len(Document.objects.bulk_create(batch))
+                    batch = []
+            counts[entity.type] += len(Document.objects.bulk_create(batch))
+    return counts
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from search.documents import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Recria o indice de busca de insumos, escolas, receitas e entregas.'
+
+    def handle(self, *args, **options):
+        counts = rebuild_index()
+        summary = ', '.join(f'{entity}: {count}' for entity, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Indice de busca recriado ({summary}).'))
@@ -0,0 +1,86 @@
+from django.db import migrations
+
+import search.documents
+
+TABLE = 'search_searchdocument'
+FTS_TABLE = f'{TABLE}_fts'
+
+POSTGRES_FORWARD = [
+    f"""
+    ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese', title_text), 'A')
+        || setweight(to_tsvector('portuguese', body_text), 'B')
+    ) STORED
+    """,
+    f'CREATE INDEX {TABLE}_vector_gin ON {TABLE} USING gin (search_vector)',
+]
+POSTGRES_REVERSE = [
+    f'DROP INDEX IF EXISTS {TABLE}_vector_gin',
+    f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector',
+]
+
+# External-content FTS5 table: the text lives in TABLE, the triggers keep the index in step.
+SQLITE_FORWARD = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title_text, body_text, content='{TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, title_text, body_text) VALUES (new.id, new.title_text, new.body_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title_text, body_text)
+        VALUES ('delete', old.id, old.title_text, old.body_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title_text, body_text)
+        VALUES ('delete', old.id, old.title_text, old.body_text);
+        INSERT INTO {FTS_TABLE} (rowid, title_text, body_text) VALUES (new.id, new.title_text, new.body_text);
+    END
+    """,
+]
+SQLITE_REVERSE = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def create_index(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD})
+
+
+def drop_index(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE})
+
+
+def build_documents(apps, schema_editor):
+    search.documents.rebuild_index(apps.get_model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('inventory', '0017_event_stream_indexes'),
+        ('recipes', '0001_initial'),
+        ('schools', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable text of one supply, school, recipe or delivery (see search/documents.py).
+
+    ``title_text`` and ``body_text`` are lowercased and without accents. The
+    database keeps its own index over them: a generated ``search_vector``
+    column with a GIN index on Postgres, the ``search_searchdocument_fts``
+    FTS5 table on SQLite (migration 0002).
+    """
+
+    class EntityType(models.TextChoices):
+        SUPPLY = 'supply', 'Insumo'
+        SCHOOL = 'school', 'Escola'
+        RECIPE = 'recipe', 'Receita'
+        DELIVERY = 'delivery', 'Entrega'
+
+    entity_type = models.CharField(max_length=20, choices=EntityType.choices)
+    object_id = models.UUIDField()
+    title = models.CharField(max_length=255)
+    subtitle = models.CharField(max_length=255, blank=True)
+    title_text = models.TextField(blank=True)
+    body_text = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entity_type', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.entity_type}: {self.title}"
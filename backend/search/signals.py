@@ -0,0 +1,23 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+from .documents import ENTITIES, index_object, remove_object
+
+
+def _connect(entity):
+    model = apps.get_model(entity.model)
+
+    def saved(sender, instance, **kwargs):
+        if kwargs.get('raw'):
+            return
+        index_object(entity, instance)
+
+    def deleted(sender, instance, **kwargs):
+        remove_object(entity, instance)
+
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=f'search-index-{entity.type}')
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=f'search-remove-{entity.type}')
+
+
+for _entity in ENTITIES.values():
+    _connect(_entity)
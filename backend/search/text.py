@@ -0,0 +1,38 @@
+"""Text normalization shared by indexed documents and queries."""
+import re
+import unicodedata
+
+STOPWORDS = {'a', 'o', 'e', 'as', 'os', 'com', 'de', 'da', 'do', 'das', 'dos', 'em', 'na', 'no', 'para'}
+# Longest first; a suffix is only removed when at least MIN_STEM letters remain.
+SUFFIXES = (
+    'amentos', 'imentos', 'amento', 'imento', 'acoes', 'icoes', 'mente', 'coes', 'soes',
+    'oes', 'aes', 'ais', 'eis', 'ois', 'ao', 'ns', 'es', 'as', 'os', 'a', 'e', 'o', 's',
+)
+MIN_STEM = 3
+
+
+def normalize(text: str) -> str:
+    """Lowercase ``text`` without accents or punctuation."""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'[^a-z0-9]+', ' ', text)
+    return text.strip()
+
+
+def terms(query: str) -> list[str]:
+    return [word for word in normalize(query).split(' ') if word and word not in STOPWORDS]
+
+
+def stem(word: str) -> str:
+    """
+    Light Portuguese stemmer for the SQLite backend.
+
+    Only plural, gender and a few derivational endings are removed; the stem is
+    then matched as a prefix, so "feijoes" and "feijao" both find "feij*".
+    """
+    if word.isdigit():
+        return word
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[:-len(suffix)]
+    return word
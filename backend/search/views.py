@@ -0,0 +1,54 @@
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.permissions import IsSemedAdmin
+
+from .backends import search_documents
+from .models import SearchDocument
+from .text import normalize
+
+# Recipes are only listed for SEMED admins (see recipes/views.py).
+ADMIN_ONLY_TYPES = {SearchDocument.EntityType.RECIPE}
+
+
+class SearchView(APIView):
+    """Ranked results across supplies, schools, recipes and deliveries."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _types(self, request):
+        allowed = set(SearchDocument.EntityType.values)
+        if not IsSemedAdmin().has_permission(request, self):
+            allowed -= ADMIN_ONLY_TYPES
+        raw = (request.query_params.get('types') or '').strip()
+        if not raw:
+            return allowed
+        requested = {value.strip() for value in raw.split(',') if value.strip()}
+        unknown = requested - set(SearchDocument.EntityType.values)
+        if unknown:
+            raise ValidationError({'types': f'Tipos invalidos: {", ".join(sorted(unknown))}.'})
+        return requested & allowed
+
+    def get(self, request):
+        q = (request.query_params.get('q') or '').strip()
+        try:
+            limit = int(request.query_params.get('limit') or 20)
+        except ValueError:
+            raise ValidationError({'limit': 'Parametro limit invalido.'})
+        if not 1 <= limit <= 50:
+            raise ValidationError({'limit': 'Parametro limit deve estar entre 1 e 50.'})
+        types = self._types(request)
+        if not normalize(q) or not types:
+            return Response({'results': []})
+        documents = search_documents(q, types)[:limit]
+        return Response({'results': [
+            {
+                'type': document.entity_type,
+                'id': str(document.object_id),
+                'title': document.title,
+                'subtitle': document.subtitle,
+                'rank': document.rank,
+            }
+            for document in documents
+        ]})
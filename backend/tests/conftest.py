@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def synchronous_audit_log(settings):
+    # The buffered audit writer inserts from its own thread and connection,
+    # which cannot see rows inside the per-test transaction.
+    settings.AUDIT_LOG_BUFFERED = False
@@ -0,0 +1,113 @@
+import gzip
+import json
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from auditlog.models import AuditLog
+from inventory.models import Notification
+from merenda_semed.archive import _append, encode_row, partition_path, read_archive
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def archive_root(settings, tmp_path):
+    settings.ARCHIVE_ROOT = str(tmp_path / 'archive')
+    settings.BLOB_ROOT = str(tmp_path / 'blobs')
+    settings.AUDIT_LOG_RETENTION_DAYS = 90
+
+
+@pytest.fixture
+def users():
+    User = get_user_model()
+    admin = User.objects.create(email='admin-archive@semed.local', name='Admin', role=User.Roles.SEMED_ADMIN, is_staff=True)
+    nutritionist = User.objects.create(email='nutri-archive@semed.local', name='Nutri', role=User.Roles.NUTRITIONIST)
+    return admin, nutritionist
+
+
+def _log(user, days_ago, path='/api/schools/'):
+    return AuditLog.objects.create(
+        user=user,
+        action_type=AuditLog.ActionTypes.CREATE,
+        method='POST',
+        path=path,
+        status_code=201,
+        request_payload={'name': f'Escola {days_ago}'},
+        payload_after={'name': f'Escola {days_ago}', 'id': days_ago},
+        created_at=timezone.now() - timedelta(days=days_ago),
+    )
+
+
+def test_archive_moves_old_rows_in_batches(users):
+    _, nutritionist = users
+    old_logs = [_log(nutritionist, days) for days in (200, 150, 120)]
+    recent = _log(nutritionist, 5)
+    notification = Notification.objects.create(
+        notification_type=Notification.NotificationType.LOT_EXPIRED, title='Lote vencido', message='...'
+    )
+    Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=400))
+
+    call_command('archive_old_records', batch_size=2)
+
+    assert list(AuditLog.objects.all()) == [recent]
+    assert not Notification.objects.exists()
+    path = partition_path(AuditLog, old_logs[0].created_at.astimezone(dt_timezone.utc).date())
+    with gzip.open(path, 'rt', encoding='utf-8') as handle:
+        record = json.loads(handle.readline())
+    assert record['id'] == str(old_logs[0].id)
+
+    archived = list(read_archive(AuditLog))
+    assert [log.id for log in archived] == [log.id for log in reversed(old_logs)]
+    assert archived[0].request_payload == {'name': 'Escola 120'}
+    assert archived[0].created_at == old_logs[2].created_at
+    assert [n.title for n in read_archive(Notification)] == ['Lote vencido']
+
+
+def test_read_archive_skips_rows_archived_twice(users):
+    _, nutritionist = users
+    log = _log(nutritionist, 100)
+    # A chunk written again after a crash between the write and the delete.
+    _append(partition_path(AuditLog, log.created_at.astimezone(dt_timezone.utc).date()), [encode_row(log)])
+    call_command('archive_old_records')
+
+    assert [archived.id for archived in read_archive(AuditLog)] == [log.id]
+
+
+def test_list_endpoint_merges_archived_entries(users, settings):
+    admin, nutritionist = users
+    _log(nutritionist, 300, path='/api/deliveries/')
+    _log(nutritionist, 200)
+    _log(nutritionist, 10)
+    _log(nutritionist, 1, path='/api/deliveries/')
+    call_command('archive_old_records')
+    assert AuditLog.objects.count() == 2
+
+    client = APIClient()
+    client.force_authenticate(user=admin)
+
+    response = client.get('/api/audit-logs/')
+    assert response.data['count'] == 2
+
+    # The archive is only read for a bounded range.
+    assert client.get('/api/audit-logs/', {'include_archived': '1'}).status_code == 400
+    date_from = timezone.localdate() - timedelta(days=365)
+    assert client.get('/api/audit-logs/', {'date_from': date_from.isoformat()}).status_code == 400
+
+    settings.AUDIT_ARCHIVE_MAX_DAYS = 400
+    response = client.get('/api/audit-logs/', {'include_archived': '1', 'date_from': date_from.isoformat(), 'page_size': 3})
+    assert response.data['count'] == 4
+    names = [entry['request_payload']['name'] for entry in response.data['results']]
+    assert names == ['Escola 1', 'Escola 10', 'Escola 200']
+    assert response.data['results'][2]['user_email'] == 'nutri-archive@semed.local'
+    response = client.get(response.data['next'])
+    assert [entry['request_payload']['name'] for entry in response.data['results']] == ['Escola 300']
+
+    # A range starting before the retention horizon reads the archive without asking.
+    response = client.get('/api/audit-logs/', {'date_from': date_from.isoformat(), 'path': 'deliveries'})
+    assert [entry['request_payload']['name'] for entry in response.data['results']] == ['Escola 1', 'Escola 300']
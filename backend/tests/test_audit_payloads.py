@@ -0,0 +1,138 @@
+import base64
+import json
+import zlib
+from pathlib import Path
+
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from auditlog.models import AuditLog
+from auditlog.payloads import BLOB_KEY, apply_diff, diff, pack, unpack
+from merenda_semed.blobs import blob_name, blob_path, blob_url, put_blob
+
+
+@pytest.fixture(autouse=True)
+def blob_root(settings, tmp_path):
+    settings.BLOB_ROOT = str(tmp_path / 'blobs')
+    settings.AUDIT_BLOB_ROOT = str(tmp_path / 'audit_blobs')
+    settings.AUDIT_LOG_BLOB_MIN_BYTES = 256
+    return Path(settings.AUDIT_BLOB_ROOT)
+
+
+def _signature(seed):
+    content = bytes(range(256)) * 8 + seed.encode()
+    return 'data:image/png;base64,' + base64.b64encode(content).decode('ascii')
+
+
+def _delivery(status, signature, items=60):
+    return {
+        'id': 'c0ffee',
+        'status': status,
+        'conference_enabled': True,
+        'sender_signature': signature,
+        'items': [
+            {'id': index, 'supply': f'Insumo {index}', 'planned_quantity': '10.00', 'received': status == 'CONFERRED'}
+            for index in range(items)
+        ],
+    }
+
+
+@pytest.mark.parametrize('before, after', [
+    ({'a': 1, 'b': [1, 2, 3]}, {'a': 1, 'b': [1, 5]}),
+    ({'a': 1, 'b': {'c': True}}, {'b': {'c': 1}, 'd': None}),
+    ([1, 2], [1, 2, {'x': 'y'}]),
+    (None, {'created': True}),
+    ({'a': 1}, None),
+    ({'a': [1, 2]}, {'a': [1, 2]}),
+])
+def test_diff_round_trip(before, after):
+    restored = apply_diff(before, diff(before, after))
+    assert json.dumps(restored, sort_keys=True) == json.dumps(after, sort_keys=True)
+
+
+def test_diff_of_equal_payloads_is_empty():
+    payload = _delivery('SENT', 'x')
+    assert diff(payload, json.loads(json.dumps(payload))) is None
+
+
+def test_pack_stores_large_values_once(blob_root):
+    signature = _signature('a')
+    before = _delivery('SENT', signature)
+    after = _delivery('CONFERRED', signature)
+    request = {'sender_signature': signature, 'status': 'CONFERRED'}
+
+    packed = pack(before, after, request)
+
+    raw = len(json.dumps([before, after, request]))
+    assert len(packed) * 10 < raw
+    assert len(list(blob_root.rglob('*.png'))) == 1
+    payloads = unpack(packed)
+    assert payloads['before'] == before
+    assert payloads['after'] == after
+    assert payloads['request'] == request
+    # Only the status and the per-item flags changed.
+    assert set(payloads['diff']['d']) == {'status', 'items'}
+
+
+def test_long_text_is_stored_as_text_blob(blob_root):
+    note = 'Observacao longa. ' * 40
+    packed = pack({'note': note}, {'note': note + 'fim'}, None)
+    payloads = unpack(packed)
+    assert payloads['after'] == {'note': note + 'fim'}
+    assert len(list(blob_root.rglob('*.txt'))) == 2
+    assert payloads['diff'] == {'d': {'note': {'v': note + 'fim'}}}
+    assert BLOB_KEY in json.loads(zlib.decompress(packed))['d']['d']['note']['v']
+
+
+@pytest.mark.django_db
+def test_audit_blobs_are_not_served(settings):
+    note = 'Dado pessoal. ' * 40
+    packed = pack(None, None, {'note': note})
+    name = blob_name(json.loads(zlib.decompress(packed))['r']['note'][BLOB_KEY])
+
+    assert not blob_path(name).exists()
+    assert APIClient().get(blob_url(name)).status_code == 404
+    assert unpack(packed)['request'] == {'note': note}
+
+
+def test_entries_written_before_the_audit_store_still_unpack():
+    note = 'Observacao antiga. ' * 40
+    ref = put_blob(note.encode('utf-8'), 'text/plain')
+    packed = zlib.compress(json.dumps({'b': None, 'd': None, 'r': {BLOB_KEY: ref}}).encode('utf-8'))
+
+    assert unpack(packed)['request'] == note
+
+
+@pytest.mark.django_db
+def test_audit_log_api_rebuilds_payloads():
+    User = get_user_model()
+    admin = User.objects.create(email='admin-audit@semed.local', name='Admin', role=User.Roles.SEMED_ADMIN, is_staff=True)
+    nutritionist = User.objects.create(email='nutri-audit@semed.local', name='Nutri', role=User.Roles.NUTRITIONIST)
+    signature = _signature('b')
+    before = _delivery('SENT', signature, items=3)
+    after = _delivery('CONFERRED', signature, items=3)
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            user=nutritionist,
+            action_type=AuditLog.ActionTypes.UPDATE,
+            method='PATCH',
+            path='/api/deliveries/c0ffee/',
+            payload_before=before,
+            payload_after=after,
+            request_payload={'status': 'CONFERRED'},
+        )
+    ])
+    log = AuditLog.objects.get()
+    assert log.payload is not None
+    assert log.payload_after == after
+
+    client = APIClient()
+    client.force_authenticate(user=admin)
+    response = client.get('/api/audit-logs/')
+    assert response.status_code == 200
+    entry = response.data['results'][0]
+    assert entry['payload_before'] == before
+    assert entry['payload_after'] == after
+    assert entry['request_payload'] == {'status': 'CONFERRED'}
+    assert entry['payload_diff']['d']['status'] == {'v': 'CONFERRED'}
@@ -0,0 +1,105 @@
+import json
+import os
+import queue
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+import auditlog.middleware
+import auditlog.views
+from auditlog.models import AuditLog
+from auditlog.writer import AuditLogWriter
+
+
+@pytest.fixture
+def writer(monkeypatch, settings, tmp_path):
+    settings.AUDIT_LOG_FALLBACK_PATH = str(tmp_path / 'audit-fallback.jsonl')
+    writer = AuditLogWriter()
+    monkeypatch.setattr(auditlog.middleware, 'audit_writer', writer)
+    monkeypatch.setattr(auditlog.views, 'audit_writer', writer)
+    yield writer
+    writer.close()
+
+
+def _nutritionist(email):
+    User = get_user_model()
+    return User.objects.create(email=email, name='Nutri', role=User.Roles.NUTRITIONIST, is_active=True)
+
+
+def _create_school(client, name):
+    response = client.post('/api/schools/', {'name': name, 'city': 'Maceio'}, format='json')
+    assert response.status_code == 201
+    return response
+
+
+@pytest.mark.django_db(transaction=True)
+def test_buffered_entries_are_written_in_batches(settings, writer):
+    settings.AUDIT_LOG_BUFFERED = True
+    settings.AUDIT_LOG_BATCH_SIZE = 2
+    settings.AUDIT_LOG_FLUSH_INTERVAL_MS = 20
+    client = APIClient()
+    client.force_authenticate(user=_nutritionist('buffered@semed.local'))
+
+    for index in range(3):
+        _create_school(client, f'Escola Buffer {index}')
+
+    deadline = time.monotonic() + 5
+    while AuditLog.objects.count() < 3 and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    logs = list(AuditLog.objects.order_by('created_at'))
+    assert [log.request_payload['name'] for log in logs] == ['Escola Buffer 0', 'Escola Buffer 1', 'Escola Buffer 2']
+    assert logs[0].payload_after['name'] == 'Escola Buffer 0'
+    stats = writer.stats()
+    assert (stats['written'], stats['queue_depth'], stats['spilled'], stats['dropped']) == (3, 0, 0, 0)
+
+
+@pytest.mark.django_db
+def test_failed_batch_spills_to_file_and_is_replayed(settings, writer, monkeypatch):
+    client = APIClient()
+    user = _nutritionist('spill@semed.local')
+    client.force_authenticate(user=user)
+
+    def failing(self, objs, **kwargs):
+        raise RuntimeError('banco indisponivel')
+
+    with monkeypatch.context() as patched:
+        patched.setattr(AuditLog.objects.__class__, 'bulk_create', failing)
+        settings.AUDIT_LOG_BUFFERED = True
+        # Queue without the background thread: drain() writes in this test's transaction.
+        writer._ensure_started = lambda: None
+        writer._queue = queue.Queue()
+        writer._pid = os.getpid()
+        _create_school(client, 'Escola Spill')
+        writer.drain()
+
+    assert writer.stats()['spilled'] == 1
+    with open(settings.AUDIT_LOG_FALLBACK_PATH, encoding='utf-8') as handle:
+        spilled = json.loads(handle.readline())
+    assert spilled['request_payload']['name'] == 'Escola Spill'
+    assert not AuditLog.objects.exists()
+
+    call_command('replay_audit_fallback')
+    call_command('replay_audit_fallback')
+
+    log = AuditLog.objects.get()
+    assert str(log.id) == spilled['id']
+    assert log.user == user
+    assert log.payload_after['name'] == 'Escola Spill'
+
+
+@pytest.mark.django_db
+def test_writer_stats_endpoint(settings, writer, tmp_path):
+    User = get_user_model()
+    admin = User.objects.create(email='stats@semed.local', name='Admin', role=User.Roles.SEMED_ADMIN, is_staff=True)
+    settings.AUDIT_LOG_FALLBACK_PATH = str(tmp_path)  # a directory: spilling fails
+    writer._spill([{'user_id': admin.pk}])
+
+    client = APIClient()
+    client.force_authenticate(user=admin)
+    response = client.get('/api/audit-logs/writer/')
+    assert response.status_code == 200
+    assert response.data['dropped'] == 1
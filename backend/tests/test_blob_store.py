@@ -0,0 +1,129 @@
+import base64
+import time
+from datetime import date, timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from inventory.models import Delivery
+from menus.models import Menu, MenuItem
+from menus.serializers import MenuItemSerializer
+from merenda_semed.blobs import blob_path, blob_url, is_blob_ref
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 200
+SIGNATURE = 'data:image/png;base64,' + base64.b64encode(PNG_BYTES).decode('ascii')
+
+
+@pytest.fixture(autouse=True)
+def blob_root(settings, tmp_path):
+    settings.BLOB_ROOT = str(tmp_path / 'blobs')
+    return tmp_path / 'blobs'
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user():
+    User = get_user_model()
+    user = User.objects.create(
+        email='blobs@semed.local',
+        name='Blobs',
+        role=User.Roles.SEMED_ADMIN,
+        is_staff=True,
+        is_active=True,
+    )
+    user.set_password('Test123!')
+    user.save(update_fields=['password'])
+    return user
+
+
+def test_signatures_are_stored_once_and_listed_as_urls(api_client, admin_user, blob_root):
+    api_client.force_authenticate(user=admin_user)
+    school = School.objects.create(name='Escola Blob')
+    for _ in range(3):
+        Delivery.objects.create(
+            school=school,
+            delivery_date=date.today(),
+            created_by=admin_user,
+            sender_signature=SIGNATURE,
+            receiver_signature=SIGNATURE,
+        )
+
+    stored = Delivery.objects.values_list('sender_signature', flat=True).first()
+    assert is_blob_ref(stored)
+    assert len([path for path in blob_root.rglob('*') if path.is_file()]) == 1
+
+    response = api_client.get('/api/deliveries/')
+    assert response.status_code == 200
+    url = response.data[0]['sender_signature']
+    assert url.startswith('http://testserver/api/blobs/')
+    light_size = len(response.content)
+
+    response = api_client.get('/api/deliveries/?include_blobs=1')
+    assert response.data[0]['receiver_signature'] == SIGNATURE
+    assert len(response.content) > light_size * 20
+
+    blob = APIClient().get(url)
+    assert blob.status_code == 200
+    assert blob['Content-Type'] == 'image/png'
+    assert blob['Cache-Control'].startswith('private, max-age=')
+    assert b''.join(blob.streaming_content) == PNG_BYTES
+
+
+def test_blobs_need_a_signed_url_or_authentication(api_client, admin_user, settings):
+    name = Delivery.objects.create(
+        school=School.objects.create(name='Escola Assinada'),
+        delivery_date=date.today(),
+        created_by=admin_user,
+        sender_signature=SIGNATURE,
+    ).sender_signature[len('blob:'):]
+    unsigned = f'/api/blobs/{name}/'
+
+    assert api_client.get(unsigned).status_code == 401
+    assert api_client.get(unsigned + '?expires=9999999999&signature=forjada').status_code == 401
+    expired = blob_url(name, now=time.time() - 3 * settings.BLOB_URL_MAX_AGE)
+    assert api_client.get(expired).status_code == 401
+    assert api_client.get(blob_url(name)).status_code == 200
+
+    api_client.force_authenticate(user=admin_user)
+    assert api_client.get(unsigned).status_code == 200
+
+
+def test_menu_item_image_round_trips_through_blob_url(api_client, admin_user):
+    api_client.force_authenticate(user=admin_user)
+    school = School.objects.create(name='Escola Menu Blob')
+    menu = Menu.objects.create(
+        school=school,
+        week_start=date.today(),
+        week_end=date.today() + timedelta(days=4),
+        created_by=admin_user,
+    )
+    item = MenuItem.objects.create(
+        menu=menu,
+        day_of_week=MenuItem.DayOfWeek.MON,
+        meal_type=MenuItem.MealType.LUNCH,
+        image_data=SIGNATURE,
+    )
+
+    response = api_client.get('/api/menus/')
+    image_url = response.data[0]['items'][0]['image_data']
+    assert '/api/blobs/' in image_url
+
+    serializer = MenuItemSerializer(item, data={'image_data': image_url}, partial=True)
+    assert serializer.is_valid(), serializer.errors
+    serializer.save()
+    item.refresh_from_db()
+    assert is_blob_ref(item.image_data)
+    assert blob_path(item.image_data[len('blob:'):]).exists()
+
+
+def test_unknown_blob_returns_404(api_client):
+    response = api_client.get(blob_url('0' * 64 + '.png'))
+    assert response.status_code == 404
@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from menus.models import Menu
+from menus.services import current_published_menu, current_published_menus
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+MONDAY = date(2026, 3, 2)
+
+
+@pytest.fixture
+def admin_user():
+    User = get_user_model()
+    user = User.objects.create(
+        email='resolver@semed.local',
+        name='Resolver',
+        role=User.Roles.SEMED_ADMIN,
+        is_staff=True,
+        is_active=True,
+    )
+    user.set_password('Test123!')
+    user.save(update_fields=['password'])
+    return user
+
+
+def _menu(school, user, week_start, status=Menu.Status.PUBLISHED, **extra):
+    return Menu.objects.create(
+        school=school,
+        week_start=week_start,
+        week_end=week_start + timedelta(days=4),
+        status=status,
+        created_by=user,
+        **extra,
+    )
+
+
+def test_resolver_prefers_covering_week_then_falls_back(admin_user):
+    school = School.objects.create(name='Escola A')
+    past = _menu(school, admin_user, MONDAY - timedelta(days=7))
+    current = _menu(school, admin_user, MONDAY)
+    future = _menu(school, admin_user, MONDAY + timedelta(days=14))
+    _menu(school, admin_user, MONDAY + timedelta(days=21), status=Menu.Status.DRAFT)
+
+    assert current_published_menu(school, MONDAY + timedelta(days=2)) == current
+    saturday = MONDAY + timedelta(days=5)
+    assert current_published_menu(school, saturday) == future
+    assert current_published_menu(school, saturday, prefer_past=True) == current
+    assert current_published_menu(school, saturday, fallback=False) is None
+    assert current_published_menu(school, MONDAY - timedelta(days=30), prefer_past=True) == future
+    assert past.pk not in {menu.pk for menu in current_published_menus([school], saturday).values()}
+
+
+def test_resolver_picks_one_menu_per_school_in_one_query(admin_user, django_assert_num_queries):
+    first = School.objects.create(name='Escola A')
+    second = School.objects.create(name='Escola B')
+    without_menu = School.objects.create(name='Escola C')
+    first_current = _menu(first, admin_user, MONDAY)
+    _menu(first, admin_user, MONDAY - timedelta(days=7))
+    second_latest = _menu(second, admin_user, MONDAY - timedelta(days=14))
+    _menu(second, admin_user, MONDAY - timedelta(days=21))
+
+    with django_assert_num_queries(1):
+        menus = current_published_menus([first.id, second.id, without_menu.id], MONDAY)
+
+    assert menus == {first.id: first_current, second.id: second_latest}
+
+
+def test_public_school_list_uses_constant_queries(admin_user, django_assert_num_queries):
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    for index in range(5):
+        school = School.objects.create(name=f'Escola {index}')
+        _menu(school, admin_user, week_start, author_name=f'Nutri {index}')
+        _menu(school, admin_user, week_start - timedelta(days=7), author_name='Antiga')
+    School.objects.create(name='Escola sem cardapio')
+
+    with django_assert_num_queries(2):
+        response = APIClient().get('/public/schools/')
+
+    assert response.status_code == 200
+    assert [row['author_name'] for row in response.data] == [f'Nutri {index}' for index in range(5)]
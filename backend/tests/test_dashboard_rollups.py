@@ -0,0 +1,237 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from dashboard.models import MonthlyMealsServedRollup, MonthlyStockMovementRollup
+from inventory.models import StockBalance, StockMovement, Supply
+from inventory.services.ledger import LedgerEntry, post_movements
+from menus.models import MealServiceEntry, MealServiceReport, Menu, MenuItem
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user():
+    User = get_user_model()
+    user = User.objects.create(
+        email='rollup@semed.local',
+        name='Rollup',
+        role=User.Roles.SEMED_ADMIN,
+        is_staff=True,
+        is_active=True,
+    )
+    user.set_password('Test123!')
+    user.save(update_fields=['password'])
+    return user
+
+
+@pytest.fixture
+def schools():
+    return School.objects.create(name='Escola Alfa'), School.objects.create(name='Escola Beta')
+
+
+@pytest.fixture
+def supply():
+    supply = Supply.objects.create(name='Arroz', category='Graos', unit=Supply.Units.KG, min_stock=0)
+    StockBalance.objects.create(supply=supply, quantity=1000)
+    return supply
+
+
+def _out(user, supply, school, quantity, movement_date):
+    return LedgerEntry(
+        supply=supply,
+        type=StockMovement.Types.OUT,
+        quantity=Decimal(quantity),
+        movement_date=movement_date,
+        created_by_id=user.pk,
+        school=school,
+    )
+
+
+def _report(school, service_date, **served):
+    report = MealServiceReport.objects.create(school=school, service_date=service_date)
+    for meal_type, count in served.items():
+        MealServiceEntry.objects.create(report=report, meal_type=meal_type, served_count=count)
+    return report
+
+
+def test_posted_movements_are_rolled_up(admin_user, schools, supply):
+    alfa, beta = schools
+    with transaction.atomic():
+        post_movements([
+            _out(admin_user, supply, alfa, '3', date(2025, 3, 4)),
+            _out(admin_user, supply, alfa, '2', date(2025, 3, 20)),
+            _out(admin_user, supply, beta, '5', date(2025, 4, 1)),
+            LedgerEntry(supply=supply, type=StockMovement.Types.IN, quantity=Decimal('9'),
+                        movement_date=date(2025, 3, 1), created_by_id=admin_user.pk),
+        ])
+    with transaction.atomic():
+        post_movements([_out(admin_user, supply, alfa, '1.5', date(2025, 3, 28))])
+
+    march = MonthlyStockMovementRollup.objects.get(month=date(2025, 3, 1), school=alfa)
+    assert march.quantity == Decimal('6.5')
+    assert march.movement_count == 3
+    assert MonthlyStockMovementRollup.objects.get(month=date(2025, 4, 1), school=beta).quantity == Decimal('5')
+    # Central movements have no school and are not part of the series.
+    assert MonthlyStockMovementRollup.objects.count() == 2
+
+
+def test_meal_service_rollup_follows_report_changes(schools, django_capture_on_commit_callbacks):
+    alfa, _ = schools
+    with django_capture_on_commit_callbacks(execute=True):
+        report = _report(alfa, date(2025, 3, 3), LUNCH=40)
+        _report(alfa, date(2025, 3, 4), LUNCH=10, SNACK1=5)
+
+    rollup = MonthlyMealsServedRollup.objects.get(school=alfa, month=date(2025, 3, 1), meal_type='LUNCH')
+    assert rollup.served_count == 50
+
+    with django_capture_on_commit_callbacks(execute=True):
+        report.entries.all().delete()
+    rollup = MonthlyMealsServedRollup.objects.get(school=alfa, month=date(2025, 3, 1), meal_type='LUNCH')
+    assert rollup.served_count == 10
+
+
+def test_public_submission_updates_meal_rollup(api_client, admin_user, schools, django_capture_on_commit_callbacks):
+    alfa, _ = schools
+    service_date = date(2025, 5, 5)  # Monday
+    menu = Menu.objects.create(
+        school=alfa,
+        week_start=service_date,
+        week_end=date(2025, 5, 9),
+        status=Menu.Status.PUBLISHED,
+        created_by=admin_user,
+    )
+    MenuItem.objects.create(menu=menu, day_of_week=MenuItem.DayOfWeek.MON, meal_type=MenuItem.MealType.LUNCH, description='Arroz')
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.post(
+            f'/public/schools/{alfa.public_slug}/meal-service/?token={alfa.public_token}',
+            {
+                'service_date': service_date.isoformat(),
+                'items': [{'meal_type': MenuItem.MealType.LUNCH, 'served_count': 73}],
+            },
+            format='json',
+        )
+    assert response.status_code == 200
+    assert MonthlyMealsServedRollup.objects.get(school=alfa, month=date(2025, 5, 1)).served_count == 73
+
+
+def test_rebuild_command_matches_incremental_rollups(admin_user, schools, supply, django_capture_on_commit_callbacks):
+    alfa, beta = schools
+    with transaction.atomic():
+        post_movements([
+            _out(admin_user, supply, alfa, '3', date(2025, 3, 4)),
+            _out(admin_user, supply, beta, '5', date(2025, 4, 1)),
+        ])
+    with django_capture_on_commit_callbacks(execute=True):
+        _report(beta, date(2025, 4, 2), LUNCH=12, BREAKFAST1=8)
+
+    def snapshot():
+        return (
+            sorted(MonthlyStockMovementRollup.objects.values_list('month', 'school_id', 'supply_id', 'type', 'quantity', 'movement_count')),
+            sorted(MonthlyMealsServedRollup.objects.values_list('month', 'school_id', 'meal_type', 'served_count')),
+        )
+
+    incremental = snapshot()
+    MonthlyStockMovementRollup.objects.all().delete()
+    MonthlyMealsServedRollup.objects.all().delete()
+    call_command('rebuild_dashboard_rollups')
+    assert snapshot() == incremental
+
+
+def test_series_reads_rollups_with_filters(api_client, admin_user, schools, supply, django_capture_on_commit_callbacks):
+    alfa, beta = schools
+    with transaction.atomic():
+        post_movements([
+            _out(admin_user, supply, alfa, '3', date(2025, 3, 4)),
+            _out(admin_user, supply, beta, '5', date(2025, 3, 9)),
+            _out(admin_user, supply, beta, '7', date(2025, 4, 1)),
+        ])
+    with django_capture_on_commit_callbacks(execute=True):
+        _report(alfa, date(2025, 3, 3), LUNCH=40)
+        _report(beta, date(2025, 4, 3), LUNCH=25)
+    api_client.force_authenticate(user=admin_user)
+
+    response = api_client.get('/api/dashboard/series/')
+    assert response.status_code == 200
+    assert response.data['consumption_by_month'] == [
+        {'name': 'Mar', 'value': 8.0},
+        {'name': 'Apr', 'value': 7.0},
+    ]
+    assert [row['school_name'] for row in response.data['served_by_school_category']] == ['Escola Alfa', 'Escola Beta']
+
+    response = api_client.get(f'/api/dashboard/series/?school={beta.pk}&date_from=2025-04-15')
+    assert response.data['consumption_by_month'] == [{'name': 'Apr', 'value': 7.0}]
+    assert response.data['served_by_school_category'] == [{
+        'school_id': str(beta.pk),
+        'school_name': 'Escola Beta',
+        'meal_type': 'LUNCH',
+        'meal_label': 'Almoco',
+        'value': 25,
+    }]
+
+    response = api_client.get('/api/dashboard/series/?date_to=2025-03-31')
+    assert response.data['consumption_by_month'] == [{'name': 'Mar', 'value': 8.0}]
+
+    assert api_client.get('/api/dashboard/series/?date_from=ontem').status_code == 400
+    assert api_client.get('/api/dashboard/series/?school=abc').status_code == 400
+
+
+def test_saved_movement_with_string_date_is_rolled_up(admin_user, schools, supply):
+    alfa, _ = schools
+    StockMovement.objects.create(
+        supply=supply,
+        school=alfa,
+        type=StockMovement.Types.OUT,
+        quantity='2.50',
+        movement_date='2025-06-10',
+        created_by=admin_user,
+    )
+
+    rollup = MonthlyStockMovementRollup.objects.get(month=date(2025, 6, 1), school=alfa)
+    assert rollup.quantity == Decimal('2.50')
+    assert rollup.movement_count == 1
+
+
+def test_edited_and_deleted_movements_update_the_rollup(api_client, admin_user, schools, supply):
+    alfa, beta = schools
+    with transaction.atomic():
+        post_movements([
+            _out(admin_user, supply, alfa, '3', date(2025, 3, 4)),
+            _out(admin_user, supply, alfa, '2', date(2025, 3, 20)),
+        ])
+    first, second = StockMovement.objects.order_by('quantity')
+    api_client.force_authenticate(user=admin_user)
+
+    response = api_client.put(f'/api/stock/movements/{first.pk}/', {
+        'supply': str(supply.pk),
+        'school': str(beta.pk),
+        'type': StockMovement.Types.OUT,
+        'quantity': '4',
+        'movement_date': '2025-04-02',
+    }, format='json')
+    assert response.status_code == 200
+    second.note = 'Conferido'
+    second.save()
+
+    rows = {
+        (row.month, row.school_id): (row.quantity, row.movement_count)
+        for row in MonthlyStockMovementRollup.objects.all()
+    }
+    assert rows == {
+        (date(2025, 3, 1), alfa.pk): (Decimal('3'), 1),
+        (date(2025, 4, 1), beta.pk): (Decimal('4'), 1),
+    }
+
+    assert api_client.delete(f'/api/stock/movements/{second.pk}/').status_code == 204
+    assert list(MonthlyStockMovementRollup.objects.values_list('school_id', flat=True)) == [beta.pk]
@@ -0,0 +1,107 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from dashboard.models import DashboardSnapshot
+from inventory.models import StockMovement, Supply
+from inventory.services.ledger import LedgerEntry, post_movements
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user():
+    User = get_user_model()
+    user = User.objects.create(
+        email='snapshot@semed.local',
+        name='Snapshot',
+        role=User.Roles.SEMED_ADMIN,
+        is_staff=True,
+        is_active=True,
+    )
+    user.set_password('Test123!')
+    user.save(update_fields=['password'])
+    return user
+
+
+@pytest.fixture
+def nutritionist():
+    User = get_user_model()
+    return User.objects.create(
+        email='nutri-snapshot@semed.local',
+        name='Nutri',
+        role=User.Roles.NUTRITIONIST,
+        is_active=True,
+    )
+
+
+def test_dashboard_is_served_from_snapshot(api_client, admin_user, django_assert_max_num_queries):
+    api_client.force_authenticate(user=admin_user)
+    School.objects.create(name='Escola A')
+
+    first = api_client.get('/api/dashboard/')
+    assert first.status_code == 200
+    assert first.data['schools_total'] == 1
+    assert first.data['generated_at'] is not None
+
+    School.objects.create(name='Escola B')
+    # Invalidation runs on commit; without it the cached counters are returned.
+    with django_assert_max_num_queries(2):
+        second = api_client.get('/api/dashboard/')
+    assert second.data['schools_total'] == 1
+    assert second.data['generated_at'] == first.data['generated_at']
+
+
+def test_dashboard_snapshot_is_invalidated_on_commit(api_client, admin_user, django_capture_on_commit_callbacks):
+    api_client.force_authenticate(user=admin_user)
+    api_client.get('/api/dashboard/')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        School.objects.create(name='Escola Nova')
+
+    assert DashboardSnapshot.objects.get().is_stale
+    response = api_client.get('/api/dashboard/')
+    assert response.data['schools_total'] == 1
+    assert not DashboardSnapshot.objects.get().is_stale
+
+
+def test_fresh_override_is_limited_to_admins(api_client, admin_user, nutritionist):
+    call_command('refresh_dashboard_snapshot')
+    School.objects.create(name='Escola Fresh')
+
+    api_client.force_authenticate(user=nutritionist)
+    assert api_client.get('/api/dashboard/?fresh=1').data['schools_total'] == 0
+
+    api_client.force_authenticate(user=admin_user)
+    assert api_client.get('/api/dashboard/?fresh=1').data['schools_total'] == 1
+
+
+def test_bulk_posted_movements_invalidate_the_snapshot(api_client, admin_user, django_capture_on_commit_callbacks):
+    api_client.force_authenticate(user=admin_user)
+    api_client.get('/api/dashboard/')
+    supply = Supply.objects.create(name='Arroz', category='Graos', unit=Supply.Units.KG, min_stock=0)
+    DashboardSnapshot.objects.update(is_stale=False)
+
+    with django_capture_on_commit_callbacks(execute=True), transaction.atomic():
+        post_movements([
+            LedgerEntry(
+                supply=supply,
+                type=StockMovement.Types.IN,
+                quantity=Decimal('5'),
+                movement_date=date.today(),
+                created_by_id=admin_user.pk,
+            ),
+        ])
+
+    assert DashboardSnapshot.objects.get().is_stale
@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from inventory.models import (
+    Delivery,
+    DeliveryItem,
+    DeliveryItemLot,
+    DeliveryNutritionistSignature,
+    Responsible,
+    Supplier,
+    Supply,
+    SupplyLot,
+)
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user():
+    User = get_user_model()
+    user = User.objects.create(
+        email='queries@semed.local',
+        name='Queries',
+        role=User.Roles.SEMED_ADMIN,
+        is_staff=True,
+        is_active=True,
+    )
+    user.set_password('Test123!')
+    user.save(update_fields=['password'])
+    return user
+
+
+def _create_deliveries(user, count):
+    supplier = Supplier.objects.create(name='Fornecedor Base')
+    sender = Responsible.objects.create(name='Remetente')
+    for idx in range(count):
+        school = School.objects.create(name=f'Escola {idx}')
+        delivery = Delivery.objects.create(
+            school=school,
+            sender=sender,
+            delivery_date=date.today(),
+            created_by=user,
+        )
+        for supply_idx in range(3):
+            supply = Supply.objects.create(
+                name=f'Insumo {idx}-{supply_idx}',
+                category='Graos',
+                unit=Supply.Units.KG,
+                min_stock=0,
+            )
+            item = DeliveryItem.objects.create(delivery=delivery, supply=supply, planned_quantity=4)
+            for lot_idx in range(2):
+                lot = SupplyLot.objects.create(
+                    supply=supply,
+                    lot_code=f'L{idx}{supply_idx}{lot_idx}',
+                    expiry_date=date.today() + timedelta(days=30 + lot_idx),
+                    supplier=supplier,
+                )
+                DeliveryItemLot.objects.create(delivery_item=item, lot=lot, planned_quantity=2)
+        DeliveryNutritionistSignature.objects.create(
+            delivery=delivery,
+            name='Nutri',
+            signature_data='data:image/png;base64,AAAA',
+        )
+
+
+def _count_list_queries(client):
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get('/api/deliveries/')
+    assert response.status_code == 200
+    return len(ctx.captured_queries), response.data
+
+
+def test_delivery_list_query_count_does_not_grow_with_rows(api_client, admin_user):
+    api_client.force_authenticate(user=admin_user)
+
+    _create_deliveries(admin_user, 1)
+    baseline, data = _count_list_queries(api_client)
+    assert len(data) == 1
+
+    _create_deliveries(admin_user, 5)
+    queries, data = _count_list_queries(api_client)
+    assert len(data) == 6
+    assert queries == baseline
+    assert data[0]['items'][0]['lots'][0]['supplier_name'] == 'Fornecedor Base'
+    assert len(data[0]['nutritionist_signatures']) == 1
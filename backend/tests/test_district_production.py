@@ -0,0 +1,128 @@
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from inventory.models import SchoolStockBalance, Supply
+from menus.models import Menu, MenuItem
+from production.models import SupplyAlias, SupplyConsumptionRule
+from production.services.production_calc import calculate_for_menu
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+WEEK = date(2026, 3, 2)
+
+
+@pytest.fixture
+def admin_user():
+    User = get_user_model()
+    user = User.objects.create(
+        email='district@semed.local',
+        name='District Admin',
+        role=User.Roles.SEMED_ADMIN,
+        is_staff=True,
+        is_active=True,
+    )
+    user.set_password('Test123!')
+    user.save(update_fields=['password'])
+    return user
+
+
+@pytest.fixture
+def district(admin_user):
+    arroz = Supply.objects.create(name='Arroz', category='Graos', unit=Supply.Units.KG, min_stock=0)
+    feijao = Supply.objects.create(name='Feijao', category='Graos', unit=Supply.Units.KG, min_stock=0)
+    SupplyAlias.objects.create(supply=arroz, alias='arroz')
+    SupplyAlias.objects.create(supply=feijao, alias='feijao')
+    schools = []
+    for index in range(3):
+        school = School.objects.create(name=f'Escola {index}')
+        schools.append(school)
+        for supply in (arroz, feijao):
+            SupplyConsumptionRule.objects.create(school=school, supply=supply, qty_per_student=Decimal('0.05'), unit=Supply.Units.KG)
+        SchoolStockBalance.objects.create(school=school, supply=arroz, quantity=Decimal('2'), min_stock=0)
+        for week in (WEEK, WEEK + timedelta(days=7)):
+            menu = Menu.objects.create(
+                school=school,
+                week_start=week,
+                week_end=week + timedelta(days=4),
+                status=Menu.Status.PUBLISHED,
+                created_by=admin_user,
+            )
+            MenuItem.objects.create(menu=menu, day_of_week='MON', meal_type='LUNCH', description='arroz, feijao')
+    Menu.objects.create(school=schools[0], week_start=WEEK + timedelta(days=14), week_end=WEEK + timedelta(days=18), created_by=admin_user)
+    return schools
+
+
+def test_district_matches_single_menu_calculation(admin_user, district, django_assert_max_num_queries):
+    client = APIClient()
+    client.force_authenticate(user=admin_user)
+    payload = {
+        'week_start': WEEK.isoformat(),
+        'week_end': (WEEK + timedelta(days=14)).isoformat(),
+        'students_by_meal_type': {'DEFAULT': 100},
+        'students_by_school': {str(district[2].id): {'LUNCH': 40}},
+    }
+
+    # Menus, school rules, stock and the supply catalog version are loaded once for the whole batch.
+    with django_assert_max_num_queries(15):
+        response = client.post('/api/production/district/calculate/', payload, format='json')
+
+    assert response.status_code == 200
+    data = response.data
+    assert (data['menus_count'], data['schools_count']) == (6, 3)
+    assert [row['school_name'] for row in data['results']] == ['Escola 0', 'Escola 0', 'Escola 1', 'Escola 1', 'Escola 2', 'Escola 2']
+    for row in data['results']:
+        menu = Menu.objects.get(pk=row['menu_id'])
+        students = {'LUNCH': 40} if menu.school_id == district[2].id else {'DEFAULT': 100}
+        expected = calculate_for_menu(menu, students)
+        assert {key: value for key, value in row.items() if key != 'school_name'} == expected
+
+    arroz = next(row for row in data['totals'] if row['supply_name'] == 'Arroz')
+    assert arroz['qty_needed'] == 5.0 * 4 + 2.0 * 2
+    assert arroz['stock_shortage'] == 3.0 * 4 + 0.0 * 2
+    assert arroz['schools'] == 3
+
+
+def test_district_validation_and_drafts(admin_user, district):
+    client = APIClient()
+    client.force_authenticate(user=admin_user)
+
+    response = client.post(
+        '/api/production/district/calculate/',
+        {'week_start': WEEK.isoformat(), 'week_end': (WEEK - timedelta(days=7)).isoformat()},
+        format='json',
+    )
+    assert response.status_code == 400
+    assert 'week_end' in response.data
+
+    response = client.post(
+        '/api/production/district/calculate/',
+        {'week_start': (WEEK + timedelta(days=14)).isoformat(), 'include_drafts': True, 'schools': [str(district[0].id)]},
+        format='json',
+    )
+    assert response.data['menus_count'] == 1
+
+
+def test_district_command_writes_json(district, tmp_path):
+    output = tmp_path / 'producao.json'
+    students = tmp_path / 'alunos.json'
+    students.write_text(json.dumps({str(district[0].id): {'DEFAULT': 10}}))
+
+    call_command(
+        'calculate_district_production',
+        '--week-start', WEEK.isoformat(),
+        '--students', '100',
+        '--students-file', str(students),
+        '--output', str(output),
+    )
+
+    result = json.loads(output.read_text())
+    assert result['menus_count'] == 3
+    feijao = next(row for row in result['totals'] if row['supply_name'] == 'Feijao')
+    assert feijao['qty_needed'] == 0.5 + 5.0 + 5.0
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import date
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from inventory.events import ChangePoller, unread_count, unread_count_event
+from inventory.models import Delivery, Notification
+from merenda_semed.asgi import application
+from merenda_semed.events import broker, event, event_stream
+from schools.models import School
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def no_bridge(settings):
+    # The bridge thread has its own connection and cannot see the test transaction.
+    settings.EVENT_STREAM_POLL_INTERVAL = 0
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def user():
+    User = get_user_model()
+    return User.objects.create(
+        email='events@semed.local',
+        name='Events Admin',
+        role=User.Roles.SEMED_ADMIN,
+        is_active=True,
+    )
+
+
+def _notification(title='Aviso', **extra):
+    return Notification.objects.create(
+        notification_type=Notification.NotificationType.DELIVERY_WITH_NOTE,
+        title=title,
+        message='Mensagem',
+        **extra,
+    )
+
+
+def _collect(initial=None, publish=(), count=1):
+    """First ``count`` messages after the retry line, publishing ``publish`` once subscribed."""
+
+    async def run():
+        stream = event_stream(initial=initial, heartbeat=0.05, max_seconds=2)
+        messages = [await stream.__anext__()]
+        for item in publish:
+            broker.publish(item)
+        try:
+            while len(messages) <= count:
+                message = await asyncio.wait_for(stream.__anext__(), 2)
+                if not message.startswith(':'):
+                    messages.append(message)
+        finally:
+            await stream.aclose()
+        return messages[1:]
+
+    return async_to_sync(run)()
+
+
+def test_stream_sends_initial_count_then_published_events():
+    _notification()
+    messages = _collect(
+        initial=lambda: [unread_count_event()],
+        publish=[event('notification', 'notification:test-stream', {'title': 'Novo'})],
+        count=2,
+    )
+
+    assert messages[0].startswith('id: unread_count:')
+    assert 'event: unread_count\ndata: {"count":1}\n\n' in messages[0]
+    assert messages[1] == 'id: notification:test-stream\nevent: notification\ndata: {"title":"Novo"}\n\n'
+    assert broker.subscriber_count() == 0
+
+
+def test_publish_drops_repeated_event_ids():
+    item = event('notification', 'notification:test-dedupe', {})
+    assert broker.publish(item) is True
+    assert broker.publish(item) is False
+    assert broker.seen('notification:test-dedupe')
+
+
+def test_unread_count_sees_writes_from_other_processes():
+    first = _notification()
+    _notification('Outro')
+    assert unread_count() == 2
+
+    poller = ChangePoller()
+    assert poller()[-1]['data'] == {'count': 2}
+    # Another process marks one as read: no signal here, only the row.
+    Notification.objects.filter(pk=first.pk).update(is_read=True)
+    assert unread_count() == 1
+    assert [item['data'] for item in poller() if item['type'] == 'unread_count'] == [{'count': 1}]
+    assert not [item for item in poller() if item['type'] == 'unread_count']
+
+
+def test_unread_count_endpoint_and_mark_all_read(user):
+    _notification()
+    _notification('Outro')
+    client = APIClient()
+    client.force_authenticate(user)
+
+    assert client.get('/api/notifications/unread_count/').data == {'count': 2}
+    assert client.post('/api/notifications/mark_all_read/').status_code == 200
+    assert client.get('/api/notifications/unread_count/').data == {'count': 0}
+
+
+def test_poller_finds_bulk_inserts_and_status_changes(user):
+    school = School.objects.create(name='Escola Eventos')
+    delivery = Delivery.objects.create(school=school, delivery_date=date.today(), created_by=user)
+    poller = ChangePoller()
+    assert unread_count() == 0
+
+    Notification.objects.bulk_create([
+        Notification(notification_type=Notification.NotificationType.LOT_EXPIRED, title='Lote', message='Vencido'),
+    ])
+    # Another process: no signal here, only the row.
+    Delivery.objects.filter(pk=delivery.pk).update(status=Delivery.Status.SENT)
+    items = poller()
+
+    types = [item['type'] for item in items]
+    assert types.count('notification') == 1
+    assert types[-1] == 'unread_count'
+    assert items[-1]['data'] == {'count': 1}
+    statuses = [item['data']['status'] for item in items if item['type'] == 'delivery_status']
+    assert statuses[-1] == Delivery.Status.SENT
+
+    # The overlap window returns the notification again; the broker drops it.
+    for item in items:
+        broker.publish(item)
+    again = poller()
+    assert [item['type'] for item in again] == ['notification']
+    assert not any(broker.publish(item) for item in again)
+
+
+def test_stream_view_requires_token(user):
+    client = AsyncClient()
+    token = str(AccessToken.for_user(user))
+    assert async_to_sync(client.get)('/api/events/stream/').status_code == 401
+
+    response = async_to_sync(client.get)('/api/events/stream/', {'token': token})
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/event-stream'
+    assert response['Cache-Control'] == 'no-cache'
+
+    # The WSGI app would buffer the stream, so it does not serve it.
+    assert APIClient().get('/api/events/stream/', {'token': token}).status_code == 404
+
+
+def test_asgi_process_only_serves_the_stream():
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        sent.append(message)
+
+    async_to_sync(application)({'type': 'http', 'path': '/api/supplies/', 'method': 'GET'}, receive, send)
+    assert sent[0]['status'] == 404
@@ -1,8 +1,21 @@
+import csv
+import io
+
+import openpyxl
 import pytest
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 
-from inventory.models import Delivery, DeliveryItem, StockBalance, Supplier, SupplierReceipt, SupplierReceiptItem, Supply
+from inventory.models import (
+    Delivery,
+    DeliveryItem,
+    StockBalance,
+    StockMovement,
+    Supplier,
+    SupplierReceipt,
+    SupplierReceiptItem,
+    Supply,
+)
 from menus.models import Menu, MenuItem
 from schools.models import School
 
@@ -123,3 +136,82 @@ def test_export_delivery_divergences_xlsx(api_client, admin_user):
     response = api_client.get('/api/exports/deliveries/divergences/xlsx/')
     assert response.status_code == 200
     assert response['Content-Type'].startswith('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+def _read_xlsx(response):
+    return openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+
+
+def test_export_stock_csv_is_streamed(api_client, admin_user):
+    api_client.force_authenticate(user=admin_user)
+    for idx, quantity in enumerate([5, 15, 25]):
+        supply = Supply.objects.create(name=f'Insumo {idx}', category='Graos', unit=Supply.Units.KG, min_stock=10)
+        StockBalance.objects.create(supply=supply, quantity=quantity)
+
+    response = api_client.get('/api/exports/stock/')
+
+    assert response.streaming
+    assert response['Content-Disposition'] == 'attachment; filename="stock.csv"'
+    rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+    assert rows[0][0] == 'Insumo'
+    assert [(row[0], row[5], row[6]) for row in rows[1:]] == [
+        ('Insumo 0', 'BAIXO', '-5.00'),
+        ('Insumo 1', 'NORMAL', '5.00'),
+        ('Insumo 2', 'ALTO', '15.00'),
+    ]
+
+
+def test_export_menus_csv_lists_items(api_client, admin_user):
+    api_client.force_authenticate(user=admin_user)
+    school = School.objects.create(name='Escola Export CSV')
+    menu = Menu.objects.create(school=school, name='Semana 1', week_start='2026-02-02', week_end='2026-02-06', created_by=admin_user)
+    MenuItem.objects.create(menu=menu, day_of_week=MenuItem.DayOfWeek.MON, meal_type=MenuItem.MealType.LUNCH, description='Arroz')
+
+    response = api_client.get('/api/exports/menus/')
+
+    rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+    assert rows[1][:7] == ['Escola Export CSV', 'Semana 1', '2026-02-02', '2026-02-06', Menu.Status.DRAFT, 'MON', 'LUNCH']
+    assert rows[1][-1] == 'Arroz'
+
+
+def test_export_deliveries_xlsx_query_count_is_constant(api_client, admin_user, django_assert_max_num_queries):
+    api_client.force_authenticate(user=admin_user)
+    supply = Supply.objects.create(name='Feijao', category='Graos', unit=Supply.Units.KG, min_stock=5)
+    for idx in range(5):
+        school = School.objects.create(name=f'Escola Entrega {idx}')
+        delivery = Delivery.objects.create(school=school, delivery_date=f'2026-02-1{idx}', created_by=admin_user)
+        DeliveryItem.objects.create(delivery=delivery, supply=supply, planned_quantity='10.00', received_quantity='7.00')
+
+    # Authentication, the deliveries sheet and the items sheet.
+    with django_assert_max_num_queries(4):
+        response = api_client.get('/api/exports/deliveries/xlsx/')
+
+    assert response['Content-Type'] == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    workbook = _read_xlsx(response)
+    assert workbook.sheetnames == ['Entregas', 'Itens']
+    deliveries = list(workbook['Entregas'].iter_rows(min_row=2, values_only=True))
+    assert [row[:4] for row in deliveries][0] == ('2026-02-14', 'Escola Entrega 4', 'Rascunho', 1)
+    items = list(workbook['Itens'].iter_rows(min_row=2, values_only=True))
+    assert len(items) == 5
+    assert items[0][3:8] == ('Feijao', Supply.Units.KG, 10, 7, 3)
+
+
+def test_export_consumption_xlsx_totals(api_client, admin_user):
+    api_client.force_authenticate(user=admin_user)
+    school = School.objects.create(name='Escola Consumo')
+    supply = Supply.objects.create(name='Leite', category='Laticinios', unit=Supply.Units.L, min_stock=0)
+    for quantity in ('2.50', '1.50'):
+        StockMovement.objects.create(
+            supply=supply,
+            school=school,
+            type=StockMovement.Types.OUT,
+            quantity=quantity,
+            movement_date='2026-02-10',
+            created_by=admin_user,
+        )
+
+    workbook = _read_xlsx(api_client.get('/api/exports/consumption/xlsx/'))
+
+    assert workbook.sheetnames == ['Consumo', 'Resumo por Insumo']
+    assert len(list(workbook['Consumo'].iter_rows(min_row=2))) == 2
+    assert list(workbook['Resumo por Insumo'].iter_rows(min_row=2, values_only=True)) == [('Leite', Supply.Units.L, 4)]
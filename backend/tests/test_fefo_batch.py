@@ -0,0 +1,126 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+
+from inventory.models import Delivery, DeliveryItem, LotBalanceCentral, LotBalanceSchool, Supply, SupplyLot
+from inventory.services.lots import (
+    ensure_delivery_lot_plans,
+    fefo_allocate_batch,
+    fefo_suggestion_service,
+)
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+
+def _reference_fefo(supply, qty, from_central=True, school=None):
+    """The original one-query-per-supply FEFO walk, kept as the oracle."""
+    today = date.today()
+    if from_central:
+        balances = LotBalanceCentral.objects.filter(lot__supply=supply)
+    else:
+        balances = LotBalanceSchool.objects.filter(school=school, lot__supply=supply)
+    balances = balances.filter(
+        quantity__gt=0,
+        lot__status=SupplyLot.Status.ACTIVE,
+        lot__expiry_date__gte=today,
+    ).order_by('lot__expiry_date', 'lot__lot_code', 'lot__created_at')
+    remaining = Decimal(qty)
+    allocations = []
+    for balance in balances:
+        take = min(balance.quantity, remaining)
+        if take > 0:
+            allocations.append((balance.lot_id, take))
+            remaining -= take
+        if remaining <= 0:
+            break
+    return allocations, remaining
+
+
+@pytest.fixture
+def school():
+    return School.objects.create(name='Escola FEFO')
+
+
+@pytest.fixture
+def supplies(school):
+    today = date.today()
+    created = []
+    for idx in range(12):
+        supply = Supply.objects.create(name=f'Insumo {idx}', category='Graos', unit=Supply.Units.KG, min_stock=0)
+        for lot_idx in range(idx % 4 + 1):
+            status = SupplyLot.Status.BLOCKED if (idx + lot_idx) % 7 == 0 else SupplyLot.Status.ACTIVE
+            expiry = today + timedelta(days=((idx * 3 + lot_idx * 5) % 11) - 2)
+            lot = SupplyLot.objects.create(
+                supply=supply,
+                lot_code=f'L{idx}-{lot_idx}',
+                expiry_date=expiry,
+                status=status,
+            )
+            quantity = Decimal(lot_idx + 1) * Decimal('2.5')
+            LotBalanceCentral.objects.create(lot=lot, quantity=quantity)
+            LotBalanceSchool.objects.create(school=school, lot=lot, quantity=quantity / 2)
+        created.append(supply)
+    return created
+
+
+@pytest.mark.parametrize('from_central', [True, False])
+def test_batch_allocation_matches_reference(supplies, school, from_central):
+    requests = [(supply, Decimal(idx % 5) * Decimal('1.75')) for idx, supply in enumerate(supplies)]
+    scope = {'from_central': from_central, 'school': None if from_central else school}
+
+    plans = fefo_allocate_batch(requests, **scope)
+    assert any(plan.shortage for plan in plans)
+    assert any(len(plan.allocations) > 1 for plan in plans)
+
+    for (supply, qty), plan in zip(requests, plans):
+        expected, remaining = _reference_fefo(supply, qty, **scope)
+        assert [(a.lot.pk, a.quantity) for a in plan.allocations] == expected
+        assert plan.shortage == max(remaining, Decimal('0'))
+        if plan.shortage:
+            with pytest.raises(ValidationError):
+                fefo_suggestion_service(supply=supply, qty=qty, **scope)
+        else:
+            single = fefo_suggestion_service(supply=supply, qty=qty, **scope)
+            assert [(a.lot.pk, a.quantity) for a in single] == expected
+
+
+def test_batch_allocation_uses_one_query(supplies):
+    with CaptureQueriesContext(connection) as ctx:
+        fefo_allocate_batch([(supply, Decimal('1')) for supply in supplies])
+    assert len(ctx.captured_queries) == 1
+
+
+def test_repeated_supply_never_double_allocates_a_lot(supplies):
+    supply = supplies[3]
+    total = sum(LotBalanceCentral.objects.filter(
+        lot__supply=supply,
+        lot__status=SupplyLot.Status.ACTIVE,
+        lot__expiry_date__gte=date.today(),
+    ).values_list('quantity', flat=True))
+
+    first, second = fefo_allocate_batch([(supply, total), (supply, Decimal('1'))])
+
+    assert first.shortage == 0
+    assert second.allocations == []
+    assert second.available == 0
+    assert second.shortage == Decimal('1')
+
+
+def test_ensure_delivery_lot_plans_reports_per_item_errors(supplies, school):
+    User = get_user_model()
+    user = User.objects.create(email='fefo@semed.local', name='Fefo', role=User.Roles.SEMED_ADMIN)
+    delivery = Delivery.objects.create(school=school, delivery_date=date.today(), created_by=user)
+    served = DeliveryItem.objects.create(delivery=delivery, supply=supplies[1], planned_quantity=Decimal('1'))
+    short = DeliveryItem.objects.create(delivery=delivery, supply=supplies[2], planned_quantity=Decimal('999'))
+
+    lots, errors = ensure_delivery_lot_plans(delivery.items.select_related('supply'))
+
+    assert sum(row.planned_quantity for row in lots[served.pk]) == Decimal('1')
+    assert short.pk in errors and short.pk not in lots
+    assert 'Saldo por lote insuficiente' in str(errors[short.pk].detail[0])
@@ -0,0 +1,127 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from inventory.models import SchoolStockBalance, StockBalance, StockMovement, Supply
+from inventory.services.ledger import CENTRAL, SCHOOL, InsufficientStock, LedgerEntry, post_movements
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user():
+    User = get_user_model()
+    return User.objects.create(
+        email='ledger@semed.local',
+        name='Ledger',
+        role=User.Roles.SEMED_ADMIN,
+        is_active=True,
+    )
+
+
+def _supplies(count):
+    return Supply.objects.bulk_create([
+        Supply(name=f'Insumo {idx}', category='Graos', unit=Supply.Units.KG, min_stock=0)
+        for idx in range(count)
+    ])
+
+
+def _entry(user, supply, movement_type, quantity, **kwargs):
+    return LedgerEntry(
+        supply=supply,
+        type=movement_type,
+        quantity=Decimal(quantity),
+        movement_date=date.today(),
+        created_by_id=user.pk,
+        **kwargs,
+    )
+
+
+def test_post_movements_updates_central_and_school_balances(user):
+    school = School.objects.create(name='Escola Ledger')
+    rice, beans = _supplies(2)
+    StockBalance.objects.create(supply=rice, quantity=10)
+
+    with transaction.atomic():
+        result = post_movements([
+            _entry(user, rice, StockMovement.Types.OUT, '4', school=school),
+            _entry(user, rice, StockMovement.Types.IN, '1'),
+            _entry(user, beans, StockMovement.Types.IN, '5', school=school, balance=SCHOOL),
+            _entry(user, beans, StockMovement.Types.OUT, '2', school=school, balance=None),
+        ])
+
+    assert StockBalance.objects.get(supply=rice).quantity == Decimal('7')
+    assert not StockBalance.objects.filter(supply=beans).exists()
+    assert SchoolStockBalance.objects.get(school=school, supply=beans).quantity == Decimal('5')
+    assert result.school_balance(school, beans).quantity == Decimal('5')
+    assert StockMovement.objects.count() == 4
+
+
+def test_post_movements_rejects_overdraft_without_side_effects(user):
+    rice, beans = _supplies(2)
+    StockBalance.objects.create(supply=rice, quantity=10)
+    StockBalance.objects.create(supply=beans, quantity=1)
+
+    with pytest.raises(InsufficientStock) as excinfo:
+        with transaction.atomic():
+            post_movements([
+                _entry(user, rice, StockMovement.Types.OUT, '3'),
+                _entry(user, beans, StockMovement.Types.OUT, '2'),
+            ])
+
+    assert excinfo.value.entry.supply == beans
+    assert excinfo.value.available == Decimal('1')
+    assert StockBalance.objects.get(supply=rice).quantity == Decimal('10')
+    assert not StockMovement.objects.exists()
+
+
+def test_post_movements_query_count_does_not_grow_with_batch(user):
+    def count_queries(supplies):
+        StockBalance.objects.bulk_create([StockBalance(supply=supply, quantity=100) for supply in supplies])
+        entries = [_entry(user, supply, StockMovement.Types.OUT, '1', balance=CENTRAL) for supply in supplies]
+        with CaptureQueriesContext(connection) as ctx:
+            with transaction.atomic():
+                post_movements(entries)
+        return len(ctx.captured_queries)
+
+    supplies = _supplies(61)
+    assert count_queries(supplies[:1]) == count_queries(supplies[1:])
+    assert StockBalance.objects.filter(quantity=99).count() == 61
+
+
+def test_effective_min_stock_follows_school_and_supply_minimums(user, django_assert_num_queries):
+    from rest_framework.test import APIClient
+
+    school = School.objects.create(name='Escola Minimos')
+    rice, beans = _supplies(2)
+    rice.min_stock = Decimal('10')
+    rice.save(update_fields=['min_stock'])
+
+    with transaction.atomic():
+        post_movements([
+            _entry(user, rice, StockMovement.Types.IN, '4', school=school, balance=SCHOOL),
+            _entry(user, beans, StockMovement.Types.IN, '4', school=school, balance=SCHOOL),
+        ])
+    rice_balance = SchoolStockBalance.objects.get(school=school, supply=rice)
+    beans_balance = SchoolStockBalance.objects.get(school=school, supply=beans)
+    assert rice_balance.effective_min_stock == Decimal('10')
+    assert list(SchoolStockBalance.objects.low_stock()) == [rice_balance]
+
+    beans_balance.min_stock = Decimal('5')
+    beans_balance.save(update_fields=['min_stock'])
+    rice.min_stock = Decimal('3')
+    rice.save()
+    assert SchoolStockBalance.objects.get(pk=beans_balance.pk).effective_min_stock == Decimal('5')
+    assert list(SchoolStockBalance.objects.low_stock()) == [beans_balance]
+
+    client = APIClient()
+    client.force_authenticate(user)
+    with django_assert_num_queries(3):
+        response = client.get(f'/api/schools/{school.pk}/stock/')
+    assert response.data['summary'] == {'total_items': 2, 'low_stock': 1, 'normal_stock': 1}
+    assert [item['status'] for item in response.data['items']] == ['NORMAL', 'BAIXO']
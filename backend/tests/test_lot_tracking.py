@@ -1,3 +1,4 @@
+import json
 from datetime import date, timedelta
 from decimal import Decimal
 
@@ -13,6 +14,7 @@ from inventory.models import (
     DeliveryItemLot,
     LotBalanceCentral,
     LotBalanceSchool,
+    LotExpirySweep,
     Notification,
     SchoolStockBalance,
     StockBalance,
@@ -24,6 +26,7 @@ from inventory.models import (
     Supply,
     SupplyLot,
 )
+from inventory.services.expiry import sweep_lot_expiry
 from inventory.services.lots import fefo_suggestion_service
 from schools.models import School
 
@@ -247,9 +250,10 @@ def test_central_lots_endpoint_returns_expiry_and_destinations(api_client, admin
     assert send_resp.status_code == 200, send_resp.data
 
     resp = client.get('/api/supplies/central_lots/?days_to_expiry=10')
-    assert resp.status_code == 200, resp.data
-    assert resp.data['summary']['near_expiry_lots'] >= 1
-    rows = resp.data['results']
+    assert resp.status_code == 200
+    data = json.loads(b''.join(resp.streaming_content))
+    assert data['summary']['near_expiry_lots'] >= 1
+    rows = data['results']
     target = next((row for row in rows if row['lot_code'] == 'RAST1'), None)
     assert target is not None
     assert target['expiry_state'] == 'near_expiry'
@@ -257,6 +261,60 @@ def test_central_lots_endpoint_returns_expiry_and_destinations(api_client, admin
     assert target['destinations'][0]['school_name'] == school.name
 
 
+def test_central_lots_groups_destinations_in_sql_and_paginates(
+    api_client, admin_user, school, supply, django_assert_max_num_queries
+):
+    client = _auth(api_client, admin_user)
+    other_school = School.objects.create(name='Escola B')
+    today = date.today()
+    lots = []
+    for index in range(3):
+        lot = SupplyLot.objects.create(supply=supply, lot_code=f'AG{index}', expiry_date=today + timedelta(days=5 + index))
+        LotBalanceCentral.objects.create(lot=lot, quantity=Decimal('20'))
+        lots.append(lot)
+    expired = SupplyLot.objects.create(supply=supply, lot_code='AGX', expiry_date=today - timedelta(days=1))
+    LotBalanceCentral.objects.create(lot=expired, quantity=Decimal('1.50'))
+    for target, day, status, received in [
+        (school, today - timedelta(days=3), Delivery.Status.CONFERRED, Decimal('2')),
+        (school, today - timedelta(days=1), Delivery.Status.SENT, None),
+        (other_school, today - timedelta(days=2), Delivery.Status.SENT, None),
+        (other_school, today, Delivery.Status.DRAFT, None),
+    ]:
+        delivery = Delivery.objects.create(school=target, delivery_date=day, status=status, created_by=admin_user)
+        item = DeliveryItem.objects.create(delivery=delivery, supply=supply, planned_quantity=Decimal('3'))
+        DeliveryItemLot.objects.create(
+            delivery_item=item, lot=lots[0], planned_quantity=Decimal('3'), received_quantity=received
+        )
+
+    with django_assert_max_num_queries(4):
+        resp = client.get('/api/supplies/central_lots/', {'days_to_expiry': 6})
+        data = json.loads(b''.join(resp.streaming_content))
+    assert data['summary'] == {
+        'total_lots': 4,
+        'near_expiry_lots': 2,
+        'expired_lots': 1,
+        'total_central_quantity': 61.5,
+        'days_to_expiry': 6,
+    }
+    assert [row['lot_code'] for row in data['results']] == ['AGX', 'AG0', 'AG1', 'AG2']
+    first = data['results'][1]
+    assert first['sent_total'] == 8.0
+    assert first['destinations'] == [
+        {'school_id': str(other_school.id), 'school_name': 'Escola B', 'quantity': 3.0,
+         'last_delivery_date': (today - timedelta(days=2)).isoformat()},
+        {'school_id': str(school.id), 'school_name': school.name, 'quantity': 5.0,
+         'last_delivery_date': (today - timedelta(days=1)).isoformat()},
+    ]
+
+    page = client.get('/api/supplies/central_lots/', {'page_size': 2}).json()
+    assert page['summary']['total_lots'] == 4
+    assert [row['lot_code'] for row in page['results']] == ['AGX', 'AG0']
+    assert page['results'][1]['destinations'] == first['destinations']
+    cursor = page['next'].split('cursor=')[1].split('&')[0]
+    second = client.get('/api/supplies/central_lots/', {'page_size': 2, 'cursor': cursor}).json()
+    assert [row['lot_code'] for row in second['results']] == ['AG1', 'AG2']
+
+
 def test_expiry_command_marks_expired_and_blocks_fefo(supply):
     expired_lot = SupplyLot.objects.create(
         supply=supply,
@@ -273,3 +331,45 @@ def test_expiry_command_marks_expired_and_blocks_fefo(supply):
 
     with pytest.raises(ValidationError):
         fefo_suggestion_service(supply=supply, qty=Decimal('1.00'), from_central=True)
+
+
+def test_expiry_sweep_deduplicates_and_only_revisits_changed_lots(supply, school, django_assert_max_num_queries):
+    today = date.today()
+    stale = SupplyLot.objects.create(
+        supply=supply, lot_code='OLD', expiry_date=today - timedelta(days=20), status=SupplyLot.Status.EXPIRED
+    )
+    stale_balance = LotBalanceSchool.objects.create(school=school, lot=stale, quantity=Decimal('2.00'))
+    expiring = SupplyLot.objects.create(supply=supply, lot_code='SOON', expiry_date=today + timedelta(days=7))
+    LotBalanceCentral.objects.create(lot=expiring, quantity=Decimal('5.00'))
+    for index in range(20):
+        lot = SupplyLot.objects.create(supply=supply, lot_code=f'OK{index}', expiry_date=today + timedelta(days=60 + index))
+        LotBalanceCentral.objects.create(lot=lot, quantity=Decimal('1.00'))
+
+    with django_assert_max_num_queries(8):
+        sweep = sweep_lot_expiry([30, 15, 7], today=today)
+    assert sweep.full is True
+    titles = set(Notification.objects.values_list('title', flat=True))
+    assert titles == {f'Lote vencido - {school.name}', f'Lote vencendo em 7 dia(s) (Central) - {supply.name}'}
+
+    # Same day again: nothing new.
+    call_command('check_lot_expiry')
+    assert Notification.objects.count() == 2
+    assert LotExpirySweep.objects.first().notifications_created == 0
+
+    # Next day nothing changed: only the expired lot with balance gets its daily alert again.
+    sweep = sweep_lot_expiry([30, 15, 7], today=today + timedelta(days=1))
+    assert (sweep.full, sweep.notifications_created) == (False, 1)
+    assert Notification.objects.order_by('-created_at').first().title == f'Lote vencido - {school.name}'
+
+    stale_balance.quantity = Decimal('3.00')
+    stale_balance.save()
+    sweep = sweep_lot_expiry([30, 15, 7], today=today + timedelta(days=2))
+    assert sweep.notifications_created == 1
+    latest = Notification.objects.order_by('-created_at').first()
+    assert latest.message.endswith('com saldo 3.00.')
+
+    # Used up: no more alerts.
+    stale_balance.quantity = Decimal('0.00')
+    stale_balance.save()
+    sweep = sweep_lot_expiry([30, 15, 7], today=today + timedelta(days=3))
+    assert sweep.notifications_created == 0
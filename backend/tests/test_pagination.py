@@ -0,0 +1,150 @@
+from datetime import date, timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from inventory.models import (
+    Delivery,
+    DeliveryItem,
+    SchoolStockBalance,
+    StockBalance,
+    StockMovement,
+    Supplier,
+    SupplierReceipt,
+    Supply,
+)
+from menus.models import Menu
+from production.models import SupplyConsumptionRule
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user():
+    User = get_user_model()
+    user = User.objects.create(
+        email='pages@semed.local',
+        name='Pages',
+        role=User.Roles.SEMED_ADMIN,
+        is_staff=True,
+        is_active=True,
+    )
+    user.set_password('Test123!')
+    user.save(update_fields=['password'])
+    return user
+
+
+@pytest.fixture
+def movements(admin_user):
+    supply = Supply.objects.create(name='Arroz', category='Graos', unit=Supply.Units.KG, min_stock=0)
+    return StockMovement.objects.bulk_create([
+        StockMovement(
+            supply=supply,
+            type=StockMovement.Types.IN,
+            quantity=idx + 1,
+            movement_date=date.today(),
+            created_by=admin_user,
+        )
+        for idx in range(7)
+    ])
+
+
+def test_list_stays_unpaginated_in_legacy_mode(api_client, admin_user, movements):
+    api_client.force_authenticate(user=admin_user)
+    response = api_client.get('/api/stock/movements/')
+    assert response.status_code == 200
+    assert isinstance(response.data, list)
+    assert len(response.data) == 7
+
+
+def test_cursor_pagination_walks_all_rows(api_client, admin_user, movements):
+    api_client.force_authenticate(user=admin_user)
+    seen = []
+    url = '/api/stock/movements/?page_size=3'
+    while url:
+        response = api_client.get(url)
+        assert response.status_code == 200
+        assert len(response.data['results']) <= 3
+        seen.extend(row['id'] for row in response.data['results'])
+        url = response.data['next']
+    assert len(seen) == 7
+    assert len(set(seen)) == 7
+
+
+def test_pagination_is_default_when_legacy_mode_disabled(api_client, admin_user, movements, settings):
+    settings.API_LEGACY_LIST_RESPONSES = False
+    api_client.force_authenticate(user=admin_user)
+    response = api_client.get('/api/stock/movements/')
+    assert response.status_code == 200
+    assert set(response.data.keys()) == {'next', 'previous', 'results'}
+    assert len(response.data['results']) == 7
+
+
+@pytest.fixture
+def ordered_lists(admin_user):
+    # Names and dates out of creation (and primary key) order.
+    supplies = [
+        Supply.objects.create(name=name, category='Graos', unit=Supply.Units.KG, min_stock=0)
+        for name in ('Zeta', 'Alfa', 'Mel', 'Beta', 'Caju')
+    ]
+    schools = [School.objects.create(name=name) for name in ('Escola Sul', 'Escola Norte')]
+    supplier = Supplier.objects.create(name='Fornecedor')
+    monday = date.today() - timedelta(days=date.today().weekday())
+    for index, supply in enumerate(supplies):
+        StockBalance.objects.create(supply=supply, quantity=index)
+        SchoolStockBalance.objects.create(school=schools[0], supply=supply, quantity=index)
+        for school in schools:
+            SupplyConsumptionRule.objects.create(school=school, supply=supply, qty_per_student=1, unit=Supply.Units.KG)
+        week = monday + timedelta(weeks=(index * 3) % 5)
+        Menu.objects.create(school=schools[0], week_start=week, week_end=week + timedelta(days=4), created_by=admin_user)
+        for _ in range(2):
+            SupplierReceipt.objects.create(
+                supplier=supplier, expected_date=week, created_by=admin_user,
+            )
+
+
+@pytest.mark.parametrize('url', [
+    '/api/stock/',
+    '/api/school-stock-config/',
+    '/api/menus/',
+    '/api/supplier-receipts/',
+    '/api/production/rules/',
+])
+def test_pages_keep_the_list_order(api_client, admin_user, ordered_lists, url):
+    api_client.force_authenticate(user=admin_user)
+    legacy = api_client.get(url).json()
+    assert len(legacy) >= 5
+
+    paged = []
+    page = f'{url}?page_size=2'
+    while page:
+        response = api_client.get(page)
+        paged.extend(response.json()['results'])
+        page = response.data['next']
+    assert paged == legacy
+
+
+def test_sparse_fieldsets_on_deliveries(api_client, admin_user):
+    api_client.force_authenticate(user=admin_user)
+    school = School.objects.create(name='Escola Campos')
+    supply = Supply.objects.create(name='Feijao', category='Graos', unit=Supply.Units.KG, min_stock=0)
+    delivery = Delivery.objects.create(school=school, delivery_date=date.today(), created_by=admin_user)
+    DeliveryItem.objects.create(delivery=delivery, supply=supply, planned_quantity=5)
+
+    response = api_client.get('/api/deliveries/?exclude=items.lots,nutritionist_signatures')
+    assert response.status_code == 200
+    row = response.data[0]
+    assert 'nutritionist_signatures' not in row
+    assert 'lots' not in row['items'][0]
+    assert row['items'][0]['supply_name'] == 'Feijao'
+
+    response = api_client.get('/api/deliveries/?fields=id,status')
+    assert response.status_code == 200
+    assert set(response.data[0].keys()) == {'id', 'status'}
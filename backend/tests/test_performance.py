@@ -1,8 +1,16 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
 import pytest
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 
-from inventory.models import StockBalance, Supply
+from inventory.models import LotBalanceCentral, SchoolStockBalance, StockBalance, Supply, SupplyLot
+from inventory.services.lots import fefo_allocate_batch
+from menus.models import Menu, MenuItem
+from production.models import SupplyAlias, SupplyConsumptionRule
+from production.services.production_calc import calculate_for_menu
+from production.services.supply_index import invalidate_supply_index
 from schools.models import School
 
 
@@ -52,3 +60,69 @@ def test_list_stock_performance(benchmark, api_client, admin_user):
         assert response.status_code == 200
 
     benchmark(run)
+
+
+@pytest.mark.django_db
+def test_fefo_batch_allocation_200_items_performance(benchmark):
+    supplies = Supply.objects.bulk_create([
+        Supply(name=f'Insumo FEFO {idx}', category='Graos', unit=Supply.Units.KG, min_stock=0)
+        for idx in range(200)
+    ])
+    lots = SupplyLot.objects.bulk_create([
+        SupplyLot(supply=supply, lot_code=f'L{lot_idx}', expiry_date=date.today() + timedelta(days=30 + lot_idx))
+        for supply in supplies
+        for lot_idx in range(3)
+    ])
+    LotBalanceCentral.objects.bulk_create([LotBalanceCentral(lot=lot, quantity=5) for lot in lots])
+    requests = [(supply, Decimal('12')) for supply in supplies]
+
+    def run():
+        plans = fefo_allocate_batch(requests)
+        assert all(plan.shortage == 0 for plan in plans)
+
+    benchmark(run)
+
+
+@pytest.mark.django_db
+def test_free_text_menu_calculation_performance(benchmark, django_assert_max_num_queries):
+    author = get_user_model().objects.create(email='calc-perf@semed.local', name='Calculo')
+    school = School.objects.create(name='Escola Calculo')
+    supplies = Supply.objects.bulk_create([
+        Supply(name=f'Insumo Texto {idx}', category='Graos', unit=Supply.Units.KG, min_stock=0)
+        for idx in range(40)
+    ])
+    SupplyAlias.objects.bulk_create([SupplyAlias(supply=supply, alias=f'insumo {idx}') for idx, supply in enumerate(supplies)])
+    SupplyConsumptionRule.objects.bulk_create([
+        SupplyConsumptionRule(school=school, supply=supply, qty_per_student=Decimal('0.05'), unit=Supply.Units.KG)
+        for supply in supplies
+    ])
+    SchoolStockBalance.objects.bulk_create([SchoolStockBalance(school=school, supply=supply, quantity=3) for supply in supplies])
+    # Bulk inserts send no signals.
+    invalidate_supply_index()
+    menu = Menu.objects.create(
+        school=school,
+        week_start=date(2026, 3, 2),
+        week_end=date(2026, 3, 6),
+        created_by=author,
+    )
+    MenuItem.objects.bulk_create([
+        MenuItem(
+            menu=menu,
+            day_of_week=day,
+            meal_type=meal_type,
+            description=', '.join(f'Insumo {idx}' for idx in range(offset, offset + 8)),
+        )
+        for offset, (day, meal_type) in enumerate(
+            (day, meal_type)
+            for day in MenuItem.DayOfWeek.values
+            for meal_type in [MenuItem.MealType.BREAKFAST_1, MenuItem.MealType.LUNCH, MenuItem.MealType.SNACK_2]
+        )
+    ])
+
+    def run():
+        # 120 tokens, resolved without a query per token.
+        with django_assert_max_num_queries(9):
+            result = calculate_for_menu(menu, {'DEFAULT': 100}, include_stock=True)
+        assert len(result['totals_week']) == 22
+
+    benchmark(run)
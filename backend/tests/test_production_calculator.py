@@ -8,7 +8,13 @@ from rest_framework.test import APIClient
 from inventory.models import SchoolStockBalance, Supply
 from menus.models import Menu, MenuItem
 from production.models import PublicCalculatorLink, SupplyAlias, SupplyConsumptionRule
-from production.services.production_calc import calculate_for_menu
+from production.services.production_calc import (
+    CalculationContext,
+    calculate_for_menu,
+    get_rule,
+    get_stock_available,
+    resolve_supply_from_text,
+)
 from recipes.models import Recipe, RecipeIngredient
 from schools.models import School
 
@@ -166,3 +172,69 @@ def test_public_token_only_published(api_client, admin_user, base_school):
     )
     assert response.status_code == 404
 
+
+
+def _free_text_week(menu, school):
+    arroz = Supply.objects.create(name='Arroz Branco', category='Graos', unit=Supply.Units.KG, min_stock=0)
+    Supply.objects.create(name='Arroz Integral', category='Graos', unit=Supply.Units.KG, min_stock=0)
+    feijao = Supply.objects.create(name='Feijão Carioca', category='Graos', unit=Supply.Units.KG, min_stock=0)
+    leite = Supply.objects.create(name='Leite', category='Laticinios', unit=Supply.Units.L, min_stock=0)
+    Supply.objects.create(name='Macarrao', category='Graos', unit=Supply.Units.KG, min_stock=0, is_active=False)
+    SupplyAlias.objects.create(supply=feijao, alias='feijao')
+    SupplyConsumptionRule.objects.create(school=school, supply=feijao, meal_type='', qty_per_student=Decimal('0.03'), unit=Supply.Units.KG)
+    SupplyConsumptionRule.objects.create(
+        school=school, supply=feijao, meal_type=MenuItem.MealType.LUNCH, qty_per_student=Decimal('0.04'), unit=Supply.Units.KG,
+    )
+    SupplyConsumptionRule.objects.create(school=school, supply=leite, meal_type='', qty_per_student=Decimal('150'), unit=Supply.Units.ML)
+    SupplyConsumptionRule.objects.create(
+        school=school, supply=arroz, meal_type='', qty_per_student=Decimal('0.05'), unit=Supply.Units.KG, active=False,
+    )
+    SchoolStockBalance.objects.create(school=school, supply=feijao, quantity=Decimal('3.00'), min_stock=0)
+    SchoolStockBalance.objects.create(school=school, supply=leite, quantity=Decimal('10.00'), min_stock=0)
+    descriptions = [
+        'Arroz, feijao (200g), leite',
+        'arroz branco; Feijão carioca 1kg',
+        'macarrao com leite',
+        'leite integral, arroz cozido',
+        '(sem itens)',
+    ]
+    for day in MenuItem.DayOfWeek.values:
+        for meal_type, description in zip([MenuItem.MealType.LUNCH, MenuItem.MealType.SNACK_1], descriptions):
+            MenuItem.objects.create(menu=menu, day_of_week=day, meal_type=meal_type, description=description)
+        descriptions = descriptions[1:] + descriptions[:1]
+
+
+def test_context_matches_per_token_lookups(lunch_menu, base_school):
+    _free_text_week(lunch_menu, base_school)
+    context = CalculationContext(base_school)
+    tokens = ['arroz', 'arroz branco', 'feijao', 'feijao carioca', 'leite integral', 'macarrao', 'arroz cozido', 'x', '']
+
+    for token in tokens:
+        expected_warnings, warnings = [], []
+        expected = resolve_supply_from_text(token, warnings=expected_warnings)
+        assert context.resolve_supply(token, warnings=warnings) == expected
+        assert warnings == expected_warnings
+        if expected is None:
+            continue
+        for meal_type in [MenuItem.MealType.LUNCH, MenuItem.MealType.SNACK_1]:
+            assert context.rule(expected, meal_type) == get_rule(base_school, expected, meal_type)
+        assert context.stock_available(expected) == get_stock_available(base_school, expected)
+
+
+def test_free_text_week_uses_constant_queries(lunch_menu, base_school, django_assert_max_num_queries):
+    _free_text_week(lunch_menu, base_school)
+
+    # Menu, items, recipes (two prefetch levels), aliases, supplies, rules and stock.
+    with django_assert_max_num_queries(9):
+        result = calculate_for_menu(lunch_menu, {'DEFAULT': 100}, waste_percent=5, include_stock=True)
+
+    monday = next(day for day in result['days'] if day['day_of_week'] == MenuItem.DayOfWeek.MON)
+    lunch = monday['meals'][0]
+    assert [row['supply_name'] for row in lunch['ingredients']] == ['Feijão Carioca', 'Leite']
+    assert lunch['ingredients'][0]['qty_needed'] == 4.2
+    assert lunch['ingredients'][0]['stock_shortage'] == 1.2
+    assert lunch['ingredients'][1]['unit'] == Supply.Units.ML
+    assert lunch['ingredients'][1]['stock_available'] == 10000.0
+    assert 'Alias ambiguo para token "arroz".' in result['warnings']
+    # Accents do not get in the way of the name match.
+    assert [row['supply_name'] for row in monday['meals'][1]['ingredients']] == ['Arroz Branco', 'Feijão Carioca']
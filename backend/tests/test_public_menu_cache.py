@@ -0,0 +1,163 @@
+import base64
+import time
+from datetime import date, timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+import menus.cache
+from menus.models import Menu, MenuItem
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user():
+    User = get_user_model()
+    user = User.objects.create(
+        email='menu-cache@semed.local',
+        name='Menu Cache',
+        role=User.Roles.SEMED_ADMIN,
+        is_staff=True,
+        is_active=True,
+    )
+    user.set_password('Test123!')
+    user.save(update_fields=['password'])
+    return user
+
+
+@pytest.fixture
+def menu(admin_user):
+    school = School.objects.create(name='Escola Cache')
+    week_start = date.today() - timedelta(days=date.today().weekday())
+    menu = Menu.objects.create(
+        school=school,
+        week_start=week_start,
+        week_end=week_start + timedelta(days=6),
+        status=Menu.Status.PUBLISHED,
+        created_by=admin_user,
+    )
+    MenuItem.objects.create(menu=menu, day_of_week=MenuItem.DayOfWeek.MON, meal_type=MenuItem.MealType.LUNCH, description='Arroz')
+    return menu
+
+
+def _current_url(menu):
+    return f'/public/schools/{menu.school.public_slug}/menu/current/'
+
+
+def _pdf_url(menu):
+    return f'/public/schools/{menu.school.public_slug}/menu/pdf/?week_start={menu.week_start.isoformat()}'
+
+
+def test_current_menu_is_cached_with_etag(api_client, menu, django_assert_max_num_queries):
+    first = api_client.get(_current_url(menu))
+    assert first.status_code == 200
+    etag = first['ETag']
+    assert etag.startswith('"') and not etag.startswith('W/')
+    assert 'public' in first['Cache-Control'] and 'max-age=' in first['Cache-Control']
+
+    # School, menu and the items fingerprint; nothing is serialized again.
+    with django_assert_max_num_queries(3):
+        second = api_client.get(_current_url(menu))
+    assert second['ETag'] == etag
+    assert second.data == first.data
+
+    revalidated = api_client.get(_current_url(menu), HTTP_IF_NONE_MATCH=etag)
+    assert revalidated.status_code == 304
+    assert revalidated['ETag'] == etag
+    assert not revalidated.content
+
+
+def test_menu_by_week_is_private(api_client, menu):
+    school = menu.school
+    response = api_client.get(
+        f'/public/schools/{school.public_slug}/menu/?token={school.public_token}&week_start={menu.week_start.isoformat()}'
+    )
+    assert response.status_code == 200
+    assert 'private' in response['Cache-Control']
+    assert api_client.get(
+        f'/public/schools/{school.public_slug}/menu/?token={school.public_token}&week_start={menu.week_start.isoformat()}',
+        HTTP_IF_NONE_MATCH=f'W/{response["ETag"]}',
+    ).status_code == 304
+
+
+def test_pdf_is_rendered_once(api_client, menu, monkeypatch):
+    calls = []
+    original = menus.cache.generate_menu_pdf
+
+    def counting(menu_obj, buffer):
+        calls.append(menu_obj.pk)
+        return original(menu_obj, buffer)
+
+    monkeypatch.setattr(menus.cache, 'generate_menu_pdf', counting)
+
+    first = api_client.get(_pdf_url(menu))
+    second = api_client.get(_pdf_url(menu))
+
+    assert first.status_code == second.status_code == 200
+    assert first.content.startswith(b'%PDF')
+    assert second.content == first.content
+    assert calls == [menu.pk]
+    assert api_client.get(_pdf_url(menu), HTTP_IF_NONE_MATCH=first['ETag']).status_code == 304
+
+
+def test_items_bulk_update_and_publish_change_the_etag(api_client, admin_user, menu):
+    etag = api_client.get(_current_url(menu))['ETag']
+
+    api_client.force_authenticate(user=admin_user)
+    response = api_client.post(
+        f'/api/menus/{menu.id}/items/bulk/',
+        {'items': [{'day_of_week': 'TUE', 'meal_type': 'LUNCH', 'description': 'Feijao'}]},
+        format='json',
+    )
+    assert response.status_code == 201
+    api_client.force_authenticate(user=None)
+
+    updated = api_client.get(_current_url(menu), HTTP_IF_NONE_MATCH=etag)
+    assert updated.status_code == 200
+    assert updated['ETag'] != etag
+    assert [item['description'] for item in updated.data['items']] == ['Feijao']
+
+    pdf_etag = api_client.get(_pdf_url(menu))['ETag']
+    api_client.force_authenticate(user=admin_user)
+    assert api_client.post(f'/api/menus/{menu.id}/publish/').status_code == 200
+    api_client.force_authenticate(user=None)
+    republished = api_client.get(_current_url(menu), HTTP_IF_NONE_MATCH=updated['ETag'])
+    assert republished.status_code == 200
+    assert republished.data['published_at'] is not None
+    assert api_client.get(_pdf_url(menu), HTTP_IF_NONE_MATCH=pdf_etag).status_code == 200
+
+
+def test_cached_menu_image_urls_follow_the_signing_window(api_client, menu, settings, tmp_path, monkeypatch):
+    settings.BLOB_ROOT = str(tmp_path / 'blobs')
+    image = 'data:image/png;base64,' + base64.b64encode(b'\x89PNG\r\n\x1a\n' + b'0' * 64).decode('ascii')
+    item = menu.items.get()
+    item.image_data = image
+    item.save()
+    first = api_client.get(_current_url(menu))
+    url = first.data['items'][0]['image_data']
+    assert APIClient().get(url).status_code == 200
+
+    later = time.time() + 3 * settings.BLOB_URL_MAX_AGE
+    monkeypatch.setattr(time, 'time', lambda: later)
+    # Revalidation with the old ETag gets the new URLs, not a 304.
+    second = api_client.get(_current_url(menu), HTTP_IF_NONE_MATCH=first['ETag'])
+    assert second.status_code == 200
+    assert second['ETag'] != first['ETag']
+    assert APIClient().get(url).status_code == 401
+    assert APIClient().get(second.data['items'][0]['image_data']).status_code == 200
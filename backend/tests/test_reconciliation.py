@@ -0,0 +1,176 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from inventory.models import (
+    LotBalanceCentral,
+    LotBalanceSchool,
+    SchoolStockBalance,
+    StockBalance,
+    StockMovement,
+    StockReconciliation,
+    Supply,
+    SupplyLot,
+)
+from inventory.services.ledger import CENTRAL, SCHOOL, LedgerEntry, post_movements
+from inventory.services import reconciliation
+from inventory.services.reconciliation import CORRECTION_NOTE, reconcile_stock
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def inline_workers(settings):
+    # Worker threads open their own connections and cannot see the test transaction.
+    settings.STOCK_RECONCILIATION_WORKERS = 1
+    settings.STOCK_RECONCILIATION_PARTITION_SIZE = 1
+
+
+@pytest.fixture
+def user():
+    User = get_user_model()
+    return User.objects.create(
+        email='reconcile@semed.local',
+        name='Reconcile',
+        role=User.Roles.SEMED_ADMIN,
+        is_active=True,
+    )
+
+
+@pytest.fixture
+def ledger(user):
+    school = School.objects.create(name='Escola Reconciliacao')
+    rice, beans = Supply.objects.bulk_create([
+        Supply(name='Arroz', category='Graos', unit=Supply.Units.KG, min_stock=0),
+        Supply(name='Feijao', category='Graos', unit=Supply.Units.KG, min_stock=0),
+    ])
+
+    def entry(supply, movement_type, quantity, **kwargs):
+        return LedgerEntry(
+            supply=supply,
+            type=movement_type,
+            quantity=Decimal(quantity),
+            movement_date=date.today(),
+            created_by_id=user.pk,
+            **kwargs,
+        )
+
+    with transaction.atomic():
+        post_movements([
+            entry(rice, StockMovement.Types.IN, '10.5'),
+            entry(rice, StockMovement.Types.OUT, '4', school=school),
+            entry(beans, StockMovement.Types.IN, '8'),
+            entry(rice, StockMovement.Types.IN, '4', school=school, balance=SCHOOL),
+            entry(rice, StockMovement.Types.OUT, '1.25', school=school, balance=SCHOOL),
+            entry(rice, StockMovement.Types.OUT, '2', school=school, balance=None),
+        ])
+    lot = SupplyLot.objects.create(supply=rice, lot_code='L1', expiry_date=date(2030, 1, 1))
+    LotBalanceCentral.objects.create(lot=lot, quantity=Decimal('6.5'))
+    LotBalanceSchool.objects.create(school=school, lot=lot, quantity=Decimal('2.75'))
+    return school, rice, beans
+
+
+def test_consistent_ledger_has_no_discrepancies(ledger):
+    run = reconcile_stock()
+
+    assert run.supplies_checked == 2
+    assert run.movements_checked == 5
+    assert run.discrepancy_count == 0
+    assert run.discrepancies == []
+
+
+def test_reports_every_store_and_corrects_aggregates(ledger, user):
+    school, rice, beans = ledger
+    StockBalance.objects.filter(supply=beans).update(quantity=Decimal('7'))
+    SchoolStockBalance.objects.filter(school=school, supply=rice).update(quantity=Decimal('3'))
+    LotBalanceCentral.objects.update(quantity=Decimal('6'))
+    # Legacy movement without a balance: counted against the school's balance.
+    StockMovement.objects.create(
+        supply=beans, school=school, type=StockMovement.Types.IN, quantity=2,
+        movement_date=date.today(), created_by=user,
+    )
+
+    run = reconcile_stock()
+
+    found = {(item['kind'], item['supply_id']): item for item in run.discrepancies}
+    assert set(found) == {('central', str(beans.pk)), ('school', str(rice.pk)), ('school', str(beans.pk)),
+                          ('central_lots', str(rice.pk))}
+    assert found[('central', str(beans.pk))]['difference'] == '-1.00'
+    assert found[('school', str(rice.pk))] == {
+        'kind': 'school', 'supply_id': str(rice.pk), 'school_id': str(school.pk),
+        'expected': '2.75', 'actual': '3.00', 'difference': '0.25',
+    }
+    assert found[('school', str(beans.pk))]['expected'] == '2.00'
+
+    corrected = reconcile_stock(correct=True, user=user)
+    assert corrected.corrections_posted == 3
+    corrections = StockMovement.objects.filter(note=CORRECTION_NOTE)
+    assert set(corrections.values_list('supply_id', 'balance', 'type', 'quantity')) == {
+        (beans.pk, CENTRAL, StockMovement.Types.OUT, Decimal('1.00')),
+        (rice.pk, SCHOOL, StockMovement.Types.IN, Decimal('0.25')),
+        (beans.pk, SCHOOL, StockMovement.Types.OUT, Decimal('2.00')),
+    }
+    # Corrections fix the ledger, not the balances; lots are checked against the corrected ledger.
+    assert StockBalance.objects.get(supply=beans).quantity == Decimal('7')
+    assert [item['kind'] for item in reconcile_stock().discrepancies] == ['central_lots', 'school_lots']
+
+
+def test_reconciliation_endpoint(ledger, user):
+    client = APIClient()
+    client.force_authenticate(user)
+    assert client.get('/api/stock/reconciliation/').status_code == 404
+
+    response = client.post('/api/stock/reconciliation/', {}, format='json')
+    assert response.status_code == 201
+    assert response.data['discrepancy_count'] == 0
+    assert client.get('/api/stock/reconciliation/').data['id'] == response.data['id']
+
+    User = get_user_model()
+    other = User.objects.create(email='nutri@semed.local', name='Nutri', role=User.Roles.NUTRITIONIST, is_active=True)
+    client.force_authenticate(other)
+    assert client.post('/api/stock/reconciliation/', {}, format='json').status_code == 403
+
+
+def test_reconcile_stock_command_writes_report(ledger, user, tmp_path):
+    school, rice, beans = ledger
+    StockBalance.objects.filter(supply=rice).update(quantity=0)
+    output = tmp_path / 'report.json'
+
+    call_command('reconcile_stock', '--correct', '--output', str(output))
+
+    report = json.loads(output.read_text())
+    assert [item['kind'] for item in report['discrepancies']] == ['central']
+    assert report['corrections_posted'] == 1
+    run = StockReconciliation.objects.get()
+    assert run.triggered_by == user
+
+
+def test_corrections_skip_discrepancies_fixed_since_the_read(ledger, user, monkeypatch):
+    school, rice, beans = ledger
+    StockBalance.objects.filter(supply=beans).update(quantity=Decimal('7'))
+    SchoolStockBalance.objects.filter(school=school, supply=rice).update(quantity=Decimal('3'))
+    recheck = reconciliation._recheck
+
+    def fixed_meanwhile(discrepancies):
+        # Posted by another process after the run read the ledger.
+        StockMovement.objects.create(
+            supply=beans, type=StockMovement.Types.OUT, quantity=1, balance=CENTRAL,
+            movement_date=date.today(), created_by=user,
+        )
+        return recheck(discrepancies)
+
+    monkeypatch.setattr(reconciliation, '_recheck', fixed_meanwhile)
+    run = reconcile_stock(correct=True, user=user)
+
+    assert run.discrepancy_count == 2
+    assert run.corrections_posted == 1
+    assert list(StockMovement.objects.filter(note=CORRECTION_NOTE).values_list('supply_id', 'balance')) == [
+        (rice.pk, SCHOOL),
+    ]
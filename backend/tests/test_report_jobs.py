@@ -0,0 +1,176 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from inventory.models import StockBalance, Supply
+from reports.models import ReportJob
+from merenda_semed.blobs import blob_name, blob_path
+from reports import services
+from reports.services import claim_next_job, purge_report_artifacts, request_report
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def blob_root(settings, tmp_path):
+    settings.BLOB_ROOT = str(tmp_path / 'blobs')
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user():
+    User = get_user_model()
+    user = User.objects.create(
+        email='reports@semed.local',
+        name='Reports',
+        role=User.Roles.SEMED_ADMIN,
+        is_staff=True,
+        is_active=True,
+    )
+    user.set_password('Test123!')
+    user.save(update_fields=['password'])
+    return user
+
+
+@pytest.fixture
+def supply():
+    supply = Supply.objects.create(name='Arroz', category='Graos', unit=Supply.Units.KG, min_stock=10)
+    StockBalance.objects.create(supply=supply, quantity=20)
+    return supply
+
+
+def test_report_is_queued_rendered_and_downloaded(api_client, admin_user, supply):
+    api_client.force_authenticate(user=admin_user)
+
+    response = api_client.post('/api/reports/jobs/', {'kind': 'STOCK'}, format='json')
+    assert response.status_code == 202
+    job_id = response.data['id']
+    assert response.data['status'] == ReportJob.Status.PENDING
+    assert response.data['download_url'] is None
+    assert api_client.get(f'/api/reports/jobs/{job_id}/download/').status_code == 409
+
+    call_command('run_report_worker', '--once')
+
+    detail = api_client.get(f'/api/reports/jobs/{job_id}/')
+    assert detail.data['status'] == ReportJob.Status.DONE
+    assert detail.data['download_url'].endswith(f'/api/reports/jobs/{job_id}/download/')
+
+    download = api_client.get(f'/api/reports/jobs/{job_id}/download/')
+    assert download.status_code == 200
+    assert download['Content-Disposition'] == 'attachment; filename="stock_report.pdf"'
+    assert b''.join(download.streaming_content).startswith(b'%PDF')
+
+
+def test_identical_filters_share_one_job(admin_user, supply):
+    school_id = '6f1c3c0e-4f0a-4d3a-9a43-0c4b6c1f2d11'
+    first, created = request_report('CONSUMPTION', {'school': school_id, 'date_from': '2026-01-01'}, admin_user)
+    assert created
+    # Key order, empty values and unknown keys do not change the filter set.
+    second, created = request_report(
+        'CONSUMPTION',
+        {'date_from': '2026-01-01', 'school': school_id.upper(), 'supply': '', 'status': 'DONE'},
+        admin_user,
+    )
+    assert not created
+    assert second.pk == first.pk
+
+    _, created = request_report('CONSUMPTION', {'school': school_id}, admin_user)
+    assert created
+
+
+def test_data_change_marks_finished_report_stale(api_client, admin_user, supply, django_capture_on_commit_callbacks):
+    job, _ = request_report('STOCK', {}, admin_user)
+    call_command('run_report_worker', '--once')
+
+    cached, created = request_report('STOCK', {}, admin_user)
+    assert not created and cached.pk == job.pk
+
+    with django_capture_on_commit_callbacks(execute=True):
+        StockBalance.objects.filter(supply=supply).update(quantity=5)
+        supply.save()
+
+    job.refresh_from_db()
+    assert job.is_stale
+    fresh, created = request_report('STOCK', {}, admin_user)
+    assert created and fresh.pk != job.pk
+
+
+def test_expired_artifact_is_not_reused(settings, admin_user, supply):
+    job, _ = request_report('STOCK', {}, admin_user)
+    call_command('run_report_worker', '--once')
+    ReportJob.objects.filter(pk=job.pk).update(finished_at=timezone.now() - timedelta(seconds=settings.REPORT_ARTIFACT_MAX_AGE + 1))
+
+    _, created = request_report('STOCK', {}, admin_user)
+
+    assert created
+    job.refresh_from_db()
+    assert job.is_stale
+
+
+def test_invalid_filters_are_rejected(api_client, admin_user):
+    api_client.force_authenticate(user=admin_user)
+    response = api_client.post(
+        '/api/reports/jobs/',
+        {'kind': 'DELIVERIES', 'params': {'date_from': '31/01/2026', 'school': 'abc'}},
+        format='json',
+    )
+    assert response.status_code == 400
+    assert set(response.data['params']) == {'date_from', 'school'}
+    assert not ReportJob.objects.exists()
+
+
+def test_stuck_running_job_is_requeued(settings, admin_user, supply):
+    job, _ = request_report('STOCK', {}, admin_user)
+    claimed = claim_next_job()
+    assert claimed.pk == job.pk and claimed.status == ReportJob.Status.RUNNING
+    ReportJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(seconds=settings.REPORT_JOB_TIMEOUT + 1))
+
+    call_command('run_report_worker', '--once')
+
+    job.refresh_from_db()
+    assert job.status == ReportJob.Status.DONE
+    assert job.attempts == 2
+
+
+def test_purge_removes_only_unused_artifacts(api_client, settings, admin_user, supply):
+    old, _ = request_report('STOCK', {}, admin_user)
+    call_command('run_report_worker', '--once')
+    old.refresh_from_db()
+    ReportJob.objects.filter(pk=old.pk).update(finished_at=timezone.now() - timedelta(seconds=settings.REPORT_ARTIFACT_MAX_AGE + 1))
+    live, _ = request_report('DELIVERIES', {}, admin_user)
+    assert purge_report_artifacts() == 1
+    # The worker purges too, before its first job.
+    call_command('run_report_worker', '--once')
+    live.refresh_from_db()
+
+    assert not blob_path(blob_name(old.artifact)).exists()
+    assert blob_path(blob_name(live.artifact)).exists()
+    api_client.force_authenticate(user=admin_user)
+    assert api_client.get(f'/api/reports/jobs/{old.pk}/download/').status_code == 404
+    assert purge_report_artifacts() == 0
+
+
+def test_worker_survives_a_job_error(admin_user, supply, monkeypatch):
+    broken, _ = request_report('STOCK', {}, admin_user)
+    request_report('DELIVERIES', {}, admin_user)
+    run_job = services.run_job
+
+    def flaky(job):
+        if job.pk == broken.pk:
+            raise RuntimeError('conexao perdida')
+        return run_job(job)
+
+    monkeypatch.setattr('reports.management.commands.run_report_worker.run_job', flaky)
+    call_command('run_report_worker', '--once')
+
+    statuses = dict(ReportJob.objects.values_list('kind', 'status'))
+    # The broken job is left running and requeued after REPORT_JOB_TIMEOUT.
+    assert statuses == {'STOCK': ReportJob.Status.RUNNING, 'DELIVERIES': ReportJob.Status.DONE}
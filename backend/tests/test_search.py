@@ -0,0 +1,122 @@
+from datetime import date
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from inventory.models import Delivery, StockBalance, Supply
+from recipes.models import Recipe
+from schools.models import School
+from search.models import SearchDocument
+from search.text import normalize, stem
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _user(role):
+    User = get_user_model()
+    return User.objects.create(email=f'{role.lower()}@semed.local', name=role, role=role, is_active=True)
+
+
+@pytest.fixture
+def admin_client():
+    client = APIClient()
+    client.force_authenticate(_user(get_user_model().Roles.SEMED_ADMIN))
+    return client
+
+
+@pytest.fixture
+def catalog():
+    feijao = Supply.objects.create(name='Feijão Carioca', category='Graos', unit='kg')
+    Supply.objects.create(name='Arroz Branco', category='Graos', unit='kg', storage_instructions='Local seco')
+    StockBalance.objects.create(supply=feijao, quantity=10)
+    school = School.objects.create(name='Escola São João', city='Parnaíba')
+    recipe = Recipe.objects.create(name='Baião de dois', instructions='Cozinhar o feijão e o arroz juntos.')
+    return feijao, school, recipe
+
+
+def test_normalize_and_stem():
+    assert normalize('Feijão-Carioca, 1kg!') == 'feijao carioca 1kg'
+    assert stem('feijoes') == stem('feijao') == 'feij'
+    assert stem('arroz') == 'arroz'
+
+
+def test_documents_follow_saves_and_deletes(catalog):
+    feijao, school, recipe = catalog
+    document = SearchDocument.objects.get(entity_type='supply', object_id=feijao.pk)
+    assert document.title == 'Feijão Carioca'
+    assert document.title_text == 'feijao carioca'
+
+    feijao.name = 'Feijão Preto'
+    feijao.save()
+    document.refresh_from_db()
+    assert document.title_text == 'feijao preto'
+
+    recipe.delete()
+    assert not SearchDocument.objects.filter(entity_type='recipe').exists()
+
+
+def test_search_endpoint_ranks_across_types(admin_client, catalog):
+    feijao, school, recipe = catalog
+
+    response = admin_client.get('/api/search/', {'q': 'feijoes'})
+    assert response.status_code == 200
+    results = response.data['results']
+    assert [(row['type'], row['id']) for row in results] == [('supply', str(feijao.pk)), ('recipe', str(recipe.pk))]
+    assert results[0]['rank'] > results[1]['rank']
+
+    results = admin_client.get('/api/search/', {'q': 'sao joao parnaiba'}).data['results']
+    assert [row['title'] for row in results] == ['Escola São João']
+
+    assert admin_client.get('/api/search/', {'q': 'feijao', 'types': 'school'}).data == {'results': []}
+    assert admin_client.get('/api/search/', {'q': 'feijao', 'types': 'menu'}).status_code == 400
+    assert admin_client.get('/api/search/', {'q': ''}).data == {'results': []}
+
+
+def test_search_hides_recipes_from_non_admins(catalog):
+    client = APIClient()
+    client.force_authenticate(_user(get_user_model().Roles.NUTRITIONIST))
+    results = client.get('/api/search/', {'q': 'feijao'}).data['results']
+    assert [row['type'] for row in results] == ['supply']
+
+
+def test_list_filters_use_the_index(admin_client, catalog):
+    feijao, school, recipe = catalog
+
+    supplies = admin_client.get('/api/supplies/', {'q': 'feij'}).data
+    assert [row['name'] for row in supplies] == ['Feijão Carioca']
+    stock = admin_client.get('/api/stock/', {'q': 'FEIJAO'}).data
+    assert [row['supply']['id'] for row in stock] == [str(feijao.pk)]
+    schools = admin_client.get('/api/schools/', {'q': 'joao'}).data
+    assert [row['id'] for row in schools] == [str(school.pk)]
+    recipes = admin_client.get('/api/recipes/', {'search': 'arroz'}).data
+    assert [row['id'] for row in recipes] == [str(recipe.pk)]
+
+
+def test_queries_without_terms_fall_back_to_text_matching(admin_client, catalog):
+    feijao, school, recipe = catalog
+
+    recipes = admin_client.get('/api/recipes/', {'search': 'de'}).data
+    assert [row['id'] for row in recipes] == [str(recipe.pk)]
+    supplies = admin_client.get('/api/supplies/', {'q': '...'}).data
+    assert len(supplies) == 2
+    assert admin_client.get('/api/search/', {'q': '?!'}).data == {'results': []}
+    results = admin_client.get('/api/search/', {'q': 'de'}).data['results']
+    assert [row['id'] for row in results] == [str(recipe.pk)]
+
+
+def test_rebuild_search_index_picks_up_unsignalled_writes(catalog):
+    feijao, school, recipe = catalog
+    user = _user(get_user_model().Roles.SEMED_ADMIN)
+    Delivery.objects.create(school=school, delivery_date=date(2026, 3, 2), created_by=user, notes='Entrega parcial')
+    Supply.objects.filter(pk=feijao.pk).update(name='Feijão Fradinho')
+
+    call_command('rebuild_search_index')
+
+    assert SearchDocument.objects.get(entity_type='supply', object_id=feijao.pk).title == 'Feijão Fradinho'
+    delivery = SearchDocument.objects.get(entity_type='delivery')
+    assert delivery.title == 'Entrega Escola São João'
+    assert delivery.body_text == '2026 03 02 entrega parcial'
+    assert SearchDocument.objects.count() == 5
@@ -0,0 +1,170 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from inventory.models import SchoolStockBalance, StockBalance, StockBalanceSnapshot, StockMovement, StockSnapshotRun, Supply
+from inventory.services.ledger import SCHOOL, LedgerEntry, post_movements
+from inventory.services.snapshots import annotate_as_of, take_snapshots
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+DAY = date(2026, 3, 2)
+
+
+@pytest.fixture
+def user():
+    User = get_user_model()
+    return User.objects.create(
+        email='snapshots@semed.local',
+        name='Snapshots',
+        role=User.Roles.SEMED_ADMIN,
+        is_active=True,
+    )
+
+
+@pytest.fixture
+def ledger(user):
+    school = School.objects.create(name='Escola Historico')
+    rice, beans = Supply.objects.bulk_create([
+        Supply(name='Arroz', category='Graos', unit=Supply.Units.KG, min_stock=5),
+        Supply(name='Feijao', category='Graos', unit=Supply.Units.KG, min_stock=0),
+    ])
+
+    def post(day, *entries):
+        with transaction.atomic():
+            post_movements([
+                LedgerEntry(
+                    supply=supply,
+                    type=movement_type,
+                    quantity=Decimal(quantity),
+                    movement_date=day,
+                    created_by_id=user.pk,
+                    **kwargs,
+                )
+                for supply, movement_type, quantity, kwargs in entries
+            ])
+
+    post.school, post.rice, post.beans = school, rice, beans
+    post(DAY, (rice, StockMovement.Types.IN, '20', {}), (beans, StockMovement.Types.IN, '8', {}))
+    post(
+        DAY + timedelta(days=1),
+        (rice, StockMovement.Types.OUT, '6', {'school': school}),
+        (rice, StockMovement.Types.IN, '6', {'school': school, 'balance': SCHOOL}),
+    )
+    # Same-day IN and OUT: the balance does not change, no snapshot for that day.
+    post(
+        DAY + timedelta(days=2),
+        (beans, StockMovement.Types.IN, '2', {}),
+        (beans, StockMovement.Types.OUT, '2', {}),
+    )
+    post(DAY + timedelta(days=4), (rice, StockMovement.Types.OUT, '1.5', {'school': school, 'balance': SCHOOL}))
+    return post
+
+
+def _snapshots():
+    return set(StockBalanceSnapshot.objects.values_list('school_id', 'supply_id', 'snapshot_date', 'quantity'))
+
+
+def test_snapshots_only_changed_days(ledger):
+    school, rice, beans = ledger.school, ledger.rice, ledger.beans
+
+    run = take_snapshots(DAY + timedelta(days=3))
+
+    assert run.rebuilt_from is None
+    assert _snapshots() == {
+        (None, rice.pk, DAY, Decimal('20')),
+        (None, beans.pk, DAY, Decimal('8')),
+        (None, rice.pk, DAY + timedelta(days=1), Decimal('14')),
+        (school.pk, rice.pk, DAY + timedelta(days=1), Decimal('6')),
+    }
+
+    run = take_snapshots(DAY + timedelta(days=5))
+    assert run.rebuilt_from == DAY + timedelta(days=4)
+    assert run.rows_written == 1
+    assert StockBalanceSnapshot.objects.get(snapshot_date=DAY + timedelta(days=4)).quantity == Decimal('4.5')
+
+
+def test_backdated_movements_rebuild_from_their_date(ledger):
+    take_snapshots(DAY + timedelta(days=5))
+    ledger(DAY + timedelta(days=1), (ledger.beans, StockMovement.Types.OUT, '3', {}))
+
+    run = take_snapshots(DAY + timedelta(days=5))
+
+    assert run.rebuilt_from == DAY + timedelta(days=1)
+    central_beans = StockBalanceSnapshot.objects.filter(supply=ledger.beans, school__isnull=True).order_by('snapshot_date')
+    assert [(row.snapshot_date, row.quantity) for row in central_beans] == [
+        (DAY, Decimal('8')),
+        (DAY + timedelta(days=1), Decimal('5')),
+    ]
+    assert StockBalanceSnapshot.objects.get(school=ledger.school, snapshot_date=DAY + timedelta(days=4)).quantity == Decimal('4.5')
+
+
+def test_as_of_adds_movements_after_the_nearest_snapshot(ledger):
+    take_snapshots(DAY + timedelta(days=1))
+
+    def school_rice(as_of):
+        balances = annotate_as_of(SchoolStockBalance.objects.filter(school=ledger.school), as_of)
+        return balances.get().as_of_quantity
+
+    with CaptureQueriesContext(connection) as ctx:
+        assert school_rice(DAY + timedelta(days=10)) == Decimal('4.5')
+    assert len(ctx.captured_queries) == 1
+    assert school_rice(DAY + timedelta(days=1)) == Decimal('6')
+    assert school_rice(DAY) == Decimal('0')
+    central = {row.supply_id: row.as_of_quantity for row in annotate_as_of(StockBalance.objects.all(), DAY)}
+    assert central == {ledger.rice.pk: Decimal('20'), ledger.beans.pk: Decimal('8')}
+
+
+def test_as_of_parameter_on_stock_endpoints(ledger, user):
+    call_command('snapshot_stock_balances', '--date', (DAY + timedelta(days=3)).isoformat())
+    assert StockSnapshotRun.objects.count() == 1
+    client = APIClient()
+    client.force_authenticate(user)
+
+    stock = client.get('/api/stock/', {'as_of': (DAY + timedelta(days=1)).isoformat()}).json()
+    assert {row['supply']['name']: row['quantity'] for row in stock} == {'Arroz': '14.00', 'Feijao': '8.00'}
+    low = client.get('/api/stock/', {'as_of': DAY.isoformat(), 'low_stock': 'true'}).json()
+    assert low == []
+    assert client.get('/api/stock/', {'as_of': 'ontem'}).status_code == 400
+
+    response = client.get(f'/api/schools/{ledger.school.pk}/stock/', {'as_of': (DAY + timedelta(days=1)).isoformat()})
+    assert response.data['as_of'] == (DAY + timedelta(days=1)).isoformat()
+    assert [item['quantity'] for item in response.json()['items']] == ['6.00']
+    assert client.get(f'/api/schools/{ledger.school.pk}/stock/').json()['items'][0]['quantity'] == '4.50'
+
+
+def test_edited_and_deleted_past_movements_rebuild_from_their_date(ledger, user):
+    take_snapshots(DAY + timedelta(days=5))
+    client = APIClient()
+    client.force_authenticate(user)
+    delivered = StockMovement.objects.get(supply=ledger.rice, type=StockMovement.Types.OUT, balance='central')
+
+    response = client.patch(f'/api/stock/movements/{delivered.pk}/', {
+        'supply': str(ledger.rice.pk),
+        'type': StockMovement.Types.OUT,
+        'quantity': '4',
+        'movement_date': (DAY + timedelta(days=3)).isoformat(),
+    }, format='json')
+    assert response.status_code == 200
+
+    run = take_snapshots(DAY + timedelta(days=5))
+    assert run.rebuilt_from == DAY + timedelta(days=1)
+    central_rice = StockBalanceSnapshot.objects.filter(supply=ledger.rice, school__isnull=True).order_by('snapshot_date')
+    assert [(row.snapshot_date, row.quantity) for row in central_rice] == [
+        (DAY, Decimal('20')),
+        (DAY + timedelta(days=3), Decimal('16')),
+    ]
+
+    StockMovement.objects.get(supply=ledger.beans, type=StockMovement.Types.IN, movement_date=DAY).delete()
+    run = take_snapshots(DAY + timedelta(days=5))
+    assert run.rebuilt_from == DAY
+    assert not StockBalanceSnapshot.objects.filter(supply=ledger.beans, snapshot_date=DAY).exists()
+    # Nothing changed since: the next run only writes new days.
+    assert take_snapshots(DAY + timedelta(days=5)).rebuilt_from == DAY + timedelta(days=6)
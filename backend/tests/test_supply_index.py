@@ -0,0 +1,146 @@
+from datetime import date
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from inventory.models import Supply
+from menus.models import Menu, MenuItem
+from production.models import SupplyAlias, SupplyConsumptionRule
+from production.services import production_calc
+from production.services.production_calc import resolve_supply_from_text
+from production.services.supply_index import SupplyIndex, bump_catalog_version, get_supply_index
+from schools.models import School
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def supplies():
+    return {
+        name: Supply.objects.create(name=name, category='Graos', unit=Supply.Units.KG, min_stock=0)
+        for name in ['Arroz Branco', 'Arroz Integral', 'Feijão Carioca', 'Leite em Pó']
+    }
+
+
+def test_resolution_ranks_normalized_names(supplies):
+    warnings = []
+    assert resolve_supply_from_text('feijao carioca', warnings) == supplies['Feijão Carioca']
+    assert resolve_supply_from_text('Feijao cariocca', warnings) == supplies['Feijão Carioca']
+    assert resolve_supply_from_text('leite em po', warnings) == supplies['Leite em Pó']
+    assert warnings == []
+
+    assert resolve_supply_from_text('arroz', warnings) is None
+    assert resolve_supply_from_text('batata', warnings) is None
+    assert warnings == ['Alias ambiguo para token "arroz".', 'Insumo nao encontrado para token "batata".']
+
+
+def test_alias_wins_and_saves_invalidate_the_index(supplies):
+    index = get_supply_index()
+    assert get_supply_index() is index
+
+    SupplyAlias.objects.create(supply=supplies['Arroz Branco'], alias='arroz')
+    assert get_supply_index() is not index
+    assert resolve_supply_from_text('Arroz') == supplies['Arroz Branco']
+
+    supplies['Leite em Pó'].is_active = False
+    supplies['Leite em Pó'].save()
+    assert resolve_supply_from_text('leite em po') is None
+
+
+def test_catalog_changes_by_other_processes_rebuild_the_index(supplies):
+    index = get_supply_index()
+    # Another worker saved a supply: only the version row changed here.
+    bump_catalog_version()
+    rebuilt = get_supply_index()
+    assert rebuilt is not index
+    assert rebuilt.catalog_version == index.catalog_version + 1
+    assert get_supply_index() is rebuilt
+
+
+def test_search_suggests_prefixes():
+    index = SupplyIndex(
+        [Supply(name=name, unit=Supply.Units.KG) for name in ['Feijão Preto', 'Farinha de Mandioca', 'Arroz']],
+        [],
+    )
+    assert [match.supply.name for match in index.search('feij')] == ['Feijão Preto']
+    assert [match.supply.name for match in index.search('farinha mand', limit=1)] == ['Farinha de Mandioca']
+    assert index.search('de') == []
+
+
+def test_typeahead_endpoint(supplies):
+    User = get_user_model()
+    admin = User.objects.create(email='typeahead@semed.local', name='Admin', role=User.Roles.SEMED_ADMIN, is_staff=True)
+    client = APIClient()
+    client.force_authenticate(user=admin)
+
+    response = client.get('/api/production/aliases/typeahead/', {'q': 'arr', 'limit': 1})
+    assert response.status_code == 200
+    assert [row['supply_name'] for row in response.data] == ['Arroz Branco']
+    assert response.data[0]['score'] > 0
+    assert client.get('/api/production/aliases/typeahead/', {'q': ''}).data == []
+    assert client.get('/api/production/aliases/typeahead/', {'q': 'arr', 'limit': 'x'}).status_code == 400
+
+
+def test_parsed_ingredients_are_stored_and_reused(supplies, monkeypatch):
+    author = get_user_model().objects.create(email='parsed@semed.local', name='Parsed')
+    school = School.objects.create(name='Escola Parse')
+    SupplyConsumptionRule.objects.create(
+        school=school, supply=supplies['Feijão Carioca'], qty_per_student='0.04', unit=Supply.Units.KG,
+    )
+    menu = Menu.objects.create(school=school, week_start=date(2026, 3, 2), week_end=date(2026, 3, 6), created_by=author)
+    item = MenuItem.objects.create(menu=menu, day_of_week='MON', meal_type='LUNCH', description='Feijao carioca, arroz')
+
+    call_command('backfill_parsed_ingredients')
+    item.refresh_from_db()
+    assert item.parsed_ingredients == [
+        {'token': 'feijao carioca', 'supply_id': str(supplies['Feijão Carioca'].id), 'issue': ''},
+        {'token': 'arroz', 'supply_id': None, 'issue': 'ambiguous'},
+    ]
+    version = item.parsed_catalog_version
+
+    parse_calls = []
+    original = production_calc.parse_ingredients_from_description
+
+    def counting(description):
+        parse_calls.append(description)
+        return original(description)
+
+    monkeypatch.setattr(production_calc, 'parse_ingredients_from_description', counting)
+
+    result = production_calc.calculate_for_menu(menu, {'DEFAULT': 100})
+    assert parse_calls == []
+    assert result['warnings'] == ['Alias ambiguo para token "arroz".']
+
+    # A new alias moves the catalog version, so the item is parsed again and saved.
+    SupplyAlias.objects.create(supply=supplies['Arroz Branco'], alias='arroz')
+    result = production_calc.calculate_for_menu(menu, {'DEFAULT': 100})
+    assert parse_calls == ['Feijao carioca, arroz']
+    assert any('Sem regra para Arroz Branco' in warning for warning in result['warnings'])
+    item.refresh_from_db()
+    assert item.parsed_catalog_version > version
+    assert item.parsed_ingredients[1]['supply_id'] == str(supplies['Arroz Branco'].id)
+
+    MenuItem.objects.filter(pk=item.pk).update(description='leite em po')
+    production_calc.calculate_for_menu(menu, {'DEFAULT': 100})
+    assert parse_calls[-1] == 'leite em po'
+
+
+def test_stale_index_does_not_overwrite_a_newer_parse(supplies):
+    author = get_user_model().objects.create(email='stale@semed.local', name='Stale')
+    school = School.objects.create(name='Escola Stale')
+    menu = Menu.objects.create(school=school, week_start=date(2026, 3, 2), week_end=date(2026, 3, 6), created_by=author)
+    item = MenuItem.objects.create(menu=menu, day_of_week='MON', meal_type='LUNCH', description='arroz')
+    stale = get_supply_index()
+    # Another worker adds an alias and stores the parse against the new catalog.
+    SupplyAlias.objects.create(supply=supplies['Arroz Branco'], alias='arroz')
+    call_command('backfill_parsed_ingredients')
+    item.refresh_from_db()
+    version = item.parsed_catalog_version
+
+    assert production_calc.refresh_parsed_ingredients(item, stale)
+    assert production_calc.save_parsed_items([item], stale) == 0
+    item.refresh_from_db()
+    assert item.parsed_catalog_version == version
+    assert item.parsed_ingredients[0]['supply_id'] == str(supplies['Arroz Branco'].id)